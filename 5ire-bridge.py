@@ -2,28 +2,140 @@
 """FastMCP-based bridge exposing Fiddler real-time inspection tools to MCP clients."""
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import logging
 import os
-from dataclasses import dataclass
-from datetime import datetime
+import queue
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
-from time import sleep
-from typing import Any, Dict, List, Optional, Annotated
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic, strftime
+from typing import Any, Dict, List, Optional, Tuple, Annotated
 
 import requests
+from requests.adapters import HTTPAdapter
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None  # type: ignore
+    ORJSON_AVAILABLE = False
+
+# Parse straight from response bytes: skips the str decode that response.json()
+# and response.text perform, which matters for multi-MB body payloads.
+if ORJSON_AVAILABLE:
+    def _json_loads(data: bytes) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # enhanced-bridge escapes lone surrogates as \udXXX (ensure_ascii);
+            # orjson rejects those, stdlib json accepts them
+            return json.loads(data)
+
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
 DEFAULT_BRIDGE_URL = "http://127.0.0.1:8081"
 DEFAULT_TIMEOUT = 10.0
 DEFAULT_BODY_TIMEOUT = 30.0
+MAX_COMPARE_SESSIONS = 10
+# One worker per compare slot so a full comparison fans out in a single wave.
+MAX_PARALLEL_BODY_FETCHES = MAX_COMPARE_SESSIONS
+METADATA_CACHE_TTL = 2.0
+HEALTH_CACHE_TTL = 5.0
+BODY_CACHE_TTL = 30.0
+BODY_CACHE_SIZE = 128
 ENV_PREFIX = "FMP_FIDDLER_"
 
 
+# Fields that may carry an EKFiddle comment, in priority order. Body replies
+# add snake_case aliases next to the camelCase session fields.
+_EKFIDDLE_KEYS = ("ekfiddle_comment", "ekfiddleComments", "sessionFlags", "ekfiddleFlags")
+_BODY_EKFIDDLE_KEYS = (
+    "ekfiddle_comment",
+    "ekfiddle_comments",
+    "ekfiddleComments",
+    "session_flags",
+    "sessionFlags",
+    "ekfiddle_flags",
+    "ekfiddleFlags",
+)
+
+_SIZE_UNITS = ((1024 * 1024, "MB"), (1024, "KB"))
+
+
+def _clamp(value: int, lo: int, hi: int) -> int:
+    """Bound a numeric tool argument to [lo, hi]."""
+    return lo if value < lo else hi if value > hi else value
+
+
+def _env(name: str, default: str) -> str:
+    return os.environ.get(f"{ENV_PREFIX}{name}", default)
+
+
+def _clean_filter(value: Optional[str]) -> Optional[str]:
+    """Strip a string filter argument; blank or missing means no filter (None)."""
+    return (value.strip() or None) if value else None
+
+
+def _project_headers(headers: Any, wanted: frozenset) -> Any:
+    """Keep only header names in ``wanted`` (lower-cased); non-dict values pass through."""
+    if not isinstance(headers, dict):
+        return headers
+    return {name: value for name, value in headers.items() if name.lower() in wanted}
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@lru_cache(maxsize=512)
+def _format_size(size_bytes: int) -> str:
+    """Format byte size to human readable string (KB, MB)"""
+    for threshold, unit in _SIZE_UNITS:
+        if size_bytes >= threshold:
+            return f"{size_bytes / threshold:.1f}{unit}"
+    return f"{size_bytes} bytes"
+
+
 class BridgeError(Exception):
     """Base exception for bridge related failures."""
 
+    @property
+    def retryable(self) -> bool:
+        """Whether retrying the same request could succeed."""
+        return True
+
 
 class BridgeConnectionError(BridgeError):
     """Raised when the HTTP bridge cannot be reached."""
@@ -32,6 +144,23 @@ class BridgeConnectionError(BridgeError):
 class BridgeRequestError(BridgeError):
     """Raised for non-connection related HTTP errors."""
 
+    def __init__(
+        self,
+        message: str,
+        *,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Client errors are final except request-timeout and rate-limit responses."""
+        code = self.status_code
+        return code is None or not 400 <= code < 500 or code in (408, 429)
+
 
 class HttpMethod(str, Enum):
     """Supported HTTP methods for session searching."""
@@ -45,6 +174,11 @@ class HttpMethod(str, Enum):
     PATCH = "PATCH"
 
 
+# Plain-string value per tool argument (None = no method filter)
+_METHOD_STR: Dict[Optional[HttpMethod], Optional[str]] = {m: m.value for m in HttpMethod}
+_METHOD_STR[None] = None
+
+
 class TimelineGrouping(str, Enum):
     """Valid grouping keys for the timeline endpoint."""
 
@@ -61,15 +195,56 @@ class FiddlerBridgeClient:
     base_url: str = DEFAULT_BRIDGE_URL
     timeout: float = DEFAULT_TIMEOUT
     max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    jitter: float = 0.5
+    _base_url: str = field(init=False, repr=False)
+    _session: requests.Session = field(init=False, repr=False)
+    _metadata_cache: Dict[str, Dict[str, Any]] = field(init=False, repr=False, default_factory=dict)
+    _metadata_cache_time: float = field(init=False, repr=False, default=float("-inf"))
+    _metadata_lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+    _bulk_bodies_supported: bool = field(init=False, repr=False, default=True)
+    _closed: threading.Event = field(init=False, repr=False, default_factory=threading.Event)
+    _health_ok_time: float = field(init=False, repr=False, default=float("-inf"))
+    _body_cache: "OrderedDict[Tuple[str, bool, bool], Tuple[float, Dict[str, Any]]]" = field(
+        init=False, repr=False, default_factory=OrderedDict
+    )
+    _body_cache_lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self._base_url = self.base_url.rstrip("/")
+        # One pooled keep-alive session for every bridge call. trust_env=False
+        # bypasses system proxies (Fiddler itself) for the localhost bridge and
+        # also skips requests' per-call environment merge, leaving only request
+        # preparation on top of urllib3's pool; a raw urllib3 pool would save
+        # microseconds per call against millisecond bridge round-trips.
+        self._session = requests.Session()
+        self._session.trust_env = False
+        # Keep one idle connection per body-fetch worker so a full fan-out never
+        # has to reconnect. Transport-level retries stay off: request_with_retry
+        # owns the retry policy (backoff, Retry-After, cancellation) and a
+        # urllib3 Retry would multiply attempts underneath it.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PARALLEL_BODY_FETCHES, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @classmethod
+    def from_env(cls) -> "FiddlerBridgeClient":
+        """Build a client from the FMP_FIDDLER_BRIDGE_URL / FMP_FIDDLER_TIMEOUT settings."""
+        try:
+            timeout = max(1e-3, float(_env("TIMEOUT", str(DEFAULT_TIMEOUT))))
+        except ValueError:
+            timeout = DEFAULT_TIMEOUT
+        return cls(base_url=_env("BRIDGE_URL", DEFAULT_BRIDGE_URL), timeout=timeout)
 
-    def _format_size(self, size_bytes: int) -> str:
-        """Format byte size to human readable string (KB, MB)"""
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f}KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.1f}MB"
+    def close(self) -> None:
+        """Release pooled bridge connections and cancel pending retry waits."""
+        self._closed.set()
+        self._session.close()
+
+    def _wait(self, seconds: float) -> bool:
+        """Sleep between retries; returns True early if the client was closed."""
+        return self._closed.wait(seconds)
 
     def request(
         self,
@@ -80,64 +255,82 @@ class FiddlerBridgeClient:
         json_payload: Optional[Dict[str, Any]] = None,
         timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
-        url = f"{self.base_url.rstrip('/')}{path}"
-        import time
-        start_time = time.time()
+        url = self._base_url + path
+        start_time = monotonic()
         
         try:
             # CRITICAL: Bypass Fiddler proxy for localhost connections!
             # If Fiddler is running as system proxy, it will intercept localhost
-            # requests and cause timeouts. We must bypass it for internal comms.
-            response = requests.request(
+            # requests and cause timeouts. The session has trust_env=False so
+            # proxy environment settings are never consulted.
+            response = self._session.request(
                 method,
                 url,
                 params=params,
-                json=json_payload,
+                data=_json_dumps(json_payload) if json_payload is not None else None,
+                headers=_JSON_HEADERS if json_payload is not None else None,
                 timeout=timeout or self.timeout,
-                proxies={'http': None, 'https': None},  # Bypass all proxies for localhost
             )
             response.raise_for_status()
+            body = response.content
             
-            # Log HTTP timing and response size
-            elapsed_ms = int((time.time() - start_time) * 1000)
-            response_size = len(response.content) if response.content else 0
-            logging.info("HTTP %s %s -> %s (%dms, %s)", 
-                        method, path, response.status_code, elapsed_ms, self._format_size(response_size))
+            # Log HTTP timing and response size (skip the formatting when INFO is off)
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                elapsed_ms = int((monotonic() - start_time) * 1000)
+                logging.info("HTTP %s %s -> %s (%dms, %s)",
+                             method, path, response.status_code, elapsed_ms, _format_size(len(body)))
             
         except requests.exceptions.ConnectionError as exc:  # pragma: no cover - network specific
-            elapsed_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = int((monotonic() - start_time) * 1000)
             logging.warning("HTTP %s %s -> ConnectionError (%dms)", method, path, elapsed_ms)
             raise BridgeConnectionError("Cannot connect to Fiddler real-time bridge") from exc
         except requests.exceptions.Timeout as exc:  # pragma: no cover - network specific
-            elapsed_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = int((monotonic() - start_time) * 1000)
             logging.warning("HTTP %s %s -> Timeout (%dms)", method, path, elapsed_ms)
             raise BridgeRequestError("Bridge request timed out") from exc
+        except requests.exceptions.HTTPError as exc:
+            elapsed_ms = int((monotonic() - start_time) * 1000)
+            status_code = exc.response.status_code if exc.response is not None else None
+            retry_after = None
+            if status_code in (429, 503):
+                retry_after = _parse_retry_after(exc.response.headers.get("Retry-After"))
+            logging.warning("HTTP %s %s -> %s (%dms)", method, path, status_code, elapsed_ms)
+            raise BridgeRequestError(
+                f"HTTP request failed: {exc}", status_code=status_code, retry_after=retry_after
+            ) from exc
         except requests.exceptions.RequestException as exc:  # pragma: no cover - network specific
-            elapsed_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = int((monotonic() - start_time) * 1000)
             logging.warning("HTTP %s %s -> Error: %s (%dms)", method, path, exc, elapsed_ms)
             raise BridgeRequestError(f"HTTP request failed: {exc}") from exc
 
-        if not response.content:
+        if not body:
             return {}
-        content_type = response.headers.get("content-type", "")
-        if "application/json" in content_type:
-            try:
-                return response.json()
-            except ValueError as exc:  # pragma: no cover - unexpected payload
-                raise BridgeRequestError(f"Invalid JSON payload: {exc}") from exc
+        # One parse attempt regardless of content type; the header only decides
+        # whether a parse failure is an error or a plain-text reply. Callers can
+        # rely on always getting a dict back.
         try:
-            return json.loads(response.text)
-        except ValueError:
-            return {"raw": response.text}
+            data = _json_loads(body)
+        except ValueError as exc:
+            if "application/json" in response.headers.get("content-type", ""):  # pragma: no cover - unexpected payload
+                raise BridgeRequestError(f"Invalid JSON payload: {exc}") from exc
+            # Decode directly; response.text would run charset detection first
+            return {
+                "success": False,
+                "error": "Non-JSON response from bridge",
+                "raw": body.decode("utf-8", "replace"),
+            }
+        if not isinstance(data, dict):
+            return {"success": False, "error": "Unexpected response", "raw": data}
+        return data
 
     @staticmethod
-    def _extract_ekfiddle_comment(session: Dict[str, Any]) -> Optional[str]:
+    def _extract_ekfiddle_comment(session: Dict[str, Any], keys: tuple = _EKFIDDLE_KEYS) -> Optional[str]:
         """Extract EKFiddle comment from overview or raw session fields.
 
         Prefers explicit ekfiddle_comment / ekfiddleComments, then falls back to
         risk_reasons entries that start with 'EKFiddle:'.
         """
-        for key in ("ekfiddle_comment", "ekfiddleComments", "sessionFlags", "ekfiddleFlags"):
+        for key in keys:
             val = session.get(key)
             if isinstance(val, str) and val.strip():
                 return val.strip()
@@ -146,6 +339,44 @@ class FiddlerBridgeClient:
                 return reason.split(":", 1)[1].strip() or reason.strip()
         return None
 
+    @classmethod
+    def _normalize_session(cls, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten a bridge session overview (live or search) into the tool schema."""
+        get = session.get
+        return {
+            "id": get("id"),
+            "time": get("time"),
+            "received_at": get("received_at"),
+            "received_at_iso": get("received_at_iso"),
+            "method": get("method", "GET"),
+            "status": str(get("statusCode", get("status", "?"))),
+            "status_code": get("statusCode"),
+            "host": get("host", "") or "",
+            "url": get("url", ""),
+            # Live overviews use contentType; search results add content_type_full
+            "content_type": get("content_type") or get("contentType") or get("content_type_full"),
+            "size": get("size", get("contentLength", 0)),
+            "content_length": get("contentLength"),
+            "is_https": get("is_https", (get("scheme") or "").lower() == "https"),
+            "risk_flag": get("risk_flag"),
+            "risk_score": get("risk_score"),
+            "risk_level": get("risk_level"),
+            "risk_reasons": get("risk_reasons", []),
+            "ekfiddle_comment": cls._extract_ekfiddle_comment(session),
+        }
+
+    def _backoff_delay(self, attempt: int, exc: Optional[BridgeError] = None) -> float:
+        """Delay before retry ``attempt``.
+
+        Honours a server Retry-After (429/503) capped at max_delay; otherwise a
+        capped exponential delay whose jitter decorrelates concurrent callers.
+        """
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        wait_time = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return wait_time * (1 + random.uniform(0, self.jitter))
+
     def request_with_retry(
         self,
         method: str,
@@ -154,33 +385,30 @@ class FiddlerBridgeClient:
         params: Optional[Dict[str, Any]] = None,
         json_payload: Optional[Dict[str, Any]] = None,
         timeout: Optional[float] = None,
-        attempt: int = 0,
     ) -> Dict[str, Any]:
-        """Wrap request with exponential backoff retries."""
+        """Wrap request with capped, jittered exponential backoff retries."""
 
-        try:
-            return self.request(method, path, params=params, json_payload=json_payload, timeout=timeout)
-        except (BridgeConnectionError, BridgeRequestError) as exc:
-            if attempt < self.max_retries:
-                wait_time = 2 ** attempt
+        last_exc: Optional[BridgeError] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.request(method, path, params=params, json_payload=json_payload, timeout=timeout)
+            except (BridgeConnectionError, BridgeRequestError) as exc:
+                last_exc = exc
+                if attempt == self.max_retries or not exc.retryable:
+                    break
+                wait_time = self._backoff_delay(attempt, exc)
                 logging.warning(
-                    "Request to %s failed (%s); retrying in %ss (attempt %s/%s)",
+                    "Request to %s failed (%s); retrying in %.1fs (attempt %s/%s)",
                     path,
                     exc,
                     wait_time,
                     attempt + 1,
                     self.max_retries,
                 )
-                sleep(wait_time)
-                return self.request_with_retry(
-                    method,
-                    path,
-                    params=params,
-                    json_payload=json_payload,
-                    timeout=timeout,
-                    attempt=attempt + 1,
-                )
-            raise
+                if self._wait(wait_time):
+                    break  # client closed during backoff
+        assert last_exc is not None
+        raise last_exc
 
     # Tool implementations -------------------------------------------------
 
@@ -193,9 +421,10 @@ class FiddlerBridgeClient:
         status_filter: Optional[str],
         suspicious_only: bool,
     ) -> Dict[str, Any]:
-        params: Dict[str, Any] = {}
-        params["limit"] = max(1, min(limit, 500))
-        params["since_minutes"] = max(1, min(since_minutes, 360))
+        params: Dict[str, Any] = {
+            "limit": _clamp(limit, 1, 500),
+            "since_minutes": _clamp(since_minutes, 1, 360),
+        }
         if host_filter:
             params["host"] = host_filter
         if status_filter:
@@ -219,50 +448,21 @@ class FiddlerBridgeClient:
                 "bridge_status": "Error",
             }
 
-        if not isinstance(data, dict) or not data.get("success", True):
+        if not data.get("success", True):
             return {
                 "success": False,
-                "error": data.get("error", "Session query failed") if isinstance(data, dict) else "Unexpected response",
-                "bridge_status": data.get("bridge_status", "Unknown") if isinstance(data, dict) else "Unknown",
+                "error": data.get("error", "Session query failed"),
+                "bridge_status": data.get("bridge_status", "Unknown"),
             }
 
         raw_sessions: List[Dict[str, Any]] = list(data.get("sessions", []))
-        normalized_sessions: List[Dict[str, Any]] = []
-        unique_hosts = set()
-
-        for session in raw_sessions:
-            host = session.get("host", "") or ""
-            unique_hosts.add(host)
-            # Check for EKFiddle comments from multiple possible fields
-            ekfiddle_comment = self._extract_ekfiddle_comment(session)
-            
-            normalized_sessions.append(
-                {
-                    "id": session.get("id"),
-                    "time": session.get("time"),
-                    "received_at": session.get("received_at"),
-                    "received_at_iso": session.get("received_at_iso"),
-                    "method": session.get("method", "GET"),
-                    "status": str(session.get("statusCode", session.get("status", "?"))),
-                    "status_code": session.get("statusCode"),
-                    "host": host,
-                    "url": session.get("url", ""),
-                    "content_type": session.get("content_type") or session.get("contentType"),
-                    "size": session.get("size", session.get("contentLength", 0)),
-                    "content_length": session.get("contentLength"),
-                    "is_https": session.get("is_https", (session.get("scheme") or "").lower() == "https"),
-                    "risk_flag": session.get("risk_flag"),
-                    "risk_score": session.get("risk_score"),
-                    "risk_level": session.get("risk_level"),
-                    "risk_reasons": session.get("risk_reasons", []),
-                    "ekfiddle_comment": ekfiddle_comment,
-                }
-            )
+        normalized_sessions = [self._normalize_session(session) for session in raw_sessions]
+        unique_hosts = sorted({session["host"] for session in normalized_sessions if session["host"]})
 
         statistics = data.get("statistics") or {
             "total_returned": len(normalized_sessions),
             "total_buffered": data.get("total_live", len(raw_sessions)),
-            "unique_hosts": sorted([h for h in unique_hosts if h]),
+            "unique_hosts": unique_hosts,
         }
 
         if not normalized_sessions:
@@ -289,7 +489,7 @@ class FiddlerBridgeClient:
             "query": data.get("query", params),
             "time_bounds": data.get("time_bounds", {}),
             "query_timestamp": datetime.now().isoformat(),
-            "unique_hosts": statistics.get("unique_hosts", sorted([h for h in unique_hosts if h])),
+            "unique_hosts": statistics.get("unique_hosts", unique_hosts),
         }
 
     def search_sessions(
@@ -305,13 +505,14 @@ class FiddlerBridgeClient:
         max_size: int,
         since_minutes: Optional[int],
         limit: int,
+        offset: int = 0,
     ) -> Dict[str, Any]:
         params: Dict[str, Any] = {
             "status_min": status_min,
             "status_max": status_max,
             "min_size": min_size,
             "max_size": max_size,
-            "limit": max(1, min(limit, 500)),
+            "limit": _clamp(limit, 1, 500),
         }
         if host_pattern:
             params["host"] = host_pattern
@@ -322,7 +523,9 @@ class FiddlerBridgeClient:
         if method:
             params["method"] = method.upper()
         if since_minutes is not None:
-            params["since_minutes"] = max(1, min(since_minutes, 360))
+            params["since_minutes"] = _clamp(since_minutes, 1, 360)
+        if offset > 0:
+            params["offset"] = offset
 
         try:
             data = self.request("GET", "/api/sessions/search", params=params)
@@ -338,42 +541,15 @@ class FiddlerBridgeClient:
                 "error": f"Search failed: {exc}",
             }
 
-        if not isinstance(data, dict) or not data.get("success", True):
+        if not data.get("success", True):
             return {
                 "success": False,
-                "error": data.get("error", "Search failed") if isinstance(data, dict) else "Unexpected response",
-                "query": data.get("query", params) if isinstance(data, dict) else params,
+                "error": data.get("error", "Search failed"),
+                "query": data.get("query", params),
             }
 
-        normalized_sessions: List[Dict[str, Any]] = []
-        unique_hosts = set()
-        for session in data.get("sessions", []):
-            unique_hosts.add(session.get("host", ""))
-            # Check for EKFiddle comments from multiple possible fields
-            ekfiddle_comment = self._extract_ekfiddle_comment(session)
-            
-            normalized_sessions.append(
-                {
-                    "id": session.get("id"),
-                    "time": session.get("time"),
-                    "received_at": session.get("received_at"),
-                    "received_at_iso": session.get("received_at_iso"),
-                    "method": session.get("method", "GET"),
-                    "status": str(session.get("statusCode", session.get("status", "?"))),
-                    "status_code": session.get("statusCode"),
-                    "host": session.get("host", ""),
-                    "url": session.get("url", ""),
-                    "content_type": session.get("content_type") or session.get("content_type_full"),
-                    "size": session.get("size", session.get("contentLength", 0)),
-                    "content_length": session.get("contentLength"),
-                    "is_https": session.get("is_https", False),
-                    "risk_flag": session.get("risk_flag"),
-                    "risk_score": session.get("risk_score"),
-                    "risk_level": session.get("risk_level"),
-                    "risk_reasons": session.get("risk_reasons", []),
-                    "ekfiddle_comment": ekfiddle_comment,
-                }
-            )
+        normalized_sessions = [self._normalize_session(session) for session in data.get("sessions", [])]
+        unique_hosts = sorted({session["host"] for session in normalized_sessions if session["host"]})
 
         return {
             "success": True,
@@ -382,12 +558,16 @@ class FiddlerBridgeClient:
             "total_matched": data.get("total_matched", 0),
             "returned": len(normalized_sessions),
             "sessions": normalized_sessions,
-            "unique_hosts": sorted(h for h in unique_hosts if h),
+            "unique_hosts": unique_hosts,
+            "offset": data.get("offset", offset),
+            "next_offset": data.get("next_offset"),
         }
 
-    def get_session_headers(self, *, session_id: str) -> Dict[str, Any]:
+    def get_session_headers(self, *, session_id: str, header_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        wanted = frozenset(name.strip().lower() for name in header_names or () if name.strip())
+        params = {"names": ",".join(sorted(wanted))} if wanted else None
         try:
-            data = self.request("GET", f"/api/sessions/headers/{session_id}")
+            data = self.request("GET", f"/api/sessions/headers/{session_id}", params=params)
         except BridgeConnectionError:
             return {
                 "success": False,
@@ -401,53 +581,132 @@ class FiddlerBridgeClient:
                 "session_id": session_id,
             }
 
-        if not isinstance(data, dict) or not data.get("success", False):
+        if not data.get("success", False):
             return {
                 "success": False,
-                "error": data.get("error", "Headers not available") if isinstance(data, dict) else "Unexpected response",
+                "error": data.get("error", "Headers not available"),
                 "session_id": session_id,
             }
 
+        request_headers = data.get("request_headers", {})
+        response_headers = data.get("response_headers", {})
+        if wanted:
+            # Bridges without ?names= support return everything; project here too
+            request_headers = _project_headers(request_headers, wanted)
+            response_headers = _project_headers(response_headers, wanted)
+
         return {
             "success": True,
             "session_id": session_id,
-            "request_headers": data.get("request_headers", {}),
-            "response_headers": data.get("response_headers", {}),
+            "request_headers": request_headers,
+            "response_headers": response_headers,
             "notes": [
                 "Use these headers to reason about authentication, caching, and security controls yourself.",
             ],
         }
 
-    def get_session_body(self, *, session_id: str, include_binary: bool, smart_extract: bool = False) -> Dict[str, Any]:
-        # Build params - additive approach preserves existing behavior when smart_extract=False (default)
+    def _session_metadata_map(self) -> Dict[str, Dict[str, Any]]:
+        """Map session id -> live-session overview, cached for METADATA_CACHE_TTL seconds.
+
+        Only used against bridges that do not return metadata with the body.
+        """
+        with self._metadata_lock:
+            if monotonic() - self._metadata_cache_time <= METADATA_CACHE_TTL:
+                return self._metadata_cache
+            try:
+                sessions_list = self.get_live_sessions(limit=500, since_minutes=360,
+                                                       host_filter=None, status_filter=None,
+                                                       suspicious_only=False)
+            except Exception:
+                return {}  # Metadata is optional, don't fail the request
+            if not sessions_list.get("success"):
+                return {}
+            self._metadata_cache = {str(sess.get("id")): sess for sess in sessions_list.get("sessions", [])}
+            self._metadata_cache_time = monotonic()
+            return self._metadata_cache
+
+    def _cached_body(self, key: Tuple[str, bool, bool]) -> Optional[Dict[str, Any]]:
+        """Bridge body payload cached for ``key`` within BODY_CACHE_TTL, else None."""
+        with self._body_cache_lock:
+            entry = self._body_cache.get(key)
+            if entry is None:
+                return None
+            if monotonic() - entry[0] > BODY_CACHE_TTL:
+                del self._body_cache[key]
+                return None
+            self._body_cache.move_to_end(key)
+            return entry[1]
+
+    def _store_body(self, key: Tuple[str, bool, bool], data: Any) -> None:
+        """Remember a successful body payload (LRU, BODY_CACHE_SIZE entries).
+
+        Full raw payloads (include_binary) can be arbitrarily large and are
+        never cached.
+        """
+        if key[1] or not isinstance(data, dict) or not data.get("success"):
+            return
+        with self._body_cache_lock:
+            self._body_cache[key] = (monotonic(), data)
+            self._body_cache.move_to_end(key)
+            while len(self._body_cache) > BODY_CACHE_SIZE:
+                self._body_cache.popitem(last=False)
+
+    def get_session_body(
+        self,
+        *,
+        session_id: str,
+        include_binary: bool,
+        smart_extract: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Fetch a session body; pass ``metadata`` to skip the live-session lookup."""
+        key = (str(session_id), bool(include_binary), bool(smart_extract))
+        data = self._cached_body(key)
+        if data is None:
+            try:
+                data = self.request_with_retry(
+                    "GET",
+                    f"/api/sessions/body/{session_id}",
+                    params=self._body_params(include_binary, smart_extract),
+                    timeout=DEFAULT_BODY_TIMEOUT,
+                )
+            except BridgeError as exc:
+                return self._body_error(session_id, exc)
+            self._store_body(key, data)
+        return self._build_body_result(session_id, data, metadata)
+
+    @staticmethod
+    def _body_params(include_binary: bool, smart_extract: bool) -> Dict[str, str]:
+        # Additive approach preserves existing behavior when smart_extract=False (default)
         params = {}
         if include_binary:
             params["raw"] = "true"
         if smart_extract:
             params["smart_extract"] = "true"
-        
-        try:
-            data = self.request_with_retry(
-                "GET",
-                f"/api/sessions/body/{session_id}",
-                params=params,
-                timeout=DEFAULT_BODY_TIMEOUT,
-            )
-        except BridgeConnectionError:
+        return params
+
+    @staticmethod
+    def _body_error(session_id: str, exc: BridgeError) -> Dict[str, Any]:
+        if isinstance(exc, BridgeConnectionError):
             return {
                 "success": False,
                 "error": "Cannot connect to real-time bridge after retries",
                 "bridge_status": "Disconnected",
             }
-        except BridgeRequestError as exc:
-            return {
-                "success": False,
-                "error": f"Body retrieval failed: {exc}",
-                "session_id": session_id,
-            }
+        return {
+            "success": False,
+            "error": f"Body retrieval failed: {exc}",
+            "session_id": session_id,
+        }
 
-        if not isinstance(data, dict) or not data.get("success", False):
-            error_msg = data.get("error", "Body not available") if isinstance(data, dict) else "Unexpected response"
+    def _build_body_result(
+        self,
+        session_id: str,
+        data: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        if not data.get("success", False):
+            error_msg = data.get("error", "Body not available")
             
             # Provide helpful hints and prevent tool hallucination
             if "codec" in str(error_msg).lower() or "decode" in str(error_msg).lower():
@@ -483,33 +742,20 @@ class FiddlerBridgeClient:
         }
         
         # EKFiddle threat intelligence - extract from multiple possible fields
-        ekfiddle_comment = self._extract_ekfiddle_comment({
-            "ekfiddle_comment": data.get("ekfiddle_comment"),
-            "ekfiddleComments": data.get("ekfiddle_comments") or data.get("ekfiddleComments"),
-            "sessionFlags": data.get("session_flags") or data.get("sessionFlags"),
-            "ekfiddleFlags": data.get("ekfiddle_flags") or data.get("ekfiddleFlags"),
-            "risk_reasons": data.get("risk_reasons") or [],
-        })
-        result["ekfiddle_comment"] = ekfiddle_comment
+        result["ekfiddle_comment"] = self._extract_ekfiddle_comment(data, _BODY_EKFIDDLE_KEYS)
         
         # Fetch session metadata (host, url, method, status) for context
-        try:
-            sessions_list = self.get_live_sessions(limit=500, since_minutes=360, 
-                                                   host_filter=None, status_filter=None, 
-                                                   suspicious_only=False)
-            if sessions_list.get("success"):
-                for sess in sessions_list.get("sessions", []):
-                    if str(sess.get("id")) == str(session_id):
-                        result["host"] = sess.get("host", "")
-                        result["url"] = sess.get("url", "")
-                        result["method"] = sess.get("method", "")
-                        result["status"] = sess.get("status", "")
-                        # Also get EKFiddle from session list if not in body response
-                        if not result.get("ekfiddle_comment") and sess.get("ekfiddle_comment"):
-                            result["ekfiddle_comment"] = sess.get("ekfiddle_comment")
-                        break
-        except Exception:
-            pass  # Metadata is optional, don't fail the request
+        if metadata is None:
+            # Current bridges return metadata inline; older ones need the listing
+            metadata = data if "host" in data else self._session_metadata_map().get(str(session_id))
+        if metadata:
+            result["host"] = metadata.get("host", "")
+            result["url"] = metadata.get("url", "")
+            result["method"] = metadata.get("method", "")
+            result["status"] = metadata.get("status", "")
+            # Also get EKFiddle from session list if not in body response
+            if not result.get("ekfiddle_comment") and metadata.get("ekfiddle_comment"):
+                result["ekfiddle_comment"] = metadata.get("ekfiddle_comment")
         
         # Pass through smart extraction data if available (additive - never replaces existing fields)
         if data.get("smart_extraction_available"):
@@ -522,6 +768,78 @@ class FiddlerBridgeClient:
         
         return result
 
+    def _try_fetch_body(self, session_id: str, params: Dict[str, str]) -> Any:
+        """Single body request that returns the failure instead of raising."""
+        try:
+            return self.request("GET", f"/api/sessions/body/{session_id}", params=params, timeout=DEFAULT_BODY_TIMEOUT)
+        except BridgeError as exc:
+            return exc
+
+    def _fetch_bodies_bulk(
+        self, session_ids: List[str], include_binary: bool, smart_extract: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch all bodies with one POST /api/sessions/bodies call.
+
+        Returns None (and stops probing) when the bridge predates the bulk
+        endpoint, so the caller can fall back to per-session requests.
+        """
+        if not self._bulk_bodies_supported:
+            return None
+        try:
+            data = self.request_with_retry(
+                "POST",
+                "/api/sessions/bodies",
+                json_payload={
+                    "ids": session_ids,
+                    "include_binary": include_binary,
+                    "smart_extract": smart_extract,
+                },
+                timeout=DEFAULT_BODY_TIMEOUT,
+            )
+        except BridgeRequestError as exc:
+            if exc.status_code in (404, 405):
+                self._bulk_bodies_supported = False
+                return None
+            return {session_id: exc for session_id in session_ids}
+        except BridgeError as exc:
+            return {session_id: exc for session_id in session_ids}
+
+        bodies = {str(body.get("id")): body for body in data.get("bodies") or [] if isinstance(body, dict)}
+        missing = {"success": False, "error": "Body not available"}
+        return {session_id: bodies.get(str(session_id), missing) for session_id in session_ids}
+
+    def _fetch_bodies_concurrently(self, session_ids: List[str], params: Dict[str, str]) -> Dict[str, Any]:
+        """Fetch body payloads in parallel over the pooled session.
+
+        Failed fetches are retried in rounds: workers never wait, the caller
+        waits out one backoff delay per round and re-dispatches only the
+        retryable failures. Maps session id -> payload dict or BridgeError.
+        """
+        outcomes: Dict[str, Any] = {}
+        pending = list(session_ids)
+        attempt = 0
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_BODY_FETCHES, len(pending))) as executor:
+            while True:
+                for session_id, outcome in zip(pending, executor.map(lambda sid: self._try_fetch_body(sid, params), pending)):
+                    outcomes[session_id] = outcome
+                pending = [
+                    sid for sid in pending
+                    if isinstance(outcomes[sid], BridgeError) and outcomes[sid].retryable
+                ]
+                if not pending or attempt >= self.max_retries:
+                    return outcomes
+                wait_time = max(self._backoff_delay(attempt, outcomes[sid]) for sid in pending)
+                logging.warning(
+                    "%d body fetches failed; retrying in %.1fs (attempt %s/%s)",
+                    len(pending),
+                    wait_time,
+                    attempt + 1,
+                    self.max_retries,
+                )
+                if self._wait(wait_time):
+                    return outcomes  # client closed during backoff
+                attempt += 1
+
     def get_multiple_session_bodies(self, *, session_ids: List[str], include_binary: bool, smart_extract: bool = False) -> Dict[str, Any]:
         """Fetch bodies for multiple sessions efficiently for comparison analysis."""
         if not session_ids:
@@ -535,11 +853,32 @@ class FiddlerBridgeClient:
         
         sessions_data = []
         success_count = 0
-        
+
+        # Fetch each distinct id once (order preserved); duplicates reuse the outcome.
+        # Recently fetched bodies come from the body cache; the rest prefer the
+        # bulk endpoint. Any metadata fallback is shared via the TTL cache.
+        outcomes: Dict[str, Any] = {}
+        to_fetch = []
+        for session_id in dict.fromkeys(session_ids):
+            cached = self._cached_body((str(session_id), bool(include_binary), bool(smart_extract)))
+            if cached is None:
+                to_fetch.append(session_id)
+            else:
+                outcomes[session_id] = cached
+        if to_fetch:
+            fetched = self._fetch_bodies_bulk(to_fetch, include_binary, smart_extract)
+            if fetched is None:
+                fetched = self._fetch_bodies_concurrently(to_fetch, self._body_params(include_binary, smart_extract))
+            for session_id, outcome in fetched.items():
+                self._store_body((str(session_id), bool(include_binary), bool(smart_extract)), outcome)
+            outcomes.update(fetched)
+
         for session_id in session_ids:
-            # Fetch each session body (pass through smart_extract for large file analysis)
-            result = self.get_session_body(session_id=session_id, include_binary=include_binary, smart_extract=smart_extract)
-            
+            outcome = outcomes[session_id]
+            if isinstance(outcome, BridgeError):
+                result = self._body_error(session_id, outcome)
+            else:
+                result = self._build_body_result(session_id, outcome, None)
             if result.get("success"):
                 # Add metadata that's useful for comparison
                 session_info = {
@@ -651,7 +990,7 @@ class FiddlerBridgeClient:
         filter_host: Optional[str],
     ) -> Dict[str, Any]:
         params = {
-            "time_range_minutes": max(1, min(time_range_minutes, 180)),
+            "time_range_minutes": _clamp(time_range_minutes, 1, 180),
             "group_by": group_by.value,
             "include_details": "true" if include_details else "false",
         }
@@ -711,12 +1050,18 @@ class FiddlerBridgeClient:
                 "error": f"Clear request failed: {exc}",
             }
 
-        if not isinstance(data, dict) or not data.get("success", True):
+        if not data.get("success", True):
             return {
                 "success": False,
-                "error": data.get("error", "Clear request failed") if isinstance(data, dict) else "Unexpected response",
+                "error": data.get("error", "Clear request failed"),
             }
 
+        # Cached bodies and metadata describe sessions that no longer exist
+        with self._body_cache_lock:
+            self._body_cache.clear()
+        with self._metadata_lock:
+            self._metadata_cache_time = float("-inf")
+
         return {
             "success": True,
             "message": data.get("message", "Sessions cleared"),
@@ -736,8 +1081,8 @@ class FiddlerBridgeClient:
     ) -> Dict[str, Any]:
         """List sessions that carry EKFiddle comments within a time window."""
         params = {
-            "limit": max(1, min(int(limit), 500)),
-            "time_range_minutes": max(1, min(int(time_range_minutes), 360)),
+            "limit": _clamp(int(limit), 1, 500),
+            "time_range_minutes": _clamp(int(time_range_minutes), 1, 360),
             "threat_level": (threat_level or "all").lower(),
         }
         try:
@@ -787,7 +1132,7 @@ class FiddlerBridgeClient:
     ) -> Dict[str, Any]:
         """Return high-risk EKFiddle hits for triage."""
         params: Dict[str, Any] = {
-            "time_range_minutes": max(1, min(int(time_range_minutes), 360)),
+            "time_range_minutes": _clamp(int(time_range_minutes), 1, 360),
             "min_risk_score": float(min_risk_score),
         }
         if categories:
@@ -815,37 +1160,117 @@ class FiddlerBridgeClient:
         }
 
     def check_bridge_health(self) -> bool:
-        """Lightweight reachability probe for the HTTP bridge."""
+        """Lightweight reachability probe for the HTTP bridge.
 
+        A healthy answer is reused for HEALTH_CACHE_TTL seconds so bursts of
+        callers share one probe; failures are never cached.
+        """
+
+        if monotonic() - self._health_ok_time < HEALTH_CACHE_TTL:
+            return True
         try:
-            # Bypass Fiddler proxy for localhost health checks
-            response = requests.get(
-                f"{self.base_url.rstrip('/')}/health",
-                timeout=2,
-                proxies={'http': None, 'https': None}
-            )
+            # Pooled session already bypasses the Fiddler proxy
+            response = self._session.get(self._base_url + "/health", timeout=2)
         except requests.exceptions.RequestException:
             return False
-        return response.status_code == 200
+        if response.status_code != 200:
+            return False
+        self._health_ok_time = monotonic()
+        return True
 
 
 # Configure logging EARLY (before FastMCP initialization)
 import sys
-_log_level = os.environ.get(f"{ENV_PREFIX}LOG_LEVEL", "INFO").upper()
+# Read once; shared by the root logger, FastMCP and main()
+_LOG_LEVEL = os.environ.get(f"{ENV_PREFIX}LOG_LEVEL", "INFO").upper()
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders the date/time part of ``asctime`` once per second.
+
+    Output is identical to the stock formatter; only the listener thread calls
+    it, so the cache needs no locking.
+    """
+
+    _last_second: Optional[int] = None
+    _last_stamp: str = ""
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_stamp = strftime(self.default_time_format, self.converter(record.created))
+            self._last_second = second
+        return self.default_msec_format % (self._last_stamp, record.msecs)
+
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_LOG_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+class _JsonLogFormatter(_CachedTimeFormatter):
+    """One JSON object per record, with any ``extra=`` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        payload.update((k, v) for k, v in record.__dict__.items() if k not in _LOG_RECORD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        try:
+            return _json_dumps(payload).decode("utf-8")
+        except TypeError:
+            return json.dumps(payload, default=str)
+
+
+_exc_formatter = logging.Formatter()
+
+
+class _RecordQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener's handler.
+
+    The stock ``prepare`` folds the traceback into ``msg`` and clears
+    ``exc_info``, so the JSON formatter never saw an exception. Here the
+    traceback is rendered once into ``exc_text``, which both formatters read.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Tool calls only enqueue records; a single listener thread owns the blocking
+# stderr writes so they never serialize with the stdio request loop.
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_stderr_handler = logging.StreamHandler(sys.stderr)
+if os.environ.get(f"{ENV_PREFIX}LOG_JSON", "").lower() in ("1", "true", "yes"):
+    _stderr_handler.setFormatter(_JsonLogFormatter())
+else:
+    _stderr_handler.setFormatter(_CachedTimeFormatter("%(asctime)s [%(levelname)s] %(message)s"))
+_log_listener = QueueListener(_log_queue, _stderr_handler, respect_handler_level=True)
 logging.basicConfig(
-    level=getattr(logging, _log_level, logging.INFO),
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler(sys.stderr)],
+    level=getattr(logging, _LOG_LEVEL, logging.INFO),
+    handlers=[_RecordQueueHandler(_log_queue)],
     force=True
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 # Immediate test to verify stderr logging works
-print(f"[5ire-bridge] Initializing (log_level={_log_level})", file=sys.stderr, flush=True)
-logging.info("Logging configured (level=%s)", _log_level)
+print(f"[5ire-bridge] Initializing (log_level={_LOG_LEVEL})", file=sys.stderr, flush=True)
+logging.info("Logging configured (level=%s)", _LOG_LEVEL)
 
-client = FiddlerBridgeClient()
+client = FiddlerBridgeClient.from_env()
 # FastMCP log level (controls FastMCP framework logs)
-_mcp_log_level = os.environ.get(f"{ENV_PREFIX}LOG_LEVEL", "INFO").upper()
-mcp = FastMCP("fiddler-mcp/5ire-bridge", log_level=_mcp_log_level)
+mcp = FastMCP("fiddler-mcp/5ire-bridge", log_level=_LOG_LEVEL)
 
 
 @mcp.tool()
@@ -889,6 +1314,8 @@ def fiddler_mcp__live_sessions(
         # Then inspect content of session 120
         fiddler_mcp__session_body(session_id="120")
     """
+    host_filter = _clean_filter(host_filter)
+    status_filter = _clean_filter(status_filter)
     logging.info("Tool called: fiddler_mcp__live_sessions(limit=%s, suspicious_only=%s, since_minutes=%s)", 
                  limit, suspicious_only, since_minutes)
 
@@ -900,17 +1327,23 @@ def fiddler_mcp__live_sessions(
         suspicious_only=suspicious_only,
     )
     
-    # Log result summary
-    if result.get("success"):
+    # Log result summary (only pay for the scans when INFO is actually emitted)
+    if not result.get("success"):
+        logging.warning("Tool result: fiddler_mcp__live_sessions -> error: %s", result.get("error", "unknown"))
+    elif logging.getLogger().isEnabledFor(logging.INFO):
         session_count = result.get("count", 0)
-        sessions = result.get("sessions", [])
-        suspicious_count = sum(1 for s in sessions if s.get("risk_flag") or s.get("ekfiddle_comment"))
-        ekfiddle_count = sum(1 for s in sessions if s.get("ekfiddle_comment"))
+        suspicious_count = ekfiddle_count = 0
+        for s in result.get("sessions", []):
+            if s.get("ekfiddle_comment"):
+                ekfiddle_count += 1
+                suspicious_count += 1
+            elif s.get("risk_flag"):
+                suspicious_count += 1
         unique_hosts = len(result.get("unique_hosts", []))
         logging.info("Tool result: fiddler_mcp__live_sessions -> %d sessions, %d suspicious, %d ekfiddle, %d hosts", 
-                     session_count, suspicious_count, ekfiddle_count, unique_hosts)
-    else:
-        logging.warning("Tool result: fiddler_mcp__live_sessions -> error: %s", result.get("error", "unknown"))
+                     session_count, suspicious_count, ekfiddle_count, unique_hosts,
+                     extra={"tool": "live_sessions", "sessions": session_count, "suspicious": suspicious_count,
+                            "ekfiddle": ekfiddle_count, "hosts": unique_hosts})
     
     return result
 
@@ -927,6 +1360,7 @@ def fiddler_mcp__sessions_search(
     max_size: Annotated[int, Field(description="Maximum response size in bytes.")] = 1_000_000_000,
     since_minutes: Annotated[Optional[int], Field(description="Only include sessions captured in the last N minutes.", ge=1, le=360)] = None,
     limit: Annotated[int, Field(description="Maximum matches to return (1-500).", ge=1, le=500)] = 50,
+    offset: Annotated[int, Field(description="Skip this many matches (most recent first); pass the previous next_offset to page.", ge=0)] = 0,
 ) -> Dict[str, Any]:
     """Search for specific sessions using filters, then use the returned session IDs
     with fiddler_mcp__session_body or fiddler_mcp__session_headers for detailed inspection.
@@ -940,7 +1374,7 @@ def fiddler_mcp__sessions_search(
     Each result includes: id, host, url, method, status, size, content_type, ekfiddle_comment.
 
     **VALID PARAMETERS ONLY:** host_pattern, url_pattern, content_type, method,
-    status_min, status_max, min_size, max_size, since_minutes, limit.
+    status_min, status_max, min_size, max_size, since_minutes, limit, offset.
     There is NO `query` parameter. For JS files use content_type="javascript".
     For hosts use host_pattern="example.com" (substring; no leading *).
     
@@ -954,6 +1388,10 @@ def fiddler_mcp__sessions_search(
     - Find failed requests: status_min=400
     - Find large responses: min_size=100000
 
+    **Paging:** prefer a small `limit` (e.g. 50) and start reasoning on the first
+    page. When `next_offset` is not null, more matches may exist; call again with
+    `offset=next_offset` to fetch the next page.
+
     **REMEMBER:** After finding sessions, you MUST use fiddler_mcp__session_body
     with the returned session ID to see what's actually inside!
 
@@ -976,31 +1414,37 @@ def fiddler_mcp__sessions_search(
             limit=200
         )
     """
+    host_pattern = _clean_filter(host_pattern)
+    url_pattern = _clean_filter(url_pattern)
+    content_type = _clean_filter(content_type)
+    method_str = _METHOD_STR[method]
     logging.info("Tool called: fiddler_mcp__sessions_search(host=%s, content_type=%s, method=%s, limit=%s)", 
-                 host_pattern, content_type, method.value if method else None, limit)
+                 host_pattern, content_type, method_str, limit)
 
     result = client.search_sessions(
         host_pattern=host_pattern,
         url_pattern=url_pattern,
         content_type=content_type,
-        method=method.value if method else None,
+        method=method_str,
         status_min=status_min,
         status_max=status_max,
         min_size=min_size,
         max_size=max_size,
         since_minutes=since_minutes,
         limit=limit,
+        offset=offset,
     )
     
     # Log result summary
-    if result.get("success"):
+    if not result.get("success"):
+        logging.warning("Tool result: fiddler_mcp__sessions_search -> error: %s", result.get("error", "unknown"))
+    elif logging.getLogger().isEnabledFor(logging.INFO):
         matched = result.get("total_matched", 0)
         returned = result.get("returned", 0)
         unique_hosts = len(result.get("unique_hosts", []))
         logging.info("Tool result: fiddler_mcp__sessions_search -> matched=%d, returned=%d, hosts=%d", 
-                     matched, returned, unique_hosts)
-    else:
-        logging.warning("Tool result: fiddler_mcp__sessions_search -> error: %s", result.get("error", "unknown"))
+                     matched, returned, unique_hosts,
+                     extra={"tool": "sessions_search", "matched": matched, "returned": returned, "hosts": unique_hosts})
     
     return result
 
@@ -1008,6 +1452,7 @@ def fiddler_mcp__sessions_search(
 @mcp.tool()
 def fiddler_mcp__session_headers(
     session_id: Annotated[str, Field(description="Session ID from live_sessions or sessions_search.")],
+    header_names: Annotated[Optional[List[str]], Field(description="Return only these header names (case-insensitive), e.g. ['Cache-Control', 'Set-Cookie'].")] = None,
 ) -> Dict[str, Any]:
     """Fetch ONLY the HTTP headers (NOT the body content) for a captured session.
 
@@ -1018,18 +1463,20 @@ def fiddler_mcp__session_headers(
     or message bodies - use fiddler_mcp__session_body instead.
 
     Returns a dictionary with `request_headers` and `response_headers` mappings
-    exactly as captured by Fiddler.
+    exactly as captured by Fiddler. Pass `header_names` to get back only the
+    headers you need instead of the full set.
 
     Example use cases:
         - "Show me the headers for session 120"
         - "Check caching directives for session sid-1758709783214"
         - "What authentication headers are in session 50?"
+          fiddler_mcp__session_headers(session_id="50", header_names=["Authorization", "Cookie"])
         
     When asked to "explain session X" or "analyze session X content" - use
     fiddler_mcp__session_body instead!
     """
 
-    return client.get_session_headers(session_id=session_id)
+    return client.get_session_headers(session_id=session_id, header_names=header_names)
 
 
 @mcp.tool()
@@ -1102,16 +1549,19 @@ def fiddler_mcp__session_body(
     result = client.get_session_body(session_id=session_id, include_binary=include_binary, smart_extract=smart_extract)
     
     # Log result summary with session metadata
-    if result.get("success"):
+    if not result.get("success"):
+        logging.warning("Tool result: fiddler_mcp__session_body -> session=%s, error: %s", session_id, result.get("error", "unknown"))
+    elif logging.getLogger().isEnabledFor(logging.INFO):
         content_type = result.get("content_type", "unknown")
         content_length = result.get("content_length", 0)
         response_body_len = len(result.get("response_body", "") or "")
         truncated = result.get("truncated", False)
         smart_avail = result.get("smart_extraction_available", False)
+        size = content_length or response_body_len
         logging.info("Tool result: fiddler_mcp__session_body -> session=%s, content_type=%s, size=%s, truncated=%s, smart_extract=%s", 
-                     session_id, content_type, client._format_size(content_length or response_body_len), truncated, smart_avail)
-    else:
-        logging.warning("Tool result: fiddler_mcp__session_body -> session=%s, error: %s", session_id, result.get("error", "unknown"))
+                     session_id, content_type, _format_size(size), truncated, smart_avail,
+                     extra={"tool": "session_body", "session_id": session_id, "content_type": content_type,
+                            "size": size, "truncated": truncated, "smart_extract": smart_avail})
     
     return result
 
@@ -1153,12 +1603,13 @@ def fiddler_mcp__compare_sessions(
         - `error`: Error message (if fetch failed)
     - `count`: Number of sessions successfully fetched
     - `requested`: Number of sessions requested
+    - `deduplicated`: True if repeated session IDs were collapsed before fetching
     
     **EKFIDDLE CONTEXT**: Each session includes `ekfiddle_comment` if flagged by EKFiddle.
     Use this authoritative threat intelligence to guide your comparative analysis.
     
     **Limits**: 
-    - Minimum 2 sessions (use fiddler_mcp__session_body for single session)
+    - Minimum 2 distinct sessions (use fiddler_mcp__session_body for single session)
     - Maximum 10 sessions per call (to prevent timeout)
     
     **Analysis Tips**:
@@ -1179,35 +1630,48 @@ def fiddler_mcp__compare_sessions(
         # Compare large JavaScript files with smart extraction
         fiddler_mcp__compare_sessions(session_ids=["265", "270"], smart_extract=True)
     """
-    if not isinstance(session_ids, list) or len(session_ids) < 2:
+    if not isinstance(session_ids, list):
+        return {"success": False, "error": "Must provide at least 2 session IDs in a list", "requested": 0}
+
+    requested = len(session_ids)
+    # Repeated IDs add nothing to a comparison; collapse them (order preserved)
+    session_ids = list(dict.fromkeys(session_ids))
+    deduplicated = len(session_ids) != requested
+
+    if len(session_ids) < 2:
         return {
             "success": False,
-            "error": "Must provide at least 2 session IDs in a list",
-            "requested": len(session_ids) if isinstance(session_ids, list) else 0,
+            "error": "Must provide at least 2 distinct session IDs in a list",
+            "requested": requested,
+            "deduplicated": deduplicated,
         }
     
-    if len(session_ids) > 10:
+    if len(session_ids) > MAX_COMPARE_SESSIONS:
         return {
             "success": False,
-            "error": "Maximum 10 sessions per comparison (to prevent timeout)",
-            "requested": len(session_ids),
+            "error": f"Maximum {MAX_COMPARE_SESSIONS} sessions per comparison (to prevent timeout)",
+            "requested": requested,
+            "deduplicated": deduplicated,
         }
     
     logging.info("Tool called: fiddler_mcp__compare_sessions(session_ids=%s, count=%d, smart_extract=%s)", 
                  session_ids, len(session_ids), smart_extract)
     
     result = client.get_multiple_session_bodies(session_ids=session_ids, include_binary=include_binary, smart_extract=smart_extract)
+    result["deduplicated"] = deduplicated
     
     # Log result summary
-    if result.get("success"):
+    if not result.get("success"):
+        logging.warning("Tool result: fiddler_mcp__compare_sessions -> error: %s", result.get("error", "unknown"))
+    elif logging.getLogger().isEnabledFor(logging.INFO):
         requested = result.get("requested", 0)
         fetched = result.get("count", 0)
         sessions = result.get("sessions", [])
         total_size = sum(len(s.get("response_body", "") or "") for s in sessions)
         logging.info("Tool result: fiddler_mcp__compare_sessions -> fetched %d/%d sessions, total_size=%s", 
-                     fetched, requested, client._format_size(total_size))
-    else:
-        logging.warning("Tool result: fiddler_mcp__compare_sessions -> error: %s", result.get("error", "unknown"))
+                     fetched, requested, _format_size(total_size),
+                     extra={"tool": "compare_sessions", "fetched": fetched, "requested": requested,
+                            "total_size": total_size})
     
     return result
 
@@ -1314,39 +1778,28 @@ def fiddler_mcp__ekfiddle_threats(
     )
 
 
-def _env(name: str, default: str) -> str:
-    return os.environ.get(f"{ENV_PREFIX}{name}", default)
-
-
 def main() -> None:
-    # Force UTF-8 encoding for stdin/stdout/stderr on Windows
-    import sys
+    # Force UTF-8 encoding for stdin/stdout/stderr on Windows. reconfigure()
+    # keeps the existing stream objects, so the log handler bound to
+    # sys.stderr at import time follows the new encoding too.
     if sys.platform == "win32":
-        import io
-        sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
-        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
-        sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', line_buffering=True)
+        sys.stdin.reconfigure(encoding='utf-8')
+        sys.stdout.reconfigure(encoding='utf-8', line_buffering=True)
+        sys.stderr.reconfigure(encoding='utf-8', line_buffering=True)
     
-    # Logging already configured at module level
-    log_level = _env("LOG_LEVEL", "INFO").upper()
-    
-    logging.info("5ire-bridge MCP server starting (log_level=%s)", log_level)
-    logging.info("Bridge URL: %s", _env("BRIDGE_URL", DEFAULT_BRIDGE_URL))
-    
-    client.base_url = _env("BRIDGE_URL", DEFAULT_BRIDGE_URL).rstrip("/")
-    try:
-        client.timeout = max(1e-3, float(_env("TIMEOUT", str(DEFAULT_TIMEOUT))))
-    except ValueError:
-        client.timeout = DEFAULT_TIMEOUT
-
+    # Logging and the bridge client are already configured at module level
     transport = _env("TRANSPORT", "stdio").lower()
+    host = _env("HOST", "127.0.0.1")
+    port_raw = _env("PORT", "8765")
+
+    logging.info("5ire-bridge MCP server starting (log_level=%s)", _LOG_LEVEL)
+    logging.info("Bridge URL: %s (timeout=%ss)", client.base_url, client.timeout)
     logging.info("Using transport: %s", transport)
 
     try:
         if transport == "sse":
-            host = _env("HOST", "127.0.0.1")
             try:
-                port = int(_env("PORT", "8765"))
+                port = int(port_raw)
             except ValueError:
                 port = 8765
             mcp.settings.host = host
@@ -1358,6 +1811,8 @@ def main() -> None:
             mcp.run(transport="stdio")
     except KeyboardInterrupt:  # pragma: no cover - CLI convenience
         pass
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
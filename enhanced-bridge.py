@@ -13,12 +13,85 @@ import threading
 import base64
 from collections import Counter, deque
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Any, List
 from urllib.parse import urlparse
 from flask import Flask, request, jsonify
 
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    DefaultJSONProvider = None
+    ORJSON_AVAILABLE = False
+
 MAX_BODY_PREVIEW_BYTES = 50_000
 LARGE_BODY_WARNING_BYTES = 100_000
+# Cap for /api/sessions/bodies; same limit 5ire-bridge enforces as MAX_COMPARE_SESSIONS
+MAX_BULK_BODY_IDS = 10
+# Stored session fields that may carry EKFiddle output, in priority order
+EKFIDDLE_FIELDS = ("ekfiddleComments", "sessionFlags", "ekfiddleFlags")
+
+
+def _pick_ekfiddle(session: Dict[str, Any]) -> str:
+    """Return the first non-blank EKFiddle field of a session, stripped ('' if none)."""
+    for key in EKFIDDLE_FIELDS:
+        value = session.get(key)
+        if value:
+            value = value.strip()
+            if value:
+                return value
+    return ""
+
+if ORJSON_AVAILABLE:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson for large session/body payloads.
+
+        Keys stay sorted like Flask's default, and datetimes are passed through
+        to Flask's own ``default`` so they serialize exactly as before. orjson
+        rejects lone UTF-16 surrogates (``"\\ud800"``) that stdlib json accepts,
+        so those payloads fall back to Flask's stdlib provider instead of
+        failing the request.
+        """
+
+        _OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            option = self._OPTIONS
+            indent = kwargs.pop("indent", None)
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            separators = kwargs.pop("separators", None)  # orjson output is already compact
+            if not kwargs:
+                try:
+                    return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+                except TypeError:
+                    pass  # e.g. a str holding a lone surrogate
+            if indent:
+                kwargs["indent"] = indent
+            if separators:
+                kwargs["separators"] = separators
+            return super().dumps(obj, **kwargs)
+
+        def loads(self, s: Any, **kwargs: Any) -> Any:
+            if not kwargs:
+                try:
+                    return orjson.loads(s)
+                except orjson.JSONDecodeError:
+                    pass  # retried below: stdlib also accepts lone-surrogate escapes
+            return super().loads(s, **kwargs)
+else:
+    OrjsonProvider = None
+
+
+def _project_headers(headers: Any, wanted: frozenset) -> Any:
+    """Keep only header names in ``wanted`` (lower-cased); non-dict values pass through."""
+    if not wanted or not isinstance(headers, dict):
+        return headers
+    return {name: value for name, value in headers.items() if name.lower() in wanted}
+
 
 class EnhancedFiddlerMCPBridge:
     def __init__(self):
@@ -1581,6 +1654,8 @@ class EnhancedFiddlerRealtimeBridge:
     
     def __init__(self):
         self.app = Flask(__name__)
+        if OrjsonProvider is not None:
+            self.app.json = OrjsonProvider(self.app)
         self.live_sessions = deque(maxlen=5000)  # Keep last 5000 sessions (increased from 2000)
         self.suspicious_sessions = deque(maxlen=1000)  # Keep suspicious ones longer (increased from 500)
         self.session_lock = threading.Lock()
@@ -1945,9 +2020,7 @@ class EnhancedFiddlerRealtimeBridge:
 
         # PRIORITY 1: Check EKFiddle Comments (EXCLUSIVE source of truth)
         # Check multiple possible fields where EKFiddle data might be stored
-        ekfiddle = (session.get("ekfiddleComments") or 
-                   session.get("sessionFlags") or 
-                   session.get("ekfiddleFlags") or "").strip()
+        ekfiddle = _pick_ekfiddle(session)
         
         if ekfiddle:
             # EKFiddle found something - this is authoritative threat intelligence
@@ -2014,12 +2087,15 @@ class EnhancedFiddlerRealtimeBridge:
         }
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def _compile_search_pattern(pattern: str):
         """Compile host/url search pattern safely.
 
         Supports simple * and ? wildcards. Leading/trailing * are stripped for
         substring matching. Invalid regex falls back to escaped substring match.
         Returns (compiled_regex_or_None, normalized_pattern, warning_or_None).
+        Results are cached per pattern string, since agents tend to repeat the
+        same host/url filter across consecutive searches.
         """
         import re
         if not pattern:
@@ -2068,13 +2144,7 @@ class EnhancedFiddlerRealtimeBridge:
 
         content_type = (session.get("contentType") or "").split(";")[0]
 
-        ekfiddle_comment = (
-            assessment.get("ekfiddle_comment")
-            or (session.get("ekfiddleComments") or "").strip()
-            or (session.get("sessionFlags") or "").strip()
-            or (session.get("ekfiddleFlags") or "").strip()
-            or None
-        )
+        ekfiddle_comment = assessment.get("ekfiddle_comment") or _pick_ekfiddle(session) or None
         if not ekfiddle_comment:
             for reason in assessment.get("reasons") or []:
                 if isinstance(reason, str) and reason.lower().startswith("ekfiddle:"):
@@ -2200,6 +2270,103 @@ class EnhancedFiddlerRealtimeBridge:
             }
         }
     
+    def _build_session_body(self, session_id: str, sess, *, raw: bool, smart_extract: bool) -> Dict[str, Any]:
+        """Body payload for one session, shared by the single and bulk body endpoints."""
+        if not sess:
+            return {
+                "success": False,
+                "found": False,
+                "id": session_id,
+                "response_body": "",
+                "responseBody": ""
+            }
+
+        response_body_full = sess.get("responseBody") or ""
+        request_body_full = sess.get("requestBody", "")
+
+        response_size = len(response_body_full)
+        request_size = len(request_body_full)
+
+        if response_size > LARGE_BODY_WARNING_BYTES:
+            print(
+                f"[enhanced-bridge] Large response body for session {session_id}: {response_size:,} bytes",
+                file=sys.stderr,
+            )
+
+        response_truncated = response_size > MAX_BODY_PREVIEW_BYTES
+        request_truncated = request_size > MAX_BODY_PREVIEW_BYTES
+
+        response_body_preview = response_body_full
+        request_body_preview = request_body_full
+
+        if response_truncated and not raw:
+            response_body_preview = (
+                response_body_full[:MAX_BODY_PREVIEW_BYTES]
+                + f"\n\n... [TRUNCATED: Response was {response_size:,} bytes; showing first {MAX_BODY_PREVIEW_BYTES:,} bytes] ..."
+            )
+
+        if request_truncated and not raw:
+            request_body_preview = (
+                request_body_full[:MAX_BODY_PREVIEW_BYTES]
+                + f"\n\n... [TRUNCATED: Request was {request_size:,} bytes; showing first {MAX_BODY_PREVIEW_BYTES:,} bytes] ..."
+            )
+
+        if raw:
+            response_truncated = False
+            request_truncated = False
+
+        # Build base response (existing behavior preserved)
+        response_data = {
+            "success": True,
+            "found": True,
+            "id": session_id,
+            # Session metadata inline so clients need no second listing call
+            "host": sess.get("host", ""),
+            "url": sess.get("url", ""),
+            "method": sess.get("method", ""),
+            "status": str(sess.get("statusCode", "")),
+            "content_type": sess.get("contentType"),
+            "content_length": sess.get("contentLength"),
+            "response_body": response_body_preview,
+            "responseBody": response_body_preview,
+            "request_body": request_body_preview,
+            "requestBody": request_body_preview,
+            "truncated": response_truncated or request_truncated,
+            "response_truncated": response_truncated,
+            "request_truncated": request_truncated,
+            "full_size": {
+                "response": response_size,
+                "request": request_size,
+            },
+        }
+        
+        # EKFiddle threat intelligence (additive - never affects existing fields)
+        response_data["ekfiddle_comments"] = sess.get("ekfiddleComments") or ""
+        response_data["ekfiddle_flags"] = sess.get("ekfiddleFlags") or ""
+        response_data["session_flags"] = sess.get("sessionFlags") or ""
+        
+        # NEW: Add intelligent extraction for large files when requested
+        # This is additive - existing fields remain unchanged
+        if smart_extract and response_size > MAX_BODY_PREVIEW_BYTES:
+            try:
+                content_type = sess.get("contentType") or ""
+                extraction = self._extract_intelligent_content(
+                    response_body_full, 
+                    content_type,
+                    max_total=24000
+                )
+                # Add NEW fields - never replace existing ones
+                response_data["smart_extraction"] = extraction
+                response_data["smart_extraction_available"] = True
+            except Exception as e:
+                # Graceful degradation - if extraction fails, just note it
+                response_data["smart_extraction_available"] = False
+                response_data["smart_extraction_error"] = str(e)
+        else:
+            response_data["smart_extraction_available"] = False
+
+        return response_data
+
     def setup_routes(self):
         """Setup Flask HTTP endpoints"""
         
@@ -2370,16 +2537,19 @@ class EnhancedFiddlerRealtimeBridge:
         
         @self.app.route('/api/sessions/headers/<session_id>', methods=['GET'])
         def get_session_headers(session_id):
-            """Get headers for specific session"""
+            """Get headers for specific session (optional ?names=a,b projection)"""
             try:
+                wanted = frozenset(
+                    name.strip().lower() for name in request.args.get('names', '').split(',') if name.strip()
+                )
                 with self.session_lock:
                     for session in reversed(self.live_sessions):
                         if str(session.get('id', '')) == str(session_id):
                             return jsonify({
                                 "success": True,
                                 "session_id": session_id,
-                                "request_headers": session.get('requestHeaders', {}),
-                                "response_headers": session.get('responseHeaders', {}),
+                                "request_headers": _project_headers(session.get('requestHeaders', {}), wanted),
+                                "response_headers": _project_headers(session.get('responseHeaders', {}), wanted),
                                 "found": True
                             })
 
@@ -2402,100 +2572,49 @@ class EnhancedFiddlerRealtimeBridge:
                         sess = session
                         break
 
-            if not sess:
-                return jsonify({
-                    "success": False,
-                    "found": False,
-                    "id": session_id,
-                    "response_body": "",
-                    "responseBody": ""
-                }), 200
-
-            response_body_full = sess.get("responseBody") or ""
-            request_body_full = sess.get("requestBody", "")
-
-            response_size = len(response_body_full)
-            request_size = len(request_body_full)
-
-            if response_size > LARGE_BODY_WARNING_BYTES:
-                print(
-                    f"[enhanced-bridge] Large response body for session {session_id}: {response_size:,} bytes",
-                    file=sys.stderr,
-                )
-
             raw = request.args.get('raw', 'false').lower() == 'true'
             # NEW: smart_extract parameter for intelligent content extraction (large files)
             # Default is false to preserve existing behavior exactly
             smart_extract = request.args.get('smart_extract', 'false').lower() == 'true'
-            
-            response_truncated = response_size > MAX_BODY_PREVIEW_BYTES
-            request_truncated = request_size > MAX_BODY_PREVIEW_BYTES
-
-            response_body_preview = response_body_full
-            request_body_preview = request_body_full
-
-            if response_truncated and not raw:
-                response_body_preview = (
-                    response_body_full[:MAX_BODY_PREVIEW_BYTES]
-                    + f"\n\n... [TRUNCATED: Response was {response_size:,} bytes; showing first {MAX_BODY_PREVIEW_BYTES:,} bytes] ..."
-                )
-
-            if request_truncated and not raw:
-                request_body_preview = (
-                    request_body_full[:MAX_BODY_PREVIEW_BYTES]
-                    + f"\n\n... [TRUNCATED: Request was {request_size:,} bytes; showing first {MAX_BODY_PREVIEW_BYTES:,} bytes] ..."
-                )
-
-            if raw:
-                response_truncated = False
-                request_truncated = False
+            return jsonify(self._build_session_body(session_id, sess, raw=raw, smart_extract=smart_extract)), 200
+
+        @self.app.route('/api/sessions/bodies', methods=['POST'])
+        def get_session_bodies():
+            """Bulk variant of /api/sessions/body/<id>: one round-trip for compare_sessions"""
+            payload = request.get_json(silent=True)
+            ids = payload.get("ids") if isinstance(payload, dict) else None
+            if not isinstance(ids, list):
+                return jsonify({"success": False, "error": "Expected a JSON object with an 'ids' list"}), 400
+            if len(ids) > MAX_BULK_BODY_IDS:
+                return jsonify({
+                    "success": False,
+                    "error": f"Maximum {MAX_BULK_BODY_IDS} sessions per request",
+                    "requested": len(ids),
+                }), 400
+            session_ids = [str(sid) for sid in ids]
+            raw = bool(payload.get("include_binary"))
+            smart_extract = bool(payload.get("smart_extract"))
+
+            wanted = set(session_ids)
+            found = {}
+            with self.session_lock:
+                for session in reversed(self.live_sessions):
+                    sid = str(session.get('id', ''))
+                    if sid in wanted and sid not in found:
+                        found[sid] = session
+                        if len(found) == len(wanted):
+                            break
 
-            # Build base response (existing behavior preserved)
-            response_data = {
+            bodies = [
+                self._build_session_body(sid, found.get(sid), raw=raw, smart_extract=smart_extract)
+                for sid in session_ids
+            ]
+            return jsonify({
                 "success": True,
-                "found": True,
-                "id": session_id,
-                "content_type": sess.get("contentType"),
-                "content_length": sess.get("contentLength"),
-                "response_body": response_body_preview,
-                "responseBody": response_body_preview,
-                "request_body": request_body_preview,
-                "requestBody": request_body_preview,
-                "truncated": response_truncated or request_truncated,
-                "response_truncated": response_truncated,
-                "request_truncated": request_truncated,
-                "full_size": {
-                    "response": response_size,
-                    "request": request_size,
-                },
-            }
-            
-            # EKFiddle threat intelligence (additive - never affects existing fields)
-            response_data["ekfiddle_comments"] = sess.get("ekfiddleComments") or ""
-            response_data["ekfiddle_flags"] = sess.get("ekfiddleFlags") or ""
-            response_data["session_flags"] = sess.get("sessionFlags") or ""
-            
-            # NEW: Add intelligent extraction for large files when requested
-            # This is additive - existing fields remain unchanged
-            if smart_extract and response_size > MAX_BODY_PREVIEW_BYTES:
-                try:
-                    content_type = sess.get("contentType") or ""
-                    extraction = self._extract_intelligent_content(
-                        response_body_full, 
-                        content_type,
-                        max_total=24000
-                    )
-                    # Add NEW fields - never replace existing ones
-                    response_data["smart_extraction"] = extraction
-                    response_data["smart_extraction_available"] = True
-                except Exception as e:
-                    # Graceful degradation - if extraction fails, just note it
-                    response_data["smart_extraction_available"] = False
-                    response_data["smart_extraction_error"] = str(e)
-            else:
-                response_data["smart_extraction_available"] = False
-            
-            return jsonify(response_data), 200
+                "bodies": bodies,
+                "count": sum(1 for body in bodies if body.get("found")),
+                "requested": len(session_ids),
+            }), 200
         
         @self.app.route('/api/sessions/search', methods=['GET'])
         def search_sessions():
@@ -2511,6 +2630,7 @@ class EnhancedFiddlerRealtimeBridge:
                 min_size   = int(q.get("min_size") or 0)
                 max_size   = int(q.get("max_size") or 1_000_000_000)
                 limit      = max(1, min(int(q.get("limit") or 50), 500))
+                offset     = max(0, int(q.get("offset") or 0))
                 since_raw  = q.get("since_minutes") or q.get("minutes")
                 since_minutes = int(since_raw) if since_raw else None
                 if since_minutes and since_minutes > 360:
@@ -2565,6 +2685,7 @@ class EnhancedFiddlerRealtimeBridge:
                         if not ctype_matches(ctype, ctype_want):     continue
 
                         matched_total += 1
+                        if matched_total <= offset:              continue   # earlier page
                         overview = self._format_session_overview(s)
                         overview.update({
                             "method": meth,
@@ -2580,6 +2701,9 @@ class EnhancedFiddlerRealtimeBridge:
                     "total_matched": matched_total,
                     "returned": len(out),
                     "sessions": out,
+                    "offset": offset,
+                    # Scan stops at a full page, so more matches may follow
+                    "next_offset": offset + len(out) if len(out) >= limit else None,
                     "query": {
                         "host_pattern": host_pat_norm or host_pat,
                         "url_pattern": url_pat_norm or url_pat,
@@ -2590,6 +2714,7 @@ class EnhancedFiddlerRealtimeBridge:
                         "min_size": min_size,
                         "max_size": max_size,
                         "limit": limit,
+                        "offset": offset,
                         "since_minutes": since_minutes
                     }
                 }
@@ -3074,9 +3199,7 @@ class EnhancedFiddlerRealtimeBridge:
         try:
             # PRIORITY 1: Check for EKFiddle comments (authoritative threat intelligence)
             # Any session with EKFiddle data is automatically suspicious
-            ekfiddle = (session.get("ekfiddleComments") or 
-                       session.get("sessionFlags") or 
-                       session.get("ekfiddleFlags") or "").strip()
+            ekfiddle = _pick_ekfiddle(session)
             
             if ekfiddle:
                 # Any EKFiddle comment = suspicious (Low, Medium, High, Critical)
@@ -10,14 +10,31 @@ Features:
 - Easy configuration
 - Production-ready error handling
 """
+import hashlib
+import importlib.util
 import json
 import os
+import platform
+import queue
+import re
+import signal
+import string
 import subprocess
 import sys
+import threading
 import time
-from typing import Any, Dict, List, Optional
+import urllib.request
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlparse
+
+import llm_prompts
+from gemini_native_tools import request_options as gemini_request_options
+from llm_tool_schema import canonical_mcp_tools
 
 # Suppress gRPC/absl logging noise
 os.environ.setdefault("GRPC_VERBOSITY", "NONE")
@@ -25,25 +42,89 @@ os.environ.setdefault("GRPC_LOG_SEVERITY_LEVEL", "ERROR")
 os.environ["GRPC_VERBOSITY"] = "ERROR"
 os.environ["GRPC_TRACE"] = ""
 
+
+def _lazy_import(name: str):
+    """Return module `name`, deferring its execution until first attribute access.
+
+    google.generativeai pulls in grpc and protobuf; DeepSeek/OpenRouter sessions
+    never touch it, and Gemini sessions pay for it only once the provider is built.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named {name!r}")
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
 try:
     import warnings
     warnings.filterwarnings("ignore", category=UserWarning)
     warnings.filterwarnings("ignore", message=r"Unrecognized FinishReason enum value", category=UserWarning)
     
-    import google.generativeai as genai
+    genai = _lazy_import("google.generativeai")
     GENAI_AVAILABLE = True
 except ImportError:
     genai = None  # type: ignore
     GENAI_AVAILABLE = False
 
+# rich (and pygments behind it) is only imported on the first formatted render,
+# see _load_rich; startup just checks that it is installed.
+RICH_AVAILABLE = importlib.util.find_spec("rich") is not None
+Console = None  # type: ignore
+Markdown = None  # type: ignore
+
+
+def _load_rich() -> bool:
+    """Import rich on first use; returns whether Console/Markdown are usable."""
+    global Console, Markdown, RICH_AVAILABLE
+    if Console is None:
+        try:
+            from rich.console import Console as _Console
+            from rich.markdown import Markdown as _Markdown
+        except ImportError:
+            RICH_AVAILABLE = False
+            return False
+        Console, Markdown = _Console, _Markdown
+        RICH_AVAILABLE = True
+    return True
+
 try:
-    from rich.console import Console
-    from rich.markdown import Markdown
-    RICH_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    RICH_AVAILABLE = False
-    Console = None  # type: ignore
-    Markdown = None  # type: ignore
+    orjson = None  # type: ignore
+    ORJSON_AVAILABLE = False
+
+# MCP stdio messages (requests, tool results with session bodies) go through
+# these. The server pipes are binary, so both sides work in bytes end to end;
+# orjson's JSONDecodeError subclasses json.JSONDecodeError.
+if ORJSON_AVAILABLE:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+def _config_json(config: Dict[str, Any]) -> bytes:
+    """gemini-fiddler-config.json body: 2-space indent, UTF-8, trailing newline."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(config, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+# Accepted spellings for boolean env vars and yes/no prompts
+_TRUTHY = frozenset(("1", "true", "yes", "on"))
+_YES = frozenset(("y", "yes"))
 
 # Package name in requirements -> import module name
 _REQ_IMPORT_MAP = {
@@ -66,11 +147,148 @@ REQUIRED_SCRIPTS = (
     "llm_tool_schema.py",
 )
 
+# Independent tool calls from one model turn run concurrently, at most this many at once
+MAX_PARALLEL_TOOL_CALLS = 4
+
+# Identical tool calls within one query reuse the response for this long (seconds)
+TOOL_RESULT_CACHE_TTL = 5.0
+# Tools that change bridge state: never cached, and they invalidate the cache
+_MUTATING_TOOLS = frozenset({"fiddler_mcp__sessions_clear"})
+
+# Text-path Gemini responses are reused for a byte-identical prompt (same model and
+# options) for this long; tool results are embedded in the prompt, so new data misses
+LLM_RESPONSE_CACHE_TTL = 300.0
+LLM_RESPONSE_CACHE_SIZE = 64
+
+# Whole answers persist across runs, keyed by model, conversation so far, query and a
+# capture fingerprint from /api/stats (new traffic or /clear misses). GEMINI_RESPONSE_CACHE=0 disables.
+RESPONSE_CACHE_DIR = Path.home() / ".cache" / "gemini-fiddler"
+RESPONSE_CACHE_TTL = 600.0
+
+# Prompt history for the interactive "> You:" line (readline; unavailable on plain Windows Python)
+INPUT_HISTORY_FILE = Path.home() / ".gemini_fiddler_history"
+INPUT_HISTORY_LENGTH = 1000
+
+# Conversation-facing body previews (characters) and the markers appended when shortened
+SMART_EXTRACTION_PREVIEW_CHARS = 24000  # curated, security-relevant content
+RESPONSE_PREVIEW_CHARS = 8000
+REQUEST_PREVIEW_CHARS = 4000
+_PREVIEW_SUFFIX = "\n\n...[preview shortened for conversation output]"
+_SMART_SUFFIX = "\n\n...[smart extraction shortened for conversation output]"
+_BANNER = "=" * 60
+_SEP = "-" * 40
+_SMART_HEAD_HDR = f"{_BANNER}\n=== FILE START (first 8KB) ===\n{_BANNER}"
+_SMART_PATTERNS_HDR = f"{_BANNER}\n=== DETECTED SUSPICIOUS PATTERNS (from middle section) ===\n{_BANNER}"
+_SMART_TAIL_HDR = f"{_BANNER}\n=== FILE END (last 4KB) ===\n{_BANNER}"
+
+# Session dumps are encoded and written in slices of this many characters,
+# so a multi-MB body never exists twice in memory as str + bytes
+BODY_DUMP_CHUNK_CHARS = 64 * 1024
+# Pending dumps for the background writer; when full, _save_body_to_file writes inline
+BODY_DUMP_QUEUE_SIZE = 64
+# Recent dump digests remembered for skipping identical re-dumps (LRU)
+BODY_DUMP_DEDUPE_SIZE = 256
+SESSION_DUMP_DIR = Path(__file__).resolve().parent / "session_dumps"
+# Characters that are unsafe in dump filenames on any platform (Windows is strictest)
+_UNSAFE_FILENAME_CHARS = '/\\:*?"<>|\0\n\r\t'
+_SAFE_FILENAME_TRANS = str.maketrans({c: "_" for c in _UNSAFE_FILENAME_CHARS})
+# Case-insensitive match without lowercasing a copy of the header
+_JS_CONTENT_TYPE_RE = re.compile("javascript", re.IGNORECASE)
+
+# Text-path tool-call parsing (run on every model turn, so compiled once here)
+_JSON_OPENER_RE = re.compile(r"[\[{]")
+_JSON_DECODER = json.JSONDecoder()
+_PLAIN_TOOL_CALL_RE = re.compile(r'(fiddler_mcp__\w+)\((.*?)\)')
+_PLAIN_TOOL_START_RE = re.compile(r'(fiddler_mcp__\w+)\(')
+_DOTTED_TOOL_CALL_RE = re.compile(r'fiddler_mcp\.(\w+)\((.*?)\)')
+_PLAIN_TOOL_ARG_RE = re.compile(r'(\w+)=(["\']?)([^,\'"]+)\2')
+_QUOTED_TOOL_ARG_RE = re.compile(r'(\w+)=[\'"]([^\'"]+)[\'"]')
+_TOOL_CALL_LEAD_IN_RE = re.compile(r'(Tool Call|Next):\s*$', re.IGNORECASE)
+# Any of ** __ ` "# " "* " "- " "+ " [ | anywhere in a reply, in a single scan
+_MARKDOWN_HINT_RE = re.compile(r"\*\*|__|`|[#*+-] |[\[|]")
+# Markdown in a reply shows up early; only the head is scanned
+MARKDOWN_SCAN_CHARS = 4096
+_RULE_FENCE_RE = re.compile(r"```(?:text|ekfiddle|rules)?\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+
+# mcp_server.err.log is block-buffered and flushed once per query (and on close)
+MCP_LOG_BUFFER_SIZE = 64 * 1024
+
+# Static /help text, written in one call rather than a print() per line
+_COMMANDS_MENU = """
+Commands:
+  /help         - Show this menu and example queries
+  /stats        - Show bridge statistics
+  /tools        - List available tools
+  /model        - Show/change LLM model (Gemini, DeepSeek, or OpenRouter)
+  /history      - Show conversation history
+  /clear        - Clear bridge capture buffers (live + suspicious)
+  /clearchat    - Clear conversation history
+  /cache clear  - Forget cached answers (reused while the capture is unchanged)
+  /investigate  - Hunt malicious traffic in the current buffer
+  /investigate <host> - Same playbook, prioritize a host
+  /quit         - Exit
+
+Models: Gemini default; DeepSeek 12-13; OpenRouter 14-18 (e.g. /model 14 or z-ai/glm-5.2)
+        Missing DeepSeek/OpenRouter keys: /model prompts and saves to gemini-fiddler-config.json
+        /investigate and EKFiddle authoring work on all providers
+"""
+_WELCOME_EXAMPLES = """
+Ask questions about your Fiddler traffic in natural language!
+Examples:
+  - Show me recent sessions from the last 5 minutes
+  - What hosts are in the captured traffic?
+  - Show me the body of session 240
+  - Are there any suspicious sessions?
+  - Search for JavaScript files from example.com
+"""
+_HELP_HEADER = "\n" + "=" * 70 + "\nFiddler Traffic Analyzer - Commands and Examples\n" + "=" * 70 + "\n"
+_CTRL_C_TIP = "\nTip: During a tool chain, Ctrl+C stops that answer only and returns to the prompt.\n"
+_HELP_EXAMPLES = _CTRL_C_TIP + """
+[*] OVERVIEW QUERIES:
+  - Show me statistics about the captured traffic
+  - How many sessions are in the buffer?
+  - What's the status of the Fiddler bridge?
+
+[*] SESSION QUERIES:
+  - Show me the last 20 sessions
+  - Get sessions from the last 10 minutes
+  - Show me only suspicious sessions
+  - Find all sessions from example.com
+
+[*] DETAILED ANALYSIS:
+  - Show me the headers for session 189
+  - Get the response body for session 240
+  - Analyze session 191 for threats
+
+[*] ADVANCED SEARCHES:
+  - Search for POST requests with status 404
+  - Find all JavaScript files from cdn.example.com
+  - Show me sessions larger than 1MB
+  - Get all failed requests (status >= 400)
+
+[*] INVESTIGATE:
+  - /investigate
+  - /investigate example.com
+  - Investigate the capture buffer for malicious traffic
+
+[*] BUFFER:
+  - /clear        Clear bridge live + suspicious buffers between cases
+  - /clearchat    Clear conversation history only
+""" + "=" * 70 + "\n"
+
+# The bridge normally exits on stdin EOF; escalate to terminate/kill only if it hangs
+MCP_EXIT_GRACE_SECONDS = 0.5
+MCP_KILL_WAIT_SECONDS = 1.0
+
+
+@lru_cache(maxsize=128)
+def _has_markdown_hint(head: str) -> bool:
+    return _MARKDOWN_HINT_RE.search(head) is not None
+
 
 def _python_executable() -> str:
     if sys.executable:
         return sys.executable
-    import platform
     return "python" if platform.system() == "Windows" else "python3"
 
 
@@ -100,10 +318,14 @@ def _requirement_base_name(req_line: str) -> str:
 
 
 def _is_importable(module_name: str) -> bool:
+    # A real import, so a present-but-broken package is reported missing and repaired.
+    # Touching an attribute runs a module deferred by _lazy_import (genai) for real.
     try:
-        __import__(module_name)
+        module = importlib.import_module(module_name)
+        getattr(module, "__name__")
         return True
     except Exception:
+        sys.modules.pop(module_name, None)  # a failed lazy load stays registered otherwise
         return False
 
 
@@ -186,7 +408,7 @@ def ensure_python_dependencies(script_dir: Optional[Path] = None, auto_install:
 
     print("[+] Dependencies installed successfully")
     # Reload genai into this process if it was missing at import time
-    global genai, GENAI_AVAILABLE, RICH_AVAILABLE, Console, Markdown
+    global genai, GENAI_AVAILABLE
     try:
         import google.generativeai as _genai
         genai = _genai
@@ -195,14 +417,8 @@ def ensure_python_dependencies(script_dir: Optional[Path] = None, auto_install:
         GENAI_AVAILABLE = False
         return False
     if not RICH_AVAILABLE:
-        try:
-            from rich.console import Console as _Console
-            from rich.markdown import Markdown as _Markdown
-            Console = _Console
-            Markdown = _Markdown
-            RICH_AVAILABLE = True
-        except ImportError:
-            pass
+        importlib.invalidate_caches()
+        _load_rich()
     return True
 
 
@@ -224,9 +440,7 @@ def ensure_required_scripts(script_dir: Optional[Path] = None) -> bool:
 def bootstrap_runtime(auto_install: bool = True) -> bool:
     """Install deps and verify scripts before starting bridges/client."""
     root = Path(__file__).resolve().parent
-    skip_install = os.environ.get("GEMINI_SKIP_DEP_INSTALL", "").strip().lower() in {
-        "1", "true", "yes", "on",
-    }
+    skip_install = os.environ.get("GEMINI_SKIP_DEP_INSTALL", "").strip().lower() in _TRUTHY
     if not ensure_python_dependencies(root, auto_install=auto_install and not skip_install):
         return False
     if not GENAI_AVAILABLE:
@@ -270,13 +484,17 @@ OPENROUTER_MODELS = {
 }
 # Combined for backward-compatible /model number resolution
 AVAILABLE_MODELS = {**GEMINI_MODELS, **DEEPSEEK_MODELS, **OPENROUTER_MODELS}
+# Name lookups; the number path already hits the dict keys directly
+_MODEL_NAMES = frozenset(AVAILABLE_MODELS.values())
+_DEEPSEEK_MODEL_NAMES = frozenset(DEEPSEEK_MODELS.values())
+_OPENROUTER_MODEL_NAMES = frozenset(OPENROUTER_MODELS.values())
 
 
 def provider_for_model(model_name: str) -> str:
     name = str(model_name or "")
-    if name in OPENROUTER_MODELS.values() or "/" in name:
+    if name in _OPENROUTER_MODEL_NAMES or "/" in name:
         return "openrouter"
-    if name in DEEPSEEK_MODELS.values() or (name.startswith("deepseek-") and "/" not in name):
+    if name in _DEEPSEEK_MODEL_NAMES or (name.startswith("deepseek-") and "/" not in name):
         return "deepseek"
     return "gemini"
 
@@ -285,7 +503,7 @@ def resolve_model_identifier(model_identifier: str) -> Optional[str]:
     mid = (model_identifier or "").strip()
     if mid in AVAILABLE_MODELS:
         return AVAILABLE_MODELS[mid]
-    if mid in AVAILABLE_MODELS.values():
+    if mid in _MODEL_NAMES:
         return mid
     # Freeform OpenRouter vendor/model ids
     if "/" in mid:
@@ -293,2124 +511,2658 @@ def resolve_model_identifier(model_identifier: str) -> Optional[str]:
     return None
 
 
-class GeminiFiddlerClient:
-    """Fiddler MCP client with Gemini (default), DeepSeek, or OpenRouter native tool backends."""
+@lru_cache(maxsize=256)
+def _format_size(size_bytes: int) -> str:
+    """Format byte size to human readable string (KB, MB)"""
+    if size_bytes < 1024:
+        return f"{size_bytes} bytes"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f}KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.1f}MB"
 
-    def __init__(
-        self,
-        api_key: str,
-        model_name: str = DEFAULT_GEMINI_MODEL,
-        auto_save_full_bodies: bool = False,
-        provider: str = DEFAULT_PROVIDER,
-        deepseek_api_key: Optional[str] = None,
-        deepseek_base_url: str = DEEPSEEK_BASE_URL,
-        deepseek_ssl_verify: Any = True,
-        openrouter_api_key: Optional[str] = None,
-        openrouter_base_url: str = OPENROUTER_BASE_URL,
-        openrouter_ssl_verify: Any = True,
-    ):
-        """Initialize client with LLM API credentials."""
-        self.api_key = api_key
-        self.deepseek_api_key = deepseek_api_key or os.environ.get("DEEPSEEK_API_KEY") or ""
-        self.deepseek_base_url = (deepseek_base_url or DEEPSEEK_BASE_URL).rstrip("/")
-        self.deepseek_ssl_verify = deepseek_ssl_verify
-        self.openrouter_api_key = openrouter_api_key or os.environ.get("OPENROUTER_API_KEY") or ""
-        self.openrouter_base_url = (openrouter_base_url or OPENROUTER_BASE_URL).rstrip("/")
-        self.openrouter_ssl_verify = openrouter_ssl_verify
-        self.model_name = model_name
-        self.provider_name = (provider or provider_for_model(model_name) or DEFAULT_PROVIDER).lower()
-        if self.provider_name not in ("gemini", "deepseek", "openrouter"):
-            self.provider_name = DEFAULT_PROVIDER
-        self.mcp_process = None
-        self.mcp_stderr_file = None
-        self.request_id = 0
-        self.conversation_history = []
-        self.available_tools = []
-        self.session_start = datetime.now()
-        self.auto_save_full_bodies = auto_save_full_bodies
-        self.verbose_logging = os.environ.get("GEMINI_FIDDLER_VERBOSE_LOG", "0") == "1"
-        
-        # Performance settings
-        self.tool_timeout = int(os.environ.get("GEMINI_TOOL_TIMEOUT", "30"))  # seconds
-        self.gemini_timeout = int(os.environ.get("GEMINI_API_TIMEOUT", "60"))  # seconds
-        self.show_progress = os.environ.get("GEMINI_HIDE_PROGRESS", "").strip() != "1"
-        self.max_followups = int(os.environ.get("GEMINI_MAX_TOOL_CALLS", "20"))  # Maximum tool calls per query
-        self._analyzed_session_ids: set = set()
-        self._last_search_args: Dict[str, Any] = {}
-        self._interrupt_requested = False
-        self._bridge_process = None  # optional handle if we spawned enhanced-bridge ourselves
-        self.script_dir = Path(__file__).resolve().parent
-        self.bridge_url = os.environ.get("FIDDLER_BRIDGE_URL", "http://127.0.0.1:8081").rstrip("/")
-        self._current_user_query = ""
-        self._mcp_server_command: Optional[List[str]] = None
-        # Native function calling (default on). Set GEMINI_NATIVE_TOOLS=0 for legacy text JSON loop.
-        # DeepSeek/OpenRouter have no legacy text loop; native tools are always required.
-        self.use_native_tools = os.environ.get("GEMINI_NATIVE_TOOLS", "1").strip().lower() not in {
-            "0", "false", "no", "off",
-        }
-        if self.provider_name in ("deepseek", "openrouter"):
-            self.use_native_tools = True
-        self._gemini_tool = None
-        self._system_instruction = ""
-        self.llm_provider = None
-        self.model = None
-        
-        if RICH_AVAILABLE:
-            self.console = Console()
-            self.use_rich = True
-        else:
-            self.console = None
-            self.use_rich = False
-        
-        self._init_llm_provider()
-        
-        print(f"Initialized {self.provider_name} / {model_name}")
-        if self.use_native_tools:
-            print(f"[*] Native tool schema binding enabled ({self.provider_name})")
-        if not RICH_AVAILABLE:
-            print("[!] Tip: Install 'rich' library for better formatting: pip install rich")
 
-    def _init_llm_provider(self) -> None:
-        """Create Gemini, DeepSeek, or OpenRouter provider for the configured model."""
-        if self.provider_name == "openrouter":
-            if not self.openrouter_api_key:
-                raise RuntimeError(
-                    "OpenRouter selected but no API key. Set openrouter_api_key in config "
-                    "or OPENROUTER_API_KEY env."
-                )
-            self.use_native_tools = True
-            from llm_providers.openrouter_provider import OpenRouterProvider
-            self.llm_provider = OpenRouterProvider(
-                api_key=self.openrouter_api_key,
-                model_name=self.model_name,
-                base_url=self.openrouter_base_url,
-                ssl_verify=getattr(self, "openrouter_ssl_verify", True),
-            )
-            self.model = None
-            return
+# (whole second, "HH:MM:SS") for _log_timestamp; replaced as one tuple so threads see a consistent pair
+_stamp_second = (-1, "")
 
-        if self.provider_name == "deepseek":
-            if not self.deepseek_api_key:
-                raise RuntimeError(
-                    "DeepSeek selected but no API key. Set deepseek_api_key in config "
-                    "or DEEPSEEK_API_KEY env."
-                )
-            self.use_native_tools = True
-            from llm_providers.deepseek_provider import DeepSeekProvider
-            self.llm_provider = DeepSeekProvider(
-                api_key=self.deepseek_api_key,
-                model_name=self.model_name,
-                base_url=self.deepseek_base_url,
-                ssl_verify=getattr(self, "deepseek_ssl_verify", True),
-            )
-            self.model = None
-            return
 
-        if not GENAI_AVAILABLE or genai is None:
-            raise RuntimeError(
-                "google-generativeai is not installed. "
-                "Run: python -m pip install -r requirements-gemini.txt"
-            )
-        from llm_providers.gemini_provider import GeminiProvider
-        self.llm_provider = GeminiProvider(api_key=self.api_key, model_name=self.model_name)
-        self.model = self.llm_provider.model
-        genai.configure(api_key=self.api_key)
+def _log_timestamp() -> str:
+    """Local "HH:MM:SS.mmm" for log lines; the seconds part is formatted once per second."""
+    global _stamp_second
+    now = time.time()
+    second = int(now)
+    cached_second, stamp = _stamp_second
+    if second != cached_second:
+        stamp = time.strftime("%H:%M:%S", time.localtime(second))
+        _stamp_second = (second, stamp)
+    return f"{stamp}.{int((now - second) * 1000):03d}"
 
-    # Valid argument keys per tool (used by sanitizer)
-    _TOOL_ARG_KEYS = {
-        "fiddler_mcp__live_sessions": {"limit", "since_minutes", "host_filter", "status_filter", "suspicious_only"},
-        "fiddler_mcp__sessions_search": {
-            "host_pattern", "url_pattern", "content_type", "method",
-            "status_min", "status_max", "min_size", "max_size", "since_minutes", "limit",
-        },
-        "fiddler_mcp__session_headers": {"session_id"},
-        "fiddler_mcp__session_body": {"session_id", "include_binary", "smart_extract"},
-        "fiddler_mcp__compare_sessions": {"session_ids", "include_binary", "smart_extract"},
-        "fiddler_mcp__live_stats": set(),
-        "fiddler_mcp__sessions_timeline": {
-            "time_range_minutes", "group_by", "include_details", "filter_host", "since_minutes",
-        },
-        "fiddler_mcp__sessions_clear": {"confirm", "clear_suspicious"},
-        "fiddler_mcp__ekfiddle_sessions": {"limit", "time_range_minutes", "threat_level"},
-        "fiddler_mcp__ekfiddle_threats": {"time_range_minutes", "min_risk_score", "categories"},
-    }
 
-    @staticmethod
-    def _flatten_session_id_value(value: Any) -> Optional[str]:
-        """Coerce nested/object session_id values to a plain string."""
-        if value is None:
-            return None
-        if isinstance(value, (int, float)):
-            return str(int(value))
-        if isinstance(value, str):
-            return value.strip()
-        if isinstance(value, dict):
-            for key in ("session_id", "id", "value"):
-                if key in value and value[key] is not None:
-                    return GeminiFiddlerClient._flatten_session_id_value(value[key])
-            if len(value) == 1:
-                return GeminiFiddlerClient._flatten_session_id_value(next(iter(value.values())))
-        if isinstance(value, list) and len(value) == 1:
-            return GeminiFiddlerClient._flatten_session_id_value(value[0])
-        return str(value).strip() or None
+# Length of the unfinished status line on screen (0 once it has been ended)
+_status_width = 0
 
-    def _sanitize_tool_arguments(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize common LLM argument mistakes before calling MCP tools.
 
-        Returns either sanitized args, or an error dict with success=False and
-        a correction hint (caller must not send that to MCP).
-        """
-        if not isinstance(arguments, dict):
-            return {
-                "success": False,
-                "error": "Tool arguments must be a JSON object",
-                "hint": 'Use format: {"tool": "fiddler_mcp__session_body", "arguments": {"session_id": "142"}}',
-                "_sanitize_error": True,
-            }
+def _status_line(message: str, done: bool = False) -> None:
+    """Rewrite the console status line in one write; done=True ends it with a newline.
 
-        args = dict(arguments)
+    Padding to the previous status width clears leftovers of a longer line
+    without ANSI erase codes, which legacy Windows consoles print literally.
+    """
+    global _status_width
+    sys.stdout.write("\r" + message.ljust(_status_width) + ("\n" if done else ""))
+    sys.stdout.flush()
+    _status_width = 0 if done else len(message)
 
-        # Map id -> session_id for body/headers tools
-        if tool_name in ("fiddler_mcp__session_body", "fiddler_mcp__session_headers"):
-            if "session_id" not in args and "id" in args:
-                args["session_id"] = args.pop("id")
-            if "session_id" in args:
-                flat = self._flatten_session_id_value(args["session_id"])
-                if not flat:
-                    return {
-                        "success": False,
-                        "error": "session_id must be a string or number",
-                        "hint": 'Correct example: {"session_id": "262"}',
-                        "received": arguments,
-                        "_sanitize_error": True,
-                    }
-                args["session_id"] = flat
 
-        if tool_name == "fiddler_mcp__compare_sessions" and "session_ids" in args:
-            raw_ids = args["session_ids"]
-            if isinstance(raw_ids, (str, int)):
-                raw_ids = [raw_ids]
-            elif not isinstance(raw_ids, list):
-                # Gemini may pass protobuf RepeatedComposite; coerce to a plain list
-                try:
-                    raw_ids = list(raw_ids)
-                except TypeError:
-                    raw_ids = [raw_ids]
-            if isinstance(raw_ids, list):
-                flattened = []
-                for item in raw_ids:
-                    flat = self._flatten_session_id_value(item)
-                    if flat:
-                        flattened.append(flat)
-                args["session_ids"] = flattened
+def _canonical_json(obj: Any) -> bytes:
+    """Compact key-sorted JSON bytes, so equal argument dicts always encode equally."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, default=str, sort_keys=True, separators=(",", ":")).encode("utf-8")
 
-        # Lucene-ish query: "content_type:javascript" / "host:cdn.apigateway.co"
-        if tool_name == "fiddler_mcp__sessions_search" and "query" in args:
-            query_val = args.pop("query")
-            if isinstance(query_val, str) and query_val.strip():
-                q = query_val.strip()
-                mapped = False
-                for field, target in (
-                    ("content_type:", "content_type"),
-                    ("host:", "host_pattern"),
-                    ("host_pattern:", "host_pattern"),
-                    ("url:", "url_pattern"),
-                    ("url_pattern:", "url_pattern"),
-                    ("method:", "method"),
-                ):
-                    if q.lower().startswith(field):
-                        args.setdefault(target, q[len(field):].strip().strip('"').strip("'"))
-                        mapped = True
-                        break
-                if not mapped:
-                    # Bare domain-like string -> host_pattern
-                    if "." in q and " " not in q and ":" not in q:
-                        args.setdefault("host_pattern", q)
-                    elif q.lower() in ("javascript", "html", "json", "css", "plain"):
-                        args.setdefault("content_type", q.lower())
-                    else:
-                        return {
-                            "success": False,
-                            "error": f"Unknown query form: {query_val!r}. sessions_search has no 'query' parameter.",
-                            "hint": 'Use host_pattern, url_pattern, or content_type. Example: {"host_pattern": "cdn.apigateway.co"} or {"content_type": "javascript"}',
-                            "received": arguments,
-                            "_sanitize_error": True,
-                        }
 
-        # host -> host_pattern alias
-        if tool_name == "fiddler_mcp__sessions_search" and "host" in args and "host_pattern" not in args:
-            args["host_pattern"] = args.pop("host")
-        if tool_name == "fiddler_mcp__sessions_search" and "url" in args and "url_pattern" not in args:
-            args["url_pattern"] = args.pop("url")
+@lru_cache(maxsize=1)
+def _session_dump_dir() -> Path:
+    """Create SESSION_DUMP_DIR on first use; later calls skip the mkdir/stat."""
+    SESSION_DUMP_DIR.mkdir(exist_ok=True)
+    return SESSION_DUMP_DIR
 
-        # filter / host_filter aliases often hallucinated by the model
-        if tool_name == "fiddler_mcp__sessions_search":
-            for alias in ("filter", "host_filter"):
-                if alias in args and "host_pattern" not in args:
-                    val = args.pop(alias)
-                    if isinstance(val, str) and val.strip():
-                        args["host_pattern"] = val.strip()
-                elif alias in args:
-                    args.pop(alias, None)
 
-            # Strip leading/trailing * before bridge call
-            for key in ("host_pattern", "url_pattern"):
-                if key in args and isinstance(args[key], str):
-                    pat = args[key].strip()
-                    while pat.startswith("*"):
-                        pat = pat[1:]
-                    while pat.endswith("*") and not pat.endswith(r"\*"):
-                        pat = pat[:-1]
-                    args[key] = pat.strip()
+def _write_body_file(path: Path, text: str) -> None:
+    """Write text as UTF-8 in BODY_DUMP_CHUNK_CHARS slices (binary, no newline translation)."""
+    with open(path, "wb") as fh:
+        for start in range(0, len(text), BODY_DUMP_CHUNK_CHARS):
+            fh.write(text[start:start + BODY_DUMP_CHUNK_CHARS].encode("utf-8", "replace"))
 
-        # Timeline: map legacy since_minutes -> time_range_minutes
-        if tool_name == "fiddler_mcp__sessions_timeline":
-            if "time_range_minutes" not in args and "since_minutes" in args:
-                args["time_range_minutes"] = args.pop("since_minutes")
-            elif "since_minutes" in args:
-                args.pop("since_minutes", None)
 
-        allowed = self._TOOL_ARG_KEYS.get(tool_name)
-        if allowed is not None:
-            unknown = [k for k in list(args.keys()) if k not in allowed]
-            for k in unknown:
-                args.pop(k, None)
-            if unknown and not args and allowed:
-                hint = f"Valid keys for {tool_name}: {sorted(allowed)}"
-                if tool_name == "fiddler_mcp__sessions_search":
-                    hint += '. Example: {"host_pattern": "cdn.apigateway.co"} or {"content_type": "javascript"}'
-                return {
-                    "success": False,
-                    "error": f"No valid arguments after removing unknown keys: {unknown}",
-                    "hint": hint,
-                    "received": arguments,
-                    "_sanitize_error": True,
-                }
+def _clip_joined_parts(parts: List[str], limit: int) -> List[str]:
+    """Shortest prefix of parts whose newline join is ``limit`` chars long, the last part cut to fit."""
+    total = -1
+    for index, part in enumerate(parts):
+        total += len(part) + 1
+        if total >= limit:
+            return parts[:index] + [part[:len(part) - (total - limit)]]
+    return parts
 
-        return args
 
-    @staticmethod
-    def _user_allows_body_refetch(user_query: str) -> bool:
-        """True only when the user explicitly asks to refresh/re-analyze a body."""
-        q = (user_query or "").lower()
-        triggers = (
-            "refresh",
-            "fetch again",
-            "re-fetch",
-            "refetch",
-            "re-analyze",
-            "reanalyze",
-            "re-analyse",
-            "analyse again",
-            "analyze again",
-            "get the body again",
-            "pull the body again",
-        )
-        return any(t in q for t in triggers)
+def _prompt_json(obj: Any) -> str:
+    """Compact JSON for tool results sent to the model (indentation only costs tokens)."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits; stdlib handles those
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
 
-    def _validate_ekfiddle_rule_line(self, line: str) -> bool:
-        """Validate one tab-separated EKFiddle CustomRegexes line."""
-        if not line or "\t" not in line:
-            return False
-        if line.lstrip().startswith("#") or line.lstrip().startswith("##"):
-            return False
-        parts = line.split("\t")
-        if len(parts) < 3:
-            return False
-        rule_type = parts[0].strip()
-        severity_name = parts[1].strip()
-        regex = parts[2].strip()
-        if rule_type not in ("IP", "URI", "SourceCode", "Headers", "Hash"):
-            return False
-        # Accept Med: or common LLM slip Medium: (normalized on save)
-        if not any(
-            severity_name.startswith(s) for s in ("High:", "Med:", "Medium:", "Low:")
-        ):
-            return False
-        if len(regex) < 3:
-            return False
-        # Reject slash-wrapped /regex/i pseudo-format and Name/Regex table leftovers
-        if regex.startswith("/") and regex.rstrip().endswith(("/i", "/")):
-            return False
-        if severity_name.lower() in ("name", "regex", "comment", "color"):
-            return False
-        return True
 
-    def _extract_ekfiddle_rules_from_text(self, text: str) -> List[str]:
-        """Pull valid tab-separated EKFiddle rule lines from mixed assistant prose."""
-        if not text:
-            return []
-        rules: List[str] = []
-        seen = set()
-        # Prefer fenced blocks first, then whole text
-        chunks = [text]
-        import re
-        fences = re.findall(r"```(?:text|ekfiddle|rules)?\s*\n(.*?)```", text, flags=re.DOTALL | re.IGNORECASE)
-        if fences:
-            chunks = fences + [text]
-        for chunk in chunks:
-            for raw in chunk.splitlines():
-                line = raw.rstrip("\n").strip()
-                if not line or line in seen:
-                    continue
-                # Normalize common LLM severity slip Medium: → Med:
-                parts = line.split("\t")
-                if len(parts) >= 2 and parts[1].strip().startswith("Medium:"):
-                    parts[1] = "Med:" + parts[1].strip()[len("Medium:") :]
-                    line = "\t".join(parts)
-                if self._validate_ekfiddle_rule_line(line):
-                    seen.add(line)
-                    rules.append(line)
-        return rules
+def _iter_tool_json(text: str):
+    """Yield (start, value) for each JSON object/array in text that mentions a tool.
 
-    def _save_ekfiddle_rules(self, rules: List[str], output_path: Optional[Path] = None) -> Optional[Path]:
-        """Append validated rules to generated_ekfiddle_rules.txt with a timestamp header."""
-        if not rules:
-            return None
-        path = Path(output_path) if output_path else (self.script_dir / "generated_ekfiddle_rules.txt")
+    Each opener is decoded in place with raw_decode, which tracks nesting and
+    string escapes in one pass. A decoded value is skipped as a whole and a
+    failed opener just moves on to the next one, so there is no backtracking
+    and no limit on how deeply arguments nest.
+    """
+    if '"tool' not in text:
+        return
+    pos = 0
+    while True:
+        match = _JSON_OPENER_RE.search(text, pos)
+        if match is None:
+            return
+        start = match.start()
         try:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open(path, "a", encoding="utf-8") as fh:
-                fh.write(f"\n# Generated {stamp}\n")
-                for rule in rules:
-                    fh.write(rule + "\n")
-            return path
-        except Exception as exc:
-            self.log_with_timestamp(f"Failed to save EKFiddle rules: {exc}", to_console=True, prefix="[!] ")
-            return None
+            value, end = _JSON_DECODER.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        if text.find('"tool', start, end) != -1:
+            yield start, value
+        pos = end
 
-    def maybe_persist_ekfiddle_rules(self, assistant_text: str) -> List[str]:
-        """Extract and save EKFiddle rules from an assistant response. Returns saved lines."""
-        rules = self._extract_ekfiddle_rules_from_text(assistant_text)
-        if not rules:
-            return []
-        # Skip auto-save of Low: FP monitors when verdict is Benign unless user asked for rules
-        q = (getattr(self, "_current_user_query", None) or "").lower()
-        asked_for_rules = any(
-            token in q for token in ("ekfiddle", "customregex", "signature", " rule", "rules")
-        )
-        text_l = (assistant_text or "").lower()
-        benign_verdict = any(
-            token in text_l
-            for token in ("benign", "false positive", "false positives", "is a false positive")
-        )
-        if benign_verdict and not asked_for_rules:
-            filtered = []
-            for rule in rules:
-                parts = rule.split("\t")
-                sev = parts[1].strip() if len(parts) > 1 else ""
-                if sev.startswith("Low:"):
-                    continue
-                filtered.append(rule)
-            rules = filtered
-            if not rules:
-                return []
-        path = self._save_ekfiddle_rules(rules)
-        if path:
-            print(f"[+] Saved {len(rules)} EKFiddle rules to {path.name}")
-        return rules
 
-    def _finalize_assistant_response(self, text: str) -> str:
-        """Persist any EKFiddle rules found in the assistant text, then return it."""
-        if text:
-            self.maybe_persist_ekfiddle_rules(text)
-        return text
+def _response_text(response: Any) -> str:
+    """Text of an SDK response or stream chunk; '' when it has none (``.text`` raises then)."""
+    try:
+        return response.text or ""
+    except Exception:
+        return ""
 
-    def _track_analyzed_session(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]) -> None:
-        """Record session IDs whose bodies were fetched in this query."""
-        if not isinstance(result, dict) or result.get("success") is False:
-            return
-        if tool_name == "fiddler_mcp__session_body":
-            sid = arguments.get("session_id") or result.get("session_id") or result.get("id")
-            if sid:
-                self._analyzed_session_ids.add(str(sid))
-        elif tool_name == "fiddler_mcp__compare_sessions":
-            for sid in arguments.get("session_ids") or []:
-                self._analyzed_session_ids.add(str(sid))
-            for item in result.get("sessions") or []:
-                if isinstance(item, dict) and item.get("session_id"):
-                    self._analyzed_session_ids.add(str(item["session_id"]))
 
-    def _analyzed_sessions_note(self) -> str:
-        if not self._analyzed_session_ids:
-            return "No session bodies analyzed yet in this query."
-        ids = ", ".join(sorted(self._analyzed_session_ids, key=lambda x: int(x) if str(x).isdigit() else str(x)))
-        return f"Already analyzed session bodies this query (DO NOT re-fetch): {ids}"
+def _response_has_text(response: Any) -> bool:
+    """Whether an SDK response carries text."""
+    return bool(_response_text(response))
 
-    def _strip_tool_json_from_text(self, text: str) -> str:
-        """Remove trailing/embedded tool-call JSON so unfinished calls are not shown as answers."""
-        if not text:
-            return text
-        explanatory = self._extract_text_before_tool_call(text)
-        return explanatory.strip() if explanatory and explanatory.strip() else text.strip()
 
-    def _should_auto_fetch_body(self, search_result: Dict[str, Any], search_args: Optional[Dict[str, Any]] = None) -> bool:
-        """Decide whether auto body fetch is appropriate for this search."""
-        args = search_args if search_args is not None else self._last_search_args
-        if not args:
-            return False
-        host_pat = (args.get("host_pattern") or "").strip()
-        url_pat = (args.get("url_pattern") or "").strip()
-        if not host_pat and not url_pat:
-            return False
-        sessions = search_result.get("sessions") or []
-        if not sessions or len(sessions) > 10:
-            return False
-        return True
+def _body_truncated(body: Dict[str, Any]) -> Any:
+    """Truthy truncation marker of a session_body result (response flag first, then the combined one)."""
+    return body.get("response_truncated") or body.get("truncated")
 
-    @staticmethod
-    def _is_text_or_js_session(session: Dict[str, Any]) -> bool:
-        ctype = (session.get("content_type") or session.get("contentType") or "").lower()
-        url = (session.get("url") or "").lower()
-        if any(x in ctype for x in ("javascript", "ecmascript", "text/html", "application/json", "text/plain")):
-            return True
-        if any(x in ctype for x in ("video/", "audio/", "image/", "octet-stream", "mp4", "mpeg")):
-            return False
-        if url.endswith((".mp4", ".webm", ".mp3", ".png", ".jpg", ".jpeg", ".gif", ".woff", ".woff2", ".ttf")):
-            return False
-        size = session.get("size") or session.get("content_length") or session.get("contentLength") or 0
-        try:
-            if int(size) > 5_000_000:
-                return False
-        except (TypeError, ValueError):
-            pass
-        return "javascript" in url or url.endswith(".js") or "/html" in ctype
 
-    def _pick_auto_fetch_session(self, sessions: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """Prefer Critical/High EKFiddle JS/HTML, else first text/JS hit; skip media and already-analyzed."""
-        def severity_rank(s: Dict[str, Any]) -> int:
-            comment = (s.get("ekfiddle_comment") or "") + " " + " ".join(s.get("risk_reasons") or [])
-            c = comment.lower()
-            if "critical" in c[:40] or c.strip().startswith("critical"):
-                return 0
-            if "high:" in c[:40] or " high " in f" {c[:40]}":
-                return 1
-            if s.get("risk_level") == "CRITICAL":
-                return 0
-            if s.get("risk_level") == "HIGH":
-                return 1
-            return 5
+def _body_fields(body: Dict[str, Any], default_size: Any = None) -> Tuple[Any, Any, str]:
+    """(truncation marker, content_length, response text) of a session_body result, read once."""
+    return _body_truncated(body), body.get("content_length", default_size), body.get("response_body") or ""
 
-        analyzed = getattr(self, "_analyzed_session_ids", set()) or set()
-        candidates = []
-        for s in sessions:
-            if not self._is_text_or_js_session(s):
-                continue
-            sid = str(s.get("id") or s.get("session_id") or "").strip()
-            if sid and sid in analyzed:
-                continue
-            candidates.append(s)
-        if not candidates:
-            return None
-        candidates.sort(key=severity_rank)
-        return candidates[0]
 
-    @staticmethod
-    def _is_media_content_type(content_type: str) -> bool:
-        ctype = (content_type or "").lower()
-        return any(
-            x in ctype
-            for x in (
-                "image/",
-                "video/",
-                "audio/",
-                "font/",
-                "application/octet-stream",
-                "application/pdf",
-            )
-        )
+# Suffix enhanced-bridge appends to a truncated body preview
+_TRUNCATION_MARKER = "\n\n... [TRUNCATED: "
 
-    @staticmethod
-    def _brief_tool_status(tool_name: str, args: Optional[Dict[str, Any]] = None) -> str:
-        """One-line investigation breadcrumb for the native tool loop."""
-        args = args or {}
-        short = (tool_name or "").replace("fiddler_mcp__", "")
-        if short == "session_body":
-            return f"  -> session_body {args.get('session_id', '?')}"
-        if short == "session_headers":
-            return f"  -> headers {args.get('session_id', '?')}"
-        if short == "sessions_search":
-            host = args.get("host_pattern") or args.get("url_pattern") or ""
-            return f"  -> search {host}".rstrip() if host else "  -> search"
-        if short == "compare_sessions":
-            ids = args.get("session_ids") or []
-            if isinstance(ids, list) and ids:
-                shown = ",".join(str(x) for x in ids[:4])
-                extra = f"+{len(ids) - 4}" if len(ids) > 4 else ""
-                return f"  -> compare {shown}{extra}"
-            return "  -> compare"
-        if short == "ekfiddle_threats":
-            return "  -> ekfiddle threats"
-        if short == "ekfiddle_sessions":
-            return "  -> ekfiddle sessions"
-        if short == "live_sessions":
-            return "  -> live sessions"
-        if short == "live_stats":
-            return "  -> stats"
-        if short == "sessions_timeline":
-            return "  -> timeline"
-        if short == "sessions_clear":
-            return "  -> clear buffer"
-        return f"  -> {short}"
 
-    @staticmethod
-    def build_investigate_prompt(host: Optional[str] = None) -> str:
-        """Canned malicious-traffic investigation prompt for /investigate."""
-        scope = ""
-        if host:
-            host = host.strip().rstrip("/")
-            if "://" in host:
-                # keep hostname only when a full URL was pasted
-                try:
-                    from urllib.parse import urlparse
-                    parsed = urlparse(host if "://" in host else f"https://{host}")
-                    host = parsed.hostname or host
-                except Exception:
-                    pass
-            scope = (
-                f" Prioritize host {host}: search that host first, then follow "
-                "any loader/C2/RPC pivots found in its bodies."
-            )
-        return (
-            "Investigate the current capture buffer for any signs of malicious traffic. "
-            "Follow the INVESTIGATE CAPTURE playbook: triage with live_stats and "
-            "ekfiddle_threats/ekfiddle_sessions, fetch a few highest-severity JS/HTML bodies, "
-            "pivot on hosts found in those bodies, trace the infection chain, then give a "
-            "structured summary with Infection chain, hosts/IOCs, and verdict. "
-            "Emit EKFiddle CustomRegexes only if malicious high-signal evidence exists. "
-            "Do not author rules for confirmed FP or benign libraries."
-            f"{scope}"
-        )
+def _preview_body_len(text: str) -> int:
+    """Length of the body carried by a preview, not counting the bridge's truncation marker."""
+    cut = text.rfind(_TRUNCATION_MARKER)
+    return len(text) if cut < 0 else cut
 
-    def log_with_timestamp(self, message: str, to_console: bool = True, prefix: str = "") -> None:
-        """Log a message with timestamp to both console and log file"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        formatted_message = f"[{timestamp}] {prefix}{message}"
-        
-        # Always log to file if available
-        if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-            try:
-                self.mcp_stderr_file.write(formatted_message + "\n")
-                self.mcp_stderr_file.flush()
-            except Exception:
-                pass  # Silently fail if file is closed
-        
-        # Optionally log to console
-        if to_console:
-            print(formatted_message)
 
-    def _format_size(self, size_bytes: int) -> str:
-        """Format byte size to human readable string (KB, MB)"""
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f}KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.1f}MB"
+def _first_nonspace(text: str) -> str:
+    """First non-whitespace character of text ('' if none), without a stripped copy."""
+    for ch in text:
+        if ch not in " \t\r\n":
+            return ch
+    return ""
 
-    def _estimate_tokens(self, text: str) -> int:
-        """Estimate token count (rough approximation: ~4 chars per token for English)"""
-        return len(text) // 4
 
-    def _extract_finish_reason(self, response) -> str:
-        """Extract finish_reason from Gemini response"""
-        try:
-            candidates = getattr(response, "candidates", []) or []
-            if candidates:
-                finish_reason = getattr(candidates[0], "finish_reason", None)
-                if finish_reason is not None:
-                    return str(finish_reason).replace("FinishReason.", "")
-        except Exception:
-            pass
-        return "UNKNOWN"
+# Tool-name corrections applied by call_tool.
+# Non-prefixed names (LLM sometimes omits the fiddler_mcp__ prefix)
+_NON_PREFIXED_ALIASES = {
+    # Common non-prefixed hallucinations
+    "get_sessions": "fiddler_mcp__live_sessions",
+    "live_sessions": "fiddler_mcp__live_sessions",
+    "list_sessions": "fiddler_mcp__live_sessions",
+    "session_body": "fiddler_mcp__session_body",
+    "get_body": "fiddler_mcp__session_body",
+    "session_headers": "fiddler_mcp__session_headers",
+    "get_headers": "fiddler_mcp__session_headers",
+    "compare_sessions": "fiddler_mcp__compare_sessions",
+    "sessions_search": "fiddler_mcp__sessions_search",
+    "search_sessions": "fiddler_mcp__sessions_search",
+    "live_stats": "fiddler_mcp__live_stats",
+    "get_stats": "fiddler_mcp__live_stats",
+    "sessions_timeline": "fiddler_mcp__sessions_timeline",
+    "sessions_clear": "fiddler_mcp__sessions_clear",
+    "ekfiddle_sessions": "fiddler_mcp__ekfiddle_sessions",
+    "ekfiddle_threats": "fiddler_mcp__ekfiddle_threats",
+}
 
-    def _count_candidates(self, response) -> int:
-        """Count number of candidates in Gemini response"""
-        try:
-            candidates = getattr(response, "candidates", []) or []
-            return len(candidates)
-        except Exception:
-            return 0
+# Common tool name hallucinations from LLM (prefixed versions)
+_TOOL_ALIASES = {
+    # Session body aliases
+    "fiddler_mcp__session_details": "fiddler_mcp__session_body",
+    "fiddler_mcp__sessions_details": "fiddler_mcp__session_body",
+    "fiddler_mcp__get_session": "fiddler_mcp__session_body",
+    "fiddler_mcp__get_body": "fiddler_mcp__session_body",
+    "fiddler_mcp__body": "fiddler_mcp__session_body",
+    # Live sessions aliases
+    "fiddler_mcp__list_sessions": "fiddler_mcp__live_sessions",
+    "fiddler_mcp__sessions_list": "fiddler_mcp__live_sessions",
+    "fiddler_mcp__get_sessions": "fiddler_mcp__live_sessions",
+    "fiddler_mcp__sessions": "fiddler_mcp__live_sessions",
+    # Headers aliases
+    "fiddler_mcp__get_headers": "fiddler_mcp__session_headers",
+    "fiddler_mcp__headers": "fiddler_mcp__session_headers",
+    # Stats aliases
+    "fiddler_mcp__stats": "fiddler_mcp__live_stats",
+    "fiddler_mcp__get_stats": "fiddler_mcp__live_stats",
+    # Search aliases
+    "fiddler_mcp__search": "fiddler_mcp__sessions_search",
+    "fiddler_mcp__search_sessions": "fiddler_mcp__sessions_search",
+    # Compare aliases
+    "fiddler_mcp__compare": "fiddler_mcp__compare_sessions",
+    # Clear aliases
+    "fiddler_mcp__clear": "fiddler_mcp__sessions_clear",
+    # Timeline aliases
+    "fiddler_mcp__timeline": "fiddler_mcp__sessions_timeline",
+}
+# Single lookup for call_tool; the two tables have disjoint keys
+_ALL_ALIASES = {**_NON_PREFIXED_ALIASES, **_TOOL_ALIASES}
 
-    def request_interrupt(self) -> None:
-        """Soft-interrupt the current tool/analysis chain without exiting the client."""
-        self._interrupt_requested = True
 
-    def clear_interrupt(self) -> None:
-        self._interrupt_requested = False
+# Legacy text-path system prompt. Fields: tool_descriptions, max_followups, history,
+# user_query. Split once at import so each build is a single join over fixed segments.
+_GEMINI_PROMPT_TEMPLATE = """You are an expert security analyst helping analyze web traffic captured by Fiddler.
 
-    def _check_interrupt(self) -> None:
-        """Raise KeyboardInterrupt if a soft interrupt was requested mid-chain."""
-        if self._interrupt_requested:
-            self._interrupt_requested = False
-            raise KeyboardInterrupt()
+{tool_descriptions}
 
-    def is_enhanced_bridge_healthy(self, timeout: float = 2.0) -> bool:
-        """Return True if enhanced-bridge HTTP API on bridge_url is reachable."""
-        try:
-            import urllib.request
-            url = f"{self.bridge_url}/health"
-            with urllib.request.urlopen(url, timeout=timeout) as resp:
-                return 200 <= getattr(resp, "status", 200) < 300
-        except Exception:
-            try:
-                import urllib.request
-                url = f"{self.bridge_url}/api/stats"
-                with urllib.request.urlopen(url, timeout=timeout) as resp:
-                    return 200 <= getattr(resp, "status", 200) < 300
-            except Exception:
-                return False
+SECURITY ANALYSIS MANDATE - CRITICAL FOR OBFUSCATED CODE:
+When encountering obfuscated JavaScript (code with string arrays, hex encoding, complex control flow, or anti-debugging patterns), your primary objective is to perform a SECURITY ANALYSIS. Assume malicious intent until the code's behavior is proven to be benign. Do not accept embedded strings at face value without cross-validating them against the script's executable logic.
 
-    def _python_executable(self) -> str:
-        import platform
-        # Prefer the same interpreter running this client
-        if sys.executable:
-            return sys.executable
-        return "python" if platform.system() == "Windows" else "python3"
+ANALYTICAL HIERARCHY - BEHAVIOR OVER CONTENT:
+When analyzing a script, you MUST prioritize evidence in the following order:
+1. EXECUTABLE ACTIONS: Identify and prioritize analysis of actions that modify the browser environment or user experience. This includes:
+   - DOM manipulation (e.g., creating iframe, div, script elements)
+   - Style changes (e.g., creating overlays with position:fixed, z-index:99999)
+   - Redirection (window.location, document.location)
+2. CONTROL FLOW & LOGIC: Analyze conditional checks (if/else), loops, and timers (setTimeout). Pay close attention to conditions that trigger actions, such as checks against:
+   - document.referrer
+   - localStorage
+   - Counters or view limits
+3. DATA AND API INTERACTION: Examine how the script interacts with:
+   - localStorage
+   - document.cookie
+   - Network requests
+4. STATIC CONTENT (STRINGS): Only after analyzing the behavior should you use embedded strings for context. Be highly skeptical of familiar-looking strings within obfuscated code, as they may be included as decoys to mislead analysis.
 
-    def _launch_script_in_new_console(self, script_name: str, title: str) -> bool:
-        """Open script_name in a new visible terminal window. Returns True on launch attempt."""
-        import platform
-        script_path = self.script_dir / script_name
-        if not script_path.exists():
-            print(f"[X] Cannot start {script_name}: not found at {script_path}")
-            return False
+MANDATORY MALICIOUS PATTERN CHECKLIST:
+For any obfuscated script, you MUST verify the presence or absence of the following patterns:
+[ ] Iframe/Script Injection: Does the code dynamically create and append <iframe> or <script> elements to the DOM?
+[ ] Redirection: Does the code manipulate window.location or document.location?
+[ ] Anti-Analysis Techniques:
+    [ ] Does it check document.referrer to alter its behavior?
+    [ ] Does it use localStorage or cookies to implement view counters or persistent flags?
+    [ ] Does it contain anti-debugging patterns (e.g., debugger; statements inside a loop)?
+[ ] Overlay/UI Hijacking: Does the script apply CSS to create full-screen overlays (e.g., position:fixed, z-index:99999, width:100%)?
+[ ] Dynamic Code Execution: Is eval() or new Function() used to execute strings as code?
 
-        python_exe = self._python_executable()
-        system = platform.system()
-        try:
-            if system == "Windows":
-                # Visible CMD window, same pattern as deploy-mcp.bat
-                cmd = f'start "{title}" cmd /k "cd /d "{self.script_dir}" && "{python_exe}" "{script_path}""'
-                subprocess.Popen(cmd, shell=True, cwd=str(self.script_dir))
-            elif system == "Darwin":
-                # macOS: open a new Terminal window running the bridge
-                apple_script = (
-                    f'tell application "Terminal"\n'
-                    f'  do script "cd {self.script_dir} && {python_exe} {script_path}"\n'
-                    f'  activate\n'
-                    f'end tell'
-                )
-                subprocess.Popen(["osascript", "-e", apple_script])
-            else:
-                # Linux: try common terminal emulators, else background process
-                launched = False
-                for term in (
-                    ["gnome-terminal", "--", "bash", "-lc", f"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; exec bash"],
-                    ["xterm", "-T", title, "-e", f"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; bash"],
-                    ["konsole", "-e", f"bash -lc \"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; exec bash\""],
-                ):
-                    try:
-                        subprocess.Popen(term)
-                        launched = True
-                        break
-                    except FileNotFoundError:
-                        continue
-                if not launched:
-                    log_path = self.script_dir / f"{script_name}.autostart.log"
-                    log_f = open(log_path, "a", encoding="utf-8", errors="replace")
-                    self._bridge_process = subprocess.Popen(
-                        [python_exe, str(script_path)],
-                        cwd=str(self.script_dir),
-                        stdout=log_f,
-                        stderr=subprocess.STDOUT,
-                        start_new_session=True,
-                    )
-                    print(f"[*] No GUI terminal found; started {script_name} in background (log: {log_path})")
-            print(f"[+] Launched {script_name} in a new window ({title})")
-            return True
-        except Exception as exc:
-            print(f"[X] Failed to launch {script_name}: {exc}")
-            return False
+HOLISTIC SYNTHESIS REQUIREMENT:
+Your final conclusion MUST synthesize all evidence. If conflicting evidence is found (e.g., telemetry-like strings alongside ad-injection logic), you MUST address the discrepancy. Do not base your conclusion on a single piece of evidence if other behavioral indicators contradict it. State the script's most probable primary purpose based on the weight of the behavioral evidence.
 
-    def ensure_enhanced_bridge_running(self, wait_seconds: float = 25.0) -> bool:
-        """Start enhanced-bridge.py if the HTTP bridge is not already healthy."""
-        if self.is_enhanced_bridge_healthy():
-            print(f"[+] Enhanced bridge already running at {self.bridge_url}")
-            return True
+HOW TO ANALYZE OBFUSCATED CODE:
+When asked to "explain" or "analyze" a session, follow this structured approach:
+1. Request the session body using fiddler_mcp__session_body
+2. Identify if the code is obfuscated (string arrays, hex encoding, etc.)
+3. If obfuscated, ASSUME MALICIOUS until proven otherwise
+4. Analyze BEHAVIOR first:
+   - What does the code DO (not what strings it contains)?
+   - What DOM elements does it create?
+   - What APIs does it call?
+   - What conditions trigger its actions?
+5. Check against the malicious pattern checklist
+6. Only then consider static strings for context
+7. Provide a holistic synthesis that reconciles all findings
 
-        print(f"[!] Enhanced bridge not reachable at {self.bridge_url}")
-        print("[*] Starting enhanced-bridge.py automatically...")
-        if not self._launch_script_in_new_console("enhanced-bridge.py", "Fiddler MCP Bridge (Port 8081)"):
-            return False
+IMPROVED REQUEST PHRASING EXAMPLES:
+Instead of: "explain 265"
+Use: "Analyze the behavior of the script in session 265. What actions does it perform on the webpage?"
 
-        deadline = time.time() + wait_seconds
-        dots = 0
-        while time.time() < deadline:
-            if self.is_enhanced_bridge_healthy(timeout=1.5):
-                print(f"\n[+] Enhanced bridge is healthy at {self.bridge_url}")
-                return True
-            dots = (dots + 1) % 4
-            sys.stdout.write(f"\r  Waiting for enhanced-bridge{'.' * dots}{' ' * (3 - dots)}")
-            sys.stdout.flush()
-            time.sleep(0.8)
+Instead of: "what is this script doing"
+Use: "Analyze session X for any malicious behavior, such as ad injection, redirects, or anti-analysis techniques."
 
-        print(f"\n[X] Timed out waiting for enhanced-bridge at {self.bridge_url}")
-        print("[!] Start it manually: python enhanced-bridge.py")
-        return False
+Instead of: "show me the code"
+Use: "Attempt to deobfuscate the script in session X and explain its primary function or purpose."
 
-    def ensure_dependencies_running(self, mcp_server_command: Optional[List[str]] = None) -> bool:
-        """Ensure enhanced-bridge (HTTP) is up, then start 5ire-bridge as MCP child if needed.
+UNDERSTANDING SUSPICIOUS SESSIONS - CRITICAL DISTINCTION:
+There are TWO types of suspicious sessions you may encounter:
 
-        5ire-bridge speaks MCP over stdin/stdout and must be this client's subprocess.
-        enhanced-bridge is a separate HTTP server and is opened in its own console when missing.
-        """
-        if not self.ensure_enhanced_bridge_running():
-            return False
-
-        # 5ire-bridge: start as MCP subprocess if not already running
-        if self.mcp_process is not None and self.mcp_process.poll() is None:
-            print("[+] MCP bridge (5ire-bridge.py) already attached")
-            return True
+1. FIDDLER-FLAGGED SUSPICIOUS SESSIONS:
+   - Marked by Fiddler's internal risk assessment
+   - May have various risk_reasons (large response, suspicious patterns, etc.)
+   - Accessed via suspicious_only: true parameter
+   - These are based on heuristics, not specific threat intelligence
 
-        import platform
-        python_cmd = self._python_executable()
-        if mcp_server_command:
-            server_command = list(mcp_server_command)
-        else:
-            server_command = [python_cmd, str(self.script_dir / "5ire-bridge.py")]
-        # Resolve relative script path against script_dir
-        if len(server_command) >= 2 and not os.path.isabs(server_command[1]):
-            candidate = self.script_dir / server_command[1]
-            if candidate.exists():
-                server_command[1] = str(candidate)
+2. EKFIDDLE-FLAGGED SESSIONS:
+   - Have ekfiddle_comment field with SPECIFIC threat intelligence
+   - This is AUTHORITATIVE intelligence from the EKFiddle extension
+   - These are a SUBSET of suspicious sessions
+   - Much higher confidence of actual threats
 
-        self._mcp_server_command = server_command
-        self.start_mcp_server(server_command)
-        return True
+CRITICAL: Not all suspicious sessions have EKFiddle comments! Be VERY CLEAR about which type you're reporting to avoid confusion.
 
-    def is_mcp_alive(self) -> bool:
-        proc = getattr(self, "mcp_process", None)
-        return proc is not None and proc.poll() is None
+IOC-FIRST INVESTIGATION RULE (HIGHEST PRIORITY):
+If the user names specific domains, hosts, URLs, or IOCs (e.g. cdn.apigateway.co, polygon.rpc.subquery.network):
+1. IMMEDIATELY search those hosts with fiddler_mcp__sessions_search using host_pattern (substring, no leading *).
+   Example: {{"tool": "fiddler_mcp__sessions_search", "arguments": {{"host_pattern": "cdn.apigateway.co", "limit": 50}}}}
+2. Do this BEFORE analyzing Low EKFiddle HTML pages on the landing site.
+3. Inspect session_body for matching IOC hosts (JS/HTML) before WordPress theme/plugin noise.
+4. ZERO-HIT PROTOCOL: if exact host returns 0 matches:
+   a) Search parent apex (e.g. subquery.network, drpc.org, apigateway.co)
+   b) Then url_pattern with the IOC string
+   c) Then live_sessions / timeline for unique hosts
+   d) Do NOT declare CLEAN after a single exact miss
+5. Do NOT invent a "query" parameter. Use host_pattern, url_pattern, or content_type only.
 
-    def ensure_mcp_alive(self) -> bool:
-        """Restart MCP child if it died (common after Windows Ctrl+C process-group signal)."""
-        if self.is_mcp_alive():
-            return True
-        # Unit tests / partial clients may lack a process handle; do not crash call_tool
-        if not hasattr(self, "mcp_process") and not getattr(self, "_mcp_server_command", None):
-            return True
-        print("[!] MCP server process is not running. Restarting 5ire-bridge...")
-        cmd = self._mcp_server_command
-        if not cmd:
-            cmd = [self._python_executable(), str(self.script_dir / "5ire-bridge.py")]
-        try:
-            # Clear dead handle before restart
-            self.mcp_process = None
-            self.start_mcp_server(cmd)
-            if self.is_mcp_alive():
-                print("[+] MCP server restarted")
-                # Re-bind tools if native mode (list_tools refreshes schemas)
-                try:
-                    tools = self.list_tools()
-                    if tools:
-                        print(f"[+] Re-discovered {len(tools)} tools after MCP restart")
-                except Exception as exc:
-                    print(f"[!] Tool rediscovery after restart failed: {exc}")
-                return True
-        except Exception as exc:
-            print(f"[X] Failed to restart MCP server: {exc}")
-        return False
+EKFIDDLE SEVERITY GATE:
+- Critical / High: investigate NOW with session_body
+- Medium: investigate after user IOCs and Critical/High
+- Low (especially "External Script Monitor [HTML/JS]"): BACKGROUND only unless it matches user IOCs or references external loader hosts named by the user
+- Do NOT treat Low External Script Monitor as primary evidence of clickfix / EtherHiding / ErrTraffic
 
-    def start_mcp_server(self, server_command: List[str]):
-        """Start the MCP server (5ire-bridge.py) as subprocess"""
-        print(f"\n[*] Starting MCP server: {' '.join(server_command)}")
-        try:
-            self._mcp_server_command = list(server_command)
-            log_dir = Path(__file__).parent
-            err_path = log_dir / "mcp_server.err.log"
-            
-            if self.verbose_logging:
-                print(f"[*] Opening log file: {err_path}")
-            
-            try:
-                err_file = open(err_path, "w", buffering=1, encoding="utf-8", errors="replace")
-                self.mcp_stderr_file = err_file
-                if self.verbose_logging:
-                    print(f"[+] Log file opened (fd={err_file.fileno()})")
-            except Exception as e:
-                print(f"[!] Failed to open log file: {e}")
-                self.mcp_stderr_file = None
-                raise
+NO REANALYSIS:
+- Never re-fetch session_body for a session ID already analyzed in this query
+- Prefer new IOC hosts and unexamined Critical/High sessions
 
-            log_mode = "VERBOSE" if self.verbose_logging else "OPTIMIZED"
-            try:
-                self.mcp_stderr_file.write(f"=== MCP Server Log Started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
-                self.mcp_stderr_file.write(f"Command: {' '.join(server_command)}\n")
-                self.mcp_stderr_file.write(f"Log Mode: {log_mode} (set GEMINI_FIDDLER_VERBOSE_LOG=1 for full JSON)\n")
-                self.mcp_stderr_file.write("=" * 70 + "\n\n")
-                self.mcp_stderr_file.flush()
-            except Exception as e:
-                print(f"[!] Error writing log file header: {e}")
-                raise
+WHEN ASKED ABOUT SUSPICIOUS OR EKFIDDLE SESSIONS:
 
-            popen_kwargs: Dict[str, Any] = {
-                "stdin": subprocess.PIPE,
-                "stdout": subprocess.PIPE,
-                "stderr": subprocess.PIPE,
-                "text": True,
-                "encoding": "utf-8",
-                "errors": "replace",
-                "bufsize": 0,
-            }
-            # Isolate child from Ctrl+C so soft-interrupt does not kill MCP
-            if sys.platform == "win32":
-                # CREATE_NEW_PROCESS_GROUP prevents console Ctrl+C broadcast to child
-                popen_kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
-            else:
-                popen_kwargs["start_new_session"] = True
+1. IF USER NAMED IOCs: search those hosts first (see IOC-FIRST rule). Otherwise call:
+   {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true, "limit": 100, "since_minutes": 360}}}}
 
-            self.mcp_process = subprocess.Popen(server_command, **popen_kwargs)
-            
-            import threading
-            def log_server_stderr():
-                try:
-                    while True:
-                        line = self.mcp_process.stderr.readline()
-                        if not line:
-                            break
-                        if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-                            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                            self.mcp_stderr_file.write(f"[{timestamp}] Server: {line}")
-                            self.mcp_stderr_file.flush()
-                except Exception as e:
-                    if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-                        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                        self.mcp_stderr_file.write(f"[{timestamp}] Stderr thread error: {e}\n")
-                        self.mcp_stderr_file.flush()
-            
-            stderr_thread = threading.Thread(target=log_server_stderr, daemon=True)
-            stderr_thread.start()
-            
-            self.mcp_stderr_file.write(f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] Client: Starting stderr capture thread\n")
-            self.mcp_stderr_file.flush()
-            
-            time.sleep(0.5)
-            print("[+] MCP server started")
-            print(f"[*] Logging to: {err_path}")
-            
-            if self.verbose_logging:
-                try:
-                    self.mcp_stderr_file.write(f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] Client: Log file test successful\n")
-                    self.mcp_stderr_file.flush()
-                    print(f"[+] Log file test successful")
-                except Exception as e:
-                    print(f"[!] Log file test failed: {e}")
-            
-            try:
-                print("[*] Initializing connection...")
-                self.initialize_mcp()
-            except Exception as e:
-                print(f"[X] Initialize failed: {e}")
-                print("[!] This usually means the MCP server isn't ready yet")
-                raise
-        except Exception as e:
-            print(f"[X] Failed to start MCP server: {e}")
-            if hasattr(self, 'mcp_process') and self.mcp_process:
-                try:
-                    print("[*] Terminating MCP server subprocess...")
-                    self.mcp_process.terminate()
-                    self.mcp_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    print("[!] Force killing MCP server subprocess...")
-                    self.mcp_process.kill()
-                except Exception as cleanup_error:
-                    print(f"[!] Error during cleanup: {cleanup_error}")
-            if self.mcp_stderr_file:
-                try:
-                    self.mcp_stderr_file.close()
-                finally:
-                    self.mcp_stderr_file = None
-            sys.exit(1)
+2. ANALYZE AND REPORT CLEARLY:
+   First, state the TOTALS:
+   - "Found X suspicious sessions (Fiddler risk assessment)"
+   - "Of these, Y have EKFiddle threat intelligence"
+   
+   If Y = 0, state clearly: "None of the suspicious sessions have EKFiddle threat intelligence comments."
+   
+3. CREATE APPROPRIATE LISTS:
+   Format output as a table or structured list showing ONLY:
+   - Session ID
+   - Domain/Host (extract subdomain if present)
+   - EKFiddle Comment/Alert Message
+   
+   Example format when EKFiddle sessions exist:
+   ```
+   SUMMARY: Found 62 suspicious sessions (Fiddler risk assessment).
+   Of these, 3 have EKFiddle threat intelligence:
+   
+   EKFIDDLE-FLAGGED SESSIONS:
+   Session 142 | cdn.malicious-ads.com | High: JavaScript obfuscation with eval()
+   Session 158 | tracking.adnetwork.io | Medium: Suspicious redirect chain detected
+   Session 201 | evil.example.org      | Critical: Known malware distribution site
+   ```
+   
+   Example format when NO EKFiddle sessions exist:
+   ```
+   SUMMARY: Found 62 suspicious sessions (Fiddler risk assessment).
+   None of these have EKFiddle threat intelligence comments.
+   
+   The suspicious sessions are based on Fiddler's heuristics (large responses, unusual patterns, etc.)
+   but lack specific threat intelligence from EKFiddle.
+   ```
 
-    def send_mcp_request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Send JSON-RPC request to MCP server with timeout"""
-        self.request_id += 1
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": method,
-        }
-        if params:
-            request["params"] = params
+3. PRIORITIZE BY SEVERITY:
+   - List Critical/High severity first
+   - Then Medium
+   - Then Low (if present) — do not deep-dive Low External Script Monitor before user IOCs
+   - Extract severity from EKFiddle comment (Critical, High, Medium, Low)
 
-        request_start = time.time()
-        
-        try:
-            if self.mcp_process.poll() is not None:
-                return {"error": "MCP server process has terminated"}
-            
-            request_json = json.dumps(request)
-            request_size = len(request_json)
-            
-            # Log MCP request with details
-            if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-                timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                if method == "tools/call":
-                    tool_name = params.get("name", "unknown") if params else "unknown"
-                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Request: method={method}, tool={tool_name}, size={self._format_size(request_size)}\n")
-                else:
-                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Request: method={method}, size={self._format_size(request_size)}\n")
-                self.mcp_stderr_file.flush()
-            self.mcp_process.stdin.write(request_json + "\n")
-            self.mcp_process.stdin.flush()
+4. EXTRACT KEY DOMAINS:
+   After the list, summarize unique domains/subdomains that were flagged:
+   ```
+   FLAGGED DOMAINS TO INVESTIGATE:
+   1. cdn.malicious-ads.com (1 session, High severity)
+   2. evil.example.org (1 session, Critical severity)
+   3. tracking.adnetwork.io (1 session, Medium severity)
+   ```
 
-            import select
-            import sys
-            
-            if sys.platform == "win32":
-                import threading
-                response_line = []
-                error = []
-                
-                def read_with_timeout():
-                    try:
-                        line = self.mcp_process.stdout.readline()
-                        response_line.append(line)
-                    except Exception as e:
-                        error.append(str(e))
-                
-                thread = threading.Thread(target=read_with_timeout, daemon=True)
-                thread.start()
-                thread.join(timeout=30.0)
-                
-                if not response_line:
-                    if error:
-                        raise RuntimeError(f"Read error: {error[0]}")
-                    raise RuntimeError("MCP server response timeout (30s) - server may not be responding")
-                
-                response_line = response_line[0]
-            else:
-                ready = select.select([self.mcp_process.stdout], [], [], 30.0)
-                if not ready[0]:
-                    raise RuntimeError("MCP server response timeout (30s)")
-                response_line = self.mcp_process.stdout.readline()
-            
-            if not response_line:
-                raise RuntimeError("MCP server closed connection")
+5. SET INVESTIGATION FOCUS:
+   If user named IOCs, those hosts remain PRIMARY. Otherwise:
+   End with: "Critical/High EKFiddle sessions should be the PRIMARY focus.
+   To analyze the code, use: fiddler_mcp__session_body with the session ID."
 
-            response = json.loads(response_line)
-            response_size = len(response_line)
-            elapsed_ms = int((time.time() - request_start) * 1000)
-            
-            # Log MCP response with timing and size
-            if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-                timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                
-                if self.verbose_logging:
-                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, size={self._format_size(response_size)}\n")
-                    self.mcp_stderr_file.write(f"[{timestamp}] Response: {json.dumps(response)}\n")
-                else:
-                    if "error" in response:
-                        self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, ERROR: {json.dumps(response.get('error', {}))}\n")
-                    elif method == "tools/call":
-                        tool_name = params.get("name", "unknown") if params else "unknown"
-                        if "result" in response:
-                            result = response.get("result", {})
-                            content = result.get("content", [])
-                            item_count = len(content) if isinstance(content, list) else 0
-                            self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, tool='{tool_name}', items={item_count}, size={self._format_size(response_size)}\n")
-                        else:
-                            self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, tool='{tool_name}', no result\n")
+WHEN ASKED ABOUT MALICIOUS/SUSPICIOUS SESSIONS IN FOLLOW-UP:
+If user asks "are there any malicious sessions?" or "show me suspicious traffic" AFTER you've listed EKFiddle flags:
+
+1. If user previously named IOC hosts still unsearched, search those first
+2. Otherwise AUTOMATICALLY FETCH CODE from the HIGHEST SEVERITY (Critical/High) EKFiddle session:
+   {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "<highest_severity_id>"}}}}
+3. Skip Low External Script Monitor unless it is the only signal and no user IOCs remain
+
+2. APPLY SECURITY ANALYSIS FRAMEWORK to that code
+3. CORRELATE your analysis with the EKFiddle comment
+4. If EKFiddle says "JavaScript obfuscation", LOOK FOR obfuscation patterns
+5. If EKFiddle says "redirect chain", LOOK FOR window.location manipulation
+6. If EKFiddle says "eval()", LOOK FOR dynamic code execution
+
+EKFIDDLE COMMENT INTERPRETATION:
+Common EKFiddle patterns and what to look for:
+- "JavaScript obfuscation" → Check for string arrays, hex encoding, packed code
+- "eval()" or "Function constructor" → Dynamic code execution pattern
+- "redirect" → window.location, document.location manipulation
+- "suspicious domain" → Check domain reputation, TLD
+- "known malware" → Treat as HIGH PRIORITY threat
+- "exploit kit" → Advanced threat, check for CVE references
+- "External Script Monitor" (Low) → Often WP performance lazy-load; confirm against user IOCs before deep dive
+
+TRUST HIERARCHY for THREAT ASSESSMENT:
+1. HIGHEST: User-supplied IOC hosts/URLs (search these first)
+2. HIGH: EKFiddle Critical/High comments
+3. MEDIUM: Behavioral analysis (malicious pattern checklist)
+4. LOWER: EKFiddle Low / heuristics
+5. LOWEST: String content (easily manipulated)
+
+If EKFiddle Critical/High flagged something, focus on CONFIRMING the threat type. Low flags need IOC correlation.
+
+EKFIDDLE RULE AUTHORING (when user asks for EKFiddle rules / CustomRegexes / signatures):
+This is a HARD TASK MODE. Follow the EKFiddle CustomRegexes skill bar exactly:
+
+1. If the user names a session ID, call fiddler_mcp__session_body for that session ONCE only if it is not already analyzed this query.
+2. Extract ONLY high-signal malicious patterns actually present in the tool results:
+   - Compound JSON-RPC: method:'eth_call' with jsonrpc:'2.0' and eth_call params shape, not bare eth_call alone
+   - Overlay UI hijack: z-index:2147483647 with position:fixed and iframe or clipboard-write
+   - Distinctive hex decode loops when unique enough; prefer technique over one hex function name
+   - Distinctive cookies or sendBeacon telemetry strings that are campaign-specific
+   - Domains / URIs / IPs that appear in the body, captured traffic, or the user query
+3. Emit rules in EXACT tab-separated CustomRegexes schema (TABS not spaces):
+   [Type]	[Severity]: [Rule Name]	[Regex]	[Optional Comment]
+   Types: SourceCode | URI | IP | Headers | Hash
+   Severity MUST be High: or Med: or Low: including the colon. Never write Medium:
+   Rule names: title case with spaces, threat-specific. No snake_case. No vague Potential X names.
+4. Write a short explanation per rule that includes The crucial pattern or The key pattern.
+5. End the answer with a plain block of ONLY the tab-separated rule lines so they can be copied into CustomRegexes.txt.
+6. STOP after delivering rules. Do NOT chase Low External Script Monitor siblings. Do NOT invent hosts not present in tool results.
+7. Do NOT refuse defensive CustomRegex generation when the user asks. Provide the rules.
+8. Do NOT emit Name/Regex/Comment/Color tables, slash-wrapped /regex/i, or markdown tables as the rule format.
+9. Prefer SourceCode rules for unique malicious JS. Use URI/IP only for IOCs observed in data or supplied by the user.
+10. Keep regexes bounded and specific: use {{0,120}} / [^}}]{{1,200}}, escape \\. \\( \\), non-capturing (?:...), avoid unbounded .*. Prefer 2 to 6 strong rules.
+11. FORBIDDEN unless user explicitly asks: bare \\beth_call\\b, _\\w{{7,8}}\\(\\), NitroPack / ___mnag / text/lazyload MutationObserver, createElement alone, appendChild alone.
+12. If improving a prior rule for false positives, tighten with compound tokens. Do not replace it with an unrelated or broken regex.
+
+Example correct rule lines:
+SourceCode	High: ErrTraffic eth_call RPC	method\\s*:\\s*['\"]eth_call['\"].{{0,80}}jsonrpc\\s*:\\s*['\"]2\\.0['\"]
+SourceCode	High: EtherHiding Fullscreen Overlay	z-index\\s*:\\s*2147483647.{{0,120}}position\\s*:\\s*fixed
+URI	High: ErrTraffic Delivery Host	cdn\\.apigateway\\.co
+
+ZERO-HIT AND INFECTION CHAIN:
+- If the user lists many IOC hosts and the first search returns 0, do not serially hunt every host. Report missing hosts, then use landing-page session bodies and prior findings.
+- When asked for the infection chain, explain stages from evidence even if RPC hosts are not currently in the buffer.
+- Low External Script Monitor is not a clean bill of health when eth_call or etherhiding patterns are present.
+- Prefer session_body over session_headers. Treat headers 404 as non-fatal.
+- Do not emit Low: CustomRegexes for confirmed Benign or False Positive libraries unless the user asks for FP monitors.
+
+INVESTIGATE CAPTURE (when user asks to investigate the buffer / malicious traffic / /investigate):
+1. live_stats then ekfiddle_threats or ekfiddle_sessions; Critical/High first
+2. Fetch a few highest-severity JS/HTML bodies; skip Low External Script Monitor unless IOCs demand it
+3. Pivot sessions_search on hosts found in those bodies; keep zero-hit budget tight
+4. Trace landing to loader to C2/RPC to payload/overlay
+5. Structured summary: Infection chain, hosts/IOCs, verdict; EKFiddle rules only for malicious high-signal evidence
+
+NO INVENTED IOCs:
+- Never invent domains, IPs, cookies, or function names that did not appear in tool results or the user query.
+- If a host search returns 0, say so. Do not fabricate related infrastructure.
+
+CRITICAL INSTRUCTIONS FOR TOOL CALLING (legacy text path only):
+NOTE: Prefer native Gemini FunctionDeclarations when GEMINI_NATIVE_TOOLS=1.
+If you must emit a text tool call, use JSON-ONLY with the tool LAST:
+{{"tool": "tool_name", "arguments": {{"param": "value"}}}}
+
+RULES:
+1. Use ONLY MCP tools from the list above. Do not invent names.
+2. MAKE ONE TOOL CALL AT A TIME
+3. session_id must be a plain string like "262", never an object
+4. sessions_search has NO "query" field — use host_pattern / url_pattern / content_type
+5. Do not use leading * in host_pattern (use "drpc.org" not "*drpc.org")
+6. Prefer fiddler_mcp__ekfiddle_threats / ekfiddle_sessions for triage before bodies
+
+MULTI-SESSION COMPARISON:
+When user asks to COMPARE 2-10 sessions, use fiddler_mcp__compare_sessions.
+When asking about ONE session, use fiddler_mcp__session_body.
+
+MULTIPLE TOOL CALLS - YOU CAN CALL TOOLS REPEATEDLY:
+
+IMPORTANT: You are ALLOWED and ENCOURAGED to call tools multiple times to provide complete analysis!
+
+YOU CAN MAKE UP TO {max_followups} TOOL CALLS in a single user request if needed to:
+- Analyze multiple sessions sequentially (e.g., top 5 EKFiddle sessions)
+- Fetch additional context after initial analysis
+- Investigate related sessions discovered during analysis
+- Gather comprehensive information for thorough security assessment
+- Follow investigation leads as they emerge
+
+HOW MULTIPLE TOOL CALLS WORK:
+
+1. Make Initial Tool Call:
+   {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true, "limit": 100}}}}
+
+2. After Receiving Results, You Can:
+   a) Provide final analysis (if you have enough information)
+   b) Make ANOTHER tool call to get more data (you don't need permission!)
+
+3. Example Multi-Call Flow:
+   First call:  List suspicious sessions
+   Second call: Get body of highest risk session
+   Third call:  Get body of another related session
+   Fourth call: Search for similar patterns
+   [Continue until you have complete picture, up to {max_followups} calls total]
+
+4. When to Make Additional Calls:
+   - You found suspicious sessions and need to examine their code
+   - Initial session reveals references to other sessions
+   - User asks for "comprehensive" or "detailed" analysis
+   - You need to verify findings across multiple sessions
+   - Investigation uncovers new leads
+   - You need more context to provide confident assessment
+
+5. When to Stop Making Calls:
+   - You have sufficient information to answer the user's question
+   - You've examined the most critical sessions
+   - You've reached {max_followups} tool calls (system limit)
+   - User explicitly asks for summary/conclusion
+
+EXAMPLE WORKFLOWS WITH MULTIPLE CALLS:
+
+Example 1: Analyzing EKFiddle Sessions
+Query: "Analyze EKFiddle sessions in detail"
+
+Call 1: {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true}}}}
+Result: Found 5 EKFiddle-flagged sessions
+
+Call 2: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "312"}}}}
+Analysis: Session 312 has eval() - HIGH RISK
+
+Call 3: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "287"}}}}
+Analysis: Session 287 has redirect chain - MEDIUM RISK
+
+Call 4: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "156"}}}}
+Analysis: Session 156 is benign false positive
+
+Final Response: Comprehensive threat assessment of all 3 sessions
+
+Example 2: Investigating Attack Chain
+Query: "Investigate suspicious sessions"
+
+Call 1: {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true}}}}
+Result: Found suspicious iframe injection in session 100
+
+Call 2: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "100"}}}}
+Analysis: Session 100 loads external script from session 105
+
+Call 3: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "105"}}}}
+Analysis: Session 105 is the malicious payload
+
+Final Response: Explains the 2-stage attack chain
+
+IMPORTANT: Don't announce "I will make X calls" - just make them as needed!
+Between each call, provide brief progress: "Analyzing session X..." then continue.
+
+IMPORTANT WORKFLOW RULES:
+- When user asks for EKFiddle rules / CustomRegexes / signatures for a named session → fetch that body once if needed, emit tab-separated rules, STOP
+- When user names IOC domains → search those hosts FIRST with host_pattern before any Low EKFiddle HTML body analysis
+- When user explicitly requests COMPARISON of multiple sessions → Use fiddler_mcp__compare_sessions (efficient, one call)
+- When analyzing EKFiddle or suspicious sessions sequentially → Fetch ONE at a time with fiddler_mcp__session_body, make multiple calls
+- DO NOT list "I will call session X, Y, Z..." - just make the calls as you analyze
+- After each call, provide brief NEW findings THEN decide if another call is needed
+- DO NOT repeat previous summaries - each response should ADD NEW information only
+- Focus on user IOCs and Critical/High first; skip Low External Script Monitor until IOCs are covered
+- Never re-fetch a session body already analyzed in this query
+- Never invent hosts or IOCs not present in tool results
+- You have a limit of {max_followups} tool calls per user query - use them wisely
+
+PERFORMANCE OPTIMIZATION INSTRUCTIONS:
+1. Be CONCISE in your initial responses - acknowledge the request in 1 sentence
+2. For tool calls, don't provide lengthy explanations beforehand
+3. After getting results, provide analysis WITHOUT repeating all raw data
+4. If listing items, show only ESSENTIAL information (ID, domain, key finding)
+5. Keep responses focused and actionable
+6. Offer to provide more detail if needed, don't dump everything at once
+
+RESPONSE SPEED PRIORITY:
+- Make tool calls immediately without preamble
+- Analyze results efficiently  
+- Keep initial responses under 10 lines unless specifically asked for detail
+- Focus on answering the specific question asked
+- Prefer JSON-only tool calls; put any short analysis BEFORE the JSON, not after
+
+CONVERSATION CONTEXT:
+{history}
+
+USER QUERY: {user_query}
+
+YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language):"""
+_GEMINI_PROMPT_SEGMENTS = tuple(
+    (literal, field) for literal, field, _spec, _conv in string.Formatter().parse(_GEMINI_PROMPT_TEMPLATE)
+)
+# Everything before the history field depends only on the tool list and max_followups,
+# so that prefix is rendered once per tool list; only history and the query vary per turn.
+_PROMPT_HISTORY_INDEX = next(i for i, (_, field) in enumerate(_GEMINI_PROMPT_SEGMENTS) if field == "history")
+_PROMPT_PREFIX_SEGMENTS = _GEMINI_PROMPT_SEGMENTS[:_PROMPT_HISTORY_INDEX] + (
+    (_GEMINI_PROMPT_SEGMENTS[_PROMPT_HISTORY_INDEX][0], None),
+)
+_PROMPT_TURN_SEGMENTS = (("", "history"),) + _GEMINI_PROMPT_SEGMENTS[_PROMPT_HISTORY_INDEX + 1:]
+
+
+# Static tails of the per-tool-result analysis and follow-up prompts. They sit on
+# either side of the tool-name list and are joined once per tool list.
+_ANALYSIS_PROMPT_RULES = """ANALYSIS REQUIREMENTS:
+1. If the user asked for EKFiddle rules / CustomRegexes / signatures:
+   - Use this tool result to extract high-signal malicious patterns only
+   - Emit tab-separated rules NOW: Type	Severity: Name	Regex	Comment
+   - Types: SourceCode URI IP Headers Hash. Severity: High: Med: Low:
+   - End with a plain block of ONLY rule lines. Then STOP. No more tool calls.
+   - Do NOT invent IOCs. Do NOT write NitroPack/___mnag rules unless asked.
+2. Otherwise IOC-FIRST: search user-named hosts with host_pattern BEFORE Low EKFiddle HTML.
+3. Distinguish suspicious vs EKFiddle-flagged; Critical/High first; Low External Script Monitor last.
+4. ZERO-HIT: if a host search returned 0 matches, search parent apex / url_pattern next. Do not invent hosts.
+5. Do NOT re-fetch session bodies already listed above.
+6. If response_body contains JavaScript, focus on BEHAVIOR over strings."""
+_ANALYSIS_PROMPT_FOOTER = """IMPORTANT: Do NOT invent tool names. Use ONLY the tools listed above.
+session_id must be a plain string. sessions_search has no "query" field — use host_pattern / content_type.
+If you need to call another tool, put brief findings then JSON: {"tool": "tool_name", "arguments": {...}}
+
+Otherwise, provide your security-focused analysis or EKFiddle rules."""
+_FOLLOWUP_PROMPT_RULES = """ANALYSIS REQUIREMENTS:
+1. If the user asked for EKFiddle rules / CustomRegexes / signatures and you have malicious SourceCode evidence:
+   - Emit final tab-separated rules NOW and STOP. No more session hopping.
+   - Format: Type	Severity: Name	Regex	OptionalComment
+   - Do NOT invent IOCs. Do NOT target NitroPack/___mnag unless asked.
+2. Otherwise continue the IOC hunt only for user-named hosts still unsearched or 0-hit parent apex / url_pattern.
+3. Be clear on ekfiddle_comment severity; Critical/High first; Low External Script Monitor last.
+4. If obfuscated JavaScript OR Critical/High EKFiddle, run MALICIOUS PATTERN CHECKLIST:
+   [ ] Iframe/Script Injection
+   [ ] Redirection (window.location)
+   [ ] Anti-Analysis (referrer checks, localStorage counters)
+   [ ] Overlay/UI Hijacking (position:fixed, z-index)
+   [ ] Dynamic Code Execution (eval, Function constructor)
+5. Focus on BEHAVIOR over string content. Correlate with EKFiddle when present.
+6. Do NOT re-fetch already analyzed session IDs listed above.
+7. Provide NEW findings only, then either call another tool OR give the final answer."""
+_FOLLOWUP_PROMPT_FOOTER = """IMPORTANT: Do NOT invent tool names. session_id must be a plain string. No "query" param on sessions_search.
+If calling a tool: brief note then {"tool": "tool_name", "arguments": {...}}"""
+_TOOL_PROMPT_TAILS = {
+    "analysis": (_ANALYSIS_PROMPT_RULES, _ANALYSIS_PROMPT_FOOTER),
+    "followup": (_FOLLOWUP_PROMPT_RULES, _FOLLOWUP_PROMPT_FOOTER),
+}
+
+
+def _render_segments(segments, values: Dict[str, str]) -> str:
+    """Join pre-split template segments, substituting each named field from values."""
+    parts = []
+    for literal, field in segments:
+        parts.append(literal)
+        if field is not None:
+            parts.append(values[field])
+    return "".join(parts)
+
+
+class _ReplyEcho:
+    """Show a streamed model reply as its chunks arrive.
+
+    With rich the accumulated text is re-rendered as Markdown in a Live
+    region; otherwise chunks are written straight to stdout. Nothing is
+    printed for a turn that returns no text (function calls only).
+    """
+
+    def __init__(self, label: str, console: Any = None):
+        self.label = label
+        self.console = console
+        self.parts: List[str] = []
+        self._live = None
+
+    def __call__(self, piece: str) -> None:
+        if not piece:
+            return
+        if not self.parts:
+            self._start()
+        self.parts.append(piece)
+        if self._live is not None:
+            self._live.update(Markdown("".join(self.parts)))
+        else:
+            sys.stdout.write(piece)
+            sys.stdout.flush()
+
+    def _start(self) -> None:
+        _status_line("", done=True)  # replace the "Waiting for ..." line
+        if self.console is not None:
+            from rich.live import Live
+
+            self.console.print(f"[bold cyan]< {self.label}:[/bold cyan]")
+            self._live = Live(console=self.console, refresh_per_second=8, vertical_overflow="visible")
+            self._live.start()
+        else:
+            sys.stdout.write(f"< {self.label}: ")
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def close(self) -> None:
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        elif self.parts:
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+
+class GeminiFiddlerClient:
+    """Fiddler MCP client with Gemini (default), DeepSeek, or OpenRouter native tool backends."""
+
+    # Fallbacks for partially constructed clients (tests build them via __new__)
+    _mcp_restart_lock = threading.Lock()
+    _analyzed_lock = threading.Lock()
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = DEFAULT_GEMINI_MODEL,
+        auto_save_full_bodies: bool = False,
+        provider: str = DEFAULT_PROVIDER,
+        deepseek_api_key: Optional[str] = None,
+        deepseek_base_url: str = DEEPSEEK_BASE_URL,
+        deepseek_ssl_verify: Any = True,
+        openrouter_api_key: Optional[str] = None,
+        openrouter_base_url: str = OPENROUTER_BASE_URL,
+        openrouter_ssl_verify: Any = True,
+    ):
+        """Initialize client with LLM API credentials."""
+        self.api_key = api_key
+        self.deepseek_api_key = deepseek_api_key or os.environ.get("DEEPSEEK_API_KEY") or ""
+        self.deepseek_base_url = (deepseek_base_url or DEEPSEEK_BASE_URL).rstrip("/")
+        self.deepseek_ssl_verify = deepseek_ssl_verify
+        self.openrouter_api_key = openrouter_api_key or os.environ.get("OPENROUTER_API_KEY") or ""
+        self.openrouter_base_url = (openrouter_base_url or OPENROUTER_BASE_URL).rstrip("/")
+        self.openrouter_ssl_verify = openrouter_ssl_verify
+        self.model_name = model_name
+        self.provider_name = (provider or provider_for_model(model_name) or DEFAULT_PROVIDER).lower()
+        if self.provider_name not in ("gemini", "deepseek", "openrouter"):
+            self.provider_name = DEFAULT_PROVIDER
+        self.mcp_process = None
+        self.mcp_stderr_file = None
+        self.request_id = 0
+        # JSON-RPC id -> Future resolved by the stdout reader thread
+        self._pending_responses: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._stdin_lock = threading.Lock()
+        # Serializes MCP child restarts across the parallel tool workers
+        self._mcp_restart_lock = threading.Lock()
+        self._tool_pool = ThreadPoolExecutor(
+            max_workers=MAX_PARALLEL_TOOL_CALLS, thread_name_prefix="mcp-tool"
+        )
+        self.conversation_history = []
+        self.available_tools = []
+        # Session body dumps are written by one background thread off the tool path
+        self._dump_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=BODY_DUMP_QUEUE_SIZE)
+        self._dump_writer = threading.Thread(target=self._drain_body_dumps, name="body-dump-writer", daemon=True)
+        self._dump_writer.start()
+        # (kind, body digest) -> dump path, so re-fetched identical bodies are not rewritten
+        self._dump_paths: "OrderedDict[Tuple[str, str], Path]" = OrderedDict()
+        self._dump_paths_lock = threading.Lock()
+        # (model, prompt digest) -> (monotonic time, Gemini response); LRU across queries
+        self._llm_cache: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        # (tool_name, canonical args) -> (monotonic time, MCP response); reset per query
+        self._tool_cache: Dict[Any, Any] = {}
+        # ((tool, arguments), Future) started mid-stream by _stream_legacy, consumed by _call_legacy_tool
+        self._early_tool_call: Optional[Tuple[Tuple[str, Dict[str, Any]], Future]] = None
+        self._session_t0 = time.monotonic()
+        self._user_query_count = 0  # survives /clearchat, unlike the history
+        self.auto_save_full_bodies = auto_save_full_bodies
+        self.verbose_logging = os.environ.get("GEMINI_FIDDLER_VERBOSE_LOG", "0") == "1"
+        
+        # Performance settings
+        self.tool_timeout = int(os.environ.get("GEMINI_TOOL_TIMEOUT", "30"))  # seconds
+        self.gemini_timeout = int(os.environ.get("GEMINI_API_TIMEOUT", "60"))  # seconds
+        self.show_progress = os.environ.get("GEMINI_HIDE_PROGRESS", "").strip() != "1"
+        # Transient \r status lines only make sense on an interactive terminal
+        self._progress_tty = self.show_progress and sys.stdout.isatty()
+        self._reply_streamed = False  # the last answer was already shown while streaming
+        self._answered = False  # the last chat() produced a model answer, not an error/blocked notice
+        self.max_followups = int(os.environ.get("GEMINI_MAX_TOOL_CALLS", "20"))  # Maximum tool calls per query
+        self._analyzed_session_ids: set = set()
+        # Parallel tool workers check-and-claim session_body ids under this lock
+        self._analyzed_lock = threading.Lock()
+        self._last_search_args: Dict[str, Any] = {}
+        # (sessions list, Counter of its ids): rebuilt only when a new list comes in
+        self._session_id_counts_cache: Optional[tuple] = None
+        self._interrupt_requested = False
+        self._bridge_process = None  # optional handle if we spawned enhanced-bridge ourselves
+        self.script_dir = Path(__file__).resolve().parent
+        self.bridge_url = os.environ.get("FIDDLER_BRIDGE_URL", "http://127.0.0.1:8081").rstrip("/")
+        self.use_response_cache = os.environ.get("GEMINI_RESPONSE_CACHE", "1").strip().lower() not in {
+            "0", "false", "no", "off",
+        }
+        if self.use_response_cache:
+            self._sweep_response_cache()
+        self._current_user_query = ""
+        self._mcp_server_command: Optional[List[str]] = None
+        # Native function calling (default on). Set GEMINI_NATIVE_TOOLS=0 for legacy text JSON loop.
+        # DeepSeek/OpenRouter have no legacy text loop; native tools are always required.
+        self.use_native_tools = os.environ.get("GEMINI_NATIVE_TOOLS", "1").strip().lower() not in {
+            "0", "false", "no", "off",
+        }
+        if self.provider_name in ("deepseek", "openrouter"):
+            self.use_native_tools = True
+        self._gemini_tool = None
+        self._system_instruction = ""
+        self.llm_provider = None
+        self.model = None
+        
+        # Console is created on first render (_rich_console); piped output stays plain
+        self.console = None
+        self.use_rich = RICH_AVAILABLE and sys.stdout.isatty()
+        
+        self._init_llm_provider()
+        
+        print(f"Initialized {self.provider_name} / {model_name}")
+        if self.use_native_tools:
+            print(f"[*] Native tool schema binding enabled ({self.provider_name})")
+        if not RICH_AVAILABLE:
+            print("[!] Tip: Install 'rich' library for better formatting: pip install rich")
+
+    def _rich_console(self):
+        """Rich Console for formatted output, created (importing rich) on first use."""
+        if self.console is None and self.use_rich:
+            if _load_rich():
+                self.console = Console()
+            else:
+                self.use_rich = False
+        return self.console
+
+    def _close_llm_provider(self) -> None:
+        """Release the current provider's server-side state (the Gemini context cache)."""
+        provider, self.llm_provider = getattr(self, "llm_provider", None), None
+        closer = getattr(provider, "close", None)
+        if callable(closer):
+            try:
+                closer()
+            except Exception as e:
+                self.log_with_timestamp(f"LLM provider close failed: {e}", to_console=False)
+
+    def _init_llm_provider(self) -> None:
+        """Create Gemini, DeepSeek, or OpenRouter provider for the configured model."""
+        self._close_llm_provider()
+        if self.provider_name == "openrouter":
+            if not self.openrouter_api_key:
+                raise RuntimeError(
+                    "OpenRouter selected but no API key. Set openrouter_api_key in config "
+                    "or OPENROUTER_API_KEY env."
+                )
+            self.use_native_tools = True
+            from llm_providers.openrouter_provider import OpenRouterProvider
+            self.llm_provider = OpenRouterProvider(
+                api_key=self.openrouter_api_key,
+                model_name=self.model_name,
+                base_url=self.openrouter_base_url,
+                ssl_verify=getattr(self, "openrouter_ssl_verify", True),
+            )
+            self.model = None
+            return
+
+        if self.provider_name == "deepseek":
+            if not self.deepseek_api_key:
+                raise RuntimeError(
+                    "DeepSeek selected but no API key. Set deepseek_api_key in config "
+                    "or DEEPSEEK_API_KEY env."
+                )
+            self.use_native_tools = True
+            from llm_providers.deepseek_provider import DeepSeekProvider
+            self.llm_provider = DeepSeekProvider(
+                api_key=self.deepseek_api_key,
+                model_name=self.model_name,
+                base_url=self.deepseek_base_url,
+                ssl_verify=getattr(self, "deepseek_ssl_verify", True),
+            )
+            self.model = None
+            return
+
+        if not GENAI_AVAILABLE or genai is None:
+            raise RuntimeError(
+                "google-generativeai is not installed. "
+                "Run: python -m pip install -r requirements-gemini.txt"
+            )
+        from llm_providers.gemini_provider import GeminiProvider
+        self.llm_provider = GeminiProvider(api_key=self.api_key, model_name=self.model_name)
+        self.model = self.llm_provider.model
+        genai.configure(api_key=self.api_key)
+
+    # Valid argument keys per tool (used by sanitizer)
+    _TOOL_ARG_KEYS = {
+        "fiddler_mcp__live_sessions": {"limit", "since_minutes", "host_filter", "status_filter", "suspicious_only"},
+        "fiddler_mcp__sessions_search": {
+            "host_pattern", "url_pattern", "content_type", "method",
+            "status_min", "status_max", "min_size", "max_size", "since_minutes", "limit", "offset",
+        },
+        "fiddler_mcp__session_headers": {"session_id", "header_names"},
+        "fiddler_mcp__session_body": {"session_id", "include_binary", "smart_extract"},
+        "fiddler_mcp__compare_sessions": {"session_ids", "include_binary", "smart_extract"},
+        "fiddler_mcp__live_stats": set(),
+        "fiddler_mcp__sessions_timeline": {
+            "time_range_minutes", "group_by", "include_details", "filter_host", "since_minutes",
+        },
+        "fiddler_mcp__sessions_clear": {"confirm", "clear_suspicious"},
+        "fiddler_mcp__ekfiddle_sessions": {"limit", "time_range_minutes", "threat_level"},
+        "fiddler_mcp__ekfiddle_threats": {"time_range_minutes", "min_risk_score", "categories"},
+    }
+
+    @staticmethod
+    def _flatten_session_id_value(value: Any) -> Optional[str]:
+        """Coerce nested/object session_id values to a plain string."""
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return str(int(value))
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            for key in ("session_id", "id", "value"):
+                if key in value and value[key] is not None:
+                    return GeminiFiddlerClient._flatten_session_id_value(value[key])
+            if len(value) == 1:
+                return GeminiFiddlerClient._flatten_session_id_value(next(iter(value.values())))
+        if isinstance(value, list) and len(value) == 1:
+            return GeminiFiddlerClient._flatten_session_id_value(value[0])
+        return str(value).strip() or None
+
+    def _sanitize_tool_arguments(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize common LLM argument mistakes before calling MCP tools.
+
+        Returns either sanitized args, or an error dict with success=False and
+        a correction hint (caller must not send that to MCP).
+        """
+        if not isinstance(arguments, dict):
+            return {
+                "success": False,
+                "error": "Tool arguments must be a JSON object",
+                "hint": 'Use format: {"tool": "fiddler_mcp__session_body", "arguments": {"session_id": "142"}}',
+                "_sanitize_error": True,
+            }
+
+        args = dict(arguments)
+
+        # Map id -> session_id for body/headers tools
+        if tool_name in ("fiddler_mcp__session_body", "fiddler_mcp__session_headers"):
+            if "session_id" not in args and "id" in args:
+                args["session_id"] = args.pop("id")
+            if "session_id" in args:
+                flat = self._flatten_session_id_value(args["session_id"])
+                if not flat:
+                    return {
+                        "success": False,
+                        "error": "session_id must be a string or number",
+                        "hint": 'Correct example: {"session_id": "262"}',
+                        "received": arguments,
+                        "_sanitize_error": True,
+                    }
+                args["session_id"] = flat
+
+        if tool_name == "fiddler_mcp__compare_sessions" and "session_ids" in args:
+            raw_ids = args["session_ids"]
+            if isinstance(raw_ids, (str, int)):
+                raw_ids = [raw_ids]
+            elif not isinstance(raw_ids, list):
+                # Gemini may pass protobuf RepeatedComposite; coerce to a plain list
+                try:
+                    raw_ids = list(raw_ids)
+                except TypeError:
+                    raw_ids = [raw_ids]
+            if isinstance(raw_ids, list):
+                flattened = []
+                for item in raw_ids:
+                    flat = self._flatten_session_id_value(item)
+                    if flat:
+                        flattened.append(flat)
+                args["session_ids"] = flattened
+
+        if tool_name == "fiddler_mcp__session_headers" and "header_names" in args:
+            raw_names = args["header_names"]
+            if isinstance(raw_names, str):
+                raw_names = raw_names.split(",")
+            elif raw_names is not None and not isinstance(raw_names, list):
+                # Gemini may pass protobuf RepeatedComposite; coerce to a plain list
+                try:
+                    raw_names = list(raw_names)
+                except TypeError:
+                    raw_names = [raw_names]
+            names = [str(name).strip() for name in raw_names or [] if str(name).strip()]
+            if names:
+                args["header_names"] = names
+            else:
+                args.pop("header_names")
+
+        # Lucene-ish query: "content_type:javascript" / "host:cdn.apigateway.co"
+        if tool_name == "fiddler_mcp__sessions_search" and "query" in args:
+            query_val = args.pop("query")
+            if isinstance(query_val, str) and query_val.strip():
+                q = query_val.strip()
+                mapped = False
+                for field, target in (
+                    ("content_type:", "content_type"),
+                    ("host:", "host_pattern"),
+                    ("host_pattern:", "host_pattern"),
+                    ("url:", "url_pattern"),
+                    ("url_pattern:", "url_pattern"),
+                    ("method:", "method"),
+                ):
+                    if q.lower().startswith(field):
+                        args.setdefault(target, q[len(field):].strip().strip('"').strip("'"))
+                        mapped = True
+                        break
+                if not mapped:
+                    # Bare domain-like string -> host_pattern
+                    if "." in q and " " not in q and ":" not in q:
+                        args.setdefault("host_pattern", q)
+                    elif q.lower() in ("javascript", "html", "json", "css", "plain"):
+                        args.setdefault("content_type", q.lower())
                     else:
-                        self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, method='{method}', size={self._format_size(response_size)}\n")
-                
-                self.mcp_stderr_file.flush()
-            return response
-        except json.JSONDecodeError as e:
-            elapsed_ms = int((time.time() - request_start) * 1000)
-            self.log_with_timestamp(f"MCP Response: {elapsed_ms}ms, JSON decode error: {e}", to_console=False)
-            return {"error": f"Invalid JSON response: {e}"}
-        except Exception as e:
-            elapsed_ms = int((time.time() - request_start) * 1000)
-            self.log_with_timestamp(f"MCP Response: {elapsed_ms}ms, error: {e}", to_console=False)
-            return {"error": f"MCP request failed: {e}"}
+                        return {
+                            "success": False,
+                            "error": f"Unknown query form: {query_val!r}. sessions_search has no 'query' parameter.",
+                            "hint": 'Use host_pattern, url_pattern, or content_type. Example: {"host_pattern": "cdn.apigateway.co"} or {"content_type": "javascript"}',
+                            "received": arguments,
+                            "_sanitize_error": True,
+                        }
 
-    def send_mcp_notification(self, method: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
-        """Send JSON-RPC notification (no response expected)."""
-        try:
-            if self.mcp_process.poll() is not None:
-                return "MCP server process has terminated"
+        # host -> host_pattern alias
+        if tool_name == "fiddler_mcp__sessions_search" and "host" in args and "host_pattern" not in args:
+            args["host_pattern"] = args.pop("host")
+        if tool_name == "fiddler_mcp__sessions_search" and "url" in args and "url_pattern" not in args:
+            args["url_pattern"] = args.pop("url")
+
+        # filter / host_filter aliases often hallucinated by the model
+        if tool_name == "fiddler_mcp__sessions_search":
+            for alias in ("filter", "host_filter"):
+                if alias in args and "host_pattern" not in args:
+                    val = args.pop(alias)
+                    if isinstance(val, str) and val.strip():
+                        args["host_pattern"] = val.strip()
+                elif alias in args:
+                    args.pop(alias, None)
+
+            # Strip leading/trailing * before bridge call
+            for key in ("host_pattern", "url_pattern"):
+                if key in args and isinstance(args[key], str):
+                    pat = args[key].strip()
+                    while pat.startswith("*"):
+                        pat = pat[1:]
+                    while pat.endswith("*") and not pat.endswith(r"\*"):
+                        pat = pat[:-1]
+                    args[key] = pat.strip()
+
+        # Timeline: map legacy since_minutes -> time_range_minutes
+        if tool_name == "fiddler_mcp__sessions_timeline":
+            if "time_range_minutes" not in args and "since_minutes" in args:
+                args["time_range_minutes"] = args.pop("since_minutes")
+            elif "since_minutes" in args:
+                args.pop("since_minutes", None)
+
+        allowed = self._TOOL_ARG_KEYS.get(tool_name)
+        if allowed is not None:
+            unknown = [k for k in list(args.keys()) if k not in allowed]
+            for k in unknown:
+                args.pop(k, None)
+            if unknown and not args and allowed:
+                hint = f"Valid keys for {tool_name}: {sorted(allowed)}"
+                if tool_name == "fiddler_mcp__sessions_search":
+                    hint += '. Example: {"host_pattern": "cdn.apigateway.co"} or {"content_type": "javascript"}'
+                return {
+                    "success": False,
+                    "error": f"No valid arguments after removing unknown keys: {unknown}",
+                    "hint": hint,
+                    "received": arguments,
+                    "_sanitize_error": True,
+                }
+
+        return args
+
+    @staticmethod
+    def _user_allows_body_refetch(user_query: str) -> bool:
+        """True only when the user explicitly asks to refresh/re-analyze a body."""
+        q = (user_query or "").lower()
+        triggers = (
+            "refresh",
+            "fetch again",
+            "re-fetch",
+            "refetch",
+            "re-analyze",
+            "reanalyze",
+            "re-analyse",
+            "analyse again",
+            "analyze again",
+            "get the body again",
+            "pull the body again",
+        )
+        return any(t in q for t in triggers)
+
+    def _validate_ekfiddle_rule_line(self, line: str) -> bool:
+        """Validate one tab-separated EKFiddle CustomRegexes line."""
+        if not line or "\t" not in line:
+            return False
+        if line.lstrip().startswith("#") or line.lstrip().startswith("##"):
+            return False
+        parts = line.split("\t")
+        if len(parts) < 3:
+            return False
+        rule_type = parts[0].strip()
+        severity_name = parts[1].strip()
+        regex = parts[2].strip()
+        if rule_type not in ("IP", "URI", "SourceCode", "Headers", "Hash"):
+            return False
+        # Accept Med: or common LLM slip Medium: (normalized on save)
+        if not any(
+            severity_name.startswith(s) for s in ("High:", "Med:", "Medium:", "Low:")
+        ):
+            return False
+        if len(regex) < 3:
+            return False
+        # Reject slash-wrapped /regex/i pseudo-format and Name/Regex table leftovers
+        if regex.startswith("/") and regex.rstrip().endswith(("/i", "/")):
+            return False
+        if severity_name.lower() in ("name", "regex", "comment", "color"):
+            return False
+        return True
 
-            notification = {
-                "jsonrpc": "2.0",
-                "method": method,
-                "params": params or {},
-            }
+    def _extract_ekfiddle_rules_from_text(self, text: str) -> List[str]:
+        """Pull valid tab-separated EKFiddle rule lines from mixed assistant prose."""
+        if not text:
+            return []
+        rules: List[str] = []
+        seen = set()
+        # Prefer fenced blocks first, then whole text
+        chunks = [text]
+        fences = _RULE_FENCE_RE.findall(text)
+        if fences:
+            chunks = fences + [text]
+        for chunk in chunks:
+            for raw in chunk.splitlines():
+                line = raw.rstrip("\n").strip()
+                if not line or line in seen:
+                    continue
+                # Normalize common LLM severity slip Medium: → Med:
+                parts = line.split("\t")
+                if len(parts) >= 2 and parts[1].strip().startswith("Medium:"):
+                    parts[1] = "Med:" + parts[1].strip()[len("Medium:") :]
+                    line = "\t".join(parts)
+                if self._validate_ekfiddle_rule_line(line):
+                    seen.add(line)
+                    rules.append(line)
+        return rules
 
-            self.mcp_process.stdin.write(json.dumps(notification) + "\n")
-            self.mcp_process.stdin.flush()
+    def _save_ekfiddle_rules(self, rules: List[str], output_path: Optional[Path] = None) -> Optional[Path]:
+        """Append validated rules to generated_ekfiddle_rules.txt with a timestamp header."""
+        if not rules:
+            return None
+        path = Path(output_path) if output_path else (self.script_dir / "generated_ekfiddle_rules.txt")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(f"\n# Generated {stamp}\n")
+                for rule in rules:
+                    fh.write(rule + "\n")
+            return path
         except Exception as exc:
-            return f"Failed to send notification: {exc}"
-        return None
+            self.log_with_timestamp(f"Failed to save EKFiddle rules: {exc}", to_console=True, prefix="[!] ")
+            return None
 
-    def initialize_mcp(self):
-        """Initialize MCP connection"""
-        response = self.send_mcp_request(
-            "initialize",
-            {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "gemini-fiddler-client", "version": "1.0.0"},
-            },
+    def maybe_persist_ekfiddle_rules(self, assistant_text: str) -> List[str]:
+        """Extract and save EKFiddle rules from an assistant response. Returns saved lines."""
+        rules = self._extract_ekfiddle_rules_from_text(assistant_text)
+        if not rules:
+            return []
+        # Skip auto-save of Low: FP monitors when verdict is Benign unless user asked for rules
+        q = (getattr(self, "_current_user_query", None) or "").lower()
+        asked_for_rules = any(
+            token in q for token in ("ekfiddle", "customregex", "signature", " rule", "rules")
         )
-        
-        if "result" in response:
-            server_info = response["result"].get("serverInfo", {})
-            print(f"[+] Connected to {server_info.get('name', 'MCP server')}")
+        text_l = (assistant_text or "").lower()
+        benign_verdict = any(
+            token in text_l
+            for token in ("benign", "false positive", "false positives", "is a false positive")
+        )
+        if benign_verdict and not asked_for_rules:
+            filtered = []
+            for rule in rules:
+                parts = rule.split("\t")
+                sev = parts[1].strip() if len(parts) > 1 else ""
+                if sev.startswith("Low:"):
+                    continue
+                filtered.append(rule)
+            rules = filtered
+            if not rules:
+                return []
+        path = self._save_ekfiddle_rules(rules)
+        if path:
+            print(f"[+] Saved {len(rules)} EKFiddle rules to {path.name}")
+        return rules
 
-            # MCP spec requires clients to notify once initialization completes.
-            error = self.send_mcp_notification("notifications/initialized")
-            if error and self.verbose_logging:
-                print(f"[!] Warning: {error}")
-        else:
-            print(f"[X] Initialization failed: {response.get('error', 'Unknown error')}")
+    def _finalize_assistant_response(self, text: str) -> str:
+        """Persist any EKFiddle rules found in the assistant text, then return it."""
+        if text:
+            self.maybe_persist_ekfiddle_rules(text)
+        return text
 
-    def list_tools(self) -> List[Dict[str, Any]]:
-        """List all available MCP tools"""
-        response = self.send_mcp_request("tools/list")
-        
-        if "error" in response:
-            print(f"\n[X] Error listing tools: {response['error']}")
-            print("\n[!] Diagnostics:")
-            print(f"    - Process alive: {self.mcp_process.poll() is None}")
-            print(f"    - Process PID: {self.mcp_process.pid if self.mcp_process else 'N/A'}")
-            print("\n[!] This usually means:")
-            print("    1. The 5ire-bridge.py failed to start properly")
-            print("    2. The enhanced-bridge.py is not running (needed on port 8081)")
-            print("    3. There's a port conflict or network issue")
-            print("\n[!] Try:")
-            print("    1. Start enhanced-bridge.py first: python enhanced-bridge.py")
-            print("    2. Check if port 8081 is available: netstat -an | findstr 8081")
-            print("    3. Kill stuck processes: taskkill /F /IM python.exe")
-            return []
-        
-        tools = response.get("result", {}).get("tools", [])
-        self.available_tools = tools
-        if self.use_native_tools:
-            self.bind_gemini_tools()
-        return tools
+    def _track_analyzed_session(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Record session IDs whose bodies were fetched in this query."""
+        if not isinstance(result, dict) or result.get("success") is False:
+            return
+        if tool_name == "fiddler_mcp__session_body":
+            sid = arguments.get("session_id") or result.get("session_id") or result.get("id")
+            if sid:
+                self._analyzed_session_ids.add(str(sid))
+        elif tool_name == "fiddler_mcp__compare_sessions":
+            for sid in arguments.get("session_ids") or []:
+                self._analyzed_session_ids.add(str(sid))
+            for item in result.get("sessions") or []:
+                if isinstance(item, dict) and item.get("session_id"):
+                    self._analyzed_session_ids.add(str(item["session_id"]))
 
-    def bind_gemini_tools(self) -> bool:
-        """Bind MCP tools on the active LLM provider (Gemini or DeepSeek)."""
-        import llm_prompts
+    def _analyzed_sessions_note(self) -> str:
+        if not self._analyzed_session_ids:
+            return "No session bodies analyzed yet in this query."
+        ids = ", ".join(sorted(self._analyzed_session_ids, key=lambda x: int(x) if str(x).isdigit() else str(x)))
+        return f"Already analyzed session bodies this query (DO NOT re-fetch): {ids}"
 
-        if self.llm_provider is None:
-            self._init_llm_provider()
+    def _strip_tool_json_from_text(self, text: str) -> str:
+        """Remove trailing/embedded tool-call JSON so unfinished calls are not shown as answers."""
+        if not text:
+            return text
+        explanatory = self._extract_text_before_tool_call(text)
+        return explanatory.strip() if explanatory and explanatory.strip() else text.strip()
 
-        self._system_instruction = llm_prompts.investigation_system_instruction(self.max_followups)
-        ok = self.llm_provider.bind_tools(self.available_tools, self._system_instruction)
-        for err in getattr(self.llm_provider, "bind_errors", []) or []:
-            self.log_with_timestamp(f"Tool bind skip: {err}", to_console=True, prefix="[!] ")
+    def _should_auto_fetch_body(self, search_result: Dict[str, Any], search_args: Optional[Dict[str, Any]] = None) -> bool:
+        """Decide whether auto body fetch is appropriate for this search."""
+        args = search_args if search_args is not None else self._last_search_args
+        if not args:
+            return False
+        host_pat = (args.get("host_pattern") or "").strip()
+        url_pat = (args.get("url_pattern") or "").strip()
+        if not host_pat and not url_pat:
+            return False
+        sessions = search_result.get("sessions") or []
+        if not sessions or len(sessions) > 10:
+            return False
+        return True
 
-        if not ok:
-            if self.provider_name == "gemini":
-                self.log_with_timestamp(
-                    "No tools bound; falling back to text tool loop",
-                    to_console=True,
-                    prefix="[!] ",
-                )
-            else:
-                self.log_with_timestamp(
-                    f"No tools bound for {self.provider_name}; native tools required",
-                    to_console=True,
-                    prefix="[!] ",
-                )
-            self._gemini_tool = None
-            # DeepSeek/OpenRouter require native tools; Gemini can fall back to legacy text loop
-            if self.provider_name == "gemini":
-                self.use_native_tools = False
-                if genai is not None:
-                    self.model = genai.GenerativeModel(self.model_name)
-            else:
-                self.use_native_tools = True
+    @staticmethod
+    def _is_text_or_js_session(session: Dict[str, Any]) -> bool:
+        ctype = (session.get("content_type") or session.get("contentType") or "").lower()
+        url = (session.get("url") or "").lower()
+        if any(x in ctype for x in ("javascript", "ecmascript", "text/html", "application/json", "text/plain")):
+            return True
+        if any(x in ctype for x in ("video/", "audio/", "image/", "octet-stream", "mp4", "mpeg")):
             return False
+        if url.endswith((".mp4", ".webm", ".mp3", ".png", ".jpg", ".jpeg", ".gif", ".woff", ".woff2", ".ttf")):
+            return False
+        size = session.get("size") or session.get("content_length") or session.get("contentLength") or 0
+        try:
+            if int(size) > 5_000_000:
+                return False
+        except (TypeError, ValueError):
+            pass
+        return "javascript" in url or url.endswith(".js") or "/html" in ctype
 
-        self._gemini_tool = True  # truthy flag for legacy checks / tests
-        if self.provider_name == "gemini":
-            self.model = getattr(self.llm_provider, "model", getattr(self, "model", None))
-        names = []
-        if hasattr(self.llm_provider, "bound_tool_names"):
-            names = self.llm_provider.bound_tool_names()
-        label = getattr(self.llm_provider, "display_label", self.provider_name)
-        print(f"[+] Bound {len(names)} {label} tools: {', '.join(names)}")
-        self.log_with_timestamp(f"Bound {self.provider_name} tools: {names}", to_console=False)
-        return True
+    def _pick_auto_fetch_session(self, sessions: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Prefer Critical/High EKFiddle JS/HTML, else first text/JS hit; skip media and already-analyzed."""
+        def severity_rank(s: Dict[str, Any]) -> int:
+            comment = (s.get("ekfiddle_comment") or "") + " " + " ".join(s.get("risk_reasons") or [])
+            c = comment.lower()
+            if "critical" in c[:40] or c.strip().startswith("critical"):
+                return 0
+            if "high:" in c[:40] or " high " in f" {c[:40]}":
+                return 1
+            if s.get("risk_level") == "CRITICAL":
+                return 0
+            if s.get("risk_level") == "HIGH":
+                return 1
+            return 5
 
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Call a specific MCP tool with progress indicator"""
+        analyzed = getattr(self, "_analyzed_session_ids", set()) or set()
+        candidates = []
+        for s in sessions:
+            if not self._is_text_or_js_session(s):
+                continue
+            sid = str(s.get("id") or s.get("session_id") or "").strip()
+            if sid and sid in analyzed:
+                continue
+            candidates.append(s)
+        if not candidates:
+            return None
+        candidates.sort(key=severity_rank)
+        return candidates[0]
+
+    @staticmethod
+    def _is_media_content_type(content_type: str) -> bool:
+        ctype = (content_type or "").lower()
+        return any(
+            x in ctype
+            for x in (
+                "image/",
+                "video/",
+                "audio/",
+                "font/",
+                "application/octet-stream",
+                "application/pdf",
+            )
+        )
 
-        if not self.ensure_mcp_alive():
-            return {
-                "success": False,
-                "error": "MCP server process is not running and restart failed",
-                "hint": "Restart gemini-fiddler-client.py or start 5ire-bridge.py manually",
-            }
-        
-        # Handle non-prefixed tool names (LLM sometimes omits fiddler_mcp__ prefix)
-        NON_PREFIXED_ALIASES = {
-            # Common non-prefixed hallucinations
-            "get_sessions": "fiddler_mcp__live_sessions",
-            "live_sessions": "fiddler_mcp__live_sessions",
-            "list_sessions": "fiddler_mcp__live_sessions",
-            "session_body": "fiddler_mcp__session_body",
-            "get_body": "fiddler_mcp__session_body",
-            "session_headers": "fiddler_mcp__session_headers",
-            "get_headers": "fiddler_mcp__session_headers",
-            "compare_sessions": "fiddler_mcp__compare_sessions",
-            "sessions_search": "fiddler_mcp__sessions_search",
-            "search_sessions": "fiddler_mcp__sessions_search",
-            "live_stats": "fiddler_mcp__live_stats",
-            "get_stats": "fiddler_mcp__live_stats",
-            "sessions_timeline": "fiddler_mcp__sessions_timeline",
-            "sessions_clear": "fiddler_mcp__sessions_clear",
-            "ekfiddle_sessions": "fiddler_mcp__ekfiddle_sessions",
-            "ekfiddle_threats": "fiddler_mcp__ekfiddle_threats",
-        }
-        
-        # Handle dot notation (fiddler_mcp.tool_name -> fiddler_mcp__tool_name)
-        if "." in tool_name and not tool_name.startswith("fiddler_mcp__"):
-            parts = tool_name.split(".")
-            if len(parts) == 2:
-                possible_name = f"fiddler_mcp__{parts[1]}"
-                self.log_with_timestamp(f"Auto-corrected dot notation: {tool_name} -> {possible_name}", to_console=True, prefix="[!] ")
-                tool_name = possible_name
-        
-        # Check non-prefixed aliases first
-        if tool_name in NON_PREFIXED_ALIASES:
-            corrected = NON_PREFIXED_ALIASES[tool_name]
-            self.log_with_timestamp(f"Auto-corrected non-prefixed tool: {tool_name} -> {corrected}", to_console=True, prefix="[!] ")
-            tool_name = corrected
-        
-        # Correct common tool name hallucinations from LLM (prefixed versions)
-        TOOL_ALIASES = {
-            # Session body aliases
-            "fiddler_mcp__session_details": "fiddler_mcp__session_body",
-            "fiddler_mcp__sessions_details": "fiddler_mcp__session_body",
-            "fiddler_mcp__get_session": "fiddler_mcp__session_body",
-            "fiddler_mcp__get_body": "fiddler_mcp__session_body",
-            "fiddler_mcp__body": "fiddler_mcp__session_body",
-            # Live sessions aliases
-            "fiddler_mcp__list_sessions": "fiddler_mcp__live_sessions",
-            "fiddler_mcp__sessions_list": "fiddler_mcp__live_sessions",
-            "fiddler_mcp__get_sessions": "fiddler_mcp__live_sessions",
-            "fiddler_mcp__sessions": "fiddler_mcp__live_sessions",
-            # Headers aliases
-            "fiddler_mcp__get_headers": "fiddler_mcp__session_headers",
-            "fiddler_mcp__headers": "fiddler_mcp__session_headers",
-            # Stats aliases
-            "fiddler_mcp__stats": "fiddler_mcp__live_stats",
-            "fiddler_mcp__get_stats": "fiddler_mcp__live_stats",
-            # Search aliases
-            "fiddler_mcp__search": "fiddler_mcp__sessions_search",
-            "fiddler_mcp__search_sessions": "fiddler_mcp__sessions_search",
-            # Compare aliases
-            "fiddler_mcp__compare": "fiddler_mcp__compare_sessions",
-            # Clear aliases
-            "fiddler_mcp__clear": "fiddler_mcp__sessions_clear",
-            # Timeline aliases
-            "fiddler_mcp__timeline": "fiddler_mcp__sessions_timeline",
-        }
-        if tool_name in TOOL_ALIASES:
-            corrected = TOOL_ALIASES[tool_name]
-            self.log_with_timestamp(f"Auto-corrected tool: {tool_name} -> {corrected}", to_console=True, prefix="[!] ")
-            tool_name = corrected
-        
-        # Client-side validation: check if tool exists before calling server
-        valid_tools = [t.get("name") for t in self.available_tools if t.get("name")]
-        if tool_name not in valid_tools:
-            tool_list = "\n- ".join(valid_tools) if valid_tools else "No tools available"
-            self.log_with_timestamp(f"Invalid tool name: {tool_name}", to_console=True, prefix="[!] ")
-            return {
-                "error": f"Unknown tool: '{tool_name}'",
-                "message": f"This tool does not exist. Use ONLY these exact tool names:\n- {tool_list}",
-                "hint": "Check the tool name spelling and try again with one from the list above.",
-                "available_tools": valid_tools,
-            }
+    @staticmethod
+    def _brief_tool_status(tool_name: str, args: Optional[Dict[str, Any]] = None) -> str:
+        """One-line investigation breadcrumb for the native tool loop."""
+        args = args or {}
+        short = (tool_name or "").replace("fiddler_mcp__", "")
+        if short == "session_body":
+            return f"  -> session_body {args.get('session_id', '?')}"
+        if short == "session_headers":
+            return f"  -> headers {args.get('session_id', '?')}"
+        if short == "sessions_search":
+            host = args.get("host_pattern") or args.get("url_pattern") or ""
+            return f"  -> search {host}".rstrip() if host else "  -> search"
+        if short == "compare_sessions":
+            ids = args.get("session_ids") or []
+            if isinstance(ids, list) and ids:
+                shown = ",".join(str(x) for x in ids[:4])
+                extra = f"+{len(ids) - 4}" if len(ids) > 4 else ""
+                return f"  -> compare {shown}{extra}"
+            return "  -> compare"
+        if short == "ekfiddle_threats":
+            return "  -> ekfiddle threats"
+        if short == "ekfiddle_sessions":
+            return "  -> ekfiddle sessions"
+        if short == "live_sessions":
+            return "  -> live sessions"
+        if short == "live_stats":
+            return "  -> stats"
+        if short == "sessions_timeline":
+            return "  -> timeline"
+        if short == "sessions_clear":
+            return "  -> clear buffer"
+        return f"  -> {short}"
 
-        sanitized = self._sanitize_tool_arguments(tool_name, arguments or {})
-        if isinstance(sanitized, dict) and sanitized.get("_sanitize_error"):
-            self.log_with_timestamp(
-                f"Argument sanitize rejected for {tool_name}: {sanitized.get('error')}",
-                to_console=True,
-                prefix="[!] ",
+    @staticmethod
+    def build_investigate_prompt(host: Optional[str] = None) -> str:
+        """Canned malicious-traffic investigation prompt for /investigate."""
+        scope = ""
+        if host:
+            host = host.strip().rstrip("/")
+            if "://" in host:
+                # keep hostname only when a full URL was pasted
+                try:
+                    parsed = urlparse(host if "://" in host else f"https://{host}")
+                    host = parsed.hostname or host
+                except Exception:
+                    pass
+            scope = (
+                f" Prioritize host {host}: search that host first, then follow "
+                "any loader/C2/RPC pivots found in its bodies."
             )
-            return sanitized
-        arguments = sanitized
+        return (
+            "Investigate the current capture buffer for any signs of malicious traffic. "
+            "Follow the INVESTIGATE CAPTURE playbook: triage with live_stats and "
+            "ekfiddle_threats/ekfiddle_sessions, fetch a few highest-severity JS/HTML bodies, "
+            "pivot on hosts found in those bodies, trace the infection chain, then give a "
+            "structured summary with Infection chain, hosts/IOCs, and verdict. "
+            "Emit EKFiddle CustomRegexes only if malicious high-signal evidence exists. "
+            "Do not author rules for confirmed FP or benign libraries."
+            f"{scope}"
+        )
 
-        # Re-fetch lock: do not pull the same session body twice in one query
-        if tool_name == "fiddler_mcp__session_body":
-            sid = str(arguments.get("session_id", "")).strip()
-            if sid and sid in self._analyzed_session_ids:
-                if not self._user_allows_body_refetch(self._current_user_query):
-                    msg = (
-                        f"Session {sid} already analyzed this query. "
-                        "Use prior body findings. Do not re-fetch."
-                    )
-                    self.log_with_timestamp(msg, to_console=True, prefix="[!] ")
-                    return {
-                        "success": False,
-                        "error": msg,
-                        "session_id": sid,
-                        "already_analyzed": True,
-                        "hint": "Create EKFiddle rules or continue from prior findings. "
-                                "Only re-fetch if the user explicitly asks to refresh/re-analyze.",
-                    }
-        
-        # Enhanced bridge call logging
-        args_str = ", ".join(f"{k}={v}" for k, v in arguments.items())
-        self.log_with_timestamp(f"Bridge Call: {tool_name}({args_str})", to_console=False)
-        
-        if self.verbose_logging:
-            self.log_with_timestamp(f"  Arguments: {json.dumps(arguments, indent=2)}", to_console=False, prefix="Client: ")
-        
-        # Progress indicator
-        spinner = ['|', '/', '-', '\\']
-        spinner_idx = 0
-        start_time = time.time()
-        
-        # Show initial progress - specify it's the Fiddler HTTP bridge
-        sys.stdout.write(f"\r  {spinner[spinner_idx]} Waiting for Fiddler HTTP bridge... (0s)")
-        sys.stdout.flush()
-        
-        response = self.send_mcp_request("tools/call", {"name": tool_name, "arguments": arguments})
+    def log_with_timestamp(self, message: str, to_console: bool = True, prefix: str = "") -> None:
+        """Log a message with timestamp to both console and log file"""
+        log_file = self.mcp_stderr_file
+        to_file = log_file is not None and not log_file.closed
+        if not (to_file or to_console):
+            return  # file-only line with no log open: skip the timestamp and formatting
+        formatted_message = f"[{_log_timestamp()}] {prefix}{message}"
         
-        # Stop progress and show completion with descriptive info
-        elapsed_ms = int((time.time() - start_time) * 1000)
-        elapsed_s = elapsed_ms / 1000
+        # Always log to file if available (block-buffered, flushed per query by _flush_log)
+        if to_file:
+            try:
+                log_file.write(formatted_message + "\n")
+            except Exception:
+                pass  # Silently fail if file is closed
         
-        result = self._parse_tool_response(response)
+        # Optionally log to console
+        if to_console:
+            print(formatted_message)
 
-        # Short-circuit media bodies: no malware signal, waste tokens
-        if (
-            tool_name == "fiddler_mcp__session_body"
-            and isinstance(result, dict)
-            and not result.get("error")
-        ):
-            ctype = result.get("content_type") or result.get("contentType") or ""
-            if self._is_media_content_type(ctype):
-                sid = arguments.get("session_id") or result.get("session_id") or result.get("id")
-                msg = (
-                    f"Session {sid} is media content ({ctype}). "
-                    "Skip media bodies; analyze JS/HTML/JSON sessions instead."
-                )
-                self.log_with_timestamp(msg, to_console=True, prefix="[!] ")
-                sys.stdout.write(f"\r  [Fiddler Bridge] Skipped media body ({elapsed_s:.1f}s)                    \n")
-                sys.stdout.flush()
-                return {
-                    "success": False,
-                    "error": msg,
-                    "session_id": sid,
-                    "content_type": ctype,
-                    "media_skipped": True,
-                    "hint": "Pick a text/html or application/javascript session for malware analysis.",
-                }
-        
-        # Enhanced result logging with session metadata
-        try:
-            if isinstance(result, dict):
-                if result.get("error"):
-                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, error={result.get('error')}", to_console=False)
-                    sys.stdout.write(f"\r  [Fiddler Bridge] Error ({elapsed_s:.1f}s)                    \n")
-                elif 'sessions' in result:
-                    sessions = result.get('sessions', [])
-                    count = len(sessions)
-                    suspicious = sum(1 for s in sessions if s.get('risk_flag') or s.get('ekfiddle_comment'))
-                    ekfiddle = sum(1 for s in sessions if s.get('ekfiddle_comment'))
-                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, sessions={count}, suspicious={suspicious}, ekfiddle={ekfiddle}", to_console=False)
-                    sys.stdout.write(f"\r  [Fiddler Bridge] Received {count} sessions ({elapsed_s:.1f}s)                    \n")
-                elif 'response_body' in result or 'responseBody' in result:
-                    body = result.get('response_body', '') or result.get('responseBody', '') or ''
-                    body_len = len(body)
-                    content_type = result.get('content_type', 'unknown')
-                    # Try to get host from result or infer from session data
-                    host = result.get('host', '')
-                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, content_type={content_type}, response_body={self._format_size(body_len)}", to_console=False)
-                    if host:
-                        self.log_with_timestamp(f"Bridge Result: host={host}", to_console=False)
-                    sys.stdout.write(f"\r  [Fiddler Bridge] Received session body: {self._format_size(body_len)} ({elapsed_s:.1f}s)                    \n")
-                else:
-                    result_size = len(json.dumps(result))
-                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, result_size={self._format_size(result_size)}", to_console=False)
-                    sys.stdout.write(f"\r  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)                    \n")
-            else:
-                self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, unexpected_type={type(result)}", to_console=False)
-                sys.stdout.write(f"\r  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)                    \n")
-        except Exception as e:
-            # Fallback if we can't parse the response
-            self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, parse_error={e}", to_console=False)
-            sys.stdout.write(f"\r  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)                    \n")
-        
-        sys.stdout.flush()
+    def _flush_log(self) -> None:
+        """Push buffered mcp_server.err.log lines to disk (called at query boundaries)."""
+        log_file = self.mcp_stderr_file
+        if log_file and not log_file.closed:
+            try:
+                log_file.flush()
+            except Exception:
+                pass
 
-        if tool_name == "fiddler_mcp__sessions_search":
-            self._last_search_args = dict(arguments or {})
-            if result.get("success") and self._should_auto_fetch_body(result, arguments):
-                follow_up = self._auto_fetch_session_body(result)
-                if follow_up:
-                    result.setdefault("_follow_up", {})["session_body_preview"] = follow_up
-                    metadata = follow_up.get("_auto_fetch_metadata", {})
-                    follow_id = follow_up.get("session_id") or follow_up.get("id")
-                    if follow_id:
-                        status_msg = f"[+] Auto body fetch for session {follow_id}"
-                        if metadata.get("has_duplicate_ids"):
-                            status_msg += f" at {metadata.get('fetched_timestamp', 'unknown time')}"
-                        print(status_msg)
-                        self._analyzed_session_ids.add(str(follow_id))
-                    else:
-                        print("[+] Auto body fetch complete")
-            elif result.get("success"):
-                print("[*] Auto body fetch skipped (broad search, media-only hits, or no host/url filter)")
+    def _format_size(self, size_bytes: int) -> str:
+        """Format byte size to human readable string (KB, MB); memoized per size."""
+        return _format_size(size_bytes)
 
-        self._track_analyzed_session(tool_name, arguments or {}, result if isinstance(result, dict) else {})
-        return result
+    def _estimate_tokens(self, char_count: int) -> int:
+        """Estimate token count from a character count (~4 chars per token for English)"""
+        return char_count // 4
 
-    def _parse_tool_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
-        if "result" not in response:
-            return {"error": response.get("error", "Tool call failed")}
+    def _extract_response_text(self, response) -> str:
+        """Safely extract text from Gemini response, even if no Parts were returned."""
+        try:
+            return response.text  # fast path
+        except Exception:
+            pass
+        # .text raises when the reply has no text part (blocked, MAX_TOKENS, ...)
+        try:
+            first = response.candidates[0]
+        except (AttributeError, IndexError, TypeError):
+            return ""
+        finish_reason = getattr(first, "finish_reason", None)
+        if finish_reason is not None:
+            self.log_with_timestamp(f"Gemini finish_reason: {finish_reason}", to_console=False)
+        try:
+            parts = first.content.parts
+        except AttributeError:
+            return ""
+        try:
+            return "\n".join(t for t in (getattr(p, "text", None) for p in parts) if isinstance(t, str) and t)
+        except Exception:
+            return ""
 
-        result = response["result"]
+    def _extract_finish_reason(self, response) -> str:
+        """Extract finish_reason from Gemini response"""
+        try:
+            candidates = getattr(response, "candidates", []) or []
+            if candidates:
+                finish_reason = getattr(candidates[0], "finish_reason", None)
+                if finish_reason is not None:
+                    return str(finish_reason).replace("FinishReason.", "")
+        except Exception:
+            pass
+        return "UNKNOWN"
 
-        if isinstance(result, dict):
-            content = result.get("content")
-            if isinstance(content, list) and content:
-                for item in content:
-                    if isinstance(item, dict):
-                        if item.get("type") == "text" and "text" in item:
-                            text_data = item["text"]
-                            if isinstance(text_data, str) and (text_data.strip().startswith('{') or text_data.strip().startswith('[')):
-                                try:
-                                    return json.loads(text_data)
-                                except json.JSONDecodeError:
-                                    return {"text": text_data}
-                            return {"text": text_data}
-                        return item
+    def _count_candidates(self, response) -> int:
+        """Count number of candidates in Gemini response"""
+        try:
+            candidates = getattr(response, "candidates", []) or []
+            return len(candidates)
+        except Exception:
+            return 0
 
-            if any(key in result for key in ("success", "error", "sessions", "bridge_status")):
-                return result
+    def request_interrupt(self) -> None:
+        """Soft-interrupt the current tool/analysis chain without exiting the client."""
+        self._interrupt_requested = True
 
-            response_envelope = result.get("response")
-            if isinstance(response_envelope, dict):
-                data = response_envelope.get("data")
-                if data is not None:
-                    return data if isinstance(data, dict) else {"data": data}
-                return response_envelope
+    def clear_interrupt(self) -> None:
+        self._interrupt_requested = False
 
-        return result if isinstance(result, dict) else {"result": result}
+    def _check_interrupt(self) -> None:
+        """Raise KeyboardInterrupt if a soft interrupt was requested mid-chain."""
+        if self._interrupt_requested:
+            self._interrupt_requested = False
+            raise KeyboardInterrupt()
 
-    def _auto_fetch_session_body(self, search_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Auto-retrieve body for a host/url-filtered text or JS hit; never media."""
-        sessions = search_result.get("sessions") or []
-        if not sessions:
-            return None
+    def is_enhanced_bridge_healthy(self, timeout: float = 2.0) -> bool:
+        """Return True if enhanced-bridge HTTP API on bridge_url is reachable."""
+        try:
+            url = f"{self.bridge_url}/health"
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                return 200 <= getattr(resp, "status", 200) < 300
+        except Exception:
+            try:
+                url = f"{self.bridge_url}/api/stats"
+                with urllib.request.urlopen(url, timeout=timeout) as resp:
+                    return 200 <= getattr(resp, "status", 200) < 300
+            except Exception:
+                return False
 
-        first = self._pick_auto_fetch_session(sessions)
-        if not first:
-            print("[*] Auto body fetch skipped: no text/html or javascript candidate in results")
-            return None
+    def _python_executable(self) -> str:
+        # Prefer the same interpreter running this client
+        if sys.executable:
+            return sys.executable
+        return "python" if platform.system() == "Windows" else "python3"
 
-        session_id = str(first.get("id", "")).strip()
-        if not session_id:
-            return None
+    def _launch_script_in_new_console(self, script_name: str, title: str) -> bool:
+        """Open script_name in a new visible terminal window. Returns True on launch attempt."""
+        script_path = self.script_dir / script_name
+        if not script_path.exists():
+            print(f"[X] Cannot start {script_name}: not found at {script_path}")
+            return False
 
-        # Extract timestamp info for disambiguation
-        received_at = first.get("received_at")
-        received_at_iso = first.get("received_at_iso") or first.get("time")
-        
-        # Check if there are duplicate session IDs with different timestamps
-        duplicate_ids = [s for s in sessions if str(s.get("id", "")) == session_id]
-        has_duplicates = len(duplicate_ids) > 1
-        
-        # Build informative log message
-        log_msg = f"[*] Auto-fetching body for session {session_id}"
-        if received_at_iso:
-            log_msg += f" (timestamp: {received_at_iso})"
-        if has_duplicates:
-            log_msg += f" [WARNING: {len(duplicate_ids)} sessions share this ID]"
-        print(log_msg)
-        
-        response = self.send_mcp_request(
-            "tools/call",
-            {"name": "fiddler_mcp__session_body", "arguments": {"session_id": session_id}},
-        )
-        body_data = self._parse_tool_response(response)
+        python_exe = self._python_executable()
+        system = platform.system()
+        try:
+            if system == "Windows":
+                # Visible CMD window, same pattern as deploy-mcp.bat
+                cmd = f'start "{title}" cmd /k "cd /d "{self.script_dir}" && "{python_exe}" "{script_path}""'
+                subprocess.Popen(cmd, shell=True, cwd=str(self.script_dir))
+            elif system == "Darwin":
+                # macOS: open a new Terminal window running the bridge
+                apple_script = (
+                    f'tell application "Terminal"\n'
+                    f'  do script "cd {self.script_dir} && {python_exe} {script_path}"\n'
+                    f'  activate\n'
+                    f'end tell'
+                )
+                subprocess.Popen(["osascript", "-e", apple_script])
+            else:
+                # Linux: try common terminal emulators, else background process
+                launched = False
+                for term in (
+                    ["gnome-terminal", "--", "bash", "-lc", f"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; exec bash"],
+                    ["xterm", "-T", title, "-e", f"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; bash"],
+                    ["konsole", "-e", f"bash -lc \"cd '{self.script_dir}' && '{python_exe}' '{script_path}'; exec bash\""],
+                ):
+                    try:
+                        subprocess.Popen(term)
+                        launched = True
+                        break
+                    except FileNotFoundError:
+                        continue
+                if not launched:
+                    log_path = self.script_dir / f"{script_name}.autostart.log"
+                    log_f = open(log_path, "a", encoding="utf-8", errors="replace")
+                    self._bridge_process = subprocess.Popen(
+                        [python_exe, str(script_path)],
+                        cwd=str(self.script_dir),
+                        stdout=log_f,
+                        stderr=subprocess.STDOUT,
+                        start_new_session=True,
+                    )
+                    print(f"[*] No GUI terminal found; started {script_name} in background (log: {log_path})")
+            print(f"[+] Launched {script_name} in a new window ({title})")
+            return True
+        except Exception as exc:
+            print(f"[X] Failed to launch {script_name}: {exc}")
+            return False
 
-        if not isinstance(body_data, dict) or body_data.get("success") is False:
-            if isinstance(body_data, dict):
-                body_data.setdefault("note", "Automatic session body lookup failed or returned no content.")
-            return body_data
+    def ensure_enhanced_bridge_running(self, wait_seconds: float = 25.0) -> bool:
+        """Start enhanced-bridge.py if the HTTP bridge is not already healthy."""
+        if self.is_enhanced_bridge_healthy():
+            print(f"[+] Enhanced bridge already running at {self.bridge_url}")
+            return True
 
-        # Add disambiguation metadata to help AI understand which session was fetched
-        body_data["_auto_fetch_metadata"] = {
-            "fetched_session_id": session_id,
-            "fetched_timestamp": received_at_iso,
-            "fetched_received_at": received_at,
-            "has_duplicate_ids": has_duplicates,
-            "note": f"This is session {session_id} from the search results (first match)" 
-                    + (f" - WARNING: {len(duplicate_ids)} sessions share this ID with different timestamps" if has_duplicates else "")
-        }
+        print(f"[!] Enhanced bridge not reachable at {self.bridge_url}")
+        print("[*] Starting enhanced-bridge.py automatically...")
+        if not self._launch_script_in_new_console("enhanced-bridge.py", "Fiddler MCP Bridge (Port 8081)"):
+            return False
 
-        truncated_flag = body_data.get("response_truncated") or body_data.get("truncated")
-        size_bytes = body_data.get("content_length")
+        deadline = time.monotonic() + wait_seconds
+        dots = 0
+        while time.monotonic() < deadline:
+            if self.is_enhanced_bridge_healthy(timeout=1.5):
+                print(f"\n[+] Enhanced bridge is healthy at {self.bridge_url}")
+                return True
+            dots = (dots + 1) % 4
+            _status_line(f"  Waiting for enhanced-bridge{'.' * dots}")
+            time.sleep(0.8)
 
-        # If preview is truncated, request the raw body and persist it to disk.
-        # NEW: For large JavaScript files, also request smart extraction for better LLM analysis
-        if truncated_flag:
-            content_type = body_data.get("content_type", "") or ""
-            is_javascript = "javascript" in content_type.lower()
-            
-            # Determine if we should use smart extraction (large JS files benefit most)
-            # Default threshold: 50KB - matches enhanced-bridge MAX_BODY_PREVIEW_BYTES
-            use_smart_extract = is_javascript and size_bytes and size_bytes > 50000
-            
-            if use_smart_extract:
-                print(f"[*] Large JavaScript detected ({size_bytes:,} bytes); using smart extraction for session {session_id}...")
-            else:
-                print(f"[*] Preview for session {session_id} was truncated; requesting full body...")
-            
-            raw_response = self.send_mcp_request(
-                "tools/call",
-                {
-                    "name": "fiddler_mcp__session_body",
-                    "arguments": {
-                        "session_id": session_id, 
-                        "include_binary": True,
-                        "smart_extract": use_smart_extract,  # NEW: Request intelligent extraction
-                    },
-                },
-            )
-            raw_data = self._parse_tool_response(raw_response)
-            if isinstance(raw_data, dict) and raw_data.get("success"):
-                body_data = raw_data
-                truncated_flag = body_data.get("response_truncated") or body_data.get("truncated")
-                size_bytes = body_data.get("content_length", size_bytes)
-            else:
-                body_data.setdefault(
-                    "auto_note",
-                    "Body preview was truncated and full fetch failed; inspect manually via fiddler_mcp__session_body",
-                )
-                return body_data
+        print(f"\n[X] Timed out waiting for enhanced-bridge at {self.bridge_url}")
+        print("[!] Start it manually: python enhanced-bridge.py")
+        return False
 
-        # Check if smart extraction is available (from the bridge response)
-        smart_extraction = body_data.get("smart_extraction")
-        smart_extraction_available = body_data.get("smart_extraction_available", False)
-        
-        response_text = body_data.get("response_body") or ""
-        
-        # NEW: If smart extraction is available, use it for better LLM analysis
-        if smart_extraction_available and smart_extraction:
-            # Format the smart extraction for LLM consumption
-            formatted_extraction = self._format_smart_extraction(smart_extraction)
-            
-            if formatted_extraction:
-                # Use larger snippet limit for curated smart extraction content
-                snippet_limit = 24000  # ~24KB of curated, security-relevant content
-                
-                if len(formatted_extraction) > snippet_limit:
-                    body_data["response_body_analyzed"] = (
-                        formatted_extraction[:snippet_limit]
-                        + "\n\n...[smart extraction shortened for conversation output]"
-                    )
-                else:
-                    body_data["response_body_analyzed"] = formatted_extraction
-                
-                # Add the analyzed content as the primary response for LLM
-                body_data["response_body"] = body_data["response_body_analyzed"]
-                body_data["response_body_preview"] = body_data["response_body_analyzed"]
-                body_data["analysis_method"] = "smart_extraction"
-                
-                # Log what was extracted
-                metadata = smart_extraction.get("metadata", {})
-                patterns_found = metadata.get("patterns_found", [])
-                if patterns_found:
-                    print(f"[+] Smart extraction found {len(patterns_found)} suspicious patterns: {', '.join(patterns_found[:5])}")
-                
-                # Still save the full body to disk if enabled
-                saved_path = self._save_body_to_file(session_id, response_text)
-                if saved_path:
-                    body_data["saved_response_path"] = saved_path
-                    body_data.setdefault(
-                        "auto_note_details",
-                        f"Smart extraction from {size_bytes:,} byte file; full response saved to {saved_path}"
-                    )
-                    body_data["auto_note"] = f"Smart extraction applied; full body saved to {saved_path}"
-                else:
-                    body_data["auto_note"] = "Smart extraction applied for enhanced analysis"
-        
-        # FALLBACK: Existing behavior for non-JavaScript or when smart extraction not available
-        elif response_text:
-            snippet_limit = 8000  # Original limit preserved
-            if len(response_text) > snippet_limit:
-                body_data["response_body_preview"] = (
-                    response_text[:snippet_limit]
-                    + "\n\n...[preview shortened for conversation output]"
-                )
-                body_data["response_body"] = body_data["response_body_preview"]
-            else:
-                body_data["response_body_preview"] = response_text
+    def ensure_dependencies_running(self, mcp_server_command: Optional[List[str]] = None) -> bool:
+        """Ensure enhanced-bridge (HTTP) is up, then start 5ire-bridge as MCP child if needed.
 
-            saved_path = self._save_body_to_file(session_id, response_text)
-            if saved_path:
-                body_data["saved_response_path"] = saved_path
-                body_data.setdefault(
-                    "auto_note_details",
-                    f"Body length reported as {size_bytes} bytes; full response saved to {saved_path}"
-                    if size_bytes is not None
-                    else f"Full response saved to {saved_path}",
-                )
-                if not truncated_flag:
-                    body_data["auto_note"] = f"Full body retrieved and saved to {saved_path}"
-                else:
-                    body_data["auto_note"] = f"Body preview truncated; full response saved to {saved_path}"
+        5ire-bridge speaks MCP over stdin/stdout and must be this client's subprocess.
+        enhanced-bridge is a separate HTTP server and is opened in its own console when missing.
+        """
+        if not self.ensure_enhanced_bridge_running():
+            return False
 
-        request_text = body_data.get("request_body") or ""
-        if request_text:
-            snippet_limit = 4000
-            if len(request_text) > snippet_limit:
-                body_data["request_body_preview"] = (
-                    request_text[:snippet_limit]
-                    + "\n\n...[preview shortened for conversation output]"
-                )
-                body_data["request_body"] = body_data["request_body_preview"]
-            else:
-                body_data["request_body_preview"] = request_text
+        # 5ire-bridge: start as MCP subprocess if not already running
+        if self.mcp_process is not None and self.mcp_process.poll() is None:
+            print("[+] MCP bridge (5ire-bridge.py) already attached")
+            return True
 
-            saved_req_path = self._save_body_to_file(session_id, request_text, kind="request")
-            if saved_req_path:
-                body_data["saved_request_path"] = saved_req_path
+        python_cmd = self._python_executable()
+        if mcp_server_command:
+            server_command = list(mcp_server_command)
+        else:
+            server_command = [python_cmd, str(self.script_dir / "5ire-bridge.py")]
+        # Resolve relative script path against script_dir
+        if len(server_command) >= 2 and not os.path.isabs(server_command[1]):
+            candidate = self.script_dir / server_command[1]
+            if candidate.exists():
+                server_command[1] = str(candidate)
 
-        # Build auto_note with disambiguation info
-        base_note = "Full body retrieved" if not truncated_flag else "Body preview truncated; saved full payload to disk"
-        if has_duplicates:
-            base_note += f" [Session {session_id} at {received_at_iso} - {len(duplicate_ids)} total with this ID]"
-        
-        body_data.setdefault("auto_note", base_note)
-        
-        if size_bytes is not None:
-            body_data.setdefault("auto_note_details", f"Body length reported as {size_bytes} bytes")
+        self._mcp_server_command = server_command
+        self.start_mcp_server(server_command)
+        return True
 
-        return body_data
+    def is_mcp_alive(self) -> bool:
+        proc = getattr(self, "mcp_process", None)
+        return proc is not None and proc.poll() is None
 
-    def _save_body_to_file(self, session_id: str, body_text: str, kind: str = "response") -> Optional[str]:
-        if not self.auto_save_full_bodies:
-            return None
+    def ensure_mcp_alive(self) -> bool:
+        """Restart MCP child if it died (common after Windows Ctrl+C process-group signal)."""
+        if self.is_mcp_alive():
+            return True
+        # Unit tests / partial clients may lack a process handle; do not crash call_tool
+        if not hasattr(self, "mcp_process") and not getattr(self, "_mcp_server_command", None):
+            return True
+        # Up to MAX_PARALLEL_TOOL_CALLS workers can see the dead child at once;
+        # only the first restarts it, the rest find it alive after the lock.
+        with self._mcp_restart_lock:
+            if self.is_mcp_alive():
+                return True
+            return self._restart_mcp_server()
 
+    def _restart_mcp_server(self) -> bool:
+        print("[!] MCP server process is not running. Restarting 5ire-bridge...")
+        cmd = self._mcp_server_command
+        if not cmd:
+            cmd = [self._python_executable(), str(self.script_dir / "5ire-bridge.py")]
         try:
-            dump_dir = Path(__file__).parent / "session_dumps"
-            dump_dir.mkdir(exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            safe_id = str(session_id).replace(os.sep, "_")
-            file_path = dump_dir / f"session_{safe_id}_{kind}_{timestamp}.txt"
-            file_path.write_text(body_text, encoding="utf-8", errors="replace")
-            return str(file_path)
+            # Clear dead handle before restart
+            self.mcp_process = None
+            self.start_mcp_server(cmd)
+            if self.is_mcp_alive():
+                print("[+] MCP server restarted")
+                # Re-bind tools if native mode (list_tools refreshes schemas)
+                try:
+                    tools = self.list_tools()
+                    if tools:
+                        print(f"[+] Re-discovered {len(tools)} tools after MCP restart")
+                except Exception as exc:
+                    print(f"[!] Tool rediscovery after restart failed: {exc}")
+                return True
         except Exception as exc:
-            print(f"[!] Failed to persist {kind} body for session {session_id}: {exc}")
-            return None
-
-    def _format_smart_extraction(self, extraction: dict) -> str:
-        """
-        Format intelligent extraction data for LLM consumption.
-        
-        This method takes the smart_extraction dict from the bridge and formats it
-        into a structured string that helps the LLM understand the content layout.
-        
-        Args:
-            extraction: Dict with keys: head, tail, suspicious_patterns, metadata
-        
-        Returns:
-            Formatted string combining head, patterns, and tail sections
-        """
-        if not extraction or not isinstance(extraction, dict):
-            return ""
-        
-        parts = []
-        metadata = extraction.get("metadata", {})
-        original_size = metadata.get("original_size", 0)
-        patterns_found = metadata.get("patterns_found", [])
-        
-        # Add header with context
-        if original_size > 0:
-            parts.append(f"[INTELLIGENT EXTRACTION from {original_size:,} byte file]")
-            if patterns_found:
-                parts.append(f"[Suspicious patterns detected: {', '.join(patterns_found[:10])}]")
-            parts.append("")
-        
-        # Add head section (first 8KB - variable declarations, imports, configs)
-        head = extraction.get("head", "")
-        if head:
-            parts.append("=" * 60)
-            parts.append("=== FILE START (first 8KB) ===")
-            parts.append("=" * 60)
-            parts.append(head)
-        
-        # Add suspicious patterns section (security-relevant code from middle)
-        suspicious = extraction.get("suspicious_patterns", "")
-        if suspicious:
-            parts.append("")
-            parts.append("=" * 60)
-            parts.append("=== DETECTED SUSPICIOUS PATTERNS (from middle section) ===")
-            parts.append("=" * 60)
-            parts.append(suspicious)
-        
-        # Add tail section (last 4KB - execution logic, callbacks)
-        tail = extraction.get("tail", "")
-        if tail:
-            parts.append("")
-            parts.append("=" * 60)
-            parts.append("=== FILE END (last 4KB) ===")
-            parts.append("=" * 60)
-            parts.append(tail)
-        
-        # Add extraction summary
-        if metadata:
-            parts.append("")
-            parts.append("-" * 40)
-            total_extracted = metadata.get("total_extracted", 0)
-            patterns_count = metadata.get("patterns_count", 0)
-            parts.append(f"[Extraction summary: {total_extracted:,} bytes extracted from {original_size:,} bytes original]")
-            if patterns_count > 0:
-                parts.append(f"[{patterns_count} suspicious code patterns identified]")
-        
-        return "\n".join(parts)
+            print(f"[X] Failed to restart MCP server: {exc}")
+        return False
 
-    def create_tool_descriptions(self) -> str:
-        """Create formatted tool descriptions for Gemini with security focus"""
-        if not self.available_tools:
-            return "No tools available."
-        
-        descriptions = ["Available Fiddler MCP Tools:\n"]
-        for i, tool in enumerate(self.available_tools, 1):
-            name = tool.get("name", "")
-            desc = tool.get("description", "No description")
-            schema = tool.get("inputSchema", {})
-            props = schema.get("properties", {})
-            
-            descriptions.append(f"{i}. {name}")
-            descriptions.append(f"   Description: {desc}")
+    def start_mcp_server(self, server_command: List[str]):
+        """Start the MCP server (5ire-bridge.py) as subprocess"""
+        print(f"\n[*] Starting MCP server: {' '.join(server_command)}")
+        try:
+            self._mcp_server_command = list(server_command)
+            log_dir = Path(__file__).parent
+            err_path = log_dir / "mcp_server.err.log"
             
-            # Add security guidance for session_body tool
-            if "session_body" in name:
-                descriptions.append("   SECURITY NOTE: Use this tool to analyze script behavior, not just content.")
-                descriptions.append("   Focus on: DOM manipulation, redirects, iframe injection, anti-analysis patterns.")
+            if self.verbose_logging:
+                print(f"[*] Opening log file: {err_path}")
             
-            if props:
-                descriptions.append("   Parameters:")
-                for param_name, param_info in props.items():
-                    param_type = param_info.get("type", "any")
-                    param_desc = param_info.get("description", "")
-                    required = "required" if param_name in schema.get("required", []) else "optional"
-                    descriptions.append(f"     - {param_name} ({param_type}, {required}): {param_desc}")
-            descriptions.append("")
-        
-        # Add note about multiple tool calls
-        descriptions.append("\n" + "="*80)
-        descriptions.append("IMPORTANT: YOU CAN CALL ANY TOOL MULTIPLE TIMES!")
-        descriptions.append("="*80)
-        descriptions.append("")
-        descriptions.append("You are NOT limited to one tool call per user request.")
-        descriptions.append(f"You can call tools up to {self.max_followups} times to gather all necessary information.")
-        descriptions.append("")
-        descriptions.append("Common multi-call scenarios:")
-        descriptions.append("  - List sessions, then analyze multiple session bodies")
-        descriptions.append("  - Search for pattern, then examine each matching session")
-        descriptions.append("  - Get suspicious sessions, then investigate top 5 in detail")
-        descriptions.append("  - Discover attack chain, then trace each stage")
-        descriptions.append("")
-        descriptions.append("After EACH tool result, you can either:")
-        descriptions.append("  a) Make ANOTHER tool call (no permission needed)")
-        descriptions.append("  b) Provide your final analysis")
-        descriptions.append("")
-        descriptions.append("Make calls as needed to provide thorough, complete analysis!")
-        descriptions.append("="*80 + "\n")
-        
-        return "\n".join(descriptions)
-
-    def _get_tool_names_list(self) -> str:
-        """Get compact list of available tool names for prompt reinforcement.
-        
-        This prevents LLM from inventing tool names by reminding it of exact valid names.
-        """
-        if not self.available_tools:
-            return ""
-        names = [t.get("name", "") for t in self.available_tools if t.get("name")]
-        if not names:
-            return ""
-        return "AVAILABLE TOOLS (use ONLY these exact names):\n- " + "\n- ".join(names)
-
-    def build_gemini_prompt(self, user_query: str) -> str:
-        """Build comprehensive prompt for Gemini"""
-        tool_descriptions = self.create_tool_descriptions()
-        
-        prompt = f"""You are an expert security analyst helping analyze web traffic captured by Fiddler.
+            try:
+                err_file = open(err_path, "w", buffering=MCP_LOG_BUFFER_SIZE, encoding="utf-8", errors="replace")
+                self.mcp_stderr_file = err_file
+                if self.verbose_logging:
+                    print(f"[+] Log file opened (fd={err_file.fileno()})")
+            except Exception as e:
+                print(f"[!] Failed to open log file: {e}")
+                self.mcp_stderr_file = None
+                raise
 
-{tool_descriptions}
+            log_mode = "VERBOSE" if self.verbose_logging else "OPTIMIZED"
+            try:
+                self.mcp_stderr_file.write(f"=== MCP Server Log Started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
+                self.mcp_stderr_file.write(f"Command: {' '.join(server_command)}\n")
+                self.mcp_stderr_file.write(f"Log Mode: {log_mode} (set GEMINI_FIDDLER_VERBOSE_LOG=1 for full JSON)\n")
+                self.mcp_stderr_file.write("=" * 70 + "\n\n")
+                self.mcp_stderr_file.flush()
+            except Exception as e:
+                print(f"[!] Error writing log file header: {e}")
+                raise
 
-SECURITY ANALYSIS MANDATE - CRITICAL FOR OBFUSCATED CODE:
-When encountering obfuscated JavaScript (code with string arrays, hex encoding, complex control flow, or anti-debugging patterns), your primary objective is to perform a SECURITY ANALYSIS. Assume malicious intent until the code's behavior is proven to be benign. Do not accept embedded strings at face value without cross-validating them against the script's executable logic.
+            # Binary, buffered pipes: the stdout reader hands raw JSON-RPC lines
+            # straight to the JSON parser without a UTF-8 decode pass.
+            popen_kwargs: Dict[str, Any] = {
+                "stdin": subprocess.PIPE,
+                "stdout": subprocess.PIPE,
+                "stderr": subprocess.PIPE,
+            }
+            # Isolate child from Ctrl+C so soft-interrupt does not kill MCP
+            if sys.platform == "win32":
+                # CREATE_NEW_PROCESS_GROUP prevents console Ctrl+C broadcast to child
+                popen_kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+            else:
+                popen_kwargs["start_new_session"] = True
 
-ANALYTICAL HIERARCHY - BEHAVIOR OVER CONTENT:
-When analyzing a script, you MUST prioritize evidence in the following order:
-1. EXECUTABLE ACTIONS: Identify and prioritize analysis of actions that modify the browser environment or user experience. This includes:
-   - DOM manipulation (e.g., creating iframe, div, script elements)
-   - Style changes (e.g., creating overlays with position:fixed, z-index:99999)
-   - Redirection (window.location, document.location)
-2. CONTROL FLOW & LOGIC: Analyze conditional checks (if/else), loops, and timers (setTimeout). Pay close attention to conditions that trigger actions, such as checks against:
-   - document.referrer
-   - localStorage
-   - Counters or view limits
-3. DATA AND API INTERACTION: Examine how the script interacts with:
-   - localStorage
-   - document.cookie
-   - Network requests
-4. STATIC CONTENT (STRINGS): Only after analyzing the behavior should you use embedded strings for context. Be highly skeptical of familiar-looking strings within obfuscated code, as they may be included as decoys to mislead analysis.
+            self.mcp_process = subprocess.Popen(server_command, **popen_kwargs)
 
-MANDATORY MALICIOUS PATTERN CHECKLIST:
-For any obfuscated script, you MUST verify the presence or absence of the following patterns:
-[ ] Iframe/Script Injection: Does the code dynamically create and append <iframe> or <script> elements to the DOM?
-[ ] Redirection: Does the code manipulate window.location or document.location?
-[ ] Anti-Analysis Techniques:
-    [ ] Does it check document.referrer to alter its behavior?
-    [ ] Does it use localStorage or cookies to implement view counters or persistent flags?
-    [ ] Does it contain anti-debugging patterns (e.g., debugger; statements inside a loop)?
-[ ] Overlay/UI Hijacking: Does the script apply CSS to create full-screen overlays (e.g., position:fixed, z-index:99999, width:100%)?
-[ ] Dynamic Code Execution: Is eval() or new Function() used to execute strings as code?
+            # One long-lived reader per server process routes every stdout line
+            # to the request waiting on its id; send_mcp_request only waits.
+            self._pending_responses = {}
+            reader_thread = threading.Thread(
+                target=self._read_mcp_responses,
+                args=(self.mcp_process, self._pending_responses),
+                daemon=True,
+            )
+            reader_thread.start()
 
-HOLISTIC SYNTHESIS REQUIREMENT:
-Your final conclusion MUST synthesize all evidence. If conflicting evidence is found (e.g., telemetry-like strings alongside ad-injection logic), you MUST address the discrepancy. Do not base your conclusion on a single piece of evidence if other behavioral indicators contradict it. State the script's most probable primary purpose based on the weight of the behavioral evidence.
+            def log_server_stderr():
+                try:
+                    while True:
+                        line = self.mcp_process.stderr.readline()
+                        if not line:
+                            break
+                        if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
+                            timestamp = _log_timestamp()
+                            self.mcp_stderr_file.write(f"[{timestamp}] Server: {line.decode('utf-8', 'replace')}")
+                except Exception as e:
+                    if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
+                        timestamp = _log_timestamp()
+                        self.mcp_stderr_file.write(f"[{timestamp}] Stderr thread error: {e}\n")
+            
+            stderr_thread = threading.Thread(target=log_server_stderr, daemon=True)
+            stderr_thread.start()
+            
+            self.mcp_stderr_file.write(f"[{_log_timestamp()}] Client: Starting stderr capture thread\n")
+            
+            time.sleep(0.5)
+            print("[+] MCP server started")
+            print(f"[*] Logging to: {err_path}")
+            
+            if self.verbose_logging:
+                try:
+                    self.mcp_stderr_file.write(f"[{_log_timestamp()}] Client: Log file test successful\n")
+                    self.mcp_stderr_file.flush()
+                    print(f"[+] Log file test successful")
+                except Exception as e:
+                    print(f"[!] Log file test failed: {e}")
+            
+            try:
+                print("[*] Initializing connection...")
+                self.initialize_mcp()
+            except Exception as e:
+                print(f"[X] Initialize failed: {e}")
+                print("[!] This usually means the MCP server isn't ready yet")
+                raise
+        except Exception as e:
+            print(f"[X] Failed to start MCP server: {e}")
+            if hasattr(self, 'mcp_process') and self.mcp_process:
+                try:
+                    print("[*] Terminating MCP server subprocess...")
+                    self.mcp_process.terminate()
+                    self.mcp_process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    print("[!] Force killing MCP server subprocess...")
+                    self.mcp_process.kill()
+                except Exception as cleanup_error:
+                    print(f"[!] Error during cleanup: {cleanup_error}")
+            if self.mcp_stderr_file:
+                try:
+                    self.mcp_stderr_file.close()
+                finally:
+                    self.mcp_stderr_file = None
+            sys.exit(1)
 
-HOW TO ANALYZE OBFUSCATED CODE:
-When asked to "explain" or "analyze" a session, follow this structured approach:
-1. Request the session body using fiddler_mcp__session_body
-2. Identify if the code is obfuscated (string arrays, hex encoding, etc.)
-3. If obfuscated, ASSUME MALICIOUS until proven otherwise
-4. Analyze BEHAVIOR first:
-   - What does the code DO (not what strings it contains)?
-   - What DOM elements does it create?
-   - What APIs does it call?
-   - What conditions trigger its actions?
-5. Check against the malicious pattern checklist
-6. Only then consider static strings for context
-7. Provide a holistic synthesis that reconciles all findings
+    def _read_mcp_responses(self, proc: subprocess.Popen, pending: Dict[int, Future]) -> None:
+        """Reader thread: resolve the pending future matching each response id.
 
-IMPROVED REQUEST PHRASING EXAMPLES:
-Instead of: "explain 265"
-Use: "Analyze the behavior of the script in session 265. What actions does it perform on the webpage?"
+        Lines without a pending id (server notifications, late replies to
+        timed-out requests) are dropped. When the server closes stdout every
+        request still waiting on this process fails immediately.
+        """
+        try:
+            for line in iter(proc.stdout.readline, b""):
+                try:
+                    response = _json_loads(line)
+                except json.JSONDecodeError as e:
+                    self.log_with_timestamp(f"MCP stdout: skipped non-JSON line ({e})", to_console=False)
+                    continue
+                if not isinstance(response, dict):
+                    continue
+                with self._pending_lock:
+                    future = pending.pop(response.get("id"), None)
+                if future is not None:
+                    future.set_result((response, line))
+        except Exception as e:
+            self.log_with_timestamp(f"MCP stdout reader error: {e}", to_console=False)
+        finally:
+            with self._pending_lock:
+                waiting = list(pending.values())
+                pending.clear()
+            for future in waiting:
+                future.set_exception(RuntimeError("MCP server closed connection"))
 
-Instead of: "what is this script doing"
-Use: "Analyze session X for any malicious behavior, such as ad injection, redirects, or anti-analysis techniques."
+    def send_mcp_request(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        encoded_params: Optional[bytes] = None,
+    ) -> Dict[str, Any]:
+        """Send JSON-RPC request to MCP server with timeout
+
+        encoded_params, when given, is the params object already encoded as
+        JSON and is spliced into the message as-is; params is then only used
+        for logging.
+        """
+        future: Future = Future()
+        with self._pending_lock:
+            self.request_id += 1
+            request_id = self.request_id
+            pending = self._pending_responses
+            pending[request_id] = future
+        request = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": method,
+        }
+        if params and encoded_params is None:
+            request["params"] = params
 
-Instead of: "show me the code"
-Use: "Attempt to deobfuscate the script in session X and explain its primary function or purpose."
+        request_start = time.perf_counter()
+        
+        try:
+            if self.mcp_process.poll() is not None:
+                return {"error": "MCP server process has terminated"}
+            
+            if encoded_params is None:
+                request_bytes = _json_dumps(request) + b"\n"
+            else:
+                request_bytes = _json_dumps(request)[:-1] + b',"params":' + encoded_params + b"}\n"
+            request_size = len(request_bytes) - 1
+            
+            # Log MCP request with details
+            if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
+                timestamp = _log_timestamp()
+                if method == "tools/call":
+                    tool_name = params.get("name", "unknown") if params else "unknown"
+                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Request: method={method}, tool={tool_name}, size={self._format_size(request_size)}\n")
+                else:
+                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Request: method={method}, size={self._format_size(request_size)}\n")
+            with self._stdin_lock:
+                self.mcp_process.stdin.write(request_bytes)
+                self.mcp_process.stdin.flush()
 
-UNDERSTANDING SUSPICIOUS SESSIONS - CRITICAL DISTINCTION:
-There are TWO types of suspicious sessions you may encounter:
+            try:
+                response, response_line = future.result(timeout=self.tool_timeout)
+            except FutureTimeoutError:
+                raise RuntimeError(
+                    f"MCP server response timeout ({self.tool_timeout}s) - server may not be responding"
+                ) from None
+            response_size = len(response_line)
+            elapsed_ms = int((time.perf_counter() - request_start) * 1000)
+            
+            # Log MCP response with timing and size
+            if self.mcp_stderr_file and not self.mcp_stderr_file.closed:
+                timestamp = _log_timestamp()
+                
+                if self.verbose_logging:
+                    self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, size={self._format_size(response_size)}\n")
+                    # The raw line is already the serialized response; don't re-dump it
+                    self.mcp_stderr_file.write(f"[{timestamp}] Response: {response_line.decode('utf-8', 'replace').rstrip()}\n")
+                else:
+                    if "error" in response:
+                        self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, ERROR: {json.dumps(response.get('error', {}))}\n")
+                    elif method == "tools/call":
+                        tool_name = params.get("name", "unknown") if params else "unknown"
+                        if "result" in response:
+                            result = response.get("result", {})
+                            content = result.get("content", [])
+                            item_count = len(content) if isinstance(content, list) else 0
+                            self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, tool='{tool_name}', items={item_count}, size={self._format_size(response_size)}\n")
+                        else:
+                            self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, tool='{tool_name}', no result\n")
+                    else:
+                        self.mcp_stderr_file.write(f"[{timestamp}] MCP Response: {elapsed_ms}ms, method='{method}', size={self._format_size(response_size)}\n")
+            return response
+        except Exception as e:
+            elapsed_ms = int((time.perf_counter() - request_start) * 1000)
+            self.log_with_timestamp(f"MCP Response: {elapsed_ms}ms, error: {e}", to_console=False)
+            return {"error": f"MCP request failed: {e}"}
+        finally:
+            with self._pending_lock:
+                pending.pop(request_id, None)
 
-1. FIDDLER-FLAGGED SUSPICIOUS SESSIONS:
-   - Marked by Fiddler's internal risk assessment
-   - May have various risk_reasons (large response, suspicious patterns, etc.)
-   - Accessed via suspicious_only: true parameter
-   - These are based on heuristics, not specific threat intelligence
+    def send_mcp_notification(self, method: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Send JSON-RPC notification (no response expected)."""
+        try:
+            if self.mcp_process.poll() is not None:
+                return "MCP server process has terminated"
 
-2. EKFIDDLE-FLAGGED SESSIONS:
-   - Have ekfiddle_comment field with SPECIFIC threat intelligence
-   - This is AUTHORITATIVE intelligence from the EKFiddle extension
-   - These are a SUBSET of suspicious sessions
-   - Much higher confidence of actual threats
+            notification = {
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": params or {},
+            }
 
-CRITICAL: Not all suspicious sessions have EKFiddle comments! Be VERY CLEAR about which type you're reporting to avoid confusion.
+            with self._stdin_lock:
+                self.mcp_process.stdin.write(_json_dumps(notification) + b"\n")
+                self.mcp_process.stdin.flush()
+        except Exception as exc:
+            return f"Failed to send notification: {exc}"
+        return None
 
-IOC-FIRST INVESTIGATION RULE (HIGHEST PRIORITY):
-If the user names specific domains, hosts, URLs, or IOCs (e.g. cdn.apigateway.co, polygon.rpc.subquery.network):
-1. IMMEDIATELY search those hosts with fiddler_mcp__sessions_search using host_pattern (substring, no leading *).
-   Example: {{"tool": "fiddler_mcp__sessions_search", "arguments": {{"host_pattern": "cdn.apigateway.co", "limit": 50}}}}
-2. Do this BEFORE analyzing Low EKFiddle HTML pages on the landing site.
-3. Inspect session_body for matching IOC hosts (JS/HTML) before WordPress theme/plugin noise.
-4. ZERO-HIT PROTOCOL: if exact host returns 0 matches:
-   a) Search parent apex (e.g. subquery.network, drpc.org, apigateway.co)
-   b) Then url_pattern with the IOC string
-   c) Then live_sessions / timeline for unique hosts
-   d) Do NOT declare CLEAN after a single exact miss
-5. Do NOT invent a "query" parameter. Use host_pattern, url_pattern, or content_type only.
+    def initialize_mcp(self):
+        """Initialize MCP connection"""
+        response = self.send_mcp_request(
+            "initialize",
+            {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "gemini-fiddler-client", "version": "1.0.0"},
+            },
+        )
+        
+        if "result" in response:
+            server_info = response["result"].get("serverInfo", {})
+            print(f"[+] Connected to {server_info.get('name', 'MCP server')}")
 
-EKFIDDLE SEVERITY GATE:
-- Critical / High: investigate NOW with session_body
-- Medium: investigate after user IOCs and Critical/High
-- Low (especially "External Script Monitor [HTML/JS]"): BACKGROUND only unless it matches user IOCs or references external loader hosts named by the user
-- Do NOT treat Low External Script Monitor as primary evidence of clickfix / EtherHiding / ErrTraffic
+            # MCP spec requires clients to notify once initialization completes.
+            error = self.send_mcp_notification("notifications/initialized")
+            if error and self.verbose_logging:
+                print(f"[!] Warning: {error}")
+        else:
+            print(f"[X] Initialization failed: {response.get('error', 'Unknown error')}")
 
-NO REANALYSIS:
-- Never re-fetch session_body for a session ID already analyzed in this query
-- Prefer new IOC hosts and unexamined Critical/High sessions
+    @property
+    def available_tools(self) -> List[Dict[str, Any]]:
+        return self._available_tools
 
-WHEN ASKED ABOUT SUSPICIOUS OR EKFIDDLE SESSIONS:
+    @available_tools.setter
+    def available_tools(self, tools: List[Dict[str, Any]]) -> None:
+        self._available_tools = tools
+        # call_tool validates every call against this; rebuilt only when tools change
+        self._valid_tool_names = frozenset(t["name"] for t in tools if t.get("name"))
+        # Prompt text derived from the tool list (descriptions, name list)
+        self._tool_text_cache: Dict[Any, str] = {}
 
-1. IF USER NAMED IOCs: search those hosts first (see IOC-FIRST rule). Otherwise call:
-   {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true, "limit": 100, "since_minutes": 360}}}}
+    def list_tools(self) -> List[Dict[str, Any]]:
+        """List all available MCP tools"""
+        response = self.send_mcp_request("tools/list")
+        
+        if "error" in response:
+            print(f"\n[X] Error listing tools: {response['error']}")
+            print("\n[!] Diagnostics:")
+            print(f"    - Process alive: {self.mcp_process.poll() is None}")
+            print(f"    - Process PID: {self.mcp_process.pid if self.mcp_process else 'N/A'}")
+            print("\n[!] This usually means:")
+            print("    1. The 5ire-bridge.py failed to start properly")
+            print("    2. The enhanced-bridge.py is not running (needed on port 8081)")
+            print("    3. There's a port conflict or network issue")
+            print("\n[!] Try:")
+            print("    1. Start enhanced-bridge.py first: python enhanced-bridge.py")
+            print("    2. Check if port 8081 is available: netstat -an | findstr 8081")
+            print("    3. Kill stuck processes: taskkill /F /IM python.exe")
+            return []
+        
+        tools = response.get("result", {}).get("tools", [])
+        self.available_tools = tools
+        if self.use_native_tools:
+            self.bind_gemini_tools()
+        return tools
 
-2. ANALYZE AND REPORT CLEARLY:
-   First, state the TOTALS:
-   - "Found X suspicious sessions (Fiddler risk assessment)"
-   - "Of these, Y have EKFiddle threat intelligence"
-   
-   If Y = 0, state clearly: "None of the suspicious sessions have EKFiddle threat intelligence comments."
-   
-3. CREATE APPROPRIATE LISTS:
-   Format output as a table or structured list showing ONLY:
-   - Session ID
-   - Domain/Host (extract subdomain if present)
-   - EKFiddle Comment/Alert Message
-   
-   Example format when EKFiddle sessions exist:
-   ```
-   SUMMARY: Found 62 suspicious sessions (Fiddler risk assessment).
-   Of these, 3 have EKFiddle threat intelligence:
-   
-   EKFIDDLE-FLAGGED SESSIONS:
-   Session 142 | cdn.malicious-ads.com | High: JavaScript obfuscation with eval()
-   Session 158 | tracking.adnetwork.io | Medium: Suspicious redirect chain detected
-   Session 201 | evil.example.org      | Critical: Known malware distribution site
-   ```
-   
-   Example format when NO EKFiddle sessions exist:
-   ```
-   SUMMARY: Found 62 suspicious sessions (Fiddler risk assessment).
-   None of these have EKFiddle threat intelligence comments.
-   
-   The suspicious sessions are based on Fiddler's heuristics (large responses, unusual patterns, etc.)
-   but lack specific threat intelligence from EKFiddle.
-   ```
+    def bind_gemini_tools(self) -> bool:
+        """Bind MCP tools on the active LLM provider (Gemini or DeepSeek)."""
+        if self.llm_provider is None:
+            self._init_llm_provider()
 
-3. PRIORITIZE BY SEVERITY:
-   - List Critical/High severity first
-   - Then Medium
-   - Then Low (if present) — do not deep-dive Low External Script Monitor before user IOCs
-   - Extract severity from EKFiddle comment (Critical, High, Medium, Low)
+        # Stable system instruction + name-ordered tools keep the request prefix
+        # identical across turns and rebinds (provider prompt caching).
+        self._system_instruction = llm_prompts.investigation_system_instruction(self.max_followups)
+        ok = self.llm_provider.bind_tools(
+            canonical_mcp_tools(self.available_tools), self._system_instruction
+        )
+        for err in getattr(self.llm_provider, "bind_errors", []) or []:
+            self.log_with_timestamp(f"Tool bind skip: {err}", to_console=True, prefix="[!] ")
 
-4. EXTRACT KEY DOMAINS:
-   After the list, summarize unique domains/subdomains that were flagged:
-   ```
-   FLAGGED DOMAINS TO INVESTIGATE:
-   1. cdn.malicious-ads.com (1 session, High severity)
-   2. evil.example.org (1 session, Critical severity)
-   3. tracking.adnetwork.io (1 session, Medium severity)
-   ```
+        if not ok:
+            if self.provider_name == "gemini":
+                self.log_with_timestamp(
+                    "No tools bound; falling back to text tool loop",
+                    to_console=True,
+                    prefix="[!] ",
+                )
+            else:
+                self.log_with_timestamp(
+                    f"No tools bound for {self.provider_name}; native tools required",
+                    to_console=True,
+                    prefix="[!] ",
+                )
+            self._gemini_tool = None
+            # DeepSeek/OpenRouter require native tools; Gemini can fall back to legacy text loop
+            if self.provider_name == "gemini":
+                self.use_native_tools = False
+                if genai is not None:
+                    self.model = genai.GenerativeModel(self.model_name)
+            else:
+                self.use_native_tools = True
+            return False
 
-5. SET INVESTIGATION FOCUS:
-   If user named IOCs, those hosts remain PRIMARY. Otherwise:
-   End with: "Critical/High EKFiddle sessions should be the PRIMARY focus.
-   To analyze the code, use: fiddler_mcp__session_body with the session ID."
+        self._gemini_tool = True  # truthy flag for legacy checks / tests
+        if self.provider_name == "gemini":
+            self.model = getattr(self.llm_provider, "model", getattr(self, "model", None))
+        names = []
+        if hasattr(self.llm_provider, "bound_tool_names"):
+            names = self.llm_provider.bound_tool_names()
+        label = getattr(self.llm_provider, "display_label", self.provider_name)
+        print(f"[+] Bound {len(names)} {label} tools: {', '.join(names)}")
+        self.log_with_timestamp(f"Bound {self.provider_name} tools: {names}", to_console=False)
+        return True
 
-WHEN ASKED ABOUT MALICIOUS/SUSPICIOUS SESSIONS IN FOLLOW-UP:
-If user asks "are there any malicious sessions?" or "show me suspicious traffic" AFTER you've listed EKFiddle flags:
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a specific MCP tool with progress indicator"""
 
-1. If user previously named IOC hosts still unsearched, search those first
-2. Otherwise AUTOMATICALLY FETCH CODE from the HIGHEST SEVERITY (Critical/High) EKFiddle session:
-   {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "<highest_severity_id>"}}}}
-3. Skip Low External Script Monitor unless it is the only signal and no user IOCs remain
+        if not self.ensure_mcp_alive():
+            return {
+                "success": False,
+                "error": "MCP server process is not running and restart failed",
+                "hint": "Restart gemini-fiddler-client.py or start 5ire-bridge.py manually",
+            }
+        
+        # Correctly named calls (the common case) skip alias resolution entirely
+        if tool_name not in self._valid_tool_names:
+            canonical = _ALL_ALIASES.get(tool_name)
+            # Handle dot notation (fiddler_mcp.tool_name -> fiddler_mcp__tool_name)
+            if canonical is None and "." in tool_name and not tool_name.startswith("fiddler_mcp__"):
+                parts = tool_name.split(".")
+                if len(parts) == 2:
+                    possible_name = f"fiddler_mcp__{parts[1]}"
+                    self.log_with_timestamp(f"Auto-corrected dot notation: {tool_name} -> {possible_name}", to_console=True, prefix="[!] ")
+                    tool_name = possible_name
+                    canonical = _ALL_ALIASES.get(tool_name)
+            if canonical is not None:
+                kind = "tool" if tool_name.startswith("fiddler_mcp__") else "non-prefixed tool"
+                self.log_with_timestamp(f"Auto-corrected {kind}: {tool_name} -> {canonical}", to_console=True, prefix="[!] ")
+                tool_name = canonical
 
-2. APPLY SECURITY ANALYSIS FRAMEWORK to that code
-3. CORRELATE your analysis with the EKFiddle comment
-4. If EKFiddle says "JavaScript obfuscation", LOOK FOR obfuscation patterns
-5. If EKFiddle says "redirect chain", LOOK FOR window.location manipulation
-6. If EKFiddle says "eval()", LOOK FOR dynamic code execution
+        # Client-side validation: check if tool exists before calling server
+        if tool_name not in self._valid_tool_names:
+            valid_tools = [t["name"] for t in self.available_tools if t.get("name")]
+            tool_list = "\n- ".join(valid_tools) if valid_tools else "No tools available"
+            self.log_with_timestamp(f"Invalid tool name: {tool_name}", to_console=True, prefix="[!] ")
+            return {
+                "error": f"Unknown tool: '{tool_name}'",
+                "message": f"This tool does not exist. Use ONLY these exact tool names:\n- {tool_list}",
+                "hint": "Check the tool name spelling and try again with one from the list above.",
+                "available_tools": valid_tools,
+            }
 
-EKFIDDLE COMMENT INTERPRETATION:
-Common EKFiddle patterns and what to look for:
-- "JavaScript obfuscation" → Check for string arrays, hex encoding, packed code
-- "eval()" or "Function constructor" → Dynamic code execution pattern
-- "redirect" → window.location, document.location manipulation
-- "suspicious domain" → Check domain reputation, TLD
-- "known malware" → Treat as HIGH PRIORITY threat
-- "exploit kit" → Advanced threat, check for CVE references
-- "External Script Monitor" (Low) → Often WP performance lazy-load; confirm against user IOCs before deep dive
+        sanitized = self._sanitize_tool_arguments(tool_name, arguments or {})
+        if isinstance(sanitized, dict) and sanitized.get("_sanitize_error"):
+            self.log_with_timestamp(
+                f"Argument sanitize rejected for {tool_name}: {sanitized.get('error')}",
+                to_console=True,
+                prefix="[!] ",
+            )
+            return sanitized
+        arguments = sanitized
 
-TRUST HIERARCHY for THREAT ASSESSMENT:
-1. HIGHEST: User-supplied IOC hosts/URLs (search these first)
-2. HIGH: EKFiddle Critical/High comments
-3. MEDIUM: Behavioral analysis (malicious pattern checklist)
-4. LOWER: EKFiddle Low / heuristics
-5. LOWEST: String content (easily manipulated)
+        # Re-fetch lock: do not pull the same session body twice in one query.
+        # The id is claimed up front so parallel workers cannot both fetch it.
+        claimed_sid = None
+        if tool_name == "fiddler_mcp__session_body":
+            sid = str(arguments.get("session_id", "")).strip()
+            if sid:
+                with self._analyzed_lock:
+                    seen = sid in self._analyzed_session_ids
+                    if not seen:
+                        self._analyzed_session_ids.add(sid)
+                        claimed_sid = sid
+            if sid and seen:
+                if not self._user_allows_body_refetch(self._current_user_query):
+                    msg = (
+                        f"Session {sid} already analyzed this query. "
+                        "Use prior body findings. Do not re-fetch."
+                    )
+                    self.log_with_timestamp(msg, to_console=True, prefix="[!] ")
+                    return {
+                        "success": False,
+                        "error": msg,
+                        "session_id": sid,
+                        "already_analyzed": True,
+                        "hint": "Create EKFiddle rules or continue from prior findings. "
+                                "Only re-fetch if the user explicitly asks to refresh/re-analyze.",
+                    }
 
-If EKFiddle Critical/High flagged something, focus on CONFIRMING the threat type. Low flags need IOC correlation.
+        result = None
+        try:
+            result = self._dispatch_tool_call(tool_name, arguments)
+            return result
+        finally:
+            # Failed or skipped fetches release the claim so a retry is allowed
+            if claimed_sid and (not isinstance(result, dict) or result.get("success") is False):
+                self._analyzed_session_ids.discard(claimed_sid)
 
-EKFIDDLE RULE AUTHORING (when user asks for EKFiddle rules / CustomRegexes / signatures):
-This is a HARD TASK MODE. Follow the EKFiddle CustomRegexes skill bar exactly:
+    def _dispatch_tool_call(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a validated tool call to the bridge and log/post-process the result."""
+        # Encoded once: the log line, the query-cache key and the tools/call payload reuse it
+        args_json = _canonical_json(arguments)
 
-1. If the user names a session ID, call fiddler_mcp__session_body for that session ONCE only if it is not already analyzed this query.
-2. Extract ONLY high-signal malicious patterns actually present in the tool results:
-   - Compound JSON-RPC: method:'eth_call' with jsonrpc:'2.0' and eth_call params shape, not bare eth_call alone
-   - Overlay UI hijack: z-index:2147483647 with position:fixed and iframe or clipboard-write
-   - Distinctive hex decode loops when unique enough; prefer technique over one hex function name
-   - Distinctive cookies or sendBeacon telemetry strings that are campaign-specific
-   - Domains / URIs / IPs that appear in the body, captured traffic, or the user query
-3. Emit rules in EXACT tab-separated CustomRegexes schema (TABS not spaces):
-   [Type]	[Severity]: [Rule Name]	[Regex]	[Optional Comment]
-   Types: SourceCode | URI | IP | Headers | Hash
-   Severity MUST be High: or Med: or Low: including the colon. Never write Medium:
-   Rule names: title case with spaces, threat-specific. No snake_case. No vague Potential X names.
-4. Write a short explanation per rule that includes The crucial pattern or The key pattern.
-5. End the answer with a plain block of ONLY the tab-separated rule lines so they can be copied into CustomRegexes.txt.
-6. STOP after delivering rules. Do NOT chase Low External Script Monitor siblings. Do NOT invent hosts not present in tool results.
-7. Do NOT refuse defensive CustomRegex generation when the user asks. Provide the rules.
-8. Do NOT emit Name/Regex/Comment/Color tables, slash-wrapped /regex/i, or markdown tables as the rule format.
-9. Prefer SourceCode rules for unique malicious JS. Use URI/IP only for IOCs observed in data or supplied by the user.
-10. Keep regexes bounded and specific: use {{0,120}} / [^}}]{{1,200}}, escape \\. \\( \\), non-capturing (?:...), avoid unbounded .*. Prefer 2 to 6 strong rules.
-11. FORBIDDEN unless user explicitly asks: bare \\beth_call\\b, _\\w{{7,8}}\\(\\), NitroPack / ___mnag / text/lazyload MutationObserver, createElement alone, appendChild alone.
-12. If improving a prior rule for false positives, tighten with compound tokens. Do not replace it with an unrelated or broken regex.
+        # Enhanced bridge call logging
+        self.log_with_timestamp(f"Bridge Call: {tool_name}({args_json.decode('utf-8')})", to_console=False)
+        
+        if self.verbose_logging:
+            self.log_with_timestamp(f"  Arguments: {json.dumps(arguments, indent=2)}", to_console=False, prefix="Client: ")
+        
+        start_time = time.perf_counter()
+        
+        # Show initial progress - specify it's the Fiddler HTTP bridge
+        if getattr(self, "_progress_tty", False):
+            _status_line("  | Waiting for Fiddler HTTP bridge... (0s)")
+        
+        # Repeat calls within the query (models often "double-check") skip the bridge
+        cache_key = None
+        if tool_name in _MUTATING_TOOLS:
+            self._tool_cache.clear()
+        else:
+            cache_key = (tool_name, args_json)
+        cached = self._tool_cache.get(cache_key) if cache_key else None
+        if cached and time.monotonic() - cached[0] < TOOL_RESULT_CACHE_TTL:
+            response = cached[1]
+            cache_key = None
+            self.log_with_timestamp(f"Bridge Call: {tool_name} served from query cache", to_console=False)
+        else:
+            response = self.send_mcp_request(
+                "tools/call",
+                {"name": tool_name, "arguments": arguments},
+                encoded_params=b'{"name":' + _json_dumps(tool_name) + b',"arguments":' + args_json + b"}",
+            )
+        
+        # Stop progress and show completion with descriptive info
+        elapsed_ms = int((time.perf_counter() - start_time) * 1000)
+        elapsed_s = elapsed_ms / 1000
+        
+        result = self._parse_tool_response(response)
+        # Only successful results are reused; the raw response is stored so every
+        # hit re-parses into a fresh dict that callers may annotate freely.
+        if (
+            cache_key
+            and isinstance(result, dict)
+            and not result.get("error")
+            and result.get("success") is not False
+        ):
+            self._tool_cache[cache_key] = (time.monotonic(), response)
 
-Example correct rule lines:
-SourceCode	High: ErrTraffic eth_call RPC	method\\s*:\\s*['\"]eth_call['\"].{{0,80}}jsonrpc\\s*:\\s*['\"]2\\.0['\"]
-SourceCode	High: EtherHiding Fullscreen Overlay	z-index\\s*:\\s*2147483647.{{0,120}}position\\s*:\\s*fixed
-URI	High: ErrTraffic Delivery Host	cdn\\.apigateway\\.co
+        # Short-circuit media bodies: no malware signal, waste tokens
+        if (
+            tool_name == "fiddler_mcp__session_body"
+            and isinstance(result, dict)
+            and not result.get("error")
+        ):
+            ctype = result.get("content_type") or result.get("contentType") or ""
+            if self._is_media_content_type(ctype):
+                sid = arguments.get("session_id") or result.get("session_id") or result.get("id")
+                msg = (
+                    f"Session {sid} is media content ({ctype}). "
+                    "Skip media bodies; analyze JS/HTML/JSON sessions instead."
+                )
+                self.log_with_timestamp(msg, to_console=True, prefix="[!] ")
+                _status_line(f"  [Fiddler Bridge] Skipped media body ({elapsed_s:.1f}s)", done=True)
+                return {
+                    "success": False,
+                    "error": msg,
+                    "session_id": sid,
+                    "content_type": ctype,
+                    "media_skipped": True,
+                    "hint": "Pick a text/html or application/javascript session for malware analysis.",
+                }
+        
+        # Enhanced result logging with session metadata
+        try:
+            if isinstance(result, dict):
+                if result.get("error"):
+                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, error={result.get('error')}", to_console=False)
+                    _status_line(f"  [Fiddler Bridge] Error ({elapsed_s:.1f}s)", done=True)
+                elif 'sessions' in result:
+                    sessions = result.get('sessions', [])
+                    count = len(sessions)
+                    suspicious = ekfiddle = 0
+                    for s in sessions:
+                        if s.get('ekfiddle_comment'):
+                            ekfiddle += 1
+                            suspicious += 1
+                        elif s.get('risk_flag'):
+                            suspicious += 1
+                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, sessions={count}, suspicious={suspicious}, ekfiddle={ekfiddle}", to_console=False)
+                    _status_line(f"  [Fiddler Bridge] Received {count} sessions ({elapsed_s:.1f}s)", done=True)
+                elif 'response_body' in result or 'responseBody' in result:
+                    body = result.get('response_body', '') or result.get('responseBody', '') or ''
+                    body_len = len(body)
+                    content_type = result.get('content_type', 'unknown')
+                    # Try to get host from result or infer from session data
+                    host = result.get('host', '')
+                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, content_type={content_type}, response_body={self._format_size(body_len)}", to_console=False)
+                    if host:
+                        self.log_with_timestamp(f"Bridge Result: host={host}", to_console=False)
+                    _status_line(f"  [Fiddler Bridge] Received session body: {self._format_size(body_len)} ({elapsed_s:.1f}s)", done=True)
+                else:
+                    result_size = self._response_text_size(response)
+                    self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, success=true, result_size={self._format_size(result_size)}", to_console=False)
+                    _status_line(f"  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)", done=True)
+            else:
+                self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, unexpected_type={type(result)}", to_console=False)
+                _status_line(f"  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)", done=True)
+        except Exception as e:
+            # Fallback if we can't parse the response
+            self.log_with_timestamp(f"Bridge Result: {elapsed_ms}ms, parse_error={e}", to_console=False)
+            _status_line(f"  [Fiddler Bridge] Response received ({elapsed_s:.1f}s)", done=True)
 
-ZERO-HIT AND INFECTION CHAIN:
-- If the user lists many IOC hosts and the first search returns 0, do not serially hunt every host. Report missing hosts, then use landing-page session bodies and prior findings.
-- When asked for the infection chain, explain stages from evidence even if RPC hosts are not currently in the buffer.
-- Low External Script Monitor is not a clean bill of health when eth_call or etherhiding patterns are present.
-- Prefer session_body over session_headers. Treat headers 404 as non-fatal.
-- Do not emit Low: CustomRegexes for confirmed Benign or False Positive libraries unless the user asks for FP monitors.
+        if tool_name == "fiddler_mcp__sessions_search":
+            self._last_search_args = dict(arguments or {})
+            if result.get("success") and self._should_auto_fetch_body(result, arguments):
+                follow_up = self._auto_fetch_session_body(result)
+                if follow_up:
+                    result.setdefault("_follow_up", {})["session_body_preview"] = follow_up
+                    metadata = follow_up.get("_auto_fetch_metadata", {})
+                    follow_id = follow_up.get("session_id") or follow_up.get("id")
+                    if follow_id:
+                        status_msg = f"[+] Auto body fetch for session {follow_id}"
+                        if metadata.get("has_duplicate_ids"):
+                            status_msg += f" at {metadata.get('fetched_timestamp', 'unknown time')}"
+                        print(status_msg)
+                        self._analyzed_session_ids.add(str(follow_id))
+                    else:
+                        print("[+] Auto body fetch complete")
+            elif result.get("success") and self.show_progress:
+                print("[*] Auto body fetch skipped (broad search, media-only hits, or no host/url filter)")
 
-INVESTIGATE CAPTURE (when user asks to investigate the buffer / malicious traffic / /investigate):
-1. live_stats then ekfiddle_threats or ekfiddle_sessions; Critical/High first
-2. Fetch a few highest-severity JS/HTML bodies; skip Low External Script Monitor unless IOCs demand it
-3. Pivot sessions_search on hosts found in those bodies; keep zero-hit budget tight
-4. Trace landing to loader to C2/RPC to payload/overlay
-5. Structured summary: Infection chain, hosts/IOCs, verdict; EKFiddle rules only for malicious high-signal evidence
+        self._track_analyzed_session(tool_name, arguments or {}, result if isinstance(result, dict) else {})
+        return result
 
-NO INVENTED IOCs:
-- Never invent domains, IPs, cookies, or function names that did not appear in tool results or the user query.
-- If a host search returns 0, say so. Do not fabricate related infrastructure.
+    def _response_text_size(self, response: Dict[str, Any]) -> int:
+        """Size of a tools/call result as the server sent it (its text content), no re-serialization."""
+        result = response.get("result")
+        content = result.get("content") if isinstance(result, dict) else None
+        if not isinstance(content, list):
+            return 0
+        return sum(len(item.get("text") or "") for item in content if isinstance(item, dict))
 
-CRITICAL INSTRUCTIONS FOR TOOL CALLING (legacy text path only):
-NOTE: Prefer native Gemini FunctionDeclarations when GEMINI_NATIVE_TOOLS=1.
-If you must emit a text tool call, use JSON-ONLY with the tool LAST:
-{{"tool": "tool_name", "arguments": {{"param": "value"}}}}
+    def _parse_tool_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        if "result" not in response:
+            return {"error": response.get("error", "Tool call failed")}
 
-RULES:
-1. Use ONLY MCP tools from the list above. Do not invent names.
-2. MAKE ONE TOOL CALL AT A TIME
-3. session_id must be a plain string like "262", never an object
-4. sessions_search has NO "query" field — use host_pattern / url_pattern / content_type
-5. Do not use leading * in host_pattern (use "drpc.org" not "*drpc.org")
-6. Prefer fiddler_mcp__ekfiddle_threats / ekfiddle_sessions for triage before bodies
+        result = response["result"]
 
-MULTI-SESSION COMPARISON:
-When user asks to COMPARE 2-10 sessions, use fiddler_mcp__compare_sessions.
-When asking about ONE session, use fiddler_mcp__session_body.
+        if isinstance(result, dict):
+            content = result.get("content")
+            if isinstance(content, list) and content:
+                for item in content:
+                    if isinstance(item, dict):
+                        if item.get("type") == "text" and "text" in item:
+                            text_data = item["text"]
+                            if isinstance(text_data, str) and _first_nonspace(text_data) in ("{", "["):
+                                try:
+                                    return _json_loads(text_data)
+                                except json.JSONDecodeError:
+                                    return {"text": text_data}
+                            return {"text": text_data}
+                        return item
 
-MULTIPLE TOOL CALLS - YOU CAN CALL TOOLS REPEATEDLY:
+            if any(key in result for key in ("success", "error", "sessions", "bridge_status")):
+                return result
 
-IMPORTANT: You are ALLOWED and ENCOURAGED to call tools multiple times to provide complete analysis!
+            response_envelope = result.get("response")
+            if isinstance(response_envelope, dict):
+                data = response_envelope.get("data")
+                if data is not None:
+                    return data if isinstance(data, dict) else {"data": data}
+                return response_envelope
 
-YOU CAN MAKE UP TO {self.max_followups} TOOL CALLS in a single user request if needed to:
-- Analyze multiple sessions sequentially (e.g., top 5 EKFiddle sessions)
-- Fetch additional context after initial analysis
-- Investigate related sessions discovered during analysis
-- Gather comprehensive information for thorough security assessment
-- Follow investigation leads as they emerge
+        return result if isinstance(result, dict) else {"result": result}
 
-HOW MULTIPLE TOOL CALLS WORK:
+    def _session_id_count(self, sessions: List[Dict[str, Any]], session_id: str) -> int:
+        """How many entries in sessions carry session_id; counts are built once per list."""
+        cached = getattr(self, "_session_id_counts_cache", None)
+        if cached is None or cached[0] is not sessions:
+            cached = (sessions, Counter(str(s.get("id", "")) for s in sessions))
+            self._session_id_counts_cache = cached
+        return cached[1][session_id]
 
-1. Make Initial Tool Call:
-   {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true, "limit": 100}}}}
+    def _auto_fetch_session_body(self, search_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Auto-retrieve body for a host/url-filtered text or JS hit; never media."""
+        sessions = search_result.get("sessions") or []
+        if not sessions:
+            return None
 
-2. After Receiving Results, You Can:
-   a) Provide final analysis (if you have enough information)
-   b) Make ANOTHER tool call to get more data (you don't need permission!)
+        first = self._pick_auto_fetch_session(sessions)
+        if not first:
+            if self.show_progress:
+                print("[*] Auto body fetch skipped: no text/html or javascript candidate in results")
+            return None
 
-3. Example Multi-Call Flow:
-   First call:  List suspicious sessions
-   Second call: Get body of highest risk session
-   Third call:  Get body of another related session
-   Fourth call: Search for similar patterns
-   [Continue until you have complete picture, up to {self.max_followups} calls total]
+        session_id = str(first.get("id", "")).strip()
+        if not session_id:
+            return None
 
-4. When to Make Additional Calls:
-   - You found suspicious sessions and need to examine their code
-   - Initial session reveals references to other sessions
-   - User asks for "comprehensive" or "detailed" analysis
-   - You need to verify findings across multiple sessions
-   - Investigation uncovers new leads
-   - You need more context to provide confident assessment
+        # Extract timestamp info for disambiguation
+        received_at = first.get("received_at")
+        received_at_iso = first.get("received_at_iso") or first.get("time")
+        
+        # Check if there are duplicate session IDs with different timestamps
+        duplicate_count = self._session_id_count(sessions, session_id)
+        has_duplicates = duplicate_count > 1
+        
+        # Build informative progress message (skipped entirely when progress output is off)
+        if self.show_progress:
+            log_msg = f"[*] Auto-fetching body for session {session_id}"
+            if received_at_iso:
+                log_msg += f" (timestamp: {received_at_iso})"
+            if has_duplicates:
+                log_msg += f" [WARNING: {duplicate_count} sessions share this ID]"
+            print(log_msg)
+        
+        response = self.send_mcp_request(
+            "tools/call",
+            {"name": "fiddler_mcp__session_body", "arguments": {"session_id": session_id}},
+        )
+        body_data = self._parse_tool_response(response)
 
-5. When to Stop Making Calls:
-   - You have sufficient information to answer the user's question
-   - You've examined the most critical sessions
-   - You've reached {self.max_followups} tool calls (system limit)
-   - User explicitly asks for summary/conclusion
+        if not isinstance(body_data, dict) or body_data.get("success") is False:
+            if isinstance(body_data, dict):
+                body_data.setdefault("note", "Automatic session body lookup failed or returned no content.")
+            return body_data
 
-EXAMPLE WORKFLOWS WITH MULTIPLE CALLS:
+        # Add disambiguation metadata to help AI understand which session was fetched
+        duplicate_warning = (
+            f" - WARNING: {duplicate_count} sessions share this ID with different timestamps" if has_duplicates else ""
+        )
+        body_data["_auto_fetch_metadata"] = {
+            "fetched_session_id": session_id,
+            "fetched_timestamp": received_at_iso,
+            "fetched_received_at": received_at,
+            "has_duplicate_ids": has_duplicates,
+            "note": f"This is session {session_id} from the search results (first match){duplicate_warning}",
+        }
 
-Example 1: Analyzing EKFiddle Sessions
-Query: "Analyze EKFiddle sessions in detail"
+        truncated_flag, size_bytes, response_text = _body_fields(body_data)
 
-Call 1: {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true}}}}
-Result: Found 5 EKFiddle-flagged sessions
+        # A preview flagged as truncated may still hold the whole body; skip the second round-trip then
+        if truncated_flag and isinstance(size_bytes, int) and size_bytes and _preview_body_len(response_text) >= size_bytes:
+            truncated_flag = False
 
-Call 2: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "312"}}}}
-Analysis: Session 312 has eval() - HIGH RISK
+        # If preview is truncated, request the raw body and persist it to disk.
+        # NEW: For large JavaScript files, also request smart extraction for better LLM analysis
+        if truncated_flag:
+            content_type = body_data.get("content_type", "") or ""
+            is_javascript = _JS_CONTENT_TYPE_RE.search(content_type) is not None
+            
+            # Determine if we should use smart extraction (large JS files benefit most)
+            # Default threshold: 50KB - matches enhanced-bridge MAX_BODY_PREVIEW_BYTES
+            use_smart_extract = is_javascript and size_bytes and size_bytes > 50000
+            
+            if self.show_progress:
+                if use_smart_extract:
+                    print(f"[*] Large JavaScript detected ({size_bytes:,} bytes); using smart extraction for session {session_id}...")
+                else:
+                    print(f"[*] Preview for session {session_id} was truncated; requesting full body...")
+            
+            raw_response = self.send_mcp_request(
+                "tools/call",
+                {
+                    "name": "fiddler_mcp__session_body",
+                    "arguments": {
+                        "session_id": session_id, 
+                        "include_binary": True,
+                        "smart_extract": use_smart_extract,  # NEW: Request intelligent extraction
+                    },
+                },
+            )
+            raw_data = self._parse_tool_response(raw_response)
+            if isinstance(raw_data, dict) and raw_data.get("success"):
+                body_data = raw_data
+                truncated_flag, size_bytes, response_text = _body_fields(body_data, size_bytes)
+            else:
+                body_data.setdefault(
+                    "auto_note",
+                    "Body preview was truncated and full fetch failed; inspect manually via fiddler_mcp__session_body",
+                )
+                return body_data
 
-Call 3: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "287"}}}}
-Analysis: Session 287 has redirect chain - MEDIUM RISK
+        # Check if smart extraction is available (from the bridge response)
+        smart_extraction = body_data.get("smart_extraction")
+        smart_extraction_available = body_data.get("smart_extraction_available", False)
+        
+        # NEW: If smart extraction is available, use it for better LLM analysis
+        if smart_extraction_available and smart_extraction:
+            # Format the smart extraction for LLM consumption
+            # One character past the cap is enough to tell whether the suffix is needed
+            formatted_extraction = self._format_smart_extraction(
+                smart_extraction, limit=SMART_EXTRACTION_PREVIEW_CHARS + 1
+            )
+            
+            if formatted_extraction:
+                # Use larger snippet limit for curated smart extraction content
+                analyzed = formatted_extraction
+                if len(analyzed) > SMART_EXTRACTION_PREVIEW_CHARS:
+                    analyzed = analyzed[:SMART_EXTRACTION_PREVIEW_CHARS] + _SMART_SUFFIX
+                
+                # The analyzed content becomes the response body the LLM sees (one key, one copy)
+                body_data["response_body"] = analyzed
+                body_data["analysis_method"] = "smart_extraction"
+                
+                # Log what was extracted
+                metadata = smart_extraction.get("metadata", {})
+                patterns_found = metadata.get("patterns_found", [])
+                if patterns_found:
+                    print(f"[+] Smart extraction found {len(patterns_found)} suspicious patterns: {', '.join(patterns_found[:5])}")
+                
+                # Still save the full body to disk if enabled
+                saved_path = self._save_body_to_file(session_id, response_text)
+                if saved_path:
+                    body_data["saved_response_path"] = saved_path
+                    body_data.setdefault(
+                        "auto_note_details",
+                        f"Smart extraction from {size_bytes:,} byte file; full response saved to {saved_path}"
+                    )
+                    body_data["auto_note"] = f"Smart extraction applied; full body saved to {saved_path}"
+                else:
+                    body_data["auto_note"] = "Smart extraction applied for enhanced analysis"
+        
+        # FALLBACK: Existing behavior for non-JavaScript or when smart extraction not available
+        # A body that fits the preview is already complete in the result; no dump needed
+        elif len(response_text) > RESPONSE_PREVIEW_CHARS:
+            body_data["response_body"] = response_text[:RESPONSE_PREVIEW_CHARS] + _PREVIEW_SUFFIX
 
-Call 4: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "156"}}}}
-Analysis: Session 156 is benign false positive
+            saved_path = self._save_body_to_file(session_id, response_text)
+            if saved_path:
+                body_data["saved_response_path"] = saved_path
+                body_data.setdefault(
+                    "auto_note_details",
+                    f"Body length reported as {size_bytes} bytes; full response saved to {saved_path}"
+                    if size_bytes is not None
+                    else f"Full response saved to {saved_path}",
+                )
+                if not truncated_flag:
+                    body_data["auto_note"] = f"Full body retrieved and saved to {saved_path}"
+                else:
+                    body_data["auto_note"] = f"Body preview truncated; full response saved to {saved_path}"
 
-Final Response: Comprehensive threat assessment of all 3 sessions
+        request_text = body_data.get("request_body") or ""
+        if len(request_text) > REQUEST_PREVIEW_CHARS:
+            body_data["request_body"] = request_text[:REQUEST_PREVIEW_CHARS] + _PREVIEW_SUFFIX
 
-Example 2: Investigating Attack Chain
-Query: "Investigate suspicious sessions"
+            saved_req_path = self._save_body_to_file(session_id, request_text, kind="request")
+            if saved_req_path:
+                body_data["saved_request_path"] = saved_req_path
 
-Call 1: {{"tool": "fiddler_mcp__live_sessions", "arguments": {{"suspicious_only": true}}}}
-Result: Found suspicious iframe injection in session 100
+        # Build auto_note with disambiguation info
+        base_note = "Full body retrieved" if not truncated_flag else "Body preview truncated; saved full payload to disk"
+        if has_duplicates:
+            base_note += f" [Session {session_id} at {received_at_iso} - {duplicate_count} total with this ID]"
+        
+        body_data.setdefault("auto_note", base_note)
+        
+        if size_bytes is not None:
+            body_data.setdefault("auto_note_details", f"Body length reported as {size_bytes} bytes")
 
-Call 2: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "100"}}}}
-Analysis: Session 100 loads external script from session 105
+        return body_data
 
-Call 3: {{"tool": "fiddler_mcp__session_body", "arguments": {{"session_id": "105"}}}}
-Analysis: Session 105 is the malicious payload
+    def _save_body_to_file(self, session_id: str, body_text: str, kind: str = "response") -> Optional[str]:
+        if not self.auto_save_full_bodies:
+            return None
 
-Final Response: Explains the 2-stage attack chain
+        try:
+            # Identical content already dumped (same kind) keeps its file; a missing file is rewritten
+            dedupe_key = (kind, hashlib.blake2b(body_text.encode("utf-8", "replace"), digest_size=16).hexdigest())
+            existing = self._dumped_path(dedupe_key)
+            if existing is not None and existing.exists():
+                return str(existing)
+            dump_dir = _session_dump_dir()
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            safe_id = str(session_id).translate(_SAFE_FILENAME_TRANS)
+            file_path = dump_dir / f"session_{safe_id}_{kind}_{timestamp}.txt"
+            dump_queue = getattr(self, "_dump_queue", None)
+            queued = False
+            if dump_queue is not None:
+                try:
+                    dump_queue.put_nowait((file_path, body_text, kind, session_id))
+                    queued = True
+                except queue.Full:
+                    pass  # writer is behind: apply backpressure by writing inline
+            if not queued:
+                _write_body_file(file_path, body_text)
+            self._remember_dump(dedupe_key, file_path)
+            return str(file_path)
+        except Exception as exc:
+            print(f"[!] Failed to persist {kind} body for session {session_id}: {exc}")
+            return None
 
-IMPORTANT: Don't announce "I will make X calls" - just make them as needed!
-Between each call, provide brief progress: "Analyzing session X..." then continue.
+    def _dumped_path(self, key: Tuple[str, str]) -> Optional[Path]:
+        """Dump path previously recorded for (kind, digest), refreshing its LRU position."""
+        dump_paths = getattr(self, "_dump_paths", None)
+        if dump_paths is None:
+            return None
+        with self._dump_paths_lock:
+            path = dump_paths.get(key)
+            if path is not None:
+                dump_paths.move_to_end(key)
+            return path
 
-IMPORTANT WORKFLOW RULES:
-- When user asks for EKFiddle rules / CustomRegexes / signatures for a named session → fetch that body once if needed, emit tab-separated rules, STOP
-- When user names IOC domains → search those hosts FIRST with host_pattern before any Low EKFiddle HTML body analysis
-- When user explicitly requests COMPARISON of multiple sessions → Use fiddler_mcp__compare_sessions (efficient, one call)
-- When analyzing EKFiddle or suspicious sessions sequentially → Fetch ONE at a time with fiddler_mcp__session_body, make multiple calls
-- DO NOT list "I will call session X, Y, Z..." - just make the calls as you analyze
-- After each call, provide brief NEW findings THEN decide if another call is needed
-- DO NOT repeat previous summaries - each response should ADD NEW information only
-- Focus on user IOCs and Critical/High first; skip Low External Script Monitor until IOCs are covered
-- Never re-fetch a session body already analyzed in this query
-- Never invent hosts or IOCs not present in tool results
-- You have a limit of {self.max_followups} tool calls per user query - use them wisely
+    def _remember_dump(self, key: Tuple[str, str], path: Path) -> None:
+        """Record where a body was dumped (LRU, BODY_DUMP_DEDUPE_SIZE entries)."""
+        dump_paths = getattr(self, "_dump_paths", None)
+        if dump_paths is None:
+            return
+        with self._dump_paths_lock:
+            dump_paths[key] = path
+            dump_paths.move_to_end(key)
+            while len(dump_paths) > BODY_DUMP_DEDUPE_SIZE:
+                dump_paths.popitem(last=False)
+
+    def _drain_body_dumps(self) -> None:
+        """Writer thread: persist queued body dumps in order; a None item stops it."""
+        while True:
+            item = self._dump_queue.get()
+            if item is None:
+                return
+            file_path, body_text, kind, session_id = item
+            try:
+                _write_body_file(file_path, body_text)
+            except Exception as exc:
+                print(f"[!] Failed to persist {kind} body for session {session_id}: {exc}")
 
-PERFORMANCE OPTIMIZATION INSTRUCTIONS:
-1. Be CONCISE in your initial responses - acknowledge the request in 1 sentence
-2. For tool calls, don't provide lengthy explanations beforehand
-3. After getting results, provide analysis WITHOUT repeating all raw data
-4. If listing items, show only ESSENTIAL information (ID, domain, key finding)
-5. Keep responses focused and actionable
-6. Offer to provide more detail if needed, don't dump everything at once
+    def _format_smart_extraction(self, extraction: dict, limit: Optional[int] = None) -> str:
+        """
+        Format intelligent extraction data for LLM consumption.
+        
+        This method takes the smart_extraction dict from the bridge and formats it
+        into a structured string that helps the LLM understand the content layout.
+        
+        Args:
+            extraction: Dict with keys: head, tail, suspicious_patterns, metadata
+            limit: If given, stop once the result reaches this many characters
+                (the output equals the full text's first ``limit`` characters)
+        
+        Returns:
+            Formatted string combining head, patterns, and tail sections
+        """
+        if not extraction or not isinstance(extraction, dict):
+            return ""
+        
+        metadata = extraction.get("metadata") or {}
+        original_size = metadata.get("original_size", 0)
+        patterns_found = metadata.get("patterns_found") or ()
+        head = extraction.get("head", "")
+        suspicious = extraction.get("suspicious_patterns", "")
+        tail = extraction.get("tail", "")
+        if not (head or suspicious or tail):
+            # Banner-only output would displace the plain preview fallback
+            return ""
+        
+        parts = []
+        
+        # Add header with context
+        if original_size > 0:
+            parts.append(f"[INTELLIGENT EXTRACTION from {original_size:,} byte file]")
+            if patterns_found:
+                parts.append(f"[Suspicious patterns detected: {', '.join(patterns_found[:10])}]")
+            parts.append("")
+        
+        # Add head section (first 8KB - variable declarations, imports, configs)
+        # Sections stay separate parts so the only copy of a large body is the final join
+        if head:
+            parts += (_SMART_HEAD_HDR, head)
+        
+        # Add suspicious patterns section (security-relevant code from middle)
+        if suspicious:
+            parts += ("", _SMART_PATTERNS_HDR, suspicious)
+        
+        # Add tail section (last 4KB - execution logic, callbacks)
+        if tail:
+            parts += ("", _SMART_TAIL_HDR, tail)
+        
+        # Add extraction summary
+        if metadata:
+            total_extracted = metadata.get("total_extracted", 0)
+            patterns_count = metadata.get("patterns_count", 0)
+            parts.append(
+                f"\n{_SEP}\n"
+                f"[Extraction summary: {total_extracted:,} bytes extracted from {original_size:,} bytes original]"
+            )
+            if patterns_count > 0:
+                parts.append(f"[{patterns_count} suspicious code patterns identified]")
+        
+        if limit is not None:
+            parts = _clip_joined_parts(parts, limit)
+        return "\n".join(parts)
 
-RESPONSE SPEED PRIORITY:
-- Make tool calls immediately without preamble
-- Analyze results efficiently  
-- Keep initial responses under 10 lines unless specifically asked for detail
-- Focus on answering the specific question asked
-- Prefer JSON-only tool calls; put any short analysis BEFORE the JSON, not after
+    def create_tool_descriptions(self) -> str:
+        """Create formatted tool descriptions for Gemini with security focus"""
+        if not self.available_tools:
+            return "No tools available."
+        cache_key = ("descriptions", self.max_followups)
+        cached = self._tool_text_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        descriptions = ["Available Fiddler MCP Tools:\n"]
+        for i, tool in enumerate(self.available_tools, 1):
+            name = tool.get("name", "")
+            desc = tool.get("description", "No description")
+            schema = tool.get("inputSchema", {})
+            props = schema.get("properties", {})
+            
+            descriptions.append(f"{i}. {name}")
+            descriptions.append(f"   Description: {desc}")
+            
+            # Add security guidance for session_body tool
+            if "session_body" in name:
+                descriptions.append("   SECURITY NOTE: Use this tool to analyze script behavior, not just content.")
+                descriptions.append("   Focus on: DOM manipulation, redirects, iframe injection, anti-analysis patterns.")
+            
+            if props:
+                descriptions.append("   Parameters:")
+                for param_name, param_info in props.items():
+                    param_type = param_info.get("type", "any")
+                    param_desc = param_info.get("description", "")
+                    required = "required" if param_name in schema.get("required", []) else "optional"
+                    descriptions.append(f"     - {param_name} ({param_type}, {required}): {param_desc}")
+            descriptions.append("")
+        
+        # Add note about multiple tool calls
+        descriptions.append("\n" + "="*80)
+        descriptions.append("IMPORTANT: YOU CAN CALL ANY TOOL MULTIPLE TIMES!")
+        descriptions.append("="*80)
+        descriptions.append("")
+        descriptions.append("You are NOT limited to one tool call per user request.")
+        descriptions.append(f"You can call tools up to {self.max_followups} times to gather all necessary information.")
+        descriptions.append("")
+        descriptions.append("Common multi-call scenarios:")
+        descriptions.append("  - List sessions, then analyze multiple session bodies")
+        descriptions.append("  - Search for pattern, then examine each matching session")
+        descriptions.append("  - Get suspicious sessions, then investigate top 5 in detail")
+        descriptions.append("  - Discover attack chain, then trace each stage")
+        descriptions.append("")
+        descriptions.append("After EACH tool result, you can either:")
+        descriptions.append("  a) Make ANOTHER tool call (no permission needed)")
+        descriptions.append("  b) Provide your final analysis")
+        descriptions.append("")
+        descriptions.append("Make calls as needed to provide thorough, complete analysis!")
+        descriptions.append("="*80 + "\n")
+        
+        text = "\n".join(descriptions)
+        self._tool_text_cache[cache_key] = text
+        return text
 
-CONVERSATION CONTEXT:
-{self._format_recent_history(5)}
+    def _get_tool_names_list(self) -> str:
+        """Get compact list of available tool names for prompt reinforcement.
+        
+        This prevents LLM from inventing tool names by reminding it of exact valid names.
+        """
+        if not self.available_tools:
+            return ""
+        cached = self._tool_text_cache.get("names")
+        if cached is not None:
+            return cached
+        names = [t.get("name", "") for t in self.available_tools if t.get("name")]
+        text = "AVAILABLE TOOLS (use ONLY these exact names):\n- " + "\n- ".join(names) if names else ""
+        self._tool_text_cache["names"] = text
+        return text
 
-USER QUERY: {user_query}
+    def _tool_prompt_tail(self, kind: str) -> str:
+        """Requirements, tool names and reply format that close an analysis/follow-up prompt."""
+        cache_key = ("prompt_tail", kind)
+        cached = self._tool_text_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        rules, footer = _TOOL_PROMPT_TAILS[kind]
+        text = f"{rules}\n\n{self._get_tool_names_list()}\n\n{footer}"
+        self._tool_text_cache[cache_key] = text
+        return text
 
-YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language):"""
-        return prompt
+    def build_gemini_prompt(self, user_query: str) -> str:
+        """Build comprehensive prompt for Gemini"""
+        cache_key = ("prompt_prefix", self.max_followups)
+        prefix = self._tool_text_cache.get(cache_key)
+        if prefix is None:
+            prefix = _render_segments(
+                _PROMPT_PREFIX_SEGMENTS,
+                {
+                    "tool_descriptions": self.create_tool_descriptions(),
+                    "max_followups": str(self.max_followups),
+                },
+            )
+            self._tool_text_cache[cache_key] = prefix
+        turn = _render_segments(
+            _PROMPT_TURN_SEGMENTS,
+            {"history": self._format_recent_history(5), "user_query": user_query},
+        )
+        return prefix + turn
 
     def _format_recent_history(self, limit: int = 5) -> str:
         """Format recent conversation history"""
@@ -2430,48 +3182,42 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
 
     def parse_gemini_response(self, response_text: str) -> Optional[Dict[str, Any]]:
         """Parse Gemini response for tool calls - handles multiple formats"""
-        import re
         
-        response_text = response_text.strip()
-        
-        if not response_text:
+        # Every accepted form carries a "tool"/"tool_code" key or a fiddler_mcp__ call,
+        # so a final prose answer is rejected with two substring scans, before
+        # stripping, fence removal or any decoding.
+        if '"tool' not in response_text and "fiddler_mcp__" not in response_text:
             return None
         
+        response_text = response_text.strip()
+        
         if response_text.startswith("```"):
             lines = response_text.split("\n")
             response_text = "\n".join(lines[1:-1]).strip()
         
-        try:
-            data = json.loads(response_text)
-            return self._process_tool_call_data(data)
-        except json.JSONDecodeError:
-            pass
+        if not response_text:
+            return None
         
-        json_patterns = [
-            r'\{(?:[^{}]|\{[^{}]*\})*"tool(?:_code)?"(?:[^{}]|\{[^{}]*\})*\}',
-            r'\[(?:[^\[\]]|\[[^\[\]]*\])*"tool(?:_code)?"(?:[^\[\]]|\[[^\[\]]*\])*\]',
-        ]
+        if response_text[0] in "{[":
+            try:
+                data = json.loads(response_text)
+                return self._process_tool_call_data(data)
+            except json.JSONDecodeError:
+                pass
         
-        for pattern in json_patterns:
-            matches = re.findall(pattern, response_text, re.DOTALL)
-            for match in matches:
-                try:
-                    data = json.loads(match)
-                    result = self._process_tool_call_data(data)
-                    if result:
-                        print("  Extracted tool call from mixed text/JSON response")
-                        return result
-                except json.JSONDecodeError:
-                    continue
+        for _start, data in _iter_tool_json(response_text):
+            result = self._process_tool_call_data(data)
+            if result:
+                print("  Extracted tool call from mixed text/JSON response")
+                return result
         
-        plain_text_pattern = r'(fiddler_mcp__\w+)\((.*?)\)'
-        match = re.search(plain_text_pattern, response_text)
+        match = _PLAIN_TOOL_CALL_RE.search(response_text)
         if match:
             tool_name = match.group(1)
             args_str = match.group(2)
             
             arguments = {}
-            arg_matches = re.findall(r'(\w+)=(["\']?)([^,\'"]+)\2', args_str)
+            arg_matches = _PLAIN_TOOL_ARG_RE.findall(args_str)
             for key, quote, value in arg_matches:
                 if not quote and value.isdigit():
                     arguments[key] = int(value)
@@ -2486,45 +3232,38 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
     
     def _extract_text_before_tool_call(self, response_text: str) -> str:
         """Extract text before tool call"""
-        import re
         
         response_text = response_text.strip()
         
-        json_patterns = [
-            r'\{(?:[^{}]|\{[^{}]*\})*"tool(?:_code)?"(?:[^{}]|\{[^{}]*\})*\}',
-            r'\[(?:[^\[\]]|\[[^\[\]]*\])*"tool(?:_code)?"(?:[^\[\]]|\[[^\[\]]*\])*\]',
-        ]
-        
         earliest_pos = len(response_text)
         
-        for pattern in json_patterns:
-            match = re.search(pattern, response_text, re.DOTALL)
-            if match:
-                earliest_pos = min(earliest_pos, match.start())
+        for start, _data in _iter_tool_json(response_text):
+            earliest_pos = start
+            break
         
-        plain_text_pattern = r'(fiddler_mcp__\w+)\('
-        plain_match = re.search(plain_text_pattern, response_text)
+        plain_match = _PLAIN_TOOL_START_RE.search(response_text)
         if plain_match:
             earliest_pos = min(earliest_pos, plain_match.start())
         
         if earliest_pos < len(response_text):
             explanatory_text = response_text[:earliest_pos].strip()
-            explanatory_text = re.sub(r'(Tool Call|Next):\s*$', '', explanatory_text, flags=re.IGNORECASE).strip()
+            explanatory_text = _TOOL_CALL_LEAD_IN_RE.sub('', explanatory_text).strip()
             return explanatory_text
         
         return response_text
     
     def _process_tool_call_data(self, data: Any) -> Optional[Dict[str, Any]]:
         """Process parsed JSON to extract tool call"""
-        import re
         
         if isinstance(data, list):
-            print(f"  Gemini returned multiple tool calls ({len(data)} calls)")
-            print("   Processing first call only (will chain the rest)")
-            if data:
-                data = data[0]
-            else:
+            calls = [c for c in map(self._process_tool_call_data, data[:MAX_PARALLEL_TOOL_CALLS]) if c]
+            if not calls:
                 return None
+            if len(calls) > 1:
+                # Independent calls issued together run concurrently (see _call_legacy_tool)
+                print(f"  Gemini returned {len(data)} tool calls; running {len(calls)} together")
+                return {**calls[0], "batch": calls}
+            return calls[0]
         
         if not isinstance(data, dict):
             return None
@@ -2540,12 +3279,12 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
             tool_name = None
             args_str = None
             
-            match = re.search(r'(fiddler_mcp__\w+)\((.*?)\)', code)
+            match = _PLAIN_TOOL_CALL_RE.search(code)
             if match:
                 tool_name = match.group(1)
                 args_str = match.group(2)
             else:
-                match = re.search(r'fiddler_mcp\.(\w+)\((.*?)\)', code)
+                match = _DOTTED_TOOL_CALL_RE.search(code)
                 if match:
                     tool_suffix = match.group(1)
                     tool_name = f"fiddler_mcp__{tool_suffix}"
@@ -2553,7 +3292,7 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
             
             if tool_name and args_str is not None:
                 arguments = {}
-                arg_matches = re.findall(r'(\w+)=[\'"]([^\'"]+)[\'"]', args_str)
+                arg_matches = _QUOTED_TOOL_ARG_RE.findall(args_str)
                 for key, value in arg_matches:
                     arguments[key] = value
                 
@@ -2567,20 +3306,51 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
         if not text or len(text) < 3:
             return False
         
-        markdown_indicators = ['**', '__', '`', '# ', '## ', '### ', '* ', '- ', '+ ', '[', '|']
-        return any(indicator in text for indicator in markdown_indicators)
+        return _has_markdown_hint(text[:MARKDOWN_SCAN_CHARS])
+
+    def _log_cached_tokens(self, response: Any) -> None:
+        """Log the Gemini context-cache hit for a native turn (absent on other providers)."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None or not hasattr(usage, "cached_content_token_count"):
+            return
+        self.log_with_timestamp(
+            f"LLM usage: prompt_tokens={getattr(usage, 'prompt_token_count', 0)} "
+            f"cached_tokens={usage.cached_content_token_count}",
+            to_console=False,
+        )
+
+    def _timed_call_tool(self, name: str, args: Dict[str, Any]):
+        start = time.perf_counter()
+        result = self.call_tool(name, args)
+        return result, time.perf_counter() - start
+
+    def _run_tool_calls(self, calls: List[Dict[str, Any]]) -> List[Any]:
+        """Execute one model turn's tool calls, returning (result, seconds) per call.
+
+        Multiple calls are independent by construction (the model issued them
+        together), so they fan out over the tool pool; the reader thread keeps
+        their responses apart. Results are returned in call order so tool
+        result ids line up with the model's function calls. A turn that
+        includes a state-changing tool runs serially, in the order given.
+        """
+        pool = getattr(self, "_tool_pool", None)
+        if len(calls) == 1 or pool is None or any(c["name"] in _MUTATING_TOOLS for c in calls):
+            return [self._timed_call_tool(c["name"], c.get("args") or {}) for c in calls]
+        futures = [
+            pool.submit(self._timed_call_tool, c["name"], c.get("args") or {})
+            for c in calls
+        ]
+        return [f.result() for f in futures]
 
     def _chat_native(self, user_query: str) -> str:
         """Native function-calling loop via active LLM provider + MCP call_tool gate."""
-        import llm_prompts
-
         if self.llm_provider is None or not self.llm_provider.tools_bound():
             return "Native tools are not bound. Re-run /model or restart the client."
 
         provider = self.llm_provider
         label = getattr(provider, "display_label", self.provider_name)
 
-        query_start_time = time.time()
+        query_start_time = time.perf_counter()
         total_llm_time = 0.0
         total_bridge_time = 0.0
         tool_call_count = 0
@@ -2600,27 +3370,39 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
 
             while tool_call_count < max_calls:
                 self._check_interrupt()
-                sys.stdout.write(f"\r  Waiting for {label} LLM (native tools)...")
-                sys.stdout.flush()
-                llm_start = time.time()
-                response = provider.generate(conversation, tool_choice="auto")
+                _status_line(f"  Waiting for {label} LLM (native tools)...")
+                llm_start = time.perf_counter()
+                echo = self._reply_echo(provider, label)
+                if echo is None:
+                    response = provider.generate(conversation, tool_choice="auto")
+                else:
+                    try:
+                        response = provider.generate(conversation, tool_choice="auto", on_text=echo)
+                    finally:
+                        echo.close()
                 self._check_interrupt()
-                llm_elapsed = time.time() - llm_start
+                llm_elapsed = time.perf_counter() - llm_start
                 total_llm_time += llm_elapsed
-                sys.stdout.write(f"\r  [{label} LLM] Response ({llm_elapsed:.1f}s)                    \n")
-                sys.stdout.flush()
+                _status_line(f"  [{label} LLM] Response ({llm_elapsed:.1f}s)", done=True)
+                self._log_cached_tokens(response)
 
                 calls = provider.extract_tool_calls(response)
                 text = provider.extract_text(response)
+                streamed = echo is not None and bool(echo.parts)
 
                 # Fallback: legacy text JSON tool call if no native function_call parts
                 if not calls and text:
                     legacy = self.parse_gemini_response(text)
                     if legacy:
-                        calls = [{"name": legacy["tool"], "args": legacy.get("arguments") or {}, "id": None}]
+                        calls = [
+                            {"name": c["tool"], "args": c.get("arguments") or {}, "id": None}
+                            for c in legacy.get("batch") or (legacy,)
+                        ]
 
                 if not calls:
                     final = text or "No response from model."
+                    self._reply_streamed = streamed and bool(text)
+                    self._answered = bool(text)
                     self.conversation_history.append({"role": "assistant", "content": final})
                     self.log_with_timestamp(
                         f"Query Summary: native_tools/{self.provider_name}, llm={total_llm_time:.1f}s, "
@@ -2632,24 +3414,27 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                 provider.append_model_turn(conversation, response, calls, text)
 
                 if text and text.strip():
-                    if self.use_rich and self.console:
+                    if streamed:
+                        pass  # already on screen
+                    elif self.use_rich and self._rich_console():
                         self.console.print(f"\n[bold cyan]< {label}:[/bold cyan]")
                         self.console.print(text)
                     else:
                         print(f"\n< {label}: {text}")
                     self.maybe_persist_ekfiddle_rules(text)
 
+                self._check_interrupt()
+                if self.show_progress:
+                    for call in calls:
+                        print(self._brief_tool_status(call["name"], call.get("args") or {}))
+                batch_start = time.perf_counter()
+                timed_results = self._run_tool_calls(calls)
+                total_bridge_time += time.perf_counter() - batch_start
+
                 executed = []
-                for call in calls:
-                    self._check_interrupt()
+                for call, (result, bridge_elapsed) in zip(calls, timed_results):
                     name = call["name"]
                     args = call.get("args") or {}
-                    if self.show_progress:
-                        print(self._brief_tool_status(name, args))
-                    bridge_start = time.time()
-                    result = self.call_tool(name, args)
-                    bridge_elapsed = time.time() - bridge_start
-                    total_bridge_time += bridge_elapsed
                     tool_call_count += 1
                     self.log_with_timestamp(
                         f"Tool Chain: call #{tool_call_count} -> {name} ({bridge_elapsed*1000:.0f}ms)",
@@ -2658,7 +3443,7 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                     self.conversation_history.append({
                         "role": "tool",
                         "tool": name,
-                        "content": json.dumps(result, indent=2, default=str)[:8000],
+                        "content": _prompt_json(result)[:8000],
                     })
                     executed.append((name, args, result, call.get("id")))
 
@@ -2674,18 +3459,18 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                 user_query, self._analyzed_sessions_note(), max_calls
             )
             provider.append_user_text(conversation, synth_prompt)
-            sys.stdout.write(f"\r  Waiting for {label} LLM final synthesis...")
-            sys.stdout.flush()
-            synth_start = time.time()
+            _status_line(f"  Waiting for {label} LLM final synthesis...")
+            synth_start = time.perf_counter()
             synth_resp = provider.generate(conversation, tool_choice="none")
-            total_llm_time += time.time() - synth_start
-            sys.stdout.write(f"\r  [{label} LLM] Final synthesis complete                    \n")
-            sys.stdout.flush()
-            final = provider.extract_text(synth_resp) or "Tool budget reached."
+            total_llm_time += time.perf_counter() - synth_start
+            _status_line(f"  [{label} LLM] Final synthesis complete", done=True)
+            synth_text = provider.extract_text(synth_resp)
+            final = synth_text or "Tool budget reached."
+            self._answered = bool(synth_text)
             self.conversation_history.append({"role": "assistant", "content": final})
             self.log_with_timestamp(
                 f"Query Summary: native_tools/{self.provider_name} budget, llm={total_llm_time:.1f}s, "
-                f"bridge={total_bridge_time:.1f}s, total={time.time()-query_start_time:.1f}s, "
+                f"bridge={total_bridge_time:.1f}s, total={time.perf_counter()-query_start_time:.1f}s, "
                 f"tool_calls={tool_call_count}",
                 to_console=False,
             )
@@ -2708,6 +3493,94 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
             self.conversation_history.append({"role": "error", "content": error_msg})
             return error_msg
 
+    def _reply_echo(self, provider: Any, label: str) -> Optional[_ReplyEcho]:
+        """Live echo for a streamed native turn, or None (provider can't stream / not a TTY)."""
+        if not (getattr(provider, "streams_text", False) and getattr(self, "_progress_tty", False)):
+            return None
+        return _ReplyEcho(label, self._rich_console() if self.use_rich else None)
+
+    def _call_legacy_tool(self, tool_call: Dict[str, Any]) -> Tuple[str, Any]:
+        """Run a parsed text-path tool call; returns (label, result).
+
+        A batch (several calls in one JSON array) runs through _run_tool_calls
+        and its results come back together, in call order, for one analysis turn.
+        """
+        batch = tool_call.get("batch")
+        early, self._early_tool_call = getattr(self, "_early_tool_call", None), None
+        if not batch:
+            if early is not None and early[0] == (tool_call["tool"], tool_call["arguments"]):
+                # Already started while the model was still streaming (see _stream_legacy)
+                return tool_call["tool"], early[1].result()
+            return tool_call["tool"], self.call_tool(tool_call["tool"], tool_call["arguments"])
+        timed = self._run_tool_calls([{"name": c["tool"], "args": c["arguments"]} for c in batch])
+        label = ", ".join(c["tool"] for c in batch)
+        return label, {
+            "batch_results": [
+                {"tool": c["tool"], "arguments": c["arguments"], "result": result}
+                for c, (result, _elapsed) in zip(batch, timed)
+            ]
+        }
+
+    def _generate_legacy(self, prompt: str, *, early_tool: bool = False, **kwargs: Any) -> Any:
+        """One legacy text-path Gemini call, bounded by GEMINI_API_TIMEOUT.
+
+        Responses with text are cached per (model, prompt, options) for
+        LLM_RESPONSE_CACHE_TTL; empty or blocked responses are never reused.
+        With early_tool the response is streamed so a tool call can start
+        before the model finishes (see _stream_legacy).
+        """
+        if early_tool:
+            self._early_tool_call = None
+        cache = getattr(self, "_llm_cache", None)
+        key = None
+        if cache is not None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(prompt.encode("utf-8", "replace"))
+            if kwargs:
+                digest.update(_canonical_json(kwargs))
+            key = (getattr(self, "model_name", ""), digest.hexdigest())
+            entry = cache.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= LLM_RESPONSE_CACHE_TTL:
+                    cache.move_to_end(key)
+                    self.log_with_timestamp("Gemini Cache: hit, request skipped", to_console=False)
+                    return entry[1]
+                del cache[key]
+        request_options = gemini_request_options(self.gemini_timeout)
+        if early_tool and getattr(self, "_tool_pool", None) is not None:
+            response = self._stream_legacy(prompt, request_options, **kwargs)
+        else:
+            response = self.model.generate_content(prompt, request_options=request_options, **kwargs)
+        if key is not None and _response_has_text(response):
+            cache[key] = (time.monotonic(), response)
+            while len(cache) > LLM_RESPONSE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return response
+
+    def _stream_legacy(self, prompt: str, request_options: Dict[str, Any], **kwargs: Any) -> Any:
+        """Stream a text-path turn, submitting its tool call as soon as the JSON is complete.
+
+        The model's remaining tokens (usually trailing prose) then overlap the
+        MCP round-trip. Only a plain single call to a known, read-only tool is
+        started early; _call_legacy_tool picks up the future when the parsed
+        call matches and otherwise runs the call as usual.
+        """
+        response = self.model.generate_content(prompt, stream=True, request_options=request_options, **kwargs)
+        chunks: List[str] = []
+        for chunk in response:
+            self._check_interrupt()
+            if self._early_tool_call is not None:
+                continue
+            chunks.append(_response_text(chunk))
+            for _start, data in _iter_tool_json("".join(chunks)):
+                name = data.get("tool") if isinstance(data, dict) else None
+                arguments = data.get("arguments") if isinstance(data, dict) else None
+                if name in self._valid_tool_names and name not in _MUTATING_TOOLS and isinstance(arguments, dict):
+                    future = self._tool_pool.submit(self.call_tool, name, arguments)
+                    self._early_tool_call = ((name, arguments), future)
+                break  # only the first JSON value is the call parse_gemini_response would pick
+        return response
+
     def chat(self, user_query: str) -> str:
         """Process user query with Gemini and execute tools as needed
         
@@ -2719,8 +3592,13 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
         # Reset per-query investigation state
         self._analyzed_session_ids = set()
         self._last_search_args = {}
+        self._tool_cache = {}
+        self._early_tool_call = None
+        self._reply_streamed = False
+        self._answered = False
         self.clear_interrupt()
         self._current_user_query = user_query
+        self._user_query_count += 1
 
         # Recover MCP if a prior Ctrl+C killed the child process group
         if not self.ensure_mcp_alive():
@@ -2757,38 +3635,8 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
         self.log_with_timestamp("Building comprehensive prompt for Gemini...", to_console=False, prefix="Client: ")
         prompt = self.build_gemini_prompt(user_query)
         
-        def extract_text_safe(resp) -> str:
-            """Safely extract text from Gemini response, even if no Parts were returned."""
-            try:
-                return resp.text  # fast path
-            except Exception:
-                pass
-            try:
-                # Fallback: manual extraction
-                candidates = getattr(resp, "candidates", []) or []
-                if not candidates:
-                    return ""
-                first = candidates[0]
-                # Log finish_reason if present
-                finish_reason = getattr(first, "finish_reason", None)
-                if finish_reason is not None and self.mcp_stderr_file and not self.mcp_stderr_file.closed:
-                    ts = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                    self.mcp_stderr_file.write(f"[{ts}] Gemini finish_reason: {finish_reason}\n")
-                    self.mcp_stderr_file.flush()
-                content = getattr(first, "content", None)
-                parts = getattr(content, "parts", []) if content else []
-                # Concatenate any text parts
-                texts = []
-                for p in parts:
-                    t = getattr(p, "text", None)
-                    if isinstance(t, str) and t:
-                        texts.append(t)
-                return "\n".join(texts)
-            except Exception:
-                return ""
-
         # Track timing for query summary
-        query_start_time = time.time()
+        query_start_time = time.perf_counter()
         total_gemini_time = 0.0
         total_bridge_time = 0.0
         tool_call_count = 0
@@ -2796,7 +3644,7 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
         try:
             # Get Gemini response with progress indicator (user can interrupt with Ctrl+C)
             prompt_length = len(prompt)
-            estimated_tokens = self._estimate_tokens(prompt)
+            estimated_tokens = self._estimate_tokens(prompt_length)
             
             # Enhanced Gemini request logging
             self.log_with_timestamp(f"Gemini Request: model={self.model_name}, type=initial_query", to_console=False)
@@ -2804,22 +3652,20 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
             self.log_with_timestamp(f"Gemini Request: user_query=\"{user_query[:80]}{'...' if len(user_query) > 80 else ''}\"", to_console=False)
             
             # Show console feedback while waiting for Gemini
-            sys.stdout.write("\r  Waiting for Gemini LLM response...")
-            sys.stdout.flush()
+            _status_line("  Waiting for Gemini LLM response...")
             
-            start_time = time.time()
+            start_time = time.perf_counter()
             self._check_interrupt()
-            response = self.model.generate_content(prompt)
+            response = self._generate_legacy(prompt, early_tool=True)
             self._check_interrupt()
-            elapsed_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = int((time.perf_counter() - start_time) * 1000)
             elapsed_s = elapsed_ms / 1000
             total_gemini_time += elapsed_s
             
             # Clear the waiting message and show completion
-            sys.stdout.write(f"\r  [Gemini LLM] Response received ({elapsed_s:.1f}s)                    \n")
-            sys.stdout.flush()
+            _status_line(f"  [Gemini LLM] Response received ({elapsed_s:.1f}s)", done=True)
             
-            gemini_text = extract_text_safe(response)
+            gemini_text = self._extract_response_text(response)
             finish_reason = self._extract_finish_reason(response)
             candidates_count = self._count_candidates(response)
             
@@ -2833,13 +3679,13 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                 self.log_with_timestamp("Gemini Warning: retrying with stricter prompt (temperature=0)", to_console=False)
                 retry_prompt = prompt + "\n\nIMPORTANT: Respond ONLY with the JSON tool call format if a tool is needed, or a concise sentence otherwise."
                 # Low temperature to reduce safety blocks/hallucinations
-                start_retry = time.time()
-                response = self.model.generate_content(retry_prompt, generation_config={"temperature": 0})
-                retry_elapsed_ms = int((time.time() - start_retry) * 1000)
+                start_retry = time.perf_counter()
+                response = self._generate_legacy(retry_prompt, generation_config={"temperature": 0})
+                retry_elapsed_ms = int((time.perf_counter() - start_retry) * 1000)
                 total_gemini_time += retry_elapsed_ms / 1000
                 retry_finish_reason = self._extract_finish_reason(response)
                 self.log_with_timestamp(f"Gemini Retry: {retry_elapsed_ms}ms, finish_reason={retry_finish_reason}", to_console=False)
-                gemini_text = extract_text_safe(response)
+                gemini_text = self._extract_response_text(response)
             
             # Check if Gemini wants to call a tool
             tool_call = self.parse_gemini_response(gemini_text)
@@ -2853,18 +3699,21 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                 self.log_with_timestamp(f"Tool Chain: starting (max_followups={self.max_followups})", to_console=False)
                 
                 # Execute the tool with timing
-                bridge_start = time.time()
-                tool_result = self.call_tool(tool_name, arguments)
-                bridge_elapsed = time.time() - bridge_start
+                bridge_start = time.perf_counter()
+                tool_name, tool_result = self._call_legacy_tool(tool_call)
+                bridge_elapsed = time.perf_counter() - bridge_start
                 total_bridge_time += bridge_elapsed
-                tool_call_count += 1
+                tool_call_count += len(tool_call.get("batch") or (tool_call,))
                 self.log_with_timestamp(f"Tool Chain: call #{tool_call_count} -> {tool_name} ({bridge_elapsed*1000:.0f}ms)", to_console=False)
                 
+                # Serialized once: history, analysis prompt and size log share it
+                tool_result_str = _prompt_json(tool_result)
+
                 # Add tool result to history
                 self.conversation_history.append({
                     "role": "tool",
                     "tool": tool_name,
-                    "content": json.dumps(tool_result, indent=2)
+                    "content": tool_result_str
                 })
                 
                 # Ask Gemini to analyze the tool result with security framework
@@ -2872,7 +3721,7 @@ YOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language
                 
                 analysis_prompt = f"""The tool '{tool_name}' returned this result:
 
-{json.dumps(tool_result, indent=2)}
+{tool_result_str}
 
 CRITICAL: Apply the SECURITY ANALYSIS FRAMEWORK to analyze this result.
 
@@ -2880,51 +3729,29 @@ User's original question: "{user_query}"
 
 {self._analyzed_sessions_note()}
 
-ANALYSIS REQUIREMENTS:
-1. If the user asked for EKFiddle rules / CustomRegexes / signatures:
-   - Use this tool result to extract high-signal malicious patterns only
-   - Emit tab-separated rules NOW: Type	Severity: Name	Regex	Comment
-   - Types: SourceCode URI IP Headers Hash. Severity: High: Med: Low:
-   - End with a plain block of ONLY rule lines. Then STOP. No more tool calls.
-   - Do NOT invent IOCs. Do NOT write NitroPack/___mnag rules unless asked.
-2. Otherwise IOC-FIRST: search user-named hosts with host_pattern BEFORE Low EKFiddle HTML.
-3. Distinguish suspicious vs EKFiddle-flagged; Critical/High first; Low External Script Monitor last.
-4. ZERO-HIT: if a host search returned 0 matches, search parent apex / url_pattern next. Do not invent hosts.
-5. Do NOT re-fetch session bodies already listed above.
-6. If response_body contains JavaScript, focus on BEHAVIOR over strings.
-
-{self._get_tool_names_list()}
-
-IMPORTANT: Do NOT invent tool names. Use ONLY the tools listed above.
-session_id must be a plain string. sessions_search has no "query" field — use host_pattern / content_type.
-If you need to call another tool, put brief findings then JSON: {{"tool": "tool_name", "arguments": {{...}}}}
-
-Otherwise, provide your security-focused analysis or EKFiddle rules."""
+{self._tool_prompt_tail("analysis")}"""
                 
                 # Log tool result size for context
-                tool_result_str = json.dumps(tool_result, indent=2)
                 tool_result_size = len(tool_result_str)
                 analysis_prompt_len = len(analysis_prompt)
                 self.log_with_timestamp(f"Gemini Request: type=tool_analysis, tool_result_size={self._format_size(tool_result_size)}", to_console=False)
-                self.log_with_timestamp(f"Gemini Request: analysis_prompt_length={analysis_prompt_len} chars (~{self._estimate_tokens(analysis_prompt)} tokens)", to_console=False)
+                self.log_with_timestamp(f"Gemini Request: analysis_prompt_length={analysis_prompt_len} chars (~{self._estimate_tokens(analysis_prompt_len)} tokens)", to_console=False)
                 
                 # Show console feedback
-                sys.stdout.write("\r  Waiting for Gemini LLM analysis...")
-                sys.stdout.flush()
+                _status_line("  Waiting for Gemini LLM analysis...")
                 
-                analysis_start = time.time()
+                analysis_start = time.perf_counter()
                 self._check_interrupt()
-                analysis_response = self.model.generate_content(analysis_prompt)
+                analysis_response = self._generate_legacy(analysis_prompt, early_tool=True)
                 self._check_interrupt()
-                analysis_elapsed_ms = int((time.time() - analysis_start) * 1000)
+                analysis_elapsed_ms = int((time.perf_counter() - analysis_start) * 1000)
                 analysis_elapsed_s = analysis_elapsed_ms / 1000
                 total_gemini_time += analysis_elapsed_s
                 
                 # Show completion
-                sys.stdout.write(f"\r  [Gemini LLM] Analysis complete ({analysis_elapsed_s:.1f}s)                    \n")
-                sys.stdout.flush()
+                _status_line(f"  [Gemini LLM] Analysis complete ({analysis_elapsed_s:.1f}s)", done=True)
                 
-                final_text = extract_text_safe(analysis_response)
+                final_text = self._extract_response_text(analysis_response)
                 analysis_finish_reason = self._extract_finish_reason(analysis_response)
                 
                 # Enhanced analysis response logging
@@ -2932,7 +3759,8 @@ Otherwise, provide your security-focused analysis or EKFiddle rules."""
                 self.log_with_timestamp(f"Gemini Response: finish_reason={analysis_finish_reason}", to_console=False)
                 
                 # If blocked, provide helpful error message
-                if not final_text:
+                analysis_blocked = not final_text
+                if analysis_blocked:
                     self.log_with_timestamp(f"Gemini Warning: finish_reason={analysis_finish_reason}, analysis blocked", to_console=False)
                     final_text = "Analysis blocked by safety filters. This may indicate the content contains potentially harmful code. Try: 'Analyze session X for malicious patterns' with a fresh request."
                 
@@ -2950,11 +3778,12 @@ Otherwise, provide your security-focused analysis or EKFiddle rules."""
                     
                     if not next_tool_call:
                         # Log completion with query summary
-                        total_time = time.time() - query_start_time
+                        total_time = time.perf_counter() - query_start_time
                         self.log_with_timestamp(f"Gemini Response: no further tool calls, providing analysis", to_console=False)
                         self.log_with_timestamp(f"Tool Chain: completed after {tool_call_count} tool calls", to_console=False)
                         self.log_with_timestamp(f"Query Summary: gemini_api={total_gemini_time:.1f}s, bridge={total_bridge_time:.1f}s, total={total_time:.1f}s", to_console=False)
                         self.log_with_timestamp(f"Query Summary: tool_calls={tool_call_count}, follow_ups={followup_count}", to_console=False)
+                        self._answered = not analysis_blocked
                         self.conversation_history.append({"role": "assistant", "content": current_text})
                         return self._finalize_assistant_response(current_text)
                     
@@ -2963,10 +3792,9 @@ Otherwise, provide your security-focused analysis or EKFiddle rules."""
                     if explanatory_text.strip():
                         self.maybe_persist_ekfiddle_rules(explanatory_text)
                         self.conversation_history.append({"role": "assistant", "content": explanatory_text})
-                        if self.use_rich and self.console:
+                        if self.use_rich and self._rich_console():
                             self.console.print("\n[bold cyan]< Gemini:[/bold cyan]")
                             if self._looks_like_markdown(explanatory_text):
-                                from rich.markdown import Markdown
                                 md = Markdown(explanatory_text)
                                 self.console.print(md)
                             else:
@@ -2981,23 +3809,24 @@ Otherwise, provide your security-focused analysis or EKFiddle rules."""
                     
                     # Execute follow-up tool with timing
                     self._check_interrupt()
-                    bridge_start = time.time()
-                    next_tool_result = self.call_tool(next_tool_name, next_arguments)
+                    bridge_start = time.perf_counter()
+                    next_tool_name, next_tool_result = self._call_legacy_tool(next_tool_call)
                     self._check_interrupt()
-                    bridge_elapsed = time.time() - bridge_start
+                    bridge_elapsed = time.perf_counter() - bridge_start
                     total_bridge_time += bridge_elapsed
-                    tool_call_count += 1
+                    tool_call_count += len(next_tool_call.get("batch") or (next_tool_call,))
                     self.log_with_timestamp(f"Tool Chain: call #{tool_call_count} -> {next_tool_name} ({bridge_elapsed*1000:.0f}ms)", to_console=False)
                     
+                    followup_result_str = _prompt_json(next_tool_result)
                     self.conversation_history.append({
                         "role": "tool",
                         "tool": next_tool_name,
-                        "content": json.dumps(next_tool_result, indent=2)
+                        "content": followup_result_str
                     })
                     
                     followup_prompt = f"""The tool '{next_tool_name}' returned this result:
 
-{json.dumps(next_tool_result, indent=2)}
+{followup_result_str}
 
 CRITICAL: Apply SECURITY ANALYSIS FRAMEWORK. Analyze ONLY this new data. DO NOT repeat previous summary.
 
@@ -3005,51 +3834,29 @@ User's original question: "{user_query}"
 
 {self._analyzed_sessions_note()}
 
-ANALYSIS REQUIREMENTS:
-1. If the user asked for EKFiddle rules / CustomRegexes / signatures and you have malicious SourceCode evidence:
-   - Emit final tab-separated rules NOW and STOP. No more session hopping.
-   - Format: Type	Severity: Name	Regex	OptionalComment
-   - Do NOT invent IOCs. Do NOT target NitroPack/___mnag unless asked.
-2. Otherwise continue the IOC hunt only for user-named hosts still unsearched or 0-hit parent apex / url_pattern.
-3. Be clear on ekfiddle_comment severity; Critical/High first; Low External Script Monitor last.
-4. If obfuscated JavaScript OR Critical/High EKFiddle, run MALICIOUS PATTERN CHECKLIST:
-   [ ] Iframe/Script Injection
-   [ ] Redirection (window.location)
-   [ ] Anti-Analysis (referrer checks, localStorage counters)
-   [ ] Overlay/UI Hijacking (position:fixed, z-index)
-   [ ] Dynamic Code Execution (eval, Function constructor)
-5. Focus on BEHAVIOR over string content. Correlate with EKFiddle when present.
-6. Do NOT re-fetch already analyzed session IDs listed above.
-7. Provide NEW findings only, then either call another tool OR give the final answer.
-
-{self._get_tool_names_list()}
-
-IMPORTANT: Do NOT invent tool names. session_id must be a plain string. No "query" param on sessions_search.
-If calling a tool: brief note then {{"tool": "tool_name", "arguments": {{...}}}}"""
+{self._tool_prompt_tail("followup")}"""
                     
                     # Log follow-up prompt details
-                    followup_result_str = json.dumps(next_tool_result, indent=2)
                     followup_result_size = len(followup_result_str)
+                    followup_prompt_len = len(followup_prompt)
                     self.log_with_timestamp(f"Gemini Request: type=followup_analysis, tool_result_size={self._format_size(followup_result_size)}", to_console=False)
-                    self.log_with_timestamp(f"Gemini Request: followup_prompt_length={len(followup_prompt)} chars (~{self._estimate_tokens(followup_prompt)} tokens)", to_console=False)
+                    self.log_with_timestamp(f"Gemini Request: followup_prompt_length={followup_prompt_len} chars (~{self._estimate_tokens(followup_prompt_len)} tokens)", to_console=False)
                     
                     # Show console feedback
-                    sys.stdout.write(f"\r  Waiting for Gemini LLM follow-up #{followup_count}...")
-                    sys.stdout.flush()
+                    _status_line(f"  Waiting for Gemini LLM follow-up #{followup_count}...")
                     
-                    followup_start = time.time()
+                    followup_start = time.perf_counter()
                     self._check_interrupt()
-                    followup_response = self.model.generate_content(followup_prompt)
+                    followup_response = self._generate_legacy(followup_prompt, early_tool=True)
                     self._check_interrupt()
-                    followup_elapsed_ms = int((time.time() - followup_start) * 1000)
+                    followup_elapsed_ms = int((time.perf_counter() - followup_start) * 1000)
                     followup_elapsed_s = followup_elapsed_ms / 1000
                     total_gemini_time += followup_elapsed_s
                     
                     # Show completion
-                    sys.stdout.write(f"\r  [Gemini LLM] Follow-up #{followup_count} complete ({followup_elapsed_s:.1f}s)                    \n")
-                    sys.stdout.flush()
+                    _status_line(f"  [Gemini LLM] Follow-up #{followup_count} complete ({followup_elapsed_s:.1f}s)", done=True)
                     
-                    current_text = extract_text_safe(followup_response)
+                    current_text = self._extract_response_text(followup_response)
                     followup_finish_reason = self._extract_finish_reason(followup_response)
                     
                     # Enhanced follow-up response logging
@@ -3061,19 +3868,20 @@ If calling a tool: brief note then {{"tool": "tool_name", "arguments": {{...}}}}
                         self.log_with_timestamp(f"Gemini Warning: finish_reason={followup_finish_reason}, follow-up blocked", to_console=False)
                         current_text = "Follow-up analysis blocked by safety filters. The content may contain malicious code patterns."
                         # Log query summary even on blocked response
-                        total_time = time.time() - query_start_time
+                        total_time = time.perf_counter() - query_start_time
                         self.log_with_timestamp(f"Query Summary: gemini_api={total_gemini_time:.1f}s, bridge={total_bridge_time:.1f}s, total={total_time:.1f}s", to_console=False)
                         self.conversation_history.append({"role": "assistant", "content": current_text})
                         return self._finalize_assistant_response(current_text)
                     followup_count += 1
                 
                 # Reached max follow-ups — force synthesis without dangling tool JSON
-                total_time = time.time() - query_start_time
+                total_time = time.perf_counter() - query_start_time
                 self.log_with_timestamp(f"Gemini Warning: reached max follow-up limit ({max_followups})", to_console=False)
                 self.log_with_timestamp(f"Tool Chain: completed after {tool_call_count} tool calls (limit reached)", to_console=False)
 
                 pending_call = self.parse_gemini_response(current_text)
                 evidence_text = self._strip_tool_json_from_text(current_text)
+                synthesized = False
                 if pending_call or (current_text and current_text != evidence_text):
                     self.log_with_timestamp("Forcing final synthesis after tool budget exhausted", to_console=False)
                     synthesis_prompt = f"""Tool call budget exhausted ({max_followups} calls). Do NOT request another tool.
@@ -3093,17 +3901,16 @@ Provide a FINAL SYNTHESIS only:
 - Clear next manual steps if evidence is incomplete
 Do not emit any tool JSON."""
                     try:
-                        sys.stdout.write("\r  Waiting for Gemini LLM final synthesis...")
-                        sys.stdout.flush()
-                        synth_start = time.time()
-                        synth_resp = self.model.generate_content(synthesis_prompt)
-                        synth_elapsed = time.time() - synth_start
+                        _status_line("  Waiting for Gemini LLM final synthesis...")
+                        synth_start = time.perf_counter()
+                        synth_resp = self._generate_legacy(synthesis_prompt)
+                        synth_elapsed = time.perf_counter() - synth_start
                         total_gemini_time += synth_elapsed
-                        sys.stdout.write(f"\r  [Gemini LLM] Final synthesis complete ({synth_elapsed:.1f}s)                    \n")
-                        sys.stdout.flush()
-                        synth_text = extract_text_safe(synth_resp)
+                        _status_line(f"  [Gemini LLM] Final synthesis complete ({synth_elapsed:.1f}s)", done=True)
+                        synth_text = self._extract_response_text(synth_resp)
                         if synth_text:
                             current_text = self._strip_tool_json_from_text(synth_text)
+                            synthesized = True
                         else:
                             current_text = evidence_text or "Tool budget reached. Unable to complete further automated investigation."
                     except Exception as synth_err:
@@ -3114,14 +3921,16 @@ Do not emit any tool JSON."""
 
                 self.log_with_timestamp(f"Query Summary: gemini_api={total_gemini_time:.1f}s, bridge={total_bridge_time:.1f}s, total={total_time:.1f}s", to_console=False)
                 self.log_with_timestamp(f"Query Summary: tool_calls={tool_call_count}, follow_ups={followup_count}", to_console=False)
+                self._answered = synthesized or bool(evidence_text)
                 self.conversation_history.append({"role": "assistant", "content": current_text})
                 return self._finalize_assistant_response(current_text)
             else:
                 # Direct response from Gemini (no tool needed)
-                total_time = time.time() - query_start_time
+                total_time = time.perf_counter() - query_start_time
                 self.log_with_timestamp(f"Gemini Response: no tool call, direct response", to_console=False)
                 self.log_with_timestamp(f"Query Summary: gemini_api={total_gemini_time:.1f}s, bridge=0.0s, total={total_time:.1f}s", to_console=False)
                 self.log_with_timestamp(f"Query Summary: tool_calls=0, follow_ups=0", to_console=False)
+                self._answered = bool(gemini_text)
                 self.conversation_history.append({"role": "assistant", "content": gemini_text})
                 return self._finalize_assistant_response(gemini_text)
                 
@@ -3158,22 +3967,186 @@ Do not emit any tool JSON."""
         """Clear only the local conversation history."""
         self.conversation_history.clear()
 
+    def _capture_fingerprint(self) -> Optional[Tuple[Any, ...]]:
+        """(total, suspicious, last_activity) of the bridge buffer, or None if unreachable."""
+        try:
+            with urllib.request.urlopen(f"{self.bridge_url}/api/stats", timeout=2) as resp:
+                stats = _json_loads(resp.read())
+        except Exception:
+            return None
+        if not isinstance(stats, dict) or not stats.get("success"):
+            return None
+        return (stats.get("total_sessions"), stats.get("suspicious_sessions"), stats.get("last_activity"))
+
+    def _response_cache_path(self, user_query: str, fingerprint: Tuple[Any, ...]) -> Path:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(_canonical_json([
+            self.provider_name, self.model_name, fingerprint, self.conversation_history, user_query,
+        ]))
+        return RESPONSE_CACHE_DIR / f"{digest.hexdigest()}.json"
+
+    def chat_cached(self, user_query: str) -> str:
+        """chat() behind the on-disk response cache.
+
+        A hit replays the stored answer and the history entries the original
+        turn added, so later questions see the same context. Only turns where
+        chat() produced a model answer are stored (not errors, interrupts or
+        safety-blocked notices); expired or unreadable entries are deleted.
+        """
+        self._reply_streamed = False
+        if not getattr(self, "use_response_cache", False):
+            return self.chat(user_query)
+        fingerprint = self._capture_fingerprint()
+        if fingerprint is None:
+            return self.chat(user_query)
+        path = self._response_cache_path(user_query, fingerprint)
+        try:
+            entry = _json_loads(path.read_bytes())
+            if time.time() - entry["ts"] <= RESPONSE_CACHE_TTL:
+                self.conversation_history.extend(entry["history"])
+                self._user_query_count += 1
+                self.log_with_timestamp(f"Response Cache: hit {path.name}", to_console=False)
+                print("[*] Capture unchanged since this question was last answered; reusing that answer")
+                return entry["response"]
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        start = len(self.conversation_history)
+        response = self.chat(user_query)
+        added = self.conversation_history[start:]
+        if not self._answered or any(e.get("role") in ("error", "system") for e in added):
+            return response
+        try:
+            RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(_json_dumps({"ts": time.time(), "response": response, "history": added}))
+            os.replace(tmp, path)
+        except (OSError, TypeError):
+            pass
+        return response
+
+    def _sweep_response_cache(self) -> None:
+        """Delete stored answers (captured-traffic excerpts) older than RESPONSE_CACHE_TTL."""
+        cutoff = time.time() - RESPONSE_CACHE_TTL
+        try:
+            paths = list(RESPONSE_CACHE_DIR.iterdir())
+        except OSError:
+            return
+        for path in paths:
+            try:
+                if path.suffix in (".json", ".tmp") and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def clear_response_cache(self) -> int:
+        """Delete stored answers; returns how many were removed."""
+        removed = 0
+        for path in RESPONSE_CACHE_DIR.glob("*.json"):
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _enable_input_history(self) -> Any:
+        """Turn on readline editing/history for input(); returns the readline module or None."""
+        try:
+            import readline
+        except ImportError:
+            return None
+        try:
+            readline.read_history_file(INPUT_HISTORY_FILE)
+        except OSError:
+            pass
+        readline.set_history_length(INPUT_HISTORY_LENGTH)
+        try:
+            readline.write_history_file(INPUT_HISTORY_FILE)  # trims the file to the limit
+        except OSError:
+            return None
+        return readline
+
+    # /command -> (method name, whether it takes an argument); /quit is handled by the loop
+    _COMMANDS = {
+        "/help": ("show_help", False),
+        "/stats": ("show_stats", False),
+        "/tools": ("show_tools", False),
+        "/history": ("show_history", False),
+        "/clear": ("_cmd_clear", False),
+        "/clearchat": ("_cmd_clearchat", False),
+        "/cache": ("_cmd_cache", True),
+        "/investigate": ("_cmd_investigate", True),
+        "/model": ("_cmd_model", True),
+    }
+
+    def _cmd_clear(self) -> None:
+        print("\n[*] Clearing bridge capture buffers...")
+        result = self.clear_bridge_buffer()
+        if result.get("success") is False or result.get("error"):
+            print(f"[X] Clear failed: {result.get('error') or result}")
+        else:
+            counts = result.get("cleared_counts") or {}
+            live_n = counts.get("live_sessions", result.get("sessions_cleared", "?"))
+            sus_n = counts.get(
+                "suspicious_sessions",
+                result.get("suspicious_cleared", "?"),
+            )
+            print(
+                f"[+] Bridge buffers cleared "
+                f"(live={live_n}, suspicious={sus_n})"
+            )
+
+    def _cmd_clearchat(self) -> None:
+        self.clear_chat_history()
+        print("[+] Conversation history cleared")
+
+    def _cmd_cache(self, arg: str) -> None:
+        if arg != "clear":
+            print(f"Unknown command: /cache {arg}".rstrip())
+            return
+        print(f"[+] Response cache cleared ({self.clear_response_cache()} answers)")
+
+    def _cmd_investigate(self, host_arg: str) -> None:
+        prompt = self.build_investigate_prompt(host_arg or None)
+        print(f"\n[*] Running investigate playbook{' for ' + host_arg if host_arg else ''}...")
+        response = self.chat_cached(prompt)
+        self._flush_log()
+        if self._reply_streamed:
+            pass  # answer was rendered while it streamed
+        elif self.use_rich and self._rich_console():
+            self.console.print("\n[bold cyan]< Gemini:[/bold cyan]")
+            if self._looks_like_markdown(response):
+                md = Markdown(response)
+                self.console.print(md)
+            else:
+                self.console.print(response)
+        else:
+            print("\n< Gemini: ", end="", flush=True)
+            print(response)
+
+    def _cmd_model(self, model_arg: str) -> None:
+        if model_arg:
+            self.change_model(model_arg)
+        else:
+            self.show_models()
+
     def interactive_mode(self):
         """Run interactive chat session"""
-        print("\n" + "=" * 70)
-        print("Fiddler Traffic Analyzer")
-        print(f"Provider: {self.provider_name}  Model: {self.model_name}")
-        print("=" * 70)
-        print("\nAsk questions about your Fiddler traffic in natural language!")
-        print("Examples:")
-        print("  - Show me recent sessions from the last 5 minutes")
-        print("  - What hosts are in the captured traffic?")
-        print("  - Show me the body of session 240")
-        print("  - Are there any suspicious sessions?")
-        print("  - Search for JavaScript files from example.com")
-        self.show_commands_menu()
-        print("\nTip: During a tool chain, Ctrl+C stops that answer only and returns to the prompt.")
-        print("=" * 70)
+        rule = "=" * 70
+        # Only the provider/model line varies; the rest is module-level text
+        sys.stdout.write(
+            f"\n{rule}\nFiddler Traffic Analyzer\n"
+            f"Provider: {self.provider_name}  Model: {self.model_name}\n{rule}\n"
+            + _WELCOME_EXAMPLES + _COMMANDS_MENU + _CTRL_C_TIP + rule + "\n"
+        )
+        sys.stdout.flush()
+        readline = self._enable_input_history()
         
         while True:
             try:
@@ -3181,67 +4154,31 @@ Do not emit any tool JSON."""
                 
                 if not user_input:
                     continue
+                if readline is not None:
+                    try:
+                        readline.append_history_file(1, INPUT_HISTORY_FILE)
+                    except (AttributeError, OSError):
+                        pass
                 
                 # Handle commands
                 if user_input.startswith("/"):
                     if user_input == "/quit":
                         print("\nGoodbye!")
                         break
-                    elif user_input == "/help":
-                        self.show_help()
-                    elif user_input == "/stats":
-                        self.show_stats()
-                    elif user_input == "/tools":
-                        self.show_tools()
-                    elif user_input == "/history":
-                        self.show_history()
-                    elif user_input == "/clear":
-                        print("\n[*] Clearing bridge capture buffers...")
-                        result = self.clear_bridge_buffer()
-                        if result.get("success") is False or result.get("error"):
-                            print(f"[X] Clear failed: {result.get('error') or result}")
-                        else:
-                            counts = result.get("cleared_counts") or {}
-                            live_n = counts.get("live_sessions", result.get("sessions_cleared", "?"))
-                            sus_n = counts.get(
-                                "suspicious_sessions",
-                                result.get("suspicious_cleared", "?"),
-                            )
-                            print(
-                                f"[+] Bridge buffers cleared "
-                                f"(live={live_n}, suspicious={sus_n})"
-                            )
-                    elif user_input == "/clearchat":
-                        self.clear_chat_history()
-                        print("[+] Conversation history cleared")
-                    elif user_input == "/investigate" or user_input.startswith("/investigate "):
-                        host_arg = ""
-                        if user_input.startswith("/investigate "):
-                            host_arg = user_input[len("/investigate ") :].strip()
-                        prompt = self.build_investigate_prompt(host_arg or None)
-                        print(f"\n[*] Running investigate playbook{' for ' + host_arg if host_arg else ''}...")
-                        response = self.chat(prompt)
-                        if self.use_rich and self.console:
-                            self.console.print("\n[bold cyan]< Gemini:[/bold cyan]")
-                            if self._looks_like_markdown(response):
-                                md = Markdown(response)
-                                self.console.print(md)
-                            else:
-                                self.console.print(response)
-                        else:
-                            print("\n< Gemini: ", end="", flush=True)
-                            print(response)
-                    elif user_input == "/model":
-                        self.show_models()
-                    elif user_input.startswith("/model "):
-                        model_arg = user_input[7:].strip()
-                        self.change_model(model_arg)
-                    else:
+                    cmd, _, arg = user_input.partition(" ")
+                    arg = arg.strip()
+                    entry = self._COMMANDS.get(cmd)
+                    if entry is None or (arg and not entry[1]):
                         print(f"Unknown command: {user_input}")
+                    elif entry[1]:
+                        getattr(self, entry[0])(arg)
+                    else:
+                        getattr(self, entry[0])()
                     continue
                 
                 # Process natural language query
-                response = self.chat(user_input)
+                response = self.chat_cached(user_input)
+                self._flush_log()
                 label = (
                     getattr(self.llm_provider, "display_label", self.provider_name)
                     if self.llm_provider
@@ -3249,7 +4186,9 @@ Do not emit any tool JSON."""
                 )
 
                 # Render response with rich formatting if available
-                if self.use_rich and self.console:
+                if self._reply_streamed:
+                    pass  # answer was rendered while it streamed
+                elif self.use_rich and self._rich_console():
                     self.console.print(f"\n[bold cyan]< {label}:[/bold cyan]")
                     # Detect if response is markdown and render accordingly
                     if self._looks_like_markdown(response):
@@ -3271,89 +4210,52 @@ Do not emit any tool JSON."""
 
     def show_commands_menu(self):
         """Print the slash-command menu (same list as startup)."""
-        print("\nCommands:")
-        print("  /help         - Show this menu and example queries")
-        print("  /stats        - Show bridge statistics")
-        print("  /tools        - List available tools")
-        print("  /model        - Show/change LLM model (Gemini, DeepSeek, or OpenRouter)")
-        print("  /history      - Show conversation history")
-        print("  /clear        - Clear bridge capture buffers (live + suspicious)")
-        print("  /clearchat    - Clear conversation history")
-        print("  /investigate  - Hunt malicious traffic in the current buffer")
-        print("  /investigate <host> - Same playbook, prioritize a host")
-        print("  /quit         - Exit")
-        print("\nModels: Gemini default; DeepSeek 12-13; OpenRouter 14-18 (e.g. /model 14 or z-ai/glm-5.2)")
-        print("        Missing DeepSeek/OpenRouter keys: /model prompts and saves to gemini-fiddler-config.json")
-        print("        /investigate and EKFiddle authoring work on all providers")
+        sys.stdout.write(_COMMANDS_MENU)
+        sys.stdout.flush()
 
     def show_help(self):
         """Show slash-command menu and example queries."""
-        print("\n" + "=" * 70)
-        print("Fiddler Traffic Analyzer - Commands and Examples")
-        print("=" * 70)
-        self.show_commands_menu()
-        print("\nTip: During a tool chain, Ctrl+C stops that answer only and returns to the prompt.")
-        print("\n[*] OVERVIEW QUERIES:")
-        print("  - Show me statistics about the captured traffic")
-        print("  - How many sessions are in the buffer?")
-        print("  - What's the status of the Fiddler bridge?")
-        print("\n[*] SESSION QUERIES:")
-        print("  - Show me the last 20 sessions")
-        print("  - Get sessions from the last 10 minutes")
-        print("  - Show me only suspicious sessions")
-        print("  - Find all sessions from example.com")
-        print("\n[*] DETAILED ANALYSIS:")
-        print("  - Show me the headers for session 189")
-        print("  - Get the response body for session 240")
-        print("  - Analyze session 191 for threats")
-        print("\n[*] ADVANCED SEARCHES:")
-        print("  - Search for POST requests with status 404")
-        print("  - Find all JavaScript files from cdn.example.com")
-        print("  - Show me sessions larger than 1MB")
-        print("  - Get all failed requests (status >= 400)")
-        print("\n[*] INVESTIGATE:")
-        print("  - /investigate")
-        print("  - /investigate example.com")
-        print("  - Investigate the capture buffer for malicious traffic")
-        print("\n[*] BUFFER:")
-        print("  - /clear        Clear bridge live + suspicious buffers between cases")
-        print("  - /clearchat    Clear conversation history only")
-        print("=" * 70)
+        sys.stdout.write(_HELP_HEADER + _COMMANDS_MENU + _HELP_EXAMPLES)
+        sys.stdout.flush()
 
     def show_stats(self):
         """Show current bridge statistics"""
         print("\n[*] Fetching bridge statistics...")
         result = self.call_tool("fiddler_mcp__live_stats", {})
         if "error" not in result:
-            print(f"\n[+] Bridge Status: {result.get('bridge_status', 'Unknown')}")
-            print(f"  Total Sessions: {result.get('total_sessions', 0)}")
-            print(f"  Buffered: {result.get('buffered_sessions', 0)}")
-            print(f"  Suspicious: {result.get('suspicious_sessions', 0)}")
-            print(f"  Uptime: {result.get('uptime_hours', 0):.1f} hours")
-            print(f"  Last Minute: {result.get('last_minute', 0)} sessions")
-            print(f"  Last Hour: {result.get('last_hour', 0)} sessions")
+            sys.stdout.write(
+                f"\n[+] Bridge Status: {result.get('bridge_status', 'Unknown')}\n"
+                f"  Total Sessions: {result.get('total_sessions', 0)}\n"
+                f"  Buffered: {result.get('buffered_sessions', 0)}\n"
+                f"  Suspicious: {result.get('suspicious_sessions', 0)}\n"
+                f"  Uptime: {result.get('uptime_hours', 0):.1f} hours\n"
+                f"  Last Minute: {result.get('last_minute', 0)} sessions\n"
+                f"  Last Hour: {result.get('last_hour', 0)} sessions\n"
+            )
+            sys.stdout.flush()
         else:
             print(f"\n[X] Error: {result.get('error')}")
 
     def show_tools(self):
         """Show available MCP tools"""
-        print("\n" + "=" * 70)
-        print("Available Fiddler MCP Tools")
-        print("=" * 70)
-        for i, tool in enumerate(self.available_tools, 1):
-            name = tool.get("name", "")
-            desc = tool.get("description", "")
-            print(f"\n{i}. {name}")
-            print(f"   {desc}")
-        print("=" * 70)
+        # Rendered once per tool list; list_tools() swaps in a new list when tools change
+        cached = getattr(self, "_tools_help_cached", None)
+        if cached is None or cached[0] is not self.available_tools:
+            rule = "=" * 70
+            parts = ["\n", rule, "\nAvailable Fiddler MCP Tools\n", rule, "\n"]
+            for i, tool in enumerate(self.available_tools, 1):
+                parts.append(f"\n{i}. {tool.get('name', '')}\n   {tool.get('description', '')}\n")
+            parts.extend((rule, "\n"))
+            cached = self._tools_help_cached = (self.available_tools, "".join(parts))
+        sys.stdout.write(cached[1])
+        sys.stdout.flush()
 
     def show_history(self):
         """Show conversation history"""
-        print("\n" + "=" * 70)
-        print("Conversation History")
-        print("=" * 70)
+        rule = "=" * 70
+        parts = ["\n", rule, "\nConversation History\n", rule, "\n"]
         if not self.conversation_history:
-            print("No conversation history yet.")
+            parts.append("No conversation history yet.\n")
         else:
             for i, entry in enumerate(self.conversation_history, 1):
                 role = entry.get("role", "unknown").upper()
@@ -3364,43 +4266,45 @@ Do not emit any tool JSON."""
                 if len(content) > 300:
                     content = content[:300] + "... [truncated]"
                 
-                if tool:
-                    print(f"\n[{i}] {role} ({tool}):")
-                else:
-                    print(f"\n[{i}] {role}:")
-                print(f"  {content}")
-        print("=" * 70)
+                label = f"{role} ({tool})" if tool else role
+                parts.append(f"\n[{i}] {label}:\n  {content}\n")
+        parts.extend((rule, "\n"))
+        # One write instead of two prints per entry keeps long histories fast
+        sys.stdout.write("".join(parts))
+        sys.stdout.flush()
 
     def show_models(self):
         """Show available Gemini, DeepSeek, and OpenRouter models and current selection"""
-        print("\n" + "=" * 70)
-        print("Available LLM Models")
-        print("=" * 70)
-        print(f"\nCurrent: provider={self.provider_name} model={self.model_name}")
+        rule = "=" * 70
         ds_status = "configured" if self.deepseek_api_key else "not set (will prompt on switch)"
         or_status = "configured" if self.openrouter_api_key else "not set (will prompt on switch)"
-        print(f"DeepSeek API key: {ds_status}")
-        print(f"OpenRouter API key: {or_status}")
-        print("\nGemini:")
-        for num, name in GEMINI_MODELS.items():
-            marker = " <-- CURRENT" if name == self.model_name else ""
-            print(f"  {num}. {name}{marker}")
-        print("\nDeepSeek (direct API):")
-        for num, name in DEEPSEEK_MODELS.items():
-            marker = " <-- CURRENT" if name == self.model_name else ""
-            print(f"  {num}. {name}{marker}")
-        print("\nOpenRouter:")
-        for num, name in OPENROUTER_MODELS.items():
-            marker = " <-- CURRENT" if name == self.model_name else ""
-            print(f"  {num}. {name}{marker}")
-        print("\nTo switch: /model <number> or /model <name>")
-        print(f"Example: /model 1  or  /model {DEFAULT_OPENROUTER_MODEL}")
-        print("Freeform OpenRouter: /model vendor/model (any id containing /)")
+        parts = [
+            "\n", rule, "\nAvailable LLM Models\n", rule, "\n",
+            f"\nCurrent: provider={self.provider_name} model={self.model_name}\n",
+            f"DeepSeek API key: {ds_status}\n",
+            f"OpenRouter API key: {or_status}\n",
+        ]
+        for title, models in (
+            ("Gemini", GEMINI_MODELS),
+            ("DeepSeek (direct API)", DEEPSEEK_MODELS),
+            ("OpenRouter", OPENROUTER_MODELS),
+        ):
+            parts.append(f"\n{title}:\n")
+            for num, name in models.items():
+                marker = " <-- CURRENT" if name == self.model_name else ""
+                parts.append(f"  {num}. {name}{marker}\n")
+        parts.append(
+            "\nTo switch: /model <number> or /model <name>\n"
+            f"Example: /model 1  or  /model {DEFAULT_OPENROUTER_MODEL}\n"
+            "Freeform OpenRouter: /model vendor/model (any id containing /)\n"
+        )
         if not self.deepseek_api_key:
-            print("DeepSeek models will ask for an API key and save it to gemini-fiddler-config.json")
+            parts.append("DeepSeek models will ask for an API key and save it to gemini-fiddler-config.json\n")
         if not self.openrouter_api_key:
-            print("OpenRouter models will ask for an API key and save it to gemini-fiddler-config.json")
-        print("=" * 70)
+            parts.append("OpenRouter models will ask for an API key and save it to gemini-fiddler-config.json\n")
+        parts.extend((rule, "\n"))
+        sys.stdout.write("".join(parts))
+        sys.stdout.flush()
 
     def prompt_and_save_deepseek_api_key(self) -> bool:
         """Prompt for DeepSeek API key, save to config, and apply in-memory. Returns True if set."""
@@ -3518,12 +4422,43 @@ Do not emit any tool JSON."""
                 pass
             print(f"[X] Failed to switch model: {e}")
 
+    def _stop_mcp_process(self):
+        """Stop the bridge subprocess without blocking on a hung child.
+
+        Closing stdin is enough in the common case; a child still running after
+        MCP_EXIT_GRACE_SECONDS is terminated, then killed.
+        """
+        proc = self.mcp_process
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        deadline = time.monotonic() + MCP_EXIT_GRACE_SECONDS
+        while proc.poll() is None:
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.02)
+        else:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=MCP_EXIT_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            try:
+                proc.wait(timeout=MCP_KILL_WAIT_SECONDS)
+            except subprocess.TimeoutExpired:
+                pass
+
     def close(self):
         """Clean up resources"""
+        self._tool_pool.shutdown(wait=False, cancel_futures=True)
+        # Let queued body dumps reach disk before exiting
+        self._dump_queue.put(None)
+        self._dump_writer.join(timeout=5)
+        self._close_llm_provider()
         if self.mcp_process:
-            self.mcp_process.stdin.close()
-            self.mcp_process.terminate()
-            self.mcp_process.wait(timeout=5)
+            self._stop_mcp_process()
         if self.mcp_stderr_file:
             try:
                 self.mcp_stderr_file.close()
@@ -3531,9 +4466,9 @@ Do not emit any tool JSON."""
                 self.mcp_stderr_file = None
         
         # Print session summary
-        duration = (datetime.now() - self.session_start).total_seconds()
+        duration = time.monotonic() - self._session_t0
         print(f"\nSession duration: {duration:.1f} seconds")
-        print(f"Queries processed: {len([h for h in self.conversation_history if h.get('role') == 'user'])}")
+        print(f"Queries processed: {self._user_query_count}")
 
 
 def config_file_path() -> Path:
@@ -3546,16 +4481,13 @@ def merge_save_config(updates: Dict[str, Any]) -> Path:
     config: Dict[str, Any] = {}
     if path.exists():
         try:
-            with open(path, encoding="utf-8") as f:
-                loaded = json.load(f)
+            loaded = _json_loads(path.read_bytes())
             if isinstance(loaded, dict):
                 config = loaded
         except Exception:
             config = {}
     config.update(updates)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2)
-        f.write("\n")
+    path.write_bytes(_config_json(config))
     return path
 
 
@@ -3566,8 +4498,7 @@ def load_config() -> Dict[str, str]:
     # Try to load from config file (including stub with empty keys)
     if config_file.exists():
         try:
-            with open(config_file) as f:
-                config = json.load(f)
+            config = _json_loads(config_file.read_bytes())
             if isinstance(config, dict):
                 config.setdefault("auto_save_full_bodies", False)
                 config.setdefault("model", DEFAULT_GEMINI_MODEL)
@@ -3611,7 +4542,7 @@ def load_config() -> Dict[str, str]:
             "model": model,
             "deepseek_base_url": os.getenv("DEEPSEEK_BASE_URL", DEEPSEEK_BASE_URL),
             "openrouter_base_url": os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL),
-            "auto_save_full_bodies": os.getenv("GEMINI_AUTO_SAVE_FULL_BODIES", "false").lower() in {"1", "true", "yes", "on"},
+            "auto_save_full_bodies": os.getenv("GEMINI_AUTO_SAVE_FULL_BODIES", "false").lower() in _TRUTHY,
         }
     
     return {}
@@ -3677,11 +4608,10 @@ def create_config_file():
     print(f"\n[+] Selected provider={provider} model={model}")
     
     # Detect OS and use appropriate Python command
-    import platform
     python_cmd = "python" if platform.system() == "Windows" else "python3"
     
     auto_save_prompt = input("\nSave full response bodies to disk automatically? [y/N]: ").strip().lower()
-    auto_save_full_bodies = auto_save_prompt in {"y", "yes"}
+    auto_save_full_bodies = auto_save_prompt in _YES
 
     config = {
         "api_key": api_key,
@@ -3700,8 +4630,7 @@ def create_config_file():
     
     config_file = config_file_path()
     try:
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        config_file.write_bytes(_config_json(config))
         print(f"\n[+] Configuration saved to {config_file}")
         return config
     except Exception as e:
@@ -3712,9 +4641,6 @@ def create_config_file():
 
 def main():
     """Main entry point"""
-    import platform
-    import signal
-
     print("\nFiddler Traffic Analyzer (Gemini default; DeepSeek / OpenRouter optional)")
     print("=" * 70)
 
@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import json
 import re
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple
 
 # Gemini function name: letter/underscore start; a-zA-Z0-9_.; max 64
@@ -17,6 +18,12 @@ _FUNC_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]{0,63}$")
 DEFAULT_MAX_RESPONSE_CHARS = 48_000
 BODY_FIELD_MAX_CHARS = 24_000
 
+# Backoff for transient generateContent failures (429 / 500 / 503): 0.5s, 1s, 2s, 4s...
+# until RETRY_BUDGET_SECONDS have passed since the first attempt
+RETRY_INITIAL_SECONDS = 0.5
+RETRY_MAX_SECONDS = 4.0
+RETRY_BUDGET_SECONDS = 20.0
+
 
 def is_valid_gemini_function_name(name: str) -> bool:
     return bool(name and _FUNC_NAME_RE.match(name))
@@ -271,6 +278,35 @@ def tool_config(mode: str = "AUTO", allowed_function_names: Optional[List[str]]
     return protos.ToolConfig(function_calling_config=fc)
 
 
+@lru_cache(maxsize=1)
+def _transient_retry():
+    """google.api_core Retry for rate-limit / server errors; None if api_core is unavailable."""
+    try:
+        from google.api_core import exceptions, retry
+    except ImportError:
+        return None
+    return retry.Retry(
+        predicate=retry.if_exception_type(
+            exceptions.ResourceExhausted,
+            exceptions.InternalServerError,
+            exceptions.ServiceUnavailable,
+        ),
+        initial=RETRY_INITIAL_SECONDS,
+        maximum=RETRY_MAX_SECONDS,
+        multiplier=2.0,
+        timeout=RETRY_BUDGET_SECONDS,
+    )
+
+
+def request_options(timeout: float) -> Dict[str, Any]:
+    """generate_content request_options: per-attempt timeout plus transient-error backoff."""
+    options: Dict[str, Any] = {"timeout": timeout}
+    policy = _transient_retry()
+    if policy is not None:
+        options["retry"] = policy
+    return options
+
+
 def investigation_system_instruction(max_followups: int = 20) -> str:
     """Stable system instruction for native tool-calling investigations."""
     from llm_prompts import investigation_system_instruction as _shared
@@ -2,6 +2,7 @@
 """DeepSeek OpenAI-compatible native tool provider."""
 from __future__ import annotations
 
+import importlib.util
 import json
 import os
 from typing import Any, Dict, List, Optional, Tuple, Union
@@ -11,6 +12,9 @@ from gemini_native_tools import truncate_tool_result_for_model
 
 DEFAULT_DEEPSEEK_BASE_URL = "https://api.deepseek.com"
 DEFAULT_DEEPSEEK_MODEL = "deepseek-v4-flash"
+# Idle provider connections are kept this long (httpx default is 5s, shorter
+# than a tool round trip plus the next question, so most calls paid a TLS handshake)
+HTTP_KEEPALIVE_SECONDS = 120.0
 
 
 def resolve_ssl_verify(config_flag: Optional[Any] = None) -> Union[bool, str]:
@@ -53,6 +57,16 @@ def resolve_ssl_verify(config_flag: Optional[Any] = None) -> Union[bool, str]:
         return True
 
 
+def pooled_http_client_kwargs() -> Dict[str, Any]:
+    """Keep-alive pool settings for provider httpx clients; HTTP/2 when h2 is installed."""
+    import httpx
+
+    return {
+        "http2": importlib.util.find_spec("h2") is not None,
+        "limits": httpx.Limits(max_keepalive_connections=5, keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+    }
+
+
 class DeepSeekProvider:
     name = "deepseek"
     display_label = "DeepSeek"
@@ -82,7 +96,9 @@ class DeepSeekProvider:
         else:
             print(f"[*] DeepSeek TLS verify: {self._ssl_verify}")
         timeout = float(os.environ.get("DEEPSEEK_HTTP_TIMEOUT", "90"))
-        self._http_client = httpx.Client(verify=self._ssl_verify, timeout=timeout)
+        self._http_client = httpx.Client(
+            verify=self._ssl_verify, timeout=timeout, **pooled_http_client_kwargs()
+        )
         self._client = OpenAI(
             api_key=api_key,
             base_url=self.base_url,
@@ -2,14 +2,30 @@
 """Gemini native tool provider wrapping gemini_native_tools helpers."""
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+import datetime
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import gemini_native_tools as native
 
+# Explicit context caching of the bound tools + system instruction (GEMINI_CONTEXT_CACHE=0
+# disables it). Gemini rejects caches below a minimum size, so smaller prefixes skip it.
+CONTEXT_CACHE_MIN_TOKENS = 2048
+CONTEXT_CACHE_TTL = datetime.timedelta(minutes=30)
+# Recreate the cache this long before it expires rather than let a request hit a dead cache
+CONTEXT_CACHE_REFRESH_MARGIN = 60.0
+
+
+def _context_cache_enabled() -> bool:
+    return os.environ.get("GEMINI_CONTEXT_CACHE", "1").strip().lower() not in {"0", "false", "no", "off"}
+
 
 class GeminiProvider:
     name = "gemini"
     display_label = "Gemini"
+    streams_text = True  # generate() accepts on_text
 
     def __init__(self, api_key: str, model_name: str):
         import google.generativeai as genai
@@ -19,7 +35,14 @@ class GeminiProvider:
         self.model_name = model_name
         self._tool = None
         self._system_instruction = ""
+        self._prefix_chars = 0
+        self._cache = None
+        self._cache_expires_at = 0.0
+        self._inline_model = None  # tools sent per request; used where the cache cannot be
+        self._use_context_cache = _context_cache_enabled()
         self.model = None
+        # Same knob as the legacy text path; the SDK call otherwise has no deadline
+        self._request_options = native.request_options(float(os.environ.get("GEMINI_API_TIMEOUT", "60")))
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model_name)
 
@@ -29,16 +52,86 @@ class GeminiProvider:
         self._bind_errors = errors
         if not tool:
             self._tool = None
+            self._drop_cache()
             self.model = self._genai.GenerativeModel(self.model_name)
             return False
         self._tool = tool
-        self.model = self._genai.GenerativeModel(
-            self.model_name,
-            tools=[tool],
-            system_instruction=system_instruction,
-        )
+        self._prefix_chars = len(system_instruction) + len(json.dumps(mcp_tools, default=str))
+        self._build_model()
+        return True
+
+    def _build_model(self) -> None:
+        """(Re)create self.model for the bound tools, from a context cache when possible."""
+        self._drop_cache()
+        self._inline_model = None
+        if self._cache_tools():
+            return
+        self.model = self._tool_model()
+
+    def _tool_model(self) -> Any:
+        """Plain model carrying the bound tools and system instruction on every request."""
+        if self._inline_model is None:
+            self._inline_model = self._genai.GenerativeModel(
+                self.model_name,
+                tools=[self._tool],
+                system_instruction=self._system_instruction,
+            )
+        return self._inline_model
+
+    def _cache_tools(self) -> bool:
+        """Put tools + system instruction in a Gemini CachedContent so turns reuse that prefix.
+
+        Cached prefix tokens are billed at a discount and skipped on input
+        processing. The SDK refuses tools, tool_config and system_instruction on
+        a cached model, so the AUTO tool config is stored in the cache too.
+        Returns False (caller builds a plain model) when caching is
+        off, the prefix is under CONTEXT_CACHE_MIN_TOKENS (~4 chars/token), or
+        the model/SDK does not support it.
+        """
+        if not self._use_context_cache or self._prefix_chars // 4 < CONTEXT_CACHE_MIN_TOKENS:
+            return False
+        caching = getattr(self._genai, "caching", None)
+        if caching is None:
+            return False
+        try:
+            cache = caching.CachedContent.create(
+                model=self.model_name,
+                system_instruction=self._system_instruction,
+                tools=[self._tool],
+                tool_config=native.tool_config("AUTO"),
+                ttl=CONTEXT_CACHE_TTL,
+            )
+            model = self._genai.GenerativeModel.from_cached_content(cached_content=cache)
+        except Exception as e:
+            print(f"[*] Gemini context cache unavailable for {self.model_name}; sending tools inline ({e})")
+            self._use_context_cache = False
+            return False
+        self._cache = cache
+        self._cache_expires_at = time.monotonic() + CONTEXT_CACHE_TTL.total_seconds()
+        self.model = model
         return True
 
+    def _extend_cache(self) -> None:
+        """Push the cache expiry out by another TTL; rebuild the model if that fails."""
+        try:
+            self._cache.update(ttl=CONTEXT_CACHE_TTL)
+        except Exception:
+            self._build_model()
+            return
+        self._cache_expires_at = time.monotonic() + CONTEXT_CACHE_TTL.total_seconds()
+
+    def _drop_cache(self) -> None:
+        cache, self._cache = self._cache, None
+        if cache is not None:
+            try:
+                cache.delete()
+            except Exception:
+                pass  # expires on its own after CONTEXT_CACHE_TTL
+
+    def close(self) -> None:
+        """Delete the context cache now instead of paying for it until its TTL runs out."""
+        self._drop_cache()
+
     @property
     def bind_errors(self) -> List[str]:
         return getattr(self, "_bind_errors", []) or []
@@ -56,12 +149,33 @@ class GeminiProvider:
 
         return [protos.Content(role="user", parts=[protos.Part(text=user_text)])]
 
-    def generate(self, conversation: Any, tool_choice: str = "auto") -> Any:
+    def generate(
+        self,
+        conversation: Any,
+        tool_choice: str = "auto",
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Any:
+        """One model turn. With on_text the reply is streamed and each text chunk is
+        passed to it as it arrives; the returned response is complete either way."""
         mode = "NONE" if str(tool_choice).lower() == "none" else "AUTO"
-        return self.model.generate_content(
-            conversation,
-            tool_config=native.tool_config(mode),
-        )
+        if self._cache is not None and time.monotonic() >= self._cache_expires_at - CONTEXT_CACHE_REFRESH_MARGIN:
+            self._extend_cache()
+        model = self.model
+        kwargs: Dict[str, Any] = {"request_options": self._request_options}
+        if self._cache is None:
+            kwargs["tool_config"] = native.tool_config(mode)
+        elif mode == "NONE":
+            # The cached AUTO config cannot be overridden per request; the
+            # no-tools synthesis turn goes out uncached instead.
+            model = self._tool_model()
+            kwargs["tool_config"] = native.tool_config(mode)
+        if on_text is None:
+            response = model.generate_content(conversation, **kwargs)
+        else:
+            response = model.generate_content(conversation, stream=True, **kwargs)
+            for chunk in response:
+                on_text(native.extract_text_parts(chunk))
+        return response
 
     def extract_tool_calls(self, response: Any) -> List[Dict[str, Any]]:
         return native.extract_function_calls(response)
@@ -118,10 +232,9 @@ class GeminiProvider:
     def change_model(self, model_name: str) -> None:
         self.model_name = model_name
         if self._tool and self._system_instruction:
-            self.model = self._genai.GenerativeModel(
-                model_name,
-                tools=[self._tool],
-                system_instruction=self._system_instruction,
-            )
+            self._use_context_cache = _context_cache_enabled()  # retry for the new model
+            self._build_model()
         else:
+            self._drop_cache()
+            self._inline_model = None
             self.model = self._genai.GenerativeModel(model_name)
@@ -8,7 +8,7 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 from llm_tool_schema import mcp_tools_to_openai_tools
 from gemini_native_tools import truncate_tool_result_for_model
-from llm_providers.deepseek_provider import resolve_ssl_verify
+from llm_providers.deepseek_provider import pooled_http_client_kwargs, resolve_ssl_verify
 
 DEFAULT_OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 DEFAULT_OPENROUTER_MODEL = "z-ai/glm-5.2"
@@ -53,7 +53,9 @@ class OpenRouterProvider:
         else:
             print(f"[*] OpenRouter TLS verify: {self._ssl_verify}")
         timeout = float(os.environ.get("OPENROUTER_HTTP_TIMEOUT", "90"))
-        self._http_client = httpx.Client(verify=self._ssl_verify, timeout=timeout)
+        self._http_client = httpx.Client(
+            verify=self._ssl_verify, timeout=timeout, **pooled_http_client_kwargs()
+        )
         self._client = OpenAI(
             api_key=api_key,
             base_url=self.base_url,
@@ -41,6 +41,17 @@ def normalize_json_schema(schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     return cleaned
 
 
+def canonical_mcp_tools(available_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Order MCP tools by name so bound declarations are identical across binds.
+
+    Provider prompt-prefix caches only hit when the tools/system block is
+    byte-identical, so the declaration order must not depend on server
+    registration or tools/list ordering. Unnamed entries are dropped.
+    """
+    named = [t for t in available_tools or [] if str(t.get("name") or "").strip()]
+    return sorted(named, key=lambda t: str(t["name"]).strip())
+
+
 def mcp_tools_to_openai_tools(available_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Convert MCP tools/list entries to OpenAI/DeepSeek tools array."""
     tools: List[Dict[str, Any]] = []
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""Tests for FiddlerBridgeClient transport behaviour in 5ire-bridge.py."""
+from __future__ import annotations
+
+import importlib.util
+import json
+import logging
+import os
+import queue
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _load_module(name: str, filename: str):
+    path = os.path.join(ROOT, filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+enhanced = _load_module("enhanced_bridge_mod", "enhanced-bridge.py")
+fiveire = _load_module("fiveire_bridge_mod", "5ire-bridge.py")
+
+
+def _response(status=200, body=b"{}", content_type="application/json", headers=None):
+    resp = MagicMock()
+    resp.status_code = status
+    resp.content = body
+    resp.text = body.decode("utf-8", "replace")
+    resp.headers = {"content-type": content_type, **(headers or {})}
+    resp.raise_for_status = MagicMock()
+    resp.json = MagicMock(side_effect=lambda: json.loads(body))
+    return resp
+
+
+class TestPooledSession(unittest.TestCase):
+    def test_session_ignores_proxy_env(self):
+        client = fiveire.FiddlerBridgeClient()
+        self.assertFalse(client._session.trust_env)
+        client.close()
+
+    def test_from_env_reads_url_and_timeout(self):
+        env = {"FMP_FIDDLER_BRIDGE_URL": "http://bridge.test:9000/", "FMP_FIDDLER_TIMEOUT": "bogus"}
+        with patch.dict(os.environ, env):
+            client = fiveire.FiddlerBridgeClient.from_env()
+        self.assertEqual(client._base_url, "http://bridge.test:9000")
+        self.assertEqual(client.timeout, fiveire.DEFAULT_TIMEOUT)
+        client.close()
+
+    def test_request_goes_through_session(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.request = MagicMock(return_value=_response(body=b'{"success": true}'))
+        out = client.request("GET", "/api/stats")
+        self.assertEqual(out, {"success": True})
+        client._session.request.assert_called_once()
+
+    def test_lone_surrogate_json_is_parsed(self):
+        client = fiveire.FiddlerBridgeClient()
+        body = b'{"success": true, "response_body": "bad \\ud800 text"}'
+        client._session.request = MagicMock(return_value=_response(body=body))
+        out = client.request("GET", "/api/sessions/7/body")
+        self.assertEqual(out["response_body"], "bad \ud800 text")
+        client._session.request.assert_called_once()
+        client.close()
+
+    def test_non_json_text_falls_back_to_raw(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.request = MagicMock(return_value=_response(body=b"ok", content_type="text/plain"))
+        out = client.request("GET", "/health")
+        self.assertFalse(out["success"])
+        self.assertEqual(out["raw"], "ok")
+        client.close()
+
+    def test_non_object_json_is_wrapped(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.request = MagicMock(return_value=_response(body=b"[1, 2]"))
+        out = client.request("GET", "/api/sessions")
+        self.assertEqual(out, {"success": False, "error": "Unexpected response", "raw": [1, 2]})
+        client.close()
+
+    def test_json_payload_is_sent_as_bytes(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.request = MagicMock(return_value=_response(body=b'{"success": true}'))
+        client.request("POST", "/api/clear", json_payload={"confirm": True})
+        kwargs = client._session.request.call_args.kwargs
+        self.assertEqual(json.loads(kwargs["data"]), {"confirm": True})
+        self.assertEqual(kwargs["headers"]["Content-Type"], "application/json")
+        client.close()
+
+    def test_header_projection_applied_client_side(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(return_value={
+            "success": True,
+            "request_headers": {"Host": "a.test", "Cookie": "x=1"},
+            "response_headers": {"Cache-Control": "no-store", "Server": "nginx"},
+        })
+        out = client.get_session_headers(session_id="1", header_names=["cache-control", " cookie "])
+        self.assertEqual(client.request.call_args.kwargs["params"], {"names": "cache-control,cookie"})
+        self.assertEqual(out["request_headers"], {"Cookie": "x=1"})
+        self.assertEqual(out["response_headers"], {"Cache-Control": "no-store"})
+        client.close()
+
+    def test_health_success_is_cached(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.get = MagicMock(return_value=_response(body=b"ok"))
+        self.assertTrue(client.check_bridge_health())
+        self.assertTrue(client.check_bridge_health())
+        client._session.get.assert_called_once()
+        client.close()
+
+    def test_health_failure_is_not_cached(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.get = MagicMock(return_value=_response(status=503))
+        self.assertFalse(client.check_bridge_health())
+        self.assertFalse(client.check_bridge_health())
+        self.assertEqual(client._session.get.call_count, 2)
+        client.close()
+
+    def test_json_without_content_type_is_parsed(self):
+        client = fiveire.FiddlerBridgeClient()
+        client._session.request = MagicMock(return_value=_response(body=b'{"n": 1}', content_type="text/plain"))
+        self.assertEqual(client.request("GET", "/api/stats"), {"n": 1})
+        client.close()
+
+
+class TestLogFormatting(unittest.TestCase):
+    def test_cached_timestamp_matches_stock_formatter(self):
+        fmt = "%(asctime)s [%(levelname)s] %(message)s"
+        cached = fiveire._CachedTimeFormatter(fmt)
+        stock = logging.Formatter(fmt)
+        for created in (1700000000.125, 1700000000.875, 1700000001.5):
+            record = logging.makeLogRecord({"msg": "hi", "levelname": "INFO", "created": created, "msecs": (created % 1) * 1000})
+            self.assertEqual(cached.format(record), stock.format(record))
+
+    def test_json_formatter_emits_extra_fields(self):
+        record = logging.makeLogRecord({
+            "msg": "Tool result: %s", "args": ("ok",), "levelname": "INFO",
+            "tool": "live_sessions", "sessions": 3,
+        })
+        out = json.loads(fiveire._JsonLogFormatter().format(record))
+        self.assertEqual(out["message"], "Tool result: ok")
+        self.assertEqual(out["tool"], "live_sessions")
+        self.assertEqual(out["sessions"], 3)
+        self.assertNotIn("args", out)
+
+    def test_exception_survives_queue_handler(self):
+        q = queue.Queue()
+        logger = logging.getLogger("fiveire-test-exc")
+        logger.propagate = False
+        handler = fiveire._RecordQueueHandler(q)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Tool %s failed", "live_sessions")
+        record = q.get_nowait()
+        out = json.loads(fiveire._JsonLogFormatter().format(record))
+        self.assertEqual(out["message"], "Tool live_sessions failed")
+        self.assertIn("ValueError: boom", out["exc"])
+        text = fiveire._CachedTimeFormatter("%(message)s").format(record)
+        self.assertTrue(text.startswith("Tool live_sessions failed\nTraceback"))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.client = fiveire.FiddlerBridgeClient(max_retries=3, base_delay=1.0, max_delay=3.0, jitter=0.0)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_backoff_is_capped(self):
+        self.client.request = MagicMock(side_effect=fiveire.BridgeConnectionError("down"))
+        with patch.object(self.client, "_wait", return_value=False) as wait_mock:
+            with self.assertRaises(fiveire.BridgeConnectionError):
+                self.client.request_with_retry("GET", "/api/stats")
+        self.assertEqual([c.args[0] for c in wait_mock.call_args_list], [1.0, 2.0, 3.0])
+        self.assertEqual(self.client.request.call_count, 4)
+
+    def test_client_error_not_retried(self):
+        self.client.request = MagicMock(side_effect=fiveire.BridgeRequestError("nope", status_code=404))
+        with patch.object(self.client, "_wait", return_value=False) as wait_mock:
+            with self.assertRaises(fiveire.BridgeRequestError):
+                self.client.request_with_retry("GET", "/api/sessions/body/1")
+        wait_mock.assert_not_called()
+        self.assertEqual(self.client.request.call_count, 1)
+
+    def test_retry_after_overrides_backoff(self):
+        self.client.request = MagicMock(side_effect=[
+            fiveire.BridgeRequestError("busy", status_code=429, retry_after=2.5),
+            fiveire.BridgeRequestError("busy", status_code=503, retry_after=60.0),
+            {"success": True},
+        ])
+        with patch.object(self.client, "_wait", return_value=False) as wait_mock:
+            self.client.request_with_retry("GET", "/api/stats")
+        self.assertEqual([c.args[0] for c in wait_mock.call_args_list], [2.5, 3.0])
+
+    def test_parse_retry_after_forms(self):
+        self.assertEqual(fiveire._parse_retry_after("7"), 7.0)
+        self.assertEqual(fiveire._parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(fiveire._parse_retry_after("soon"))
+        self.assertIsNone(fiveire._parse_retry_after(None))
+
+    def test_close_cancels_backoff(self):
+        self.client.request = MagicMock(side_effect=fiveire.BridgeConnectionError("down"))
+        self.client.close()
+        with self.assertRaises(fiveire.BridgeConnectionError):
+            self.client.request_with_retry("GET", "/api/stats")
+        self.assertEqual(self.client.request.call_count, 1)
+
+    def test_rate_limit_is_retried(self):
+        self.client.request = MagicMock(
+            side_effect=[fiveire.BridgeRequestError("slow down", status_code=429), {"success": True}]
+        )
+        with patch.object(self.client, "_wait", return_value=False):
+            out = self.client.request_with_retry("GET", "/api/stats")
+        self.assertEqual(out, {"success": True})
+
+
+class TestMultipleSessionBodies(unittest.TestCase):
+    def _fake_request(self, method, path, **kwargs):
+        if path == "/api/sessions/bodies":
+            raise fiveire.BridgeRequestError("not found", status_code=404)
+        if path == "/api/sessions":
+            return {
+                "success": True,
+                "sessions": [
+                    {"id": "1", "host": "a.test", "url": "https://a.test/x.js"},
+                    {"id": "2", "host": "b.test", "url": "https://b.test/y.js"},
+                ],
+            }
+        session_id = path.rsplit("/", 1)[-1]
+        return {"success": True, "response_body": f"body-{session_id}"}
+
+    def test_single_metadata_lookup_and_order_preserved(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(side_effect=self._fake_request)
+        out = client.get_multiple_session_bodies(session_ids=["2", "1", "3"], include_binary=False)
+        self.assertEqual([s["session_id"] for s in out["sessions"]], ["2", "1", "3"])
+        self.assertEqual(out["sessions"][0]["response_body"], "body-2")
+        self.assertEqual(out["sessions"][0]["host"], "b.test")
+        self.assertEqual(out["sessions"][2]["host"], "")
+        listing_calls = [c for c in client.request.call_args_list if c.args[1] == "/api/sessions"]
+        self.assertEqual(len(listing_calls), 1)
+        client.close()
+
+    def test_failed_fetches_retry_in_one_shared_round(self):
+        client = fiveire.FiddlerBridgeClient(jitter=0.0)
+        failures = {"1": 1, "2": 1}
+
+        def fake_request(method, path, **kwargs):
+            if path == "/api/sessions/bodies":
+                raise fiveire.BridgeRequestError("not found", status_code=404)
+            session_id = path.rsplit("/", 1)[-1]
+            if failures.get(session_id):
+                failures[session_id] -= 1
+                raise fiveire.BridgeConnectionError("flap")
+            return {"success": True, "response_body": f"body-{session_id}", "host": "h.test"}
+
+        client.request = MagicMock(side_effect=fake_request)
+        with patch.object(client, "_wait", return_value=False) as wait_mock:
+            out = client.get_multiple_session_bodies(session_ids=["1", "2", "3"], include_binary=False)
+        self.assertEqual(out["count"], 3)
+        wait_mock.assert_called_once_with(1.0)
+        client.close()
+
+    def test_bulk_endpoint_used_when_available(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(return_value={
+            "success": True,
+            "bodies": [
+                {"id": "5", "success": True, "response_body": "five", "host": "e.test"},
+                {"id": "6", "success": False, "found": False},
+            ],
+        })
+        out = client.get_multiple_session_bodies(session_ids=["5", "6"], include_binary=False)
+        client.request.assert_called_once()
+        self.assertEqual(client.request.call_args.args[:2], ("POST", "/api/sessions/bodies"))
+        self.assertEqual(out["count"], 1)
+        self.assertEqual(out["sessions"][0]["host"], "e.test")
+        self.assertFalse(out["sessions"][1]["success"])
+        client.close()
+
+    def test_duplicate_ids_fetched_once(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(side_effect=self._fake_request)
+        out = client.get_multiple_session_bodies(session_ids=["1", "2", "1"], include_binary=False)
+        self.assertEqual([s["session_id"] for s in out["sessions"]], ["1", "2", "1"])
+        self.assertEqual(out["requested"], 3)
+        body_calls = [c for c in client.request.call_args_list if c.args[1].startswith("/api/sessions/body/")]
+        self.assertEqual(len(body_calls), 2)
+        client.close()
+
+    def test_bulk_404_falls_back_and_stops_probing(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(side_effect=self._fake_request)
+        client.get_multiple_session_bodies(session_ids=["1", "2"], include_binary=False)
+        client.get_multiple_session_bodies(session_ids=["1", "2"], include_binary=False)
+        bulk_calls = [c for c in client.request.call_args_list if c.args[1] == "/api/sessions/bodies"]
+        self.assertEqual(len(bulk_calls), 1)
+        client.close()
+
+    def test_inline_body_metadata_skips_listing(self):
+        client = fiveire.FiddlerBridgeClient()
+        client.request = MagicMock(return_value={
+            "success": True,
+            "response_body": "x",
+            "host": "c.test",
+            "url": "https://c.test/",
+            "method": "GET",
+            "status": "200",
+        })
+        out = client.get_session_body(session_id="7", include_binary=False)
+        self.assertEqual(out["host"], "c.test")
+        self.assertEqual(out["status"], "200")
+        client.request.assert_called_once()
+        client.close()
+
+
+class TestBodyCache(unittest.TestCase):
+    def setUp(self):
+        self.client = fiveire.FiddlerBridgeClient()
+        self.client._bulk_bodies_supported = False
+
+        def fake_request(method, path, **kwargs):
+            if path == "/api/clear":
+                return {"success": True}
+            session_id = path.rsplit("/", 1)[-1]
+            return {"success": True, "response_body": f"body-{session_id}", "host": "h.test"}
+
+        self.client.request = MagicMock(side_effect=fake_request)
+
+    def tearDown(self):
+        self.client.close()
+
+    def _body_calls(self):
+        return [c for c in self.client.request.call_args_list if c.args[1].startswith("/api/sessions/body/")]
+
+    def test_compare_reuses_recent_single_fetch(self):
+        self.client.get_session_body(session_id="1", include_binary=False, smart_extract=True)
+        out = self.client.get_multiple_session_bodies(session_ids=["1", "2"], include_binary=False, smart_extract=True)
+        self.assertEqual(out["sessions"][0]["response_body"], "body-1")
+        self.assertEqual([c.args[1] for c in self._body_calls()], ["/api/sessions/body/1", "/api/sessions/body/2"])
+
+    def test_smart_extract_is_part_of_key(self):
+        self.client.get_session_body(session_id="1", include_binary=False)
+        self.client.get_session_body(session_id="1", include_binary=False, smart_extract=True)
+        self.assertEqual(len(self._body_calls()), 2)
+
+    def test_raw_payloads_not_cached(self):
+        self.client.get_session_body(session_id="1", include_binary=True)
+        self.client.get_session_body(session_id="1", include_binary=True)
+        self.assertEqual(len(self._body_calls()), 2)
+
+    def test_clear_invalidates_cache(self):
+        self.client.get_session_body(session_id="1", include_binary=False)
+        self.client.clear_sessions(confirm=True, clear_suspicious=False)
+        self.client.get_session_body(session_id="1", include_binary=False)
+        self.assertEqual(len(self._body_calls()), 2)
+
+
+class TestToolArguments(unittest.TestCase):
+    def test_duplicate_ids_collapsed_before_fetch(self):
+        fake = MagicMock()
+        fake.get_multiple_session_bodies.return_value = {"success": True, "sessions": [], "count": 2, "requested": 2}
+        with patch.object(fiveire, "client", fake):
+            out = fiveire.fiddler_mcp__compare_sessions(session_ids=["10", "20", "10"])
+        self.assertEqual(fake.get_multiple_session_bodies.call_args.kwargs["session_ids"], ["10", "20"])
+        self.assertTrue(out["deduplicated"])
+
+    def test_blank_search_filters_are_dropped(self):
+        fake = MagicMock()
+        fake.search_sessions.return_value = {"success": True}
+        with patch.object(fiveire, "client", fake):
+            fiveire.fiddler_mcp__sessions_search(host_pattern="  ", url_pattern=" /api ", content_type="")
+        kwargs = fake.search_sessions.call_args.kwargs
+        self.assertIsNone(kwargs["host_pattern"])
+        self.assertEqual(kwargs["url_pattern"], "/api")
+        self.assertIsNone(kwargs["content_type"])
+
+    def test_only_duplicates_rejected_without_fetch(self):
+        fake = MagicMock()
+        with patch.object(fiveire, "client", fake):
+            out = fiveire.fiddler_mcp__compare_sessions(session_ids=["10", "10", "10"])
+        self.assertFalse(out["success"])
+        self.assertEqual(out["requested"], 3)
+        fake.get_multiple_session_bodies.assert_not_called()
+
+
+class TestBulkBodyEndpoint(unittest.TestCase):
+    def test_bulk_matches_single_endpoint(self):
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        bridge.live_sessions.append({
+            "id": "1", "host": "a.test", "url": "https://a.test/", "method": "GET",
+            "statusCode": 200, "responseBody": "hello", "requestBody": "",
+        })
+        http = bridge.app.test_client()
+        bulk = http.post("/api/sessions/bodies", json={"ids": ["1", "404"]}).get_json()
+        single = http.get("/api/sessions/body/1").get_json()
+        self.assertEqual(bulk["count"], 1)
+        self.assertEqual(bulk["bodies"][0], single)
+        self.assertFalse(bulk["bodies"][1]["found"])
+
+    def test_bulk_rejects_malformed_or_oversized_payloads(self):
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        http = bridge.app.test_client()
+        for payload in ([1, 2], {"ids": "1"}, {"ids": {"1": True}}, {}):
+            resp = http.post("/api/sessions/bodies", json=payload)
+            self.assertEqual(resp.status_code, 400, payload)
+            self.assertFalse(resp.get_json()["success"])
+        resp = http.post("/api/sessions/bodies", data="not json", content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        too_many = [str(i) for i in range(enhanced.MAX_BULK_BODY_IDS + 1)]
+        resp = http.post("/api/sessions/bodies", json={"ids": too_many})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()["requested"], len(too_many))
+
+    def test_header_names_projection(self):
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        bridge.live_sessions.append({
+            "id": "1", "requestHeaders": {"Host": "a.test"},
+            "responseHeaders": {"Cache-Control": "no-store", "Server": "nginx"},
+        })
+        http = bridge.app.test_client()
+        out = http.get("/api/sessions/headers/1?names=cache-control").get_json()
+        self.assertEqual(out["request_headers"], {})
+        self.assertEqual(out["response_headers"], {"Cache-Control": "no-store"})
+        full = http.get("/api/sessions/headers/1").get_json()
+        self.assertEqual(full["response_headers"]["Server"], "nginx")
+
+    def test_search_offset_pages_through_matches(self):
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        for i in range(5):
+            bridge.live_sessions.append({"id": str(i), "host": "a.test", "url": f"https://a.test/{i}", "statusCode": 200})
+        http = bridge.app.test_client()
+        first = http.get("/api/sessions/search?host=a.test&limit=2").get_json()
+        self.assertEqual([s["id"] for s in first["sessions"]], ["4", "3"])
+        self.assertEqual(first["next_offset"], 2)
+        last = http.get("/api/sessions/search?host=a.test&limit=2&offset=4").get_json()
+        self.assertEqual([s["id"] for s in last["sessions"]], ["0"])
+        self.assertIsNone(last["next_offset"])
+
+    @unittest.skipUnless(enhanced.ORJSON_AVAILABLE, "orjson not installed")
+    def test_orjson_provider_round_trips(self):
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        self.assertIsInstance(bridge.app.json, enhanced.OrjsonProvider)
+        payload = {"b": [1, 2.5, None], "a": "caf\u00e9 \u2603", "nested": {"ok": True}}
+        with bridge.app.app_context():
+            body = enhanced.jsonify(payload).get_data()
+        self.assertEqual(json.loads(body), payload)
+        self.assertTrue(body.startswith(b'{"a"'))
+
+
+    def test_lone_surrogate_session_is_stored_and_served(self):
+        # orjson rejects lone surrogates that stdlib json (and stock Flask) accept
+        bridge = enhanced.EnhancedFiddlerRealtimeBridge()
+        http = bridge.app.test_client()
+        raw = '{"id": "7", "host": "a.test", "url": "https://a.test/", "method": "GET", ' \
+              '"statusCode": 200, "responseBody": "bad \\ud800 text", "requestBody": ""}'
+        resp = http.post("/live-session", data=raw, content_type="application/json")
+        self.assertEqual(resp.status_code, 201, resp.get_data())
+        bridge.live_sessions.append({"id": "8", "host": "a.test", "responseBody": "ok"})
+        bulk = http.post("/api/sessions/bodies", json={"ids": ["7", "8"]})
+        self.assertEqual(bulk.status_code, 200)
+        out = bulk.get_json()
+        self.assertEqual(out["count"], 2)
+        self.assertEqual(out["bodies"][0]["response_body"], "bad \ud800 text")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -187,6 +187,15 @@ class TestOpenAIToolSchema(unittest.TestCase):
         self.assertEqual(method.get("enum"), ["GET", "POST", "PUT", "DELETE"])
 
 
+    def test_canonical_order_independent_of_tools_list_order(self):
+        from llm_tool_schema import canonical_mcp_tools, mcp_tools_to_openai_tools
+
+        forward = mcp_tools_to_openai_tools(canonical_mcp_tools(ALL_TEN_TOOLS))
+        backward = mcp_tools_to_openai_tools(canonical_mcp_tools(list(reversed(ALL_TEN_TOOLS))))
+        self.assertEqual(json.dumps(forward), json.dumps(backward))
+        names = [t["function"]["name"] for t in forward]
+        self.assertEqual(names, sorted(names))
+
 class TestDeepSeekProviderParse(unittest.TestCase):
     def test_extract_tool_calls_json_string_args(self):
         with patch("openai.OpenAI") as OpenAI:
@@ -207,6 +216,15 @@ class TestDeepSeekProviderParse(unittest.TestCase):
             self.assertEqual(calls[0]["args"]["min_risk_score"], 0.7)
             self.assertEqual(calls[0]["id"], "call_abc")
 
+    def test_http_client_keeps_connections_alive(self):
+        with patch("openai.OpenAI"), patch("httpx.Client") as Client:
+            from llm_providers.deepseek_provider import HTTP_KEEPALIVE_SECONDS, DeepSeekProvider
+
+            DeepSeekProvider(api_key="sk-test", model_name="deepseek-v4-flash")
+            kwargs = Client.call_args.kwargs
+            self.assertEqual(kwargs["limits"].keepalive_expiry, HTTP_KEEPALIVE_SECONDS)
+            self.assertEqual(kwargs["http2"], importlib.util.find_spec("h2") is not None)
+
     def test_tool_choice_none_omits_tools(self):
         with patch("openai.OpenAI") as OpenAI:
             client = MagicMock()
@@ -10,12 +10,16 @@ Covers failures from supremeboxer / ErrTraffic agent logs:
 from __future__ import annotations
 
 import importlib.util
+import json
 import os
 import sys
 import tempfile
+import threading
+import time
 import types
 import unittest
 from pathlib import Path
+from unittest import mock
 from unittest.mock import MagicMock
 
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -82,6 +86,11 @@ class TestWildcardSearch(unittest.TestCase):
         self.assertEqual(norm, "")
         self.assertIsNone(rx)
 
+    def test_repeated_pattern_reuses_compiled_regex(self):
+        first = self.bridge._compile_search_pattern("*.example.test")
+        second = self.bridge._compile_search_pattern("*.example.test")
+        self.assertIs(first[0], second[0])
+
 
 class TestEkfiddleOverview(unittest.TestCase):
     def setUp(self):
@@ -212,6 +221,14 @@ class TestRefetchLock(unittest.TestCase):
         self.assertTrue(result.get("already_analyzed"))
         self.assertIn("already analyzed this query", result.get("error", ""))
 
+    def test_unknown_tool_checked_against_current_tool_list(self):
+        result = self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.assertIn("Unknown tool", result.get("error", ""))
+        self.assertEqual(result["available_tools"], ["fiddler_mcp__session_body"])
+        self.client.available_tools = [{"name": "fiddler_mcp__live_stats"}]
+        self.assertIn("fiddler_mcp__live_stats", self.client._valid_tool_names)
+        self.assertNotIn("fiddler_mcp__session_body", self.client._valid_tool_names)
+
     def test_allows_refetch_when_user_asks_refresh(self):
         self.client._current_user_query = "refresh session 256 body"
         # Sanitizer + lock pass; MCP path will fail without process — stub send
@@ -228,6 +245,125 @@ class TestRefetchLock(unittest.TestCase):
         )
 
 
+    def _body_response(self, text):
+        return {"result": {"content": [{"type": "text", "text": text}]}}
+
+    def test_session_claimed_before_fetch(self):
+        self.client._tool_cache = {}
+        self.client.ensure_mcp_alive = MagicMock(return_value=True)
+        concurrent = []
+
+        def send(*_args, **_kwargs):
+            # A second worker asking for the same body while the first is in flight
+            concurrent.append(self.client.call_tool("fiddler_mcp__session_body", {"session_id": "300"}))
+            return self._body_response('{"success": true, "session_id": "300", "content_type": "text/html"}')
+
+        self.client.send_mcp_request = MagicMock(side_effect=send)
+        result = self.client.call_tool("fiddler_mcp__session_body", {"session_id": "300"})
+        self.assertTrue(result.get("success"))
+        self.assertEqual(self.client.send_mcp_request.call_count, 1)
+        self.assertTrue(concurrent[0].get("already_analyzed"))
+        self.assertIn("300", self.client._analyzed_session_ids)
+
+    def test_failed_fetch_releases_claim(self):
+        self.client._tool_cache = {}
+        self.client.ensure_mcp_alive = MagicMock(return_value=True)
+        self.client.send_mcp_request = MagicMock(
+            return_value=self._body_response('{"success": false, "error": "not found"}')
+        )
+        self.client.call_tool("fiddler_mcp__session_body", {"session_id": "301"})
+        self.assertNotIn("301", self.client._analyzed_session_ids)
+
+
+class TestMcpRestart(unittest.TestCase):
+    def setUp(self):
+        self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        self.client._mcp_server_command = ["python", "5ire-bridge.py"]
+        self.client.mcp_process = MagicMock()
+        self.client.mcp_process.poll.return_value = 1
+        self.client.list_tools = MagicMock(return_value=[])
+
+    def test_parallel_workers_restart_once(self):
+        def start(_cmd):
+            time.sleep(0.05)
+            proc = MagicMock()
+            proc.poll.return_value = None
+            self.client.mcp_process = proc
+
+        self.client.start_mcp_server = MagicMock(side_effect=start)
+        results = []
+        workers = [
+            threading.Thread(target=lambda: results.append(self.client.ensure_mcp_alive()))
+            for _ in range(4)
+        ]
+        with mock.patch("builtins.print"):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(results, [True] * 4)
+        self.client.start_mcp_server.assert_called_once()
+
+
+class TestQueryToolCache(unittest.TestCase):
+    def setUp(self):
+        self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        self.client._analyzed_session_ids = set()
+        self.client._current_user_query = "show stats"
+        self.client._last_search_args = {}
+        self.client._tool_cache = {}
+        self.client.available_tools = [
+            {"name": "fiddler_mcp__live_stats"},
+            {"name": "fiddler_mcp__sessions_clear"},
+        ]
+        self.client.verbose_logging = False
+        self.client.show_progress = False
+        self.client.log_with_timestamp = MagicMock()
+        self.client.ensure_mcp_alive = MagicMock(return_value=True)
+        self.client.send_mcp_request = MagicMock(
+            return_value={
+                "result": {
+                    "content": [{"type": "text", "text": '{"success": true, "total": 3}'}]
+                }
+            }
+        )
+
+    def test_repeated_call_served_from_cache(self):
+        first = self.client.call_tool("fiddler_mcp__live_stats", {})
+        first["annotated"] = True
+        second = self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.assertEqual(self.client.send_mcp_request.call_count, 1)
+        self.assertEqual(second, {"success": True, "total": 3})
+
+    def test_clear_invalidates_and_is_never_cached(self):
+        self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.client.call_tool("fiddler_mcp__sessions_clear", {"confirm": True})
+        self.client.call_tool("fiddler_mcp__sessions_clear", {"confirm": True})
+        self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.assertEqual(self.client.send_mcp_request.call_count, 4)
+
+    def test_aliases_resolve_to_canonical_tool(self):
+        for alias in ("get_stats", "fiddler_mcp__stats", "fiddler_mcp.stats", "fiddler_mcp.live_stats"):
+            self.client._tool_cache = {}
+            self.client.call_tool(alias, {})
+            params = self.client.send_mcp_request.call_args[0][1]
+            self.assertEqual(params["name"], "fiddler_mcp__live_stats", alias)
+
+    def test_result_size_taken_from_response_text(self):
+        response = self.client.send_mcp_request.return_value
+        self.assertEqual(
+            self.client._response_text_size(response), len('{"success": true, "total": 3}')
+        )
+        self.assertEqual(self.client._response_text_size({"error": "x"}), 0)
+
+    def test_failed_result_not_cached(self):
+        self.client.send_mcp_request.return_value = {
+            "result": {"content": [{"type": "text", "text": '{"success": false, "error": "down"}'}]}
+        }
+        self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.client.call_tool("fiddler_mcp__live_stats", {})
+        self.assertEqual(self.client.send_mcp_request.call_count, 2)
+
 class TestEkfiddleRuleHelpers(unittest.TestCase):
     def setUp(self):
         self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
@@ -301,6 +437,7 @@ class TestEkfiddleRuleHelpers(unittest.TestCase):
 class TestAutoFetchPolicy(unittest.TestCase):
     def setUp(self):
         self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        self.client.show_progress = False
         self.client._analyzed_session_ids = set()
         self.client._last_search_args = {}
 
@@ -359,6 +496,153 @@ class TestAutoFetchPolicy(unittest.TestCase):
         self.assertIsNotNone(picked)
         self.assertEqual(str(picked["id"]), "250")
 
+    def test_duplicate_id_counts_built_once_per_list(self):
+        sessions = [{"id": "5"}, {"id": 5}, {"id": "6"}]
+        self.assertEqual(self.client._session_id_count(sessions, "5"), 2)
+        counts = self.client._session_id_counts_cache[1]
+        self.assertEqual(self.client._session_id_count(sessions, "6"), 1)
+        self.assertIs(self.client._session_id_counts_cache[1], counts)
+        self.assertEqual(self.client._session_id_count([{"id": "6"}], "5"), 0)
+
+    def test_body_dump_written_in_chunks_round_trips(self):
+        text = ("var a = '\u00e9\u2603';\r\n" * 20000) + "\ud800 tail"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "body.txt"
+            gemini._write_body_file(path, text)
+            self.assertGreater(len(text), gemini.BODY_DUMP_CHUNK_CHARS)
+            self.assertEqual(path.read_bytes(), text.encode("utf-8", "replace"))
+
+    def test_dump_writer_persists_queued_bodies(self):
+        import queue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = Path(tmp) / "a.txt", Path(tmp) / "b.txt"
+            self.client._dump_queue = queue.Queue()
+            self.client._dump_queue.put((first, "alert(1)", "response", "1"))
+            self.client._dump_queue.put((second, "q=1", "request", "1"))
+            self.client._dump_queue.put(None)
+            self.client._drain_body_dumps()
+            self.assertEqual(first.read_text(encoding="utf-8"), "alert(1)")
+            self.assertEqual(second.read_text(encoding="utf-8"), "q=1")
+
+    def test_dump_filename_strips_unsafe_session_id_chars(self):
+        import queue
+
+        self.client.auto_save_full_bodies = True
+        self.client._dump_queue = queue.Queue()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            gemini, "_session_dump_dir", return_value=Path(tmp)
+        ):
+            path = self.client._save_body_to_file('a/b\\c:d*?"<>|\n', "x")
+        self.assertIn("session_a_b_c_d________response_", Path(path).name)
+
+    def test_complete_preview_skips_full_body_refetch(self):
+        self.client.auto_save_full_bodies = False
+        self.client.send_mcp_request = MagicMock(return_value={})
+        self.client._parse_tool_response = MagicMock(
+            return_value={
+                "success": True,
+                "response_truncated": True,
+                "content_length": 12,
+                "content_type": "text/html",
+                "response_body": "<html></html",
+            }
+        )
+        search = {"sessions": [{"id": "7", "content_type": "text/html", "url": "https://x/"}]}
+        body = self.client._auto_fetch_session_body(search)
+        self.assertEqual(self.client.send_mcp_request.call_count, 1)
+        self.assertEqual(body["auto_note"], "Full body retrieved")
+        self.assertEqual(body["response_body"], "<html></html")
+        self.assertNotIn("response_body_preview", body)
+
+        self.client._parse_tool_response.return_value = {
+            "success": True,
+            "response_truncated": True,
+            "content_length": 50000,
+            "content_type": "text/html",
+            "response_body": "<html>",
+        }
+        self.client.send_mcp_request.reset_mock()
+        self.client._auto_fetch_session_body(search)
+        self.assertEqual(self.client.send_mcp_request.call_count, 2)
+
+        # Bridge preview: first 50,000 chars plus the marker, longer than a 50,040-byte body
+        preview = "a" * 50000 + "\n\n... [TRUNCATED: Response was 50,040 bytes; showing first 50,000 bytes] ..."
+        self.assertGreater(len(preview), 50040)
+        self.client._parse_tool_response.return_value = {
+            "success": True,
+            "response_truncated": True,
+            "content_length": 50040,
+            "content_type": "text/html",
+            "response_body": preview,
+        }
+        self.client.send_mcp_request.reset_mock()
+        self.client._auto_fetch_session_body(search)
+        self.assertEqual(self.client.send_mcp_request.call_count, 2)
+
+    def test_bodies_within_preview_are_not_dumped(self):
+        self.client.auto_save_full_bodies = True
+        self.client._save_body_to_file = MagicMock(return_value="/tmp/dump.txt")
+        self.client.send_mcp_request = MagicMock(return_value={})
+        self.client._parse_tool_response = MagicMock(
+            return_value={
+                "success": True,
+                "content_type": "application/json",
+                "response_body": '{"ok": true}',
+                "request_body": "q=1",
+            }
+        )
+        search = {"sessions": [{"id": "8", "content_type": "application/json", "url": "https://x/api"}]}
+        body = self.client._auto_fetch_session_body(search)
+        self.client._save_body_to_file.assert_not_called()
+        self.assertEqual(body["response_body"], '{"ok": true}')
+
+        self.client._parse_tool_response.return_value["response_body"] = "x" * (gemini.RESPONSE_PREVIEW_CHARS + 1)
+        body = self.client._auto_fetch_session_body(search)
+        self.client._save_body_to_file.assert_called_once()
+        self.assertEqual(body["saved_response_path"], "/tmp/dump.txt")
+
+    def test_identical_body_reuses_existing_dump(self):
+        import threading
+        from collections import OrderedDict
+
+        self.client.auto_save_full_bodies = True
+        self.client._dump_paths = OrderedDict()
+        self.client._dump_paths_lock = threading.Lock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            gemini, "_session_dump_dir", return_value=Path(tmp)
+        ):
+            first = self.client._save_body_to_file("9", "eval(atob(x))")
+            self.assertEqual(self.client._save_body_to_file("9", "eval(atob(x))"), first)
+            self.assertEqual(len(list(Path(tmp).iterdir())), 1)
+            # Same text as a request body, or a deleted dump, is written again
+            self.assertNotEqual(self.client._save_body_to_file("9", "eval(atob(x))", kind="request"), first)
+            Path(first).unlink()
+            self.assertTrue(Path(self.client._save_body_to_file("9", "eval(atob(x))")).exists())
+
+    def test_smart_extraction_without_sections_is_empty(self):
+        extraction = {
+            "head": "",
+            "suspicious_patterns": "",
+            "tail": "",
+            "metadata": {"original_size": 5000, "total_extracted": 0},
+        }
+        self.assertEqual(self.client._format_smart_extraction(extraction), "")
+        extraction["tail"] = "run();"
+        formatted = self.client._format_smart_extraction(extraction)
+        self.assertIn("=== FILE END (last 4KB) ===\n" + "=" * 60 + "\nrun();", formatted)
+
+    def test_smart_extraction_limit_matches_sliced_full_text(self):
+        extraction = {
+            "head": "h" * 500,
+            "suspicious_patterns": "eval(x)",
+            "tail": "t" * 300,
+            "metadata": {"original_size": 90000, "total_extracted": 807, "patterns_count": 1},
+        }
+        full = self.client._format_smart_extraction(extraction)
+        for limit in (10, 560, 600, len(full) - 1, len(full), len(full) + 5):
+            self.assertEqual(self.client._format_smart_extraction(extraction, limit=limit), full[:limit])
+
     def test_is_text_or_js_rejects_mp4(self):
         self.assertFalse(
             self.client._is_text_or_js_session(
@@ -398,6 +682,13 @@ class TestCompareSanitizeAndStatus(unittest.TestCase):
 
         json.dumps(out)
 
+    def test_header_names_string_split_into_list(self):
+        out = self.client._sanitize_tool_arguments(
+            "fiddler_mcp__session_headers",
+            {"session_id": "250", "header_names": "Cache-Control, Set-Cookie"},
+        )
+        self.assertEqual(out["header_names"], ["Cache-Control", "Set-Cookie"])
+
     def test_brief_tool_status_formats(self):
         self.assertEqual(
             self.client._brief_tool_status(
@@ -462,5 +753,370 @@ class TestCompareSanitizeAndStatus(unittest.TestCase):
         self.assertTrue(any("SocGholish" in r for r in saved))
 
 
+class TestMcpResponseReader(unittest.TestCase):
+    def setUp(self):
+        self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        self.client.log_with_timestamp = MagicMock()
+        self.client._pending_lock = gemini.threading.Lock()
+
+    def test_routes_out_of_order_responses_by_id(self):
+        import io
+
+        first, second = gemini.Future(), gemini.Future()
+        pending = {1: first, 2: second}
+        proc = MagicMock()
+        proc.stdout = io.BytesIO(
+            b'{"jsonrpc": "2.0", "id": 2, "result": "b"}\n'
+            b"not json\n"
+            b'{"jsonrpc": "2.0", "id": 1, "result": "a"}\n'
+        )
+        self.client._read_mcp_responses(proc, pending)
+        self.assertEqual(first.result(timeout=1)[0]["result"], "a")
+        self.assertEqual(second.result(timeout=1)[0]["result"], "b")
+        self.assertEqual(pending, {})
+
+    def test_tool_text_parsed_with_module_json_helpers(self):
+        payload = {"success": True, "sessions": [{"id": "1", "host": "example.com"}]}
+        response = {
+            "result": {"content": [{"type": "text", "text": gemini._json_dumps(payload).decode("utf-8")}]}
+        }
+        self.assertEqual(self.client._parse_tool_response(response), payload)
+        broken = {"result": {"content": [{"type": "text", "text": "{not json"}]}}
+        self.assertEqual(self.client._parse_tool_response(broken), {"text": "{not json"})
+
+    def test_prompt_json_is_compact_and_keeps_unicode(self):
+        text = gemini._prompt_json({"host": "exämple.com", "ids": [1, 2]})
+        self.assertEqual(text, '{"host":"exämple.com","ids":[1,2]}')
+
+    def test_prompt_json_handles_values_orjson_rejects(self):
+        self.assertEqual(gemini._prompt_json({"n": 2**70}), '{"n":%d}' % 2**70)
+        self.assertEqual(gemini._prompt_json({1: "a"}), '{"1":"a"}')
+
+    def test_config_json_matches_stdlib_layout(self):
+        config = {"api_key": "", "model": "gemini-2.5-flash", "mcp_server_command": ["python3", "5ire-bridge.py"], "host": "exämple"}
+        expected = (json.dumps(config, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+        self.assertEqual(gemini._config_json(config), expected)
+        with mock.patch.object(gemini, "ORJSON_AVAILABLE", False):
+            self.assertEqual(gemini._config_json(config), expected)
+
+    def test_json_sniff_skips_leading_whitespace_only(self):
+        self.assertEqual(gemini._first_nonspace("\n\t  {\"a\": 1}"), "{")
+        self.assertEqual(gemini._first_nonspace("   "), "")
+        padded = {"result": {"content": [{"type": "text", "text": "\n  [1, 2]"}]}}
+        self.assertEqual(self.client._parse_tool_response(padded), [1, 2])
+        plain = {"result": {"content": [{"type": "text", "text": "  ok"}]}}
+        self.assertEqual(self.client._parse_tool_response(plain), {"text": "  ok"})
+
+    def test_encoded_params_spliced_into_request(self):
+        import io
+        import json
+
+        self.client.request_id = 0
+        self.client._pending_responses = {}
+        self.client._stdin_lock = gemini.threading.Lock()
+        self.client.mcp_stderr_file = None
+        self.client.tool_timeout = 0.01
+        self.client.mcp_process = MagicMock()
+        self.client.mcp_process.poll.return_value = None
+        self.client.mcp_process.stdin = io.BytesIO()
+        args = {"session_id": "7", "smart_extract": True}
+        out = self.client.send_mcp_request(
+            "tools/call",
+            {"name": "fiddler_mcp__session_body", "arguments": args},
+            encoded_params=b'{"name":"fiddler_mcp__session_body","arguments":'
+            + gemini._canonical_json(args) + b"}",
+        )
+        self.assertIn("timeout", out["error"])
+        sent = json.loads(self.client.mcp_process.stdin.getvalue())
+        self.assertEqual(sent["id"], 1)
+        self.assertEqual(sent["params"], {"name": "fiddler_mcp__session_body", "arguments": args})
+        self.assertEqual(self.client._pending_responses, {})
+
+    def test_eof_fails_waiting_requests(self):
+        import io
+
+        waiting = gemini.Future()
+        pending = {7: waiting}
+        proc = MagicMock()
+        proc.stdout = io.BytesIO(b"")
+        self.client._read_mcp_responses(proc, pending)
+        with self.assertRaises(RuntimeError):
+            waiting.result(timeout=1)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(gemini, "RESPONSE_CACHE_DIR", Path(self.tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        self.client.use_response_cache = True
+        self.client.provider_name = "gemini"
+        self.client.model_name = "gemini-test"
+        self.client.conversation_history = []
+        self.client._user_query_count = 0
+        self.client.mcp_stderr_file = None
+        self.client._capture_fingerprint = MagicMock(return_value=(10, 1, 123.0))
+
+        def fake_chat(query):
+            self.client.conversation_history.append({"role": "user", "content": query})
+            self.client.conversation_history.append({"role": "assistant", "content": "answer"})
+            self.client._answered = True
+            return "answer"
+
+        self.client.chat = MagicMock(side_effect=fake_chat)
+
+    def test_repeat_question_replays_answer_and_history(self):
+        self.assertEqual(self.client.chat_cached("list hosts"), "answer")
+        first_history = list(self.client.conversation_history)
+        self.client.conversation_history = []
+        with mock.patch("builtins.print"):
+            self.assertEqual(self.client.chat_cached("list hosts"), "answer")
+        self.assertEqual(self.client.chat.call_count, 1)
+        self.assertEqual(self.client.conversation_history, first_history)
+        self.assertEqual(self.client._user_query_count, 1)  # the replayed answer; chat() is mocked
+
+    def test_new_traffic_or_unreachable_bridge_misses(self):
+        self.client.chat_cached("list hosts")
+        self.client.conversation_history = []
+        self.client._capture_fingerprint.return_value = (11, 1, 124.0)
+        self.client.chat_cached("list hosts")
+        self.client.conversation_history = []
+        self.client._capture_fingerprint.return_value = None
+        self.client.chat_cached("list hosts")
+        self.assertEqual(self.client.chat.call_count, 3)
+        self.assertEqual(self.client.clear_response_cache(), 2)
+
+    def test_failed_turn_not_stored(self):
+        def failing_chat(query):
+            self.client.conversation_history.append({"role": "error", "content": "boom"})
+            self.client._answered = False
+            return "boom"
+
+        self.client.chat.side_effect = failing_chat
+        self.client.chat_cached("list hosts")
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    def test_blocked_notice_not_stored(self):
+        def blocked_chat(query):
+            self.client.conversation_history.append({"role": "user", "content": query})
+            self.client.conversation_history.append({"role": "assistant", "content": "Analysis blocked by safety filters."})
+            self.client._answered = False
+            return "Analysis blocked by safety filters."
+
+        self.client.chat.side_effect = blocked_chat
+        self.client.chat_cached("list hosts")
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    def test_expired_entry_is_deleted_on_read(self):
+        self.client.chat_cached("list hosts")
+        (stored,) = Path(self.tmp.name).iterdir()
+        stored.write_bytes(gemini._json_dumps({"ts": 0, "response": "old", "history": []}))
+        self.client.conversation_history = []
+        self.client.chat.side_effect = lambda q: setattr(self.client, "_answered", False) or "no answer"
+        self.assertEqual(self.client.chat_cached("list hosts"), "no answer")
+        self.assertFalse(stored.exists())
+
+    def test_startup_sweep_removes_stale_files(self):
+        root = Path(self.tmp.name)
+        stale, fresh, leftover = root / "a.json", root / "b.json", root / "c.tmp"
+        for path in (stale, fresh, leftover):
+            path.write_bytes(b"{}")
+        old = time.time() - gemini.RESPONSE_CACHE_TTL - 5
+        os.utime(stale, (old, old))
+        os.utime(leftover, (old, old))
+        self.client._sweep_response_cache()
+        self.assertEqual(sorted(p.name for p in root.iterdir()), ["b.json"])
+
+
+class TestInputHistory(unittest.TestCase):
+    def test_history_file_loaded_and_trimmed(self):
+        try:
+            import readline
+        except ImportError:
+            self.skipTest("readline not available")
+        self.addCleanup(readline.clear_history)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "history"
+            path.write_text("".join(f"query {i}\n" for i in range(5)))
+            with mock.patch.object(gemini, "INPUT_HISTORY_FILE", path), \
+                    mock.patch.object(gemini, "INPUT_HISTORY_LENGTH", 3):
+                client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+                self.assertIs(client._enable_input_history(), readline)
+            self.assertEqual(path.read_text().split(), ["query", "2", "query", "3", "query", "4"])
+            self.assertEqual(readline.get_history_item(readline.get_current_history_length()), "query 4")
+
+
+class TestStatusLine(unittest.TestCase):
+    def test_shorter_line_overwrites_longer_one(self):
+        import io
+
+        out = io.StringIO()
+        with mock.patch.object(gemini.sys, "stdout", out), mock.patch.object(gemini, "_status_width", 0):
+            gemini._status_line("  Waiting for Gemini LLM analysis...")
+            gemini._status_line("  [Gemini LLM] Done", done=True)
+            gemini._status_line("  next")
+        first, second = out.getvalue().split("\n")
+        waiting, done = first.split("\r")[1:]
+        self.assertEqual(len(done), len(waiting))
+        self.assertEqual(done.rstrip(), "  [Gemini LLM] Done")
+        self.assertEqual(second, "\r  next")
+
+
+class TestDeferredImports(unittest.TestCase):
+    def test_dependency_probe_imports_for_real(self):
+        self.assertTrue(gemini._is_importable("wave"))
+        self.assertFalse(gemini._is_importable("no_such_package_xyz"))
+        self.assertFalse(gemini._is_importable("google.no_such_module_xyz"))
+
+    def test_dependency_probe_runs_deferred_module(self):
+        # A package that is installed but fails on import (e.g. broken grpc) must
+        # read as missing even when it was bound through _lazy_import.
+        with tempfile.TemporaryDirectory() as td:
+            Path(td, "broken_dep_xyz.py").write_text("raise ImportError('grpc is broken')\n")
+            sys.path.insert(0, td)
+            self.addCleanup(sys.path.remove, td)
+            gemini._lazy_import("broken_dep_xyz")
+            self.assertFalse(gemini._is_importable("broken_dep_xyz"))
+            self.assertNotIn("broken_dep_xyz", sys.modules)
+
+    def test_lazy_import_loads_on_first_attribute(self):
+        sys.modules.pop("wave", None)
+        try:
+            wave = gemini._lazy_import("wave")
+            self.assertIs(sys.modules["wave"], wave)
+            self.assertTrue(callable(wave.open))
+            self.assertIs(gemini._lazy_import("wave"), wave)
+        finally:
+            sys.modules.pop("wave", None)
+
+
+class TestShowHistory(unittest.TestCase):
+    def test_history_is_written_once_and_truncated(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.conversation_history = [
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "x" * 400, "tool": "fiddler_mcp__sessions_search"},
+        ]
+        out = mock.Mock()
+        with mock.patch.object(gemini.sys, "stdout", out):
+            client.show_history()
+        out.write.assert_called_once()
+        text = out.write.call_args[0][0]
+        self.assertIn("[1] USER:\n  hello", text)
+        self.assertIn("[2] ASSISTANT (fiddler_mcp__sessions_search):", text)
+        self.assertIn("x" * 300 + "... [truncated]", text)
+        self.assertNotIn("x" * 301, text)
+
+
+class TestWelcomeBanner(unittest.TestCase):
+    def test_banner_is_one_write_with_current_model(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.provider_name = "gemini"
+        client.model_name = "gemini-2.5-flash"
+        client._enable_input_history = MagicMock(return_value=None)
+        out = mock.Mock()
+        with mock.patch.object(gemini.sys, "stdout", out), mock.patch("builtins.input", side_effect=["/quit"]), \
+                mock.patch("builtins.print"):
+            client.interactive_mode()
+        out.write.assert_called_once()
+        banner = out.write.call_args[0][0]
+        self.assertIn("Provider: gemini  Model: gemini-2.5-flash\n", banner)
+        self.assertIn(gemini._COMMANDS_MENU, banner)
+        self.assertTrue(banner.endswith("=" * 70 + "\n"))
+
+
+class TestCommandDispatch(unittest.TestCase):
+    def _run(self, *inputs):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.provider_name = "gemini"
+        client.model_name = "gemini-2.5-flash"
+        client._enable_input_history = MagicMock(return_value=None)
+        client.show_help = MagicMock()
+        client.show_models = MagicMock()
+        client.change_model = MagicMock()
+        client.clear_response_cache = MagicMock(return_value=2)
+        with mock.patch.object(gemini.sys, "stdout", mock.Mock()), \
+                mock.patch("builtins.input", side_effect=[*inputs, "/quit"]), \
+                mock.patch("builtins.print") as printed:
+            client.interactive_mode()
+        return client, [c.args[0] for c in printed.call_args_list if c.args]
+
+    def test_commands_route_with_and_without_arguments(self):
+        client, _ = self._run("/help", "/model", "/model  2", "/cache clear")
+        client.show_help.assert_called_once_with()
+        client.show_models.assert_called_once_with()
+        client.change_model.assert_called_once_with("2")
+        client.clear_response_cache.assert_called_once_with()
+
+    def test_unexpected_argument_is_unknown_command(self):
+        client, printed = self._run("/help me", "/cache", "/nope")
+        client.show_help.assert_not_called()
+        self.assertIn("Unknown command: /help me", printed)
+        self.assertIn("Unknown command: /cache", printed)
+        self.assertIn("Unknown command: /nope", printed)
+
+
+class TestShowTools(unittest.TestCase):
+    def test_listing_is_rendered_once_per_tool_list(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.available_tools = [{"name": "fiddler_mcp__live_stats", "description": "Stats"}]
+        out = mock.Mock()
+        with mock.patch.object(gemini.sys, "stdout", out):
+            client.show_tools()
+            client.available_tools[0]["description"] = "changed in place"
+            client.show_tools()
+            client.available_tools = [{"name": "fiddler_mcp__sessions_clear", "description": "Clear"}]
+            client.show_tools()
+        first, second, third = (c[0][0] for c in out.write.call_args_list)
+        self.assertIn("1. fiddler_mcp__live_stats\n   Stats\n", first)
+        self.assertEqual(second, first)
+        self.assertIn("1. fiddler_mcp__sessions_clear\n   Clear\n", third)
+
+
+class TestStopMcpProcess(unittest.TestCase):
+    def _client(self, proc):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.mcp_process = proc
+        return client
+
+    def test_exited_child_is_not_signalled(self):
+        proc = mock.Mock()
+        proc.poll.return_value = 0
+        self._client(proc)._stop_mcp_process()
+        proc.stdin.close.assert_called_once()
+        proc.terminate.assert_not_called()
+        proc.kill.assert_not_called()
+
+    def test_hung_child_is_killed(self):
+        proc = mock.Mock()
+        proc.poll.return_value = None
+        proc.wait.side_effect = [gemini.subprocess.TimeoutExpired("bridge", 0.5), None]
+        with mock.patch.object(gemini, "MCP_EXIT_GRACE_SECONDS", 0.0):
+            self._client(proc)._stop_mcp_process()
+        proc.terminate.assert_called_once()
+        proc.kill.assert_called_once()
+        self.assertEqual(proc.wait.call_args_list[-1], mock.call(timeout=gemini.MCP_KILL_WAIT_SECONDS))
+
+
+class TestLogTimestamp(unittest.TestCase):
+    def test_matches_strftime_format(self):
+        from datetime import datetime
+
+        before = datetime.now().strftime("%H:%M:%S")
+        stamp = gemini._log_timestamp()
+        after = datetime.now().strftime("%H:%M:%S")
+        self.assertRegex(stamp, r"^\d{2}:\d{2}:\d{2}\.\d{3}$")
+        self.assertIn(stamp[:8], (before, after))
+
+    def test_file_only_line_without_log_is_not_formatted(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.mcp_stderr_file = None
+        with mock.patch.object(gemini, "_log_timestamp", side_effect=AssertionError("formatted")):
+            client.log_with_timestamp("Gemini Request: type=initial", to_console=False)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -358,6 +358,83 @@ class TestNativeChatHelpers(unittest.TestCase):
             self.assertIn("INVESTIGATE CAPTURE", kwargs["system_instruction"])
             self.assertIn("EKFIDDLE RULE AUTHORING", kwargs["system_instruction"])
 
+    def test_gemini_provider_caches_large_tool_prefix(self):
+        # Runs against the real SDK so GenerativeModel._prepare_request enforces
+        # what a model built from cached_content may and may not be sent.
+        stub_pkg = sys.modules.get("google")
+        if stub_pkg is not None:
+            # `import google.generativeai` resolves through this attribute, which
+            # patch.dict does not restore
+            self.addCleanup(setattr, stub_pkg, "generativeai", getattr(stub_pkg, "generativeai", None))
+        with patch.dict(sys.modules):
+            for key in list(sys.modules):
+                if key.startswith("google.generativeai") or key in ("google", "gemini_native_tools"):
+                    if key != "google" or not hasattr(sys.modules[key], "__path__"):
+                        del sys.modules[key]
+            try:
+                real_genai = importlib.import_module("google.generativeai")
+                from google.generativeai import protos
+            except ImportError:
+                self.skipTest("google-generativeai not installed")
+            real_models = importlib.import_module("google.generativeai.generative_models")
+            real_native = importlib.import_module("gemini_native_tools")
+            provider_mod = _load_module("gemini_provider_real_sdk", "llm_providers/gemini_provider.py")
+
+            cache = MagicMock()
+            cache.name = "cachedContents/test"
+            cache.model = "models/gemini-2.5-flash"
+            client = MagicMock()
+            client.generate_content.return_value = protos.GenerateContentResponse()
+            with patch.object(real_genai.caching.CachedContent, "create", return_value=cache) as create, \
+                    patch.object(real_models.client, "get_default_generative_client", return_value=client):
+                provider = provider_mod.GeminiProvider(api_key="test-key", model_name="gemini-2.5-flash")
+                instruction = "x" * 4 * provider_mod.CONTEXT_CACHE_MIN_TOKENS
+                self.assertTrue(provider.bind_tools(SAMPLE_TOOLS, instruction))
+                create.assert_called_once()
+                auto = real_native.tool_config("AUTO")
+                self.assertEqual(create.call_args.kwargs["tool_config"], auto)
+
+                conversation = provider.start_conversation("stats?")
+                provider.generate(conversation)
+                request = client.generate_content.call_args.args[0]
+                self.assertEqual(request.cached_content, "cachedContents/test")
+                self.assertFalse(request.tools)
+
+                provider._cache_expires_at = 0.0
+                provider.generate(conversation, tool_choice="none")
+                cache.update.assert_called_once_with(ttl=provider_mod.CONTEXT_CACHE_TTL)
+                request = client.generate_content.call_args.args[0]
+                self.assertEqual(request.cached_content, "")
+                self.assertEqual([d.name for d in request.tools[0].function_declarations][:1], ["fiddler_mcp__live_stats"])
+                self.assertEqual(request.tool_config, real_native.tool_config("NONE"))
+
+                provider.close()
+                cache.delete.assert_called_once()
+                self.assertIsNone(provider._cache)
+
+    def test_replacing_provider_releases_old_context_cache(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.log_with_timestamp = MagicMock()
+        old = MagicMock()
+        client.llm_provider = old
+        client.provider_name = "openrouter"
+        client.openrouter_api_key = ""
+        with self.assertRaises(RuntimeError):
+            client._init_llm_provider()
+        old.close.assert_called_once_with()
+        self.assertIsNone(client.llm_provider)
+
+    def test_cached_token_usage_is_logged(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.log_with_timestamp = MagicMock()
+        usage = types.SimpleNamespace(prompt_token_count=7000, cached_content_token_count=6500)
+        client._log_cached_tokens(types.SimpleNamespace(usage_metadata=usage))
+        client.log_with_timestamp.assert_called_once_with(
+            "LLM usage: prompt_tokens=7000 cached_tokens=6500", to_console=False
+        )
+        client._log_cached_tokens(types.SimpleNamespace(usage=None))
+        client.log_with_timestamp.assert_called_once()
+
     def test_system_instruction_has_ekfiddle(self):
         text = native.investigation_system_instruction(10)
         self.assertIn("EKFIDDLE RULE AUTHORING", text)
@@ -487,6 +564,182 @@ class TestNativeChatLoop(unittest.TestCase):
         self.assertEqual(order, ["fiddler_mcp__live_stats", "fiddler_mcp__session_body"])
         self.assertIn("done", out)
 
+    def test_streamed_final_answer_echoed_once(self):
+        import io
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.provider_name = "gemini"
+        client.max_followups = 5
+        client.show_progress = False
+        client._progress_tty = True
+        client.conversation_history = []
+        client.use_rich = False
+        client.console = None
+        client.log_with_timestamp = MagicMock()
+        client._check_interrupt = MagicMock()
+        client._format_recent_history = MagicMock(return_value="")
+        client._analyzed_sessions_note = MagicMock(return_value="No sessions")
+        client._finalize_assistant_response = lambda t: t
+
+        class StreamingProvider:
+            display_label = "Gemini"
+            streams_text = True
+
+            def tools_bound(self):
+                return True
+
+            def start_conversation(self, user_text):
+                return []
+
+            def generate(self, conversation, tool_choice="auto", on_text=None):
+                for piece in ("No suspicious ", "sessions."):
+                    on_text(piece)
+                return {"text": "No suspicious sessions."}
+
+            def extract_tool_calls(self, response):
+                return []
+
+            def extract_text(self, response):
+                return response["text"]
+
+        client.llm_provider = StreamingProvider()
+        out = io.StringIO()
+        with patch.object(gemini.sys, "stdout", out), patch.object(gemini, "_status_width", 0):
+            answer = client._chat_native("anything bad?")
+        self.assertEqual(answer, "No suspicious sessions.")
+        self.assertTrue(client._reply_streamed)
+        self.assertEqual(out.getvalue().count("No suspicious sessions."), 1)
+        self.assertIn("< Gemini: No suspicious sessions.\n", out.getvalue())
+
+    def test_gemini_provider_streams_text_chunks(self):
+        from llm_providers import gemini_provider
+
+        provider = gemini_provider.GeminiProvider.__new__(gemini_provider.GeminiProvider)
+        provider._cache = None
+        provider._request_options = {"timeout": 5}
+        provider.model = MagicMock()
+        chunks = [types.SimpleNamespace(text="a"), types.SimpleNamespace(text="b")]
+        provider.model.generate_content.return_value = chunks
+        seen = []
+        with patch.object(gemini_provider.native, "tool_config", return_value=None):
+            self.assertIs(provider.generate(["turn"], on_text=seen.append), chunks)
+        self.assertEqual(seen, ["a", "b"])
+        self.assertTrue(provider.model.generate_content.call_args.kwargs["stream"])
+
+    def test_parallel_tool_results_keep_call_order(self):
+        import threading
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client._tool_pool = gemini.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(client._tool_pool.shutdown)
+        first_started = threading.Event()
+        second_done = threading.Event()
+
+        def fake_call(name, args):
+            if name == "slow":
+                first_started.set()
+                # Only returns once the later call has finished: proves overlap.
+                self.assertTrue(second_done.wait(timeout=2))
+            else:
+                self.assertTrue(first_started.wait(timeout=2))
+                second_done.set()
+            return {"tool": name}
+
+        client.call_tool = fake_call
+        out = client._run_tool_calls([
+            {"name": "slow", "args": {}},
+            {"name": "fast", "args": {}},
+        ])
+        self.assertEqual([r["tool"] for r, _ in out], ["slow", "fast"])
+
+    def test_turn_with_state_changing_tool_runs_serially(self):
+        import threading
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client._tool_pool = gemini.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(client._tool_pool.shutdown)
+        threads = []
+
+        def fake_call(name, args):
+            threads.append((name, threading.current_thread()))
+            return {"tool": name}
+
+        client.call_tool = fake_call
+        client._run_tool_calls([
+            {"name": "fiddler_mcp__sessions_clear", "args": {}},
+            {"name": "fiddler_mcp__live_stats", "args": {}},
+        ])
+        self.assertEqual([n for n, _ in threads], ["fiddler_mcp__sessions_clear", "fiddler_mcp__live_stats"])
+        self.assertTrue(all(t is threading.current_thread() for _, t in threads))
+
+    def test_legacy_tool_array_runs_as_one_batch(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        call = client.parse_gemini_response(
+            '[{"tool": "fiddler_mcp__session_body", "arguments": {"session_id": "1"}},'
+            ' {"tool": "fiddler_mcp__session_body", "arguments": {"session_id": "2"}}]'
+        )
+        self.assertEqual(call["tool"], "fiddler_mcp__session_body")
+        self.assertEqual(len(call["batch"]), 2)
+
+        client.call_tool = lambda name, args: {"id": args["session_id"]}
+        label, result = client._call_legacy_tool(call)
+        self.assertEqual(label, "fiddler_mcp__session_body, fiddler_mcp__session_body")
+        self.assertEqual([r["result"]["id"] for r in result["batch_results"]], ["1", "2"])
+
+    def test_mixed_text_tool_call_with_deeply_nested_arguments(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        text = (
+            'Stray {brace in prose. Next: '
+            '{"tool": "fiddler_mcp__sessions_search", "arguments": {"filter": {"host": {"pattern": "a}b"}}}}'
+        )
+        call = client.parse_gemini_response(text)
+        self.assertEqual(call["arguments"], {"filter": {"host": {"pattern": "a}b"}}})
+        self.assertEqual(client._extract_text_before_tool_call(text), "Stray {brace in prose.")
+
+    def test_response_text_falls_back_to_text_parts(self):
+        class _NoText:
+            def __init__(self, candidates):
+                self.candidates = candidates
+
+            @property
+            def text(self):
+                raise ValueError("no text part")
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.mcp_stderr_file = None
+        parts = [_Part(text="first"), _Part(function_call=_FC("x", {})), _Part(text="second")]
+        cand = types.SimpleNamespace(finish_reason="STOP", content=types.SimpleNamespace(parts=parts))
+        self.assertEqual(client._extract_response_text(_NoText([cand])), "first\nsecond")
+        self.assertEqual(client._extract_response_text(_NoText([])), "")
+        empty = types.SimpleNamespace(finish_reason="SAFETY", content=None)
+        self.assertEqual(client._extract_response_text(_NoText([empty])), "")
+
+    def test_markdown_detection_indicators(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        for text in ("**bold**", "use `eval`", "## Findings", "list:\n- a", "a | b", "[link]", "snake__case"):
+            self.assertTrue(client._looks_like_markdown(text), text)
+        for text in ("", "ok", "No suspicious sessions found.", "a-b+c*d#e"):
+            self.assertFalse(client._looks_like_markdown(text), text)
+
+    def test_markdown_detection_scans_cached_head_only(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        gemini._has_markdown_hint.cache_clear()
+        late = "x" * gemini.MARKDOWN_SCAN_CHARS + "**bold**"
+        self.assertFalse(client._looks_like_markdown(late))
+        self.assertTrue(client._looks_like_markdown("## Findings"))
+        self.assertTrue(client._looks_like_markdown("## Findings"))
+        self.assertEqual(gemini._has_markdown_hint.cache_info().hits, 1)
+
+    def test_prose_without_tool_markers_skips_json_decoding(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        with patch.object(gemini.json, "loads", side_effect=AssertionError("decoded prose")):
+            self.assertIsNone(client.parse_gemini_response("{Summary} no suspicious sessions found."))
+        self.assertIsNone(client.parse_gemini_response('```fiddler_mcp__live_sessions()```'))
+        with patch.object(gemini.GeminiFiddlerClient, "_process_tool_call_data", side_effect=AssertionError("parsed")):
+            self.assertIsNone(client.parse_gemini_response("```markdown\n## Findings\n- none\n```"))
+        call = client.parse_gemini_response('Run fiddler_mcp__sessions_search(host_pattern="a.test")')
+        self.assertEqual(call, {"tool": "fiddler_mcp__sessions_search", "arguments": {"host_pattern": "a.test"}})
+
     def test_legacy_prompt_notes_native_preference(self):
         client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
         client.available_tools = SAMPLE_TOOLS
@@ -497,6 +750,112 @@ class TestNativeChatLoop(unittest.TestCase):
         # Old verbose JSON examples removed
         self.assertNotIn('arguments": {{"limit": 50}}', prompt)
 
+    def test_tool_descriptions_cached_until_tools_change(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.available_tools = SAMPLE_TOOLS
+        client.max_followups = 20
+        first = client.create_tool_descriptions()
+        self.assertIs(client.create_tool_descriptions(), first)
+        client.max_followups = 5
+        self.assertIsNot(client.create_tool_descriptions(), first)
+        client.available_tools = SAMPLE_TOOLS[:1]
+        names = client._get_tool_names_list()
+        self.assertEqual(names.count("\n- "), 1)
+
+    def test_legacy_generate_passes_api_timeout(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.model = MagicMock()
+        client.gemini_timeout = 12
+        client._generate_legacy("hi", generation_config={"temperature": 0})
+        client.model.generate_content.assert_called_once_with(
+            "hi", request_options=gemini.gemini_request_options(12), generation_config={"temperature": 0}
+        )
+        self.assertEqual(client.model.generate_content.call_args.kwargs["request_options"]["timeout"], 12)
+
+    def test_request_options_add_transient_retry_when_available(self):
+        policy = object()
+        with patch.object(native, "_transient_retry", return_value=policy):
+            self.assertEqual(native.request_options(30.0), {"timeout": 30.0, "retry": policy})
+        with patch.object(native, "_transient_retry", return_value=None):
+            self.assertEqual(native.request_options(30.0), {"timeout": 30.0})
+
+    def test_legacy_generate_reuses_identical_prompt_response(self):
+        from collections import OrderedDict
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.model = MagicMock()
+        client.model_name = "gemini-test"
+        client.gemini_timeout = 12
+        client.mcp_stderr_file = None
+        client._llm_cache = OrderedDict()
+        client.model.generate_content.return_value = types.SimpleNamespace(text="answer")
+        first = client._generate_legacy("same prompt")
+        self.assertIs(client._generate_legacy("same prompt"), first)
+        client._generate_legacy("same prompt", generation_config={"temperature": 0})
+        self.assertEqual(client.model.generate_content.call_count, 2)
+
+        client.model.generate_content.return_value = types.SimpleNamespace(text="")
+        client._generate_legacy("blocked prompt")
+        client._generate_legacy("blocked prompt")
+        self.assertEqual(client.model.generate_content.call_count, 4)
+
+    def test_streamed_tool_call_starts_before_model_finishes(self):
+        import threading
+
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.available_tools = SAMPLE_TOOLS
+        client.gemini_timeout = 12
+        client._interrupt_requested = False
+        client._tool_pool = gemini.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(client._tool_pool.shutdown)
+        started = threading.Event()
+        calls = []
+
+        def fake_call(name, args):
+            calls.append((name, args))
+            started.set()
+            return {"success": True}
+
+        name = SAMPLE_TOOLS[0]["name"]
+        tool_json = '{"tool": "%s", "arguments": {"limit": 5}}' % name
+
+        def stream():
+            yield types.SimpleNamespace(text="Checking. " + tool_json[:10])
+            yield types.SimpleNamespace(text=tool_json[10:])
+            # The call is already running while the model is still producing text
+            self.assertTrue(started.wait(timeout=2))
+            yield types.SimpleNamespace(text=" Done.")
+
+        client.call_tool = fake_call
+        client.model = MagicMock()
+        client.model.generate_content.return_value = stream()
+        client._generate_legacy("prompt", early_tool=True)
+        label, result = client._call_legacy_tool({"tool": name, "arguments": {"limit": 5}})
+        self.assertEqual((label, result), (name, {"success": True}))
+        self.assertEqual(calls, [(name, {"limit": 5})])
+        self.assertIsNone(client._early_tool_call)
+
+    def test_prompt_prefix_reused_across_turns(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.available_tools = SAMPLE_TOOLS
+        client.max_followups = 20
+        client.conversation_history = []
+        first = client.build_gemini_prompt("show sessions")
+        client.create_tool_descriptions = MagicMock(side_effect=AssertionError("prefix rebuilt"))
+        second = client.build_gemini_prompt("show more")
+        self.assertTrue(second.endswith("USER QUERY: show more\n\nYOUR RESPONSE (if tool needed, use JSON format above; otherwise natural language):"))
+        self.assertEqual(first.split("CONVERSATION CONTEXT:")[0], second.split("CONVERSATION CONTEXT:")[0])
+
+    def test_tool_prompt_tail_cached_per_tool_list(self):
+        client = gemini.GeminiFiddlerClient.__new__(gemini.GeminiFiddlerClient)
+        client.available_tools = SAMPLE_TOOLS
+        tail = client._tool_prompt_tail("followup")
+        self.assertIs(client._tool_prompt_tail("followup"), tail)
+        self.assertIn(client._get_tool_names_list(), tail)
+        self.assertTrue(tail.endswith('{"tool": "tool_name", "arguments": {...}}'))
+        client.available_tools = SAMPLE_TOOLS[:1]
+        self.assertIsNot(client._tool_prompt_tail("followup"), tail)
+
 
 if __name__ == "__main__":
     unittest.main()
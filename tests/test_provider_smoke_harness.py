@@ -170,6 +170,7 @@ class TestProviderSmokeHarness(unittest.TestCase):
             client.llm_provider.bind_tools(SAMPLE_TOOLS, "sys INVESTIGATE CAPTURE EKFIDDLE")
             out = client._chat_native("hi")
             self.assertIn("ok", out)
+            self.assertTrue(client._answered)
 
     def test_investigate_prompt_unchanged(self):
         prompt = gemini.GeminiFiddlerClient.build_investigate_prompt("evil.test")